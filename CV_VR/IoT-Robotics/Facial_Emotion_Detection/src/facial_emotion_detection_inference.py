@@ -23,6 +23,8 @@ import mediapipe as mp
 # --------- TFLite Runtime ----------
 from tflite_runtime.interpreter import Interpreter, load_delegate
 
+from frame_channel import FrameChannel
+
 # ------------------- INIT -------------------
 Gst.init(None)
 os.environ.setdefault("QNN_LOG_LEVEL", "ERROR")
@@ -99,59 +101,203 @@ def load_tflite(model_path: str, backend="htp", num_threads=2):
     print(f"[TFLite] Output: shape={out_info['shape']} dtype={out_info['dtype']} quant={out_info['quantization']}")
     return interpreter
 
-# ---------------- PREPROCESS & MATH ----------
-def preprocess_caffe_bgr_from_bgr(bgr, size=(224,224)):
-    """
-    Input: BGR crop (numpy), Output: (1,3,224,224) float32 with Caffe BGR mean subtract.
-    Fast: pure OpenCV (no PIL).
-    """
-    bgr_resized = cv2.resize(bgr, size, interpolation=cv2.INTER_LINEAR).astype(np.float32)
-    bgr_resized -= BGR_MEAN
-    # HWC -> CHW
-    x = np.transpose(bgr_resized, (2,0,1))
-    return np.expand_dims(x, 0)  # (1,3,224,224)
-
+# ---------------- MATH ----------------------
 def softmax(z):
     z = z - np.max(z, axis=1, keepdims=True)
     e = np.exp(z)
     return e / np.sum(e, axis=1, keepdims=True)
 
-# -------------- INT8-safe I/O ----------------
-def set_input_int8_safe(interpreter, real_tensor):
-    in_info = interpreter.get_input_details()[0]
-    in_idx  = in_info['index']
-    in_shape = tuple(in_info['shape'])
-    in_dtype = in_info['dtype']
-    in_scale, in_zp = in_info['quantization']
-
-    tensor = real_tensor.astype(np.float32)
-
-    # TFLite commonly expects NHWC
-    if len(in_shape) == 4:
-        if in_shape[-1] == 3 and tensor.shape == (1,3,224,224):
-            tensor = np.transpose(tensor, (0,2,3,1))  # NCHW -> NHWC
-
+# ------------- BATCHED CLASSIFIER ------------
+def build_input_lut(in_dtype, in_scale=0.0, in_zp=0):
+    """
+    [256,3] lookup table: uint8 pixel value -> model input value per BGR
+    channel. Caffe BGR mean subtraction, then quantization for int8/uint8
+    models (round, clip), in one gather per channel. For a given uint8 crop
+    it matches the previous float32 subtract + quantize path exactly.
+    """
+    v = np.arange(256, dtype=np.float32)[:, None] - BGR_MEAN       # [256,3] float32
     if in_dtype in (np.int8, np.uint8):
         if in_scale == 0.0:
             print("[WARN] Input scale 0.0; using 1.0.")
             in_scale = 1.0
-        q = np.round(tensor / in_scale + in_zp)
-        q = np.clip(q, np.iinfo(in_dtype).min, np.iinfo(in_dtype).max).astype(in_dtype)
-        interpreter.set_tensor(in_idx, q)
-    else:
-        interpreter.set_tensor(in_idx, tensor.astype(in_dtype))
+        q = np.round(v / in_scale + in_zp)
+        return np.clip(q, np.iinfo(in_dtype).min, np.iinfo(in_dtype).max).astype(in_dtype)
+    return v.astype(in_dtype)
 
-def get_output_dequantized_logits(interpreter):
-    out_info = interpreter.get_output_details()[0]
-    out_idx  = out_info['index']
-    out = interpreter.get_tensor(out_idx)
-    if out_info['dtype'] in (np.int8, np.uint8):
-        out_scale, out_zp = out_info['quantization']
-        if out_scale == 0.0:
-            print("[WARN] Output scale 0.0; returning float copy.")
-            return out.astype(np.float32)
-        return out_scale * (out.astype(np.float32) - out_zp)
-    return out.astype(np.float32)
+class EmotionClassifier:
+    """
+    Batched emotion inference. Face crops are resized into a preallocated
+    uint8 batch, build_input_lut() maps them straight into the model input
+    (NHWC or NCHW), and up to `batch` faces go through one invoke().
+
+    Batch size: a model with a fixed batch dimension > 1 uses it; a model
+    with a dynamic batch dimension is resized to `batch` once at load (if
+    the delegate refuses, it falls back to 1); a fixed batch of 1 runs one
+    invoke per face, still without per-face allocations.
+    """
+    def __init__(self, interpreter, batch=4):
+        self.interpreter = interpreter
+        in_info = interpreter.get_input_details()[0]
+        self.in_idx = in_info['index']
+        self.batch = self._resolve_batch(in_info, batch)
+
+        in_info  = interpreter.get_input_details()[0]
+        out_info = interpreter.get_output_details()[0]
+        in_shape = tuple(in_info['shape'])
+        self.nhwc = in_shape[-1] == 3
+        self.h, self.w = (in_shape[1], in_shape[2]) if self.nhwc else (in_shape[2], in_shape[3])
+        in_scale, in_zp = in_info['quantization']
+        self.lut = build_input_lut(in_info['dtype'], in_scale, in_zp)
+        self.inp = np.zeros(in_shape, in_info['dtype'])
+        self.crops = np.empty((self.batch, self.h, self.w, 3), np.uint8)
+
+        self.out_idx = out_info['index']
+        self.out_quant = None
+        if out_info['dtype'] in (np.int8, np.uint8):
+            out_scale, out_zp = out_info['quantization']
+            if out_scale == 0.0:
+                print("[WARN] Output scale 0.0; returning float copy.")
+            else:
+                self.out_quant = (np.float32(out_scale), np.float32(out_zp))
+        print(f"[INFO] Emotion classifier: batch={self.batch}, input {'NHWC' if self.nhwc else 'NCHW'} {self.w}x{self.h}")
+
+    def _resolve_batch(self, in_info, batch):
+        shape = list(in_info['shape'])
+        sig = list(in_info.get('shape_signature', shape))
+        if shape[0] > 1 or batch <= 1:
+            return int(shape[0])
+        if sig[0] != -1:
+            print("[INFO] Model has a fixed batch of 1; faces are classified one invoke at a time.")
+            return 1
+        try:
+            self.interpreter.resize_tensor_input(self.in_idx, [batch] + shape[1:])
+            self.interpreter.allocate_tensors()
+            self.interpreter.set_tensor(self.in_idx, np.zeros([batch] + shape[1:], in_info['dtype']))
+            self.interpreter.invoke()    # make sure the delegate accepts the new shape
+            return batch
+        except Exception as e:
+            print(f"[WARN] Could not resize the model to batch {batch} ({e}); using batch 1.")
+            self.interpreter.resize_tensor_input(self.in_idx, shape)
+            self.interpreter.allocate_tensors()
+            return 1
+
+    def _fill(self, n):
+        """Crops [0:n] -> input tensor rows [0:n], BGR channel c = RGB channel 2-c."""
+        for c in range(3):
+            dst = self.inp[:n, ..., c] if self.nhwc else self.inp[:n, c]
+            np.take(self.lut[:, c], self.crops[:n, ..., 2 - c], out=dst, mode='clip')
+
+    def classify(self, rgb, boxes, timings=None):
+        """
+        Emotion probabilities [len(boxes), n_classes] for the square boxes
+        (x0,y0,x1,y1) on the RGB frame. timings (optional dict) accumulates
+        seconds of preproc / set_input / infer / post.
+        """
+        n_all = len(boxes)
+        probs = []
+        t = {"preproc": 0.0, "set_input": 0.0, "infer": 0.0, "post": 0.0}
+        for s in range(0, n_all, self.batch):
+            chunk = boxes[s:s + self.batch]
+            n = len(chunk)
+            t0 = time.perf_counter()
+            for i, (x0, y0, x1, y1) in enumerate(chunk):
+                cv2.resize(rgb[y0:y1, x0:x1], (self.w, self.h), dst=self.crops[i], interpolation=cv2.INTER_LINEAR)
+            self._fill(n)
+            t1 = time.perf_counter()
+            self.interpreter.set_tensor(self.in_idx, self.inp)
+            t2 = time.perf_counter()
+            self.interpreter.invoke()
+            t3 = time.perf_counter()
+            out = self.interpreter.get_tensor(self.out_idx)[:n]
+            if self.out_quant is not None:
+                logits = self.out_quant[0] * (out.astype(np.float32) - self.out_quant[1])
+            else:
+                logits = out.astype(np.float32)
+            probs.append(softmax(logits.reshape(n, -1)))
+            t4 = time.perf_counter()
+            t["preproc"] += t1 - t0; t["set_input"] += t2 - t1; t["infer"] += t3 - t2; t["post"] += t4 - t3
+        if timings is not None:
+            timings.update(t)
+        return np.concatenate(probs) if probs else np.empty((0, len(EMOTION_LABELS)), np.float32)
+
+# ---------------- FACE TRACKING --------------
+def box_iou(a, b):
+    ix = min(a[2], b[2]) - max(a[0], b[0])
+    iy = min(a[3], b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    return inter / float((a[2]-a[0])*(a[3]-a[1]) + (b[2]-b[0])*(b[3]-b[1]) - inter)
+
+class FaceTrack:
+    __slots__ = ("tid", "box", "cls_box", "cls_frame", "label", "conf", "misses")
+
+    def __init__(self, tid, box):
+        self.tid = tid
+        self.box = box
+        self.cls_box = None      # box at the last emotion inference
+        self.cls_frame = -1
+        self.label = None
+        self.conf = 0.0
+        self.misses = 0
+
+class FaceTracker:
+    """
+    Associates face boxes across frames by IoU and decides which faces need
+    a new emotion inference. A face whose box still overlaps the box it was
+    last classified at by >= stable_iou, and that was classified less than
+    reuse_frames frames ago, keeps its previous result. reuse_frames=0
+    classifies every face on every frame.
+    """
+    def __init__(self, match_iou=0.3, stable_iou=0.6, reuse_frames=5, max_misses=3):
+        self.match_iou = match_iou
+        self.stable_iou = stable_iou
+        self.reuse_frames = reuse_frames
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 0
+
+    def update(self, boxes, frame_idx):
+        """Returns (tracks of this frame's boxes, in box order; the subset that needs classification)."""
+        pairs = sorted(((box_iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        track_of = [None] * len(boxes)
+        used = set()
+        for iou, ti, bi in pairs:
+            if iou < self.match_iou:
+                break
+            if ti in used or track_of[bi] is not None:
+                continue
+            used.add(ti)
+            track_of[bi] = self.tracks[ti]
+
+        for ti, t in enumerate(self.tracks):
+            t.misses = 0 if ti in used else t.misses + 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        need = []
+        for bi, b in enumerate(boxes):
+            t = track_of[bi]
+            if t is None:
+                t = FaceTrack(self.next_id, b)
+                self.next_id += 1
+                self.tracks.append(t)
+                track_of[bi] = t
+            t.box = b
+            stale = (self.reuse_frames <= 0 or t.label is None
+                     or frame_idx - t.cls_frame >= self.reuse_frames
+                     or box_iou(b, t.cls_box) < self.stable_iou)
+            if stale:
+                need.append(t)
+        return track_of, need
+
+    def set_results(self, tracks, probs, frame_idx):
+        for t, p in zip(tracks, probs):
+            idx = int(np.argmax(p))
+            t.label = idx
+            t.conf = float(p[idx])
+            t.cls_box = t.box
+            t.cls_frame = frame_idx
 
 # -------------- FACE DETECTION ---------------
 haar = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
@@ -295,58 +441,9 @@ def draw_result(bgr, box, label, conf, fps_val=None, latency_ms=None):
     return bgr
 
 # ---------------- PING–PONG BUFFER ------------
-class PingPongBuffer:
-    """Double buffer with two slots. Capture writes alternately; processing reads the latest ready slot."""
-    def __init__(self):
-        self.frames = [None, None]
-        self.seq    = [-1, -1]
-        self.ready  = [threading.Event(), threading.Event()]
-        self.lock   = threading.Lock()
-        self.write_idx = 0
-        self.read_idx  = 1
-        self.global_seq = 0
-        self.ready[0].clear(); self.ready[1].clear()
-
-    def write(self, frame):
-        with self.lock:
-            idx = self.write_idx
-            self.frames[idx] = frame
-            self.global_seq += 1
-            self.seq[idx] = self.global_seq
-            self.ready[idx].set()                    # mark this slot ready
-            # swap indices for next write
-            self.write_idx, self.read_idx = self.read_idx, self.write_idx
-            # clear flag on the next write slot (will be overwritten soon)
-            self.ready[self.write_idx].clear()
-
-    def read_latest(self, timeout_ms=500):
-        # Wait until at least one slot is ready
-        waited = 0
-        step = 5
-        while waited < timeout_ms:
-            r0 = self.ready[0].is_set()
-            r1 = self.ready[1].is_set()
-            if r0 or r1:
-                break
-            time.sleep(step/1000.0)
-            waited += step
-
-        # Pick the slot with the highest seq (latest frame)
-        with self.lock:
-            idx = None
-            if self.ready[0].is_set() and self.ready[1].is_set():
-                idx = 0 if self.seq[0] >= self.seq[1] else 1
-            elif self.ready[0].is_set():
-                idx = 0
-            elif self.ready[1].is_set():
-                idx = 1
-            else:
-                return None
-
-            frame = self.frames[idx]
-            # Mark consumed so the next read gets the newer frame
-            self.ready[idx].clear()
-            return frame
+# Latest-frame handoff: the reader is woken by the write itself (condition
+# variable + sequence number) instead of polling; see frame_channel.py.
+PingPongBuffer = FrameChannel
 
 # ------------------- CAPTURE THREAD ----------
 def camera_thread(pipeline_str, pingpong: PingPongBuffer, rotate: int, stop_event: threading.Event):
@@ -373,14 +470,15 @@ def camera_thread(pipeline_str, pingpong: PingPongBuffer, rotate: int, stop_even
     except Exception as e:
         print(f"[CAPTURE][ERR] {e}")
     finally:
+        pingpong.close()                     # wake the processing thread
         pipeline.set_state(Gst.State.NULL)
         print("[CAPTURE] Camera thread ended.")
 
 # ---------------- PROCESSING THREAD ----------
 # NOTE: fixed parameter order: stop_event (no default) comes BEFORE defaulted args.
-def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path,
+def processing_thread(pingpong: PingPongBuffer, classifier: EmotionClassifier, show_mode, out_path,
                       stop_event: threading.Event, det_scale=0.5, detect_every=5, timing=False,
-                      processing_fps: float = None):
+                      processing_fps: float = None, tracker: FaceTracker = None):
     if processing_fps is None:
         raise ValueError("processing_fps is required; pass args.fps from CLI.")
     print("[PROC] Processing thread started.")
@@ -394,6 +492,10 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
     # Multi-face state cache
     last_boxes = None
     last_detection_frame = None
+    if tracker is None:
+        tracker = FaceTracker(reuse_frames=0)
+    frame_idx = 0            # monotonic, for the tracker (frame_count is reset after warm-up)
+    last_infer_ms = None
 
     frame_count = 0
     t_start = time.time()
@@ -413,9 +515,10 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
     try:
         while not stop_event.is_set():
             t_total0 = time.perf_counter()
-            rgb = pingpong.read_latest(timeout_ms=500)
+            rgb = pingpong.read_latest(timeout_ms=500)   # returns as soon as a new frame is written
             if rgb is None:
-                time.sleep(0.001)
+                if pingpong.closed:
+                    break
                 continue
 
             H, W = rgb.shape[:2]
@@ -437,48 +540,24 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
                 boxes = last_boxes
             t_det1 = time.perf_counter()
 
-            # Per-face emotion inference (gated by valid boxes)
+            # Emotion inference for new / moved / stale faces, batched (gated by valid boxes)
             labels_confs = []   # [(label, conf, box)]
-            latencies = []
-
-            t_pre0 = time.perf_counter()
-            t_set0 = t_pre0
-            t_inf0 = t_pre0
-            t_post0 = t_pre0
-            t_pre1 = t_pre0
-            t_set1 = t_pre0
-            t_inf1 = t_pre0
-            t_post1 = t_pre0
+            tm = {"preproc": 0.0, "set_input": 0.0, "infer": 0.0, "post": 0.0}
+            n_faces = n_classified = 0
 
             if boxes is not None:
-                for box in boxes:
-                    x0,y0,x1,y1 = box
-                    x0,y0,x1,y1 = square_expand(x0,y0,x1,y1,W,H,scale=1.25)
-                    crop_rgb = rgb[y0:y1, x0:x1]
-                    if crop_rgb.size == 0:
-                        continue
-
-                    crop_bgr = cv2.cvtColor(crop_rgb, cv2.COLOR_RGB2BGR)
-                    real_input = preprocess_caffe_bgr_from_bgr(crop_bgr)
-                    t_pre1 = time.perf_counter()
-
-                    t_set0 = time.perf_counter()
-                    set_input_int8_safe(interpreter, real_input)
-                    t_set1 = time.perf_counter()
-
-                    t_inf0 = time.perf_counter()
-                    interpreter.invoke()
-                    t_inf1 = time.perf_counter()
-                    latencies.append((t_inf1 - t_inf0) * 1000.0)
-
-                    t_post0 = time.perf_counter()
-                    logits = get_output_dequantized_logits(interpreter)
-                    probs  = softmax(logits)
-                    idx    = int(np.argmax(probs))
-                    conf   = float(probs[0][idx])
-                    label  = EMOTION_LABELS[idx]
-                    labels_confs.append((label, conf, (x0,y0,x1,y1)))
-                    t_post1 = time.perf_counter()
+                sq_boxes = [square_expand(x0,y0,x1,y1,W,H,scale=1.25) for (x0,y0,x1,y1) in boxes]
+                sq_boxes = [b for b in sq_boxes if b[2] > b[0] and b[3] > b[1]]
+                tracks, need = tracker.update(sq_boxes, frame_idx)
+                if need:
+                    probs = classifier.classify(rgb, [t.box for t in need], tm)
+                    tracker.set_results(need, probs, frame_idx)
+                    last_infer_ms = tm["infer"] * 1000.0
+                for t in tracks:
+                    if t.label is not None:
+                        labels_confs.append((EMOTION_LABELS[t.label], t.conf, t.box))
+                n_faces, n_classified = len(tracks), len(need)
+            frame_idx += 1
 
             # Convert to BGR for drawing
             bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
@@ -503,8 +582,7 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
             t_draw0 = time.perf_counter()
             for (label, conf, box) in labels_confs:
                 bgr = draw_result(bgr, box, label, conf)
-            latency_ms = max(latencies) if latencies else None
-            bgr_out = draw_result(bgr, None, None, 0.0, fps_val=None, latency_ms=latency_ms)
+            bgr_out = draw_result(bgr, None, None, 0.0, fps_val=None, latency_ms=last_infer_ms)
             t_draw1 = time.perf_counter()
 
             # Print FPS in terminal (single-line updating)
@@ -536,8 +614,9 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
             if timing:
                 print(("[TIMING] "
                        f"detect={(t_det1-t_det0)*1000.0:6.2f}ms | "
-                       f"preproc={(t_pre1-t_pre0)*1000.0:6.2f}ms | set_input={(t_set1-t_set0)*1000.0:6.2f}ms | "
-                       f"infer={(t_inf1-t_inf0)*1000.0:6.2f}ms | post={(t_post1-t_post0)*1000.0:6.2f}ms | "
+                       f"faces={n_faces} classified={n_classified} | "
+                       f"preproc={tm['preproc']*1000.0:6.2f}ms | set_input={tm['set_input']*1000.0:6.2f}ms | "
+                       f"infer={tm['infer']*1000.0:6.2f}ms | post={tm['post']*1000.0:6.2f}ms | "
                        f"draw={(t_draw1-t_draw0)*1000.0:6.2f}ms | write={(t_write1-t_write0)*1000.0:6.2f}ms | "
                        f"total={(t_total1-t_total0)*1000.0:6.2f}ms"))
 
@@ -555,7 +634,10 @@ def processing_thread(pingpong: PingPongBuffer, interpreter, show_mode, out_path
             mp_fd.close()
         except:
             pass
-        print("\n[PROC] Processing thread ended.")
+        st = pingpong.stats()
+        print(f"\n[PROC] Frames captured={st['written']} processed={st['consumed']} "
+              f"dropped (newer frame arrived first)={st['dropped']}")
+        print("[PROC] Processing thread ended.")
 
 # ------------------- MAIN --------------------
 def parse_args():
@@ -584,9 +666,17 @@ def parse_args():
     p.add_argument("--output",  type=str, default="",
                     help="Optional annotated MP4 to save (e.g., ./annotated.mp4)")
 
+    p.add_argument("--batch", type=int, default=4,
+                   help="Faces per emotion invoke (models with a dynamic batch dim are resized to this; "
+                        "a fixed batch dim in the model takes precedence)")
+    p.add_argument("--reuse-frames", type=int, default=5,
+                   help="Reuse a tracked face's emotion for up to N frames while its box is stable (0 = classify every frame)")
+    p.add_argument("--stable-iou", type=float, default=0.6,
+                   help="Min IoU between a face's box and its box at the last inference to count as stable")
+
     # Timing flag
     p.add_argument("--timing", action="store_true",
-                   help="Print per-frame timing (detect, preproc, set_input, infer, post, draw, write, total)")
+                   help="Print per-frame timing (detect, faces, preproc, set_input, infer, post, draw, write, total)")
     return p
 
 def main():
@@ -608,12 +698,14 @@ def main():
     cap_thread.start()
 
     interpreter = load_tflite(args.model, backend=args.backend, num_threads=args.threads)
+    classifier = EmotionClassifier(interpreter, batch=args.batch)
+    tracker = FaceTracker(stable_iou=args.stable_iou, reuse_frames=args.reuse_frames)
 
     # NOTE: pass stop_event BEFORE defaulted args to match signature
     proc_thread = threading.Thread(
         target=processing_thread,
-        args=(pingpong, interpreter, args.show, args.output if args.output else None,
-              stop_event, args.det_scale, args.detect_every, args.timing, args.fps),
+        args=(pingpong, classifier, args.show, args.output if args.output else None,
+              stop_event, args.det_scale, args.detect_every, args.timing, args.fps, tracker),
         daemon=True
     )
     proc_thread.start()
@@ -0,0 +1,152 @@
+#===--frame_channel.py-----------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latest-frame channel between a capture thread and its consumers.
+
+One threading.Condition and a sequence number replace sleep-polling:
+write() stores the frame, bumps the sequence and wakes every waiting
+reader at once, so a consumer starts on a new frame as soon as it exists
+and sleeps (no CPU) while there is none.
+
+- read_latest(): the main consumer (e.g. inference) gets the newest frame
+  it has not seen; frames overwritten before it got to them are counted
+  in `dropped`.
+- wait_newer(after_seq): any number of extra consumers (preview, stats)
+  each keep their own sequence cursor and never disturb the counters.
+- ring > 0 keeps the last N frames, so a recorder can take every frame
+  with read_ring() while inference only takes the latest; frames that fell
+  off the ring before the recorder read them are reported as lost.
+
+Only the standard library is used; copy or import it from other camera
+demos. Frames are passed by reference, the producer must not modify a
+frame after write().
+"""
+
+import threading, time
+from collections import deque
+
+
+class FrameChannel:
+    def __init__(self, ring=0):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0            # sequence of the latest written frame (0 = none yet)
+        self._read_seq = 0       # latest sequence taken by read_latest()
+        self._closed = False
+        self._ring = deque(maxlen=ring) if ring > 0 else None
+        self.written = 0
+        self.consumed = 0
+        self.dropped = 0         # frames overwritten before read_latest() took them
+
+    # ---------------- producer ----------------
+    def write(self, frame):
+        """Publish a frame (non-blocking) and wake all readers; returns its sequence number."""
+        with self._cond:
+            if self._seq > self._read_seq:
+                self.dropped += 1
+            self._seq += 1
+            self._frame = frame
+            self.written += 1
+            if self._ring is not None:
+                self._ring.append((self._seq, frame))
+            self._cond.notify_all()
+            return self._seq
+
+    def close(self):
+        """No more frames: wake every reader; reads then return None / empty."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def seq(self):
+        return self._seq
+
+    # ---------------- consumers ----------------
+    def read_latest(self, timeout_ms=500):
+        """
+        Newest frame not yet returned by this method, waiting up to
+        timeout_ms (None = forever). Returns None on timeout or once the
+        channel is closed and the last frame was taken.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self._closed,
+                                       None if timeout_ms is None else timeout_ms / 1000.0):
+                return None
+            if self._seq == self._read_seq:
+                return None
+            self._read_seq = self._seq
+            self.consumed += 1
+            return self._frame
+
+    def wait_newer(self, after_seq, timeout=None):
+        """
+        (seq, frame) of the newest frame with seq > after_seq, for consumers
+        that keep their own cursor; (after_seq, None) on timeout or close.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq or self._closed, timeout):
+                return after_seq, None
+            if self._seq <= after_seq:
+                return after_seq, None
+            return self._seq, self._frame
+
+    def read_ring(self, after_seq, timeout=None):
+        """
+        Every ring frame with seq > after_seq, oldest first, as
+        ([(seq, frame), ...], lost), where lost counts frames after after_seq
+        that already fell off the ring. Waits up to timeout for at least one.
+        """
+        if self._ring is None:
+            raise ValueError("FrameChannel was created without a ring (ring=0)")
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or self._closed, timeout)
+            items = [(s, f) for s, f in self._ring if s > after_seq]
+            lost = (items[0][0] - after_seq - 1) if items else 0
+            return items, lost
+
+    def stats(self):
+        with self._cond:
+            return {"written": self.written, "consumed": self.consumed, "dropped": self.dropped,
+                    "ring": len(self._ring) if self._ring is not None else 0}
+
+
+def _selftest(n=2000, producer_fps=0.0):
+    """Producer/consumer latency check: python3 frame_channel.py"""
+    ch = FrameChannel(ring=8)
+    lat = []
+
+    def consumer():
+        while True:
+            item = ch.read_latest(timeout_ms=None)
+            if item is None:
+                return
+            lat.append(time.perf_counter() - item)
+
+    period = 1.0 / producer_fps if producer_fps > 0 else 0.0005
+    th = threading.Thread(target=consumer)
+    th.start()
+    for _ in range(n):
+        ch.write(time.perf_counter())
+        time.sleep(period)
+    ch.close()
+    th.join()
+    lat.sort()
+    s = ch.stats()
+    print(f"[FrameChannel] written={s['written']} consumed={s['consumed']} dropped={s['dropped']} "
+          f"wake latency p50={lat[len(lat) // 2] * 1e6:.0f}us p99={lat[int(len(lat) * 0.99)] * 1e6:.0f}us")
+
+
+if __name__ == "__main__":
+    _selftest()
@@ -0,0 +1,246 @@
+#===--status_engine.py-----------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Temporal smoothing of per-frame detection decisions for the Arduino App Lab
+detection apps (Industrial_Anomaly_Detection, helmet-detection-on-camera-with-led,
+plant_disease_detection). App Lab deploys each app folder on its own, so every
+app ships an identical copy of this file next to its main.py.
+
+- StatusEngine: the status reported to the MCU.
+    * sliding-window voting: a status is taken once it wins `votes` of the
+      last `window` frame decisions; a running count per decision keeps
+      every update O(1)
+    * hysteresis: the current status stays until another one wins the vote,
+      and statuses listed in `hold` stay at least that many seconds
+    * timeout: `timeout` seconds without a frame that had detections reset
+      the status to `timeout_status`
+  The timeout and hold expiries are timers on one shared Scheduler thread,
+  which sleeps until the next deadline instead of polling. `status` is a
+  plain attribute, so Bridge callbacks read it without a lock.
+- RateLimiter / RateLimitedLog: at most one UI message or log line per key
+  and interval; suppressed log lines are counted in the next one printed.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Scheduler:
+    """One daemon thread running callbacks at monotonic deadlines."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+
+    def call_at(self, when, fn, *args):
+        """Run fn(*args) at time.monotonic() >= when; returns a handle for cancel()."""
+        entry = [when, next(self._seq), fn, args]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="status-scheduler", daemon=True)
+                self._thread.start()
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.monotonic() + delay, fn, *args)
+
+    def cancel(self, entry):
+        """Cancelled entries stay in the heap and are skipped when due."""
+        if entry is not None:
+            entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        _, _, fn, args = heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            if fn is None:
+                continue
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[ERROR] scheduled callback {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide Scheduler shared by every StatusEngine."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
+
+
+class RateLimiter:
+    """allow(key) is True at most once per `interval` seconds for each key."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = {}
+
+    def allow(self, key=None, now=None):
+        now = time.monotonic() if now is None else now
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+class RateLimitedLog:
+    """
+    print() at most once per `interval` seconds for each key. msg may be a
+    callable, so per-frame messages are only built when printed.
+    """
+
+    def __init__(self, interval=2.0):
+        self._limiter = RateLimiter(interval)
+        self._suppressed = {}
+
+    def __call__(self, key, msg):
+        if not self._limiter.allow(key):
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        n = self._suppressed.pop(key, 0)
+        if callable(msg):
+            msg = msg()
+        print(f"{msg} (+{n} suppressed)" if n else msg)
+
+
+class StatusEngine:
+    """
+    Debounced status from per-frame decisions. Call update() once per frame
+    from the detection callback; read `status` from anywhere.
+
+    default:        initial status
+    window, votes:  a decision becomes the status once it is at least
+                    `votes` of the last `window` decisions
+    hold:           {status: seconds} that status is kept once taken
+    timeout:        seconds without detections before falling back to
+                    `timeout_status` (default: `default`); None disables it
+    name:           prefix of the "status changed" log line
+    """
+
+    def __init__(self, default, window=5, votes=3, hold=None, timeout=1.0, timeout_status=None,
+                 name="Detection status", scheduler=None):
+        if not 1 <= votes <= window:
+            raise ValueError(f"votes must be in 1..window, got votes={votes} window={window}")
+        self.status = default
+        self.default = default
+        self.window = window
+        self.votes = votes
+        self.hold = dict(hold or {})
+        self.timeout = timeout
+        self.timeout_status = default if timeout_status is None else timeout_status
+        self.name = name
+        self.changes = 0
+
+        self._sched = scheduler or get_scheduler()
+        self._lock = threading.Lock()
+        self._recent = [None] * window      # ring of the last `window` decisions
+        self._pos = 0
+        self._counts = {}
+        self._last_seen = time.monotonic()
+        self._held_until = 0.0
+        self._hold_timer = None
+        self._timeout_timer = None
+        if timeout is not None:
+            self._timeout_timer = self._sched.call_at(self._last_seen + timeout, self._on_timeout)
+
+    # ---------------- per frame ----------------
+    def update(self, decision, seen=True):
+        """
+        Add one frame decision. seen=False for frames without detections:
+        they still vote but do not postpone the timeout.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if seen:
+                self._last_seen = now
+                if self._timeout_timer is None and self.timeout is not None:
+                    self._timeout_timer = self._sched.call_at(now + self.timeout, self._on_timeout)
+
+            old = self._recent[self._pos]
+            if old is not None:
+                self._counts[old] -= 1
+            self._recent[self._pos] = decision
+            self._pos = (self._pos + 1) % self.window
+            n = self._counts.get(decision, 0) + 1
+            self._counts[decision] = n
+
+            if n < self.votes or now < self._held_until:
+                return
+            if decision in self.hold and (decision != self.status or self._hold_timer is None):
+                self._start_hold(decision, now)
+            if decision != self.status:
+                self._set(decision)
+
+    # ---------------- timers ----------------
+    def _start_hold(self, status, now):
+        self._sched.cancel(self._hold_timer)
+        self._held_until = now + self.hold[status]
+        self._hold_timer = self._sched.call_at(self._held_until, self._on_hold_end)
+        print(f"[INFO] {status} detected - holding it for {self.hold[status]:g} seconds")
+
+    def _on_hold_end(self):
+        with self._lock:
+            self._hold_timer = None
+            self._held_until = 0.0
+            print(f"[INFO] Hold period ended for {self.status}")
+            dt = time.monotonic() - self._last_seen
+            if self.timeout is not None and dt > self.timeout:
+                print(f"[INFO] No detections for {dt:.2f}s -> force {self.timeout_status}")
+                self._fall_back()
+                return
+            leader = max(self._counts, key=self._counts.get, default=None)
+            if leader is not None and self._counts[leader] >= self.votes and leader != self.status:
+                if leader in self.hold:
+                    self._start_hold(leader, time.monotonic())
+                self._set(leader)
+
+    def _on_timeout(self):
+        with self._lock:
+            dt = time.monotonic() - self._last_seen
+            if dt < self.timeout:
+                # detections arrived meanwhile: one wake-up per timeout period, not per frame
+                self._timeout_timer = self._sched.call_at(self._last_seen + self.timeout, self._on_timeout)
+                return
+            self._timeout_timer = None
+            if self._hold_timer is not None:
+                return      # _on_hold_end() falls back if nothing was seen by then
+            if self.status != self.timeout_status:
+                print(f"[INFO] No detections for {dt:.2f}s -> force {self.timeout_status}")
+            self._fall_back()
+
+    # ---------------- state ----------------
+    def _fall_back(self):
+        """Drop the votes so a fresh status needs a full vote again."""
+        self._recent = [None] * self.window
+        self._counts.clear()
+        self._set(self.timeout_status)
+
+    def _set(self, status):
+        if status != self.status:
+            print(f"[INFO] {self.name} changed: {self.status} -> {status}")
+            self.changes += 1
+            self.status = status
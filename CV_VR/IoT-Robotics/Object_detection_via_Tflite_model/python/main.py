@@ -11,18 +11,32 @@ What this app does:
 1) Capture frames from a USB camera
 2) Run YOLOX inference via a TFLite model
 3) Post-process detections (score threshold, NMS, Top-K)
-4) Draw results on the image and expose a REST endpoint that
-   returns the latest JPEG (base64)
+4) Draw results on the image and push each new JPEG to the browser as
+   an MJPEG stream (a REST endpoint returning the latest JPEG as base64
+   remains as a fallback)
+
+The three parts run as a pipeline of threads (capture -> inference ->
+render + JPEG encode). Each hands over only its latest result: a stage
+that is still busy skips the frames it could not take instead of
+queueing them, so the stream shows the most recent frame the model
+finished, and capture never waits for inference. While no browser is
+watching, frames are still inferred but not drawn or JPEG-encoded.
 
 Notes:
 - You can override model and labels via environment variables:
     APP_MODEL, APP_LABELS
 - You can tune runtime & quality via:
     APP_THREADS, APP_JPEG_QUALITY, APP_LOOP_SLEEP
-    APP_SCORE_TH, APP_IOU_TH, APP_TOPK
+    APP_SCORE_TH, APP_IOU_TH, APP_TOPK, APP_STATS_EVERY
+    APP_STREAM_PORT, APP_STREAM_MAX_FPS, APP_CLIENT_IDLE
+- Headless benchmark on a video file (no camera / Web UI, needs OpenCV):
+    python main.py --bench video.mp4 [--frames 300] [--serial]
 """
-import io, os, time, base64
-from typing import Tuple
+import io, os, sys, time, base64, json, argparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlparse
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import threading
@@ -30,10 +44,8 @@ import threading
 # TFLite runtime (Edge AI)
 from ai_edge_litert.interpreter import Interpreter
 
-# Arduino app framework, Web UI, and USB camera wrapper
-from arduino.app_utils import App
-from arduino.app_bricks.web_ui import WebUI
-from arduino.app_peripherals.usb_camera import USBCamera
+# Letterbox into a preallocated input buffer (preprocess.py)
+from preprocess import Letterboxer, preprocess_input, unletterbox_boxes
 
 # =========================
 # Settings
@@ -47,7 +59,14 @@ LABELS_PATH = os.environ.get("APP_LABELS", os.path.join(APP_DIR, "./coco_labels.
 # Runtime & performance
 NUM_THREADS   = int(os.environ.get("APP_THREADS", "4"))
 JPEG_QUALITY  = int(os.environ.get("APP_JPEG_QUALITY", "80"))
-LOOP_SLEEP    = float(os.environ.get("APP_LOOP_SLEEP", "0.03"))
+LOOP_SLEEP    = float(os.environ.get("APP_LOOP_SLEEP", "0"))      # optional pause of the capture stage per frame
+STATS_EVERY   = float(os.environ.get("APP_STATS_EVERY", "10"))    # seconds between pipeline stats lines (0 = off)
+CAPTURE_RETRY = 0.02                                              # wait after the camera returned no frame
+
+# Frame delivery
+STREAM_PORT    = int(os.environ.get("APP_STREAM_PORT", "7001"))      # MJPEG server port, must be in app.yaml ports (0 = off, polling only)
+STREAM_MAX_FPS = float(os.environ.get("APP_STREAM_MAX_FPS", "15"))   # upper bound of the per-client rate
+CLIENT_IDLE    = float(os.environ.get("APP_CLIENT_IDLE", "3"))       # a poller counts as connected this many seconds
 
 # Post-processing
 SCORE_TH = float(os.environ.get("APP_SCORE_TH", "0.25"))
@@ -78,92 +97,6 @@ def load_labels(path: str):
         return None
 
 
-def letterbox_resize(img: Image.Image, size_hw: Tuple[int, int], pad_val: int = 114):
-    """
-    Resize with letterboxing to target size (H, W) while preserving aspect ratio.
-    The image is centered on a padded canvas.
-
-    Returns:
-      - canvas: resized RGB PIL image of size (W, H)
-      - (scale, pad_w, pad_h): scale factor and total padding in width/height
-    """
-    H, W = size_hw
-    img = img.convert("RGB")
-    w, h = img.size
-    
-    # Uniform scale to fit within target (W,H)
-    scale = min(W / w, H / h)
-    new_w = int(round(w * scale))
-    new_h = int(round(h * scale))
-    resized = img.resize((new_w, new_h), Image.BILINEAR)
-    
-    # Paste onto centered canvas
-    canvas = Image.new("RGB", (W, H), (pad_val, pad_val, pad_val))
-    pad_left = (W - new_w) // 2
-    pad_top  = (H - new_h) // 2
-    canvas.paste(resized, (pad_left, pad_top))
-    pad_w = W - new_w
-    pad_h = H - new_h
-    return canvas, (scale, pad_w, pad_h)
-
-
-def preprocess_input(img: Image.Image, size_hw: Tuple[int, int], expect_dtype):
-    """
-    Preprocess pipeline:
-      1) Letterbox to model input size
-      2) Normalize for float models (or keep uint8 as-is)
-      3) Add batch dim -> [1, H, W, 3]
-
-    Returns:
-      - input array
-      - meta dict for reversing letterbox (used in post-processing)
-    """
-    H, W = size_hw
-    img_resized, (scale, pad_w, pad_h) = letterbox_resize(img, (H, W))
-
-    if expect_dtype == np.float32:
-        arr = np.asarray(img_resized, dtype=np.float32) / 255.0
-    else:
-        arr = np.asarray(img_resized, dtype=np.uint8)
-
-    arr = np.expand_dims(arr, axis=0)  # [1,H,W,3]
-    meta = {
-        "orig_size": (img.size[1], img.size[0]),  # (H0, W0)
-        "input_size": (H, W),
-        "scale": scale, "pad_w": pad_w, "pad_h": pad_h, "add_batch": True
-    }
-    return arr, meta
-
-
-def unletterbox_boxes(boxes: np.ndarray, meta: dict):
-    """
-    Convert boxes from letterboxed input coordinates back to original image
-    coordinates. Assumes boxes in xyxy format.
-    """
-    H_in, W_in = meta["input_size"]
-    H0, W0 = meta["orig_size"]
-    scale = meta["scale"]
-    pad_w = meta["pad_w"]
-    pad_h = meta["pad_h"]
-    pad_left = pad_w / 2.0
-    pad_top  = pad_h / 2.0
-    boxes = boxes.copy().astype(np.float32)
-    
-    # Remove letterbox offsets
-    boxes[:, [0, 2]] -= pad_left
-    boxes[:, [1, 3]] -= pad_top
-    
-    # Reverse scaling
-    boxes /= max(scale, 1e-6)
-    
-    # Clip to image bounds
-    boxes[:, 0] = np.clip(boxes[:, 0], 0, W0 - 1)
-    boxes[:, 1] = np.clip(boxes[:, 1], 0, H0 - 1)
-    boxes[:, 2] = np.clip(boxes[:, 2], 0, W0 - 1)
-    boxes[:, 3] = np.clip(boxes[:, 3], 0, H0 - 1)
-    return boxes
-
-
 def iou_xyxy(a: np.ndarray, b: np.ndarray) -> np.ndarray:
     """
     Pairwise IoU for two sets of xyxy boxes.
@@ -202,20 +135,21 @@ def nms_fast(boxes: np.ndarray, scores: np.ndarray, iou_th: float) -> np.ndarray
 def postprocess_yolox(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, meta: dict, score_th: float, iou_th: float, topk: int):
     """
     YOLOX post-processing:
-      1) Un-letterbox coordinates back to original image
-      2) Score thresholding
+      1) Score thresholding
+      2) Un-letterbox coordinates back to original image
       3) NMS
       4) Keep top-K by score
 
     Returns: boxes_pp, scores_pp, classes_pp, order_idx
     """                          
-    boxes = unletterbox_boxes(boxes, meta)
-    
-     # Score filter
+     # Score filter (first, so only the surviving boxes are un-letterboxed)
     mask = scores >= float(score_th)
     boxes, scores, classes = boxes[mask], scores[mask], classes[mask]
     if boxes.shape[0] == 0:
-        return boxes, scores, classes, np.array([], dtype=np.int32)
+        return boxes.astype(np.float32), scores, classes, np.array([], dtype=np.int32)
+
+    # boxes[mask] is a fresh copy, so it is un-letterboxed in place
+    boxes = unletterbox_boxes(boxes, meta, inplace=True)
     
      # NMS
     keep = nms_fast(boxes, scores, iou_th)
@@ -290,31 +224,98 @@ def render_on_pil(pil_img: Image.Image, boxes: np.ndarray, scores: np.ndarray, c
     return img
 
 # =========================
-# Inference main flow
+# Inference
 # =========================
-# Load labels
-_labels = load_labels(LABELS_PATH)
-
-# Create TFLite interpreter and prepare I/O
-_interpreter = Interpreter(model_path=MODEL_PATH, num_threads=NUM_THREADS)
-_interpreter.allocate_tensors()
-_input_details  = _interpreter.get_input_details()
-_output_details = _interpreter.get_output_details()
-
-# Input tensor info
-in_idx   = _input_details[0]["index"]
-in_shape = tuple(_input_details[0]["shape"])  # [N,H,W,C]
-in_dtype = _input_details[0]['dtype']
-
-print(f"[INFO] Model: {MODEL_PATH}")
-print(f"[INFO] Input shape={in_shape}, dtype={in_dtype}, quant={_input_details[0].get('quantization',(0.0,0))}")
-
-# Latest JPEG cache (served by REST)
-latest_jpeg = b""
-latest_ts = 0
-#timestep
-_latest_lock = threading.Lock()
-#_cam_started = False
+def resolve_output_indices(output_details):
+    """
+    Tensor indices of the boxes / scores / classes outputs, matched by
+    name. Done once at load; returns None if any of them is missing.
+    """
+    idx_boxes = idx_scores = idx_classes = None
+    for d in output_details:
+        name = (d.get('name') or '').lower()
+        if 'box' in name:
+            idx_boxes = d['index']
+        elif 'score' in name:
+            idx_scores = d['index']
+        elif 'class' in name:
+            idx_classes = d['index']
+    if None in (idx_boxes, idx_scores, idx_classes):
+        return None
+    return idx_boxes, idx_scores, idx_classes
+
+
+class YoloxDetector:
+    """
+    TFLite interpreter with its input/output indices resolved at load.
+    Not thread-safe: only one thread (the inference stage) calls detect().
+    """
+    def __init__(self, model_path: str = MODEL_PATH, labels_path: str = LABELS_PATH, num_threads: int = NUM_THREADS):
+        self.labels = load_labels(labels_path)
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details  = self.interpreter.get_input_details()
+        output_details = self.interpreter.get_output_details()
+
+        # Input tensor info
+        self.in_idx   = input_details[0]["index"]
+        self.in_shape = tuple(input_details[0]["shape"])  # [N,H,W,C]
+        self.in_dtype = input_details[0]['dtype']
+        self.out_idx  = resolve_output_indices(output_details)
+        self.letterbox = Letterboxer((self.in_shape[1], self.in_shape[2]), self.in_dtype)
+
+        print(f"[INFO] Model: {model_path}")
+        print(f"[INFO] Input shape={self.in_shape}, dtype={self.in_dtype}, quant={input_details[0].get('quantization',(0.0,0))}")
+        if self.out_idx is None:
+            names = [d.get('name') for d in output_details]
+            print(f"[WARN] boxes/scores/classes outputs not found in {names}; frames are passed through without detections")
+
+    def detect(self, pil_img: Image.Image, timings: Optional[dict] = None):
+        """
+        Run YOLOX on one image and return post-processed boxes, scores and
+        classes. timings (optional) receives seconds per step:
+        preprocess / invoke / postprocess.
+        """
+        t0 = time.perf_counter()
+        input_tensor, meta = preprocess_input(pil_img, (self.in_shape[1], self.in_shape[2]), expect_dtype=self.in_dtype,
+                                              letterboxer=self.letterbox)
+        t1 = time.perf_counter()
+
+        # Inference
+        self.interpreter.set_tensor(self.in_idx, input_tensor)
+        self.interpreter.invoke()
+        t2 = time.perf_counter()
+
+        # If any output is missing, return empty results safely
+        if self.out_idx is None:
+            boxes_pp, scores_pp, classes_pp = np.empty((0, 4)), np.empty((0,), np.float32), np.empty((0,), np.int32)
+        else:
+            # Read outputs and normalize dtypes
+            idx_boxes, idx_scores, idx_classes = self.out_idx
+            boxes = np.squeeze(self.interpreter.get_tensor(idx_boxes))
+            scores = np.squeeze(self.interpreter.get_tensor(idx_scores))
+            classes = np.squeeze(self.interpreter.get_tensor(idx_classes))
+
+            # No dequant: use float directly; cast classes to int
+            if boxes.dtype != np.float32:
+                boxes = boxes.astype(np.float32)
+            if scores.dtype != np.float32:
+                scores = scores.astype(np.float32)
+            if np.issubdtype(classes.dtype, np.floating):
+                classes = np.rint(classes).astype(np.int32)
+            else:
+                classes = classes.astype(np.int32)
+
+            # Post-process (un-letterbox, filter, NMS, top-K)
+            boxes_pp, scores_pp, classes_pp, _ = postprocess_yolox(
+                boxes, scores, classes, meta, score_th=SCORE_TH, iou_th=IOU_TH, topk=TOPK
+            )
+        if timings is not None:
+            timings["preprocess"] = t1 - t0
+            timings["invoke"] = t2 - t1
+            timings["postprocess"] = time.perf_counter() - t2
+        return boxes_pp, scores_pp, classes_pp
+
 
 def encode_jpeg(pil_img, quality: int = JPEG_QUALITY) -> bytes:
     """
@@ -324,68 +325,471 @@ def encode_jpeg(pil_img, quality: int = JPEG_QUALITY) -> bytes:
     pil_img.save(buf, format="JPEG", quality=quality)
     return buf.getvalue()
 
-def run_yolox_on_frame(pil_img: Image.Image):
+def run_yolox_on_frame(detector: YoloxDetector, pil_img: Image.Image):
     """
     Run YOLOX inference on a single image, returning:
       - composed: PIL image with drawn detections
       - boxes_pp, scores_pp, classes_pp: post-processed arrays
     """
-    # preprocess
-    input_tensor, meta = preprocess_input(pil_img, (in_shape[1], in_shape[2]), expect_dtype=in_dtype)
-    
-    # Inference
-    _interpreter.set_tensor(in_idx, input_tensor)
-    _interpreter.invoke()
+    boxes_pp, scores_pp, classes_pp = detector.detect(pil_img)
+    composed = render_on_pil(pil_img, boxes_pp, scores_pp, classes_pp, detector.labels)
+    return composed, boxes_pp, scores_pp, classes_pp
 
-    # Locate output tensors by name
-    idx_boxes = idx_scores = idx_classes = None
-    for i, d in enumerate(_output_details):
-        name = (d.get('name') or '').lower()
-        if 'box' in name:
-            idx_boxes = i
-        elif 'score' in name:
-            idx_scores = i
-        elif 'class' in name:
-            idx_classes = i
+# =========================
+# Pipeline
+# =========================
+class LatestSlot:
+    """
+    One-item handoff between two stages. put() replaces an item the
+    consumer has not taken yet (counted in `dropped`); get() blocks until
+    a new item arrives and returns None once the slot is closed.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._fresh = False
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._fresh:
+                self.dropped += 1
+            self._item = item
+            self._fresh = True
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._fresh and not self._closed:
+                self._cond.wait()
+            if not self._fresh:
+                return None
+            self._fresh = False
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Count and recent latency samples (seconds) of one pipeline step."""
+    def __init__(self, keep: int = 2000):
+        self.n = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=keep)
+
+    def add(self, sec: float):
+        self.n += 1
+        self.total += sec
+        self.recent.append(sec)
+
+    def summary(self, wall: float) -> dict:
+        r = np.asarray(self.recent, dtype=np.float64) * 1000.0
+        return {
+            "frames": self.n,
+            "fps": self.n / wall if wall > 0 else 0.0,
+            "mean_ms": self.total * 1000.0 / self.n if self.n else 0.0,
+            "p50_ms": float(np.percentile(r, 50)) if r.size else 0.0,
+            "p95_ms": float(np.percentile(r, 95)) if r.size else 0.0,
+            "max_ms": float(r.max()) if r.size else 0.0,
+        }
 
-    # If any output is missing, return original image and empty results safely
-    if None in (idx_boxes, idx_scores, idx_classes):
-        return pil_img, np.empty((0, 4)), np.empty((0,), np.float32), np.empty((0,), np.int32)
-
-    # Read outputs and normalize dtypes
-    boxes = np.squeeze(_interpreter.get_tensor(_output_details[idx_boxes]['index']))
-    scores = np.squeeze(_interpreter.get_tensor(_output_details[idx_scores]['index']))
-    classes = np.squeeze(_interpreter.get_tensor(_output_details[idx_classes]['index']))
-
-    # No dequant: use float directly; cast classes to int
-    if boxes.dtype != np.float32:
-        boxes = boxes.astype(np.float32)
-    if scores.dtype != np.float32:
-        scores = scores.astype(np.float32)
-    if np.issubdtype(classes.dtype, np.floating):
-        classes = np.rint(classes).astype(np.int32)
-    else:
-        classes = classes.astype(np.int32)
 
-    # Post-process (un-letterbox, filter, NMS, top-K)
-    boxes_pp, scores_pp, classes_pp, _ = postprocess_yolox(
-        boxes, scores, classes, meta, score_th=SCORE_TH, iou_th=IOU_TH, topk=TOPK
-    )
+STAT_KEYS = ("capture", "preprocess", "invoke", "postprocess", "inference", "render", "encode", "output", "end_to_end")
 
-    # Draw results
-    composed = render_on_pil(pil_img, boxes_pp, scores_pp, classes_pp, _labels)
-    return composed, boxes_pp, scores_pp, classes_pp
+
+class DetectionPipeline:
+    """
+    capture -> inference -> render + encode, one thread each, connected
+    by LatestSlots. capture_fn() returns a PIL image or None. None ends
+    the stream when end_on_none is set (video files); for a camera it is
+    a missed frame and capture is retried after CAPTURE_RETRY seconds.
+    on_jpeg(jpeg_bytes, capture_time) receives every
+    rendered frame. When want_output() is False (nobody watching) results
+    are dropped without drawing or encoding. Any stage error stops the
+    pipeline and is kept in `error`.
+    """
+    def __init__(self, detector: YoloxDetector, capture_fn: Callable[[], Optional[Image.Image]],
+                 on_jpeg: Callable[[bytes, float], None], capture_pause: float = 0.0,
+                 want_output: Optional[Callable[[], bool]] = None, end_on_none: bool = True):
+        self.detector = detector
+        self.capture_fn = capture_fn
+        self.end_on_none = end_on_none
+        self.capture_misses = 0
+        self.on_jpeg = on_jpeg
+        self.capture_pause = capture_pause
+        self.want_output = want_output
+        self.unwatched = 0
+        self.frames = LatestSlot()      # capture -> inference
+        self.results = LatestSlot()     # inference -> render
+        self.stats = {k: StageStats() for k in STAT_KEYS}
+        self.error: Optional[BaseException] = None
+        self._stop = threading.Event()
+        self._threads = []
+        self.t_start = 0.0
+        self.t_end = None
+
+    def start(self):
+        self.t_start = time.perf_counter()
+        for fn, name in ((self._capture, "capture"), (self._infer, "inference"), (self._render, "render")):
+            th = threading.Thread(target=self._guard, args=(fn,), name=f"yolox-{name}", daemon=True)
+            th.start()
+            self._threads.append(th)
+        return self
+
+    def _guard(self, fn):
+        try:
+            fn()
+        except BaseException as e:   # keep it for the main thread, stop the other stages
+            if self.error is None:
+                self.error = e
+            self._stop.set()
+            self.frames.close()
+            self.results.close()
+
+    def _capture(self):
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                frame = self.capture_fn()
+                if frame is None:
+                    if self.end_on_none:
+                        break
+                    self.capture_misses += 1
+                    if self.capture_misses % 100 == 1:
+                        print(f"[WARN] Camera returned no frame ({self.capture_misses} so far), retrying")
+                    self._stop.wait(CAPTURE_RETRY)
+                    continue
+                self.stats["capture"].add(time.perf_counter() - t0)
+                self.frames.put((t0, frame))
+                if self.capture_pause > 0:
+                    time.sleep(self.capture_pause)
+        finally:
+            self.frames.close()
+
+    def _infer(self):
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                t_cap, frame = item
+                tm = {}
+                t0 = time.perf_counter()
+                boxes, scores, classes = self.detector.detect(frame, tm)
+                self.stats["inference"].add(time.perf_counter() - t0)
+                for k, v in tm.items():
+                    self.stats[k].add(v)
+                self.results.put((t_cap, frame, boxes, scores, classes))
+        finally:
+            self.results.close()
+
+    def _render(self):
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            t_cap, frame, boxes, scores, classes = item
+            if self.want_output is not None and not self.want_output():
+                self.unwatched += 1
+                continue
+            t0 = time.perf_counter()
+            composed = render_on_pil(frame, boxes, scores, classes, self.detector.labels)
+            t1 = time.perf_counter()
+            jpeg_bytes = encode_jpeg(composed, quality=JPEG_QUALITY)
+            t2 = time.perf_counter()
+            self.stats["render"].add(t1 - t0)
+            self.stats["encode"].add(t2 - t1)
+            self.stats["output"].add(t2 - t0)
+            self.on_jpeg(jpeg_bytes, t_cap)
+            self.stats["end_to_end"].add(time.perf_counter() - t_cap)
+
+    @property
+    def running(self) -> bool:
+        return any(th.is_alive() for th in self._threads)
+
+    def join(self, timeout: Optional[float] = None):
+        for th in self._threads:
+            th.join(timeout)
+        if self.t_end is None and not self.running:
+            self.t_end = time.perf_counter()
+
+    def stop(self, timeout: float = 2.0):
+        """Stop capturing; inference and render finish the frames already handed over."""
+        self._stop.set()
+        self.join(timeout)
+
+    def report(self) -> dict:
+        wall = (self.t_end or time.perf_counter()) - self.t_start
+        return {
+            "wall_sec": wall,
+            "fps": self.stats["output"].n / wall if wall > 0 else 0.0,
+            "dropped_before_inference": self.frames.dropped,
+            "dropped_before_render": self.results.dropped,
+            "not_encoded_no_client": self.unwatched,
+            "capture_misses": self.capture_misses,
+            "stages": {k: v.summary(wall) for k, v in self.stats.items()},
+        }
+
+    def stats_line(self) -> str:
+        r = self.report()
+        st = r["stages"]
+        return (f"[STATS] capture {st['capture']['fps']:.1f}fps | inference {st['inference']['fps']:.1f}fps "
+                f"{st['inference']['mean_ms']:.0f}ms | out {r['fps']:.1f}fps | "
+                f"e2e p50 {st['end_to_end']['p50_ms']:.0f}ms | skipped {r['dropped_before_inference']}")
+
+
+def print_report(r: dict, title: str):
+    print(f"[INFO] {title}: {r['wall_sec']:.1f}s, output {r['fps']:.2f} FPS")
+    print(f"{'stage':<12} {'frames':>7} {'fps':>7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for k, s in r["stages"].items():
+        if s["frames"]:
+            print(f"{k:<12} {s['frames']:7d} {s['fps']:7.2f} {s['mean_ms']:8.2f} {s['p50_ms']:8.2f} "
+                  f"{s['p95_ms']:8.2f} {s['max_ms']:8.2f}")
+    if "dropped_before_inference" in r:
+        print(f"[INFO] Frames skipped (latest-frame handoff): before inference {r['dropped_before_inference']}, "
+              f"before render {r['dropped_before_render']}")
+
+# =========================
+# Headless benchmark
+# =========================
+class VideoSource:
+    """
+    Video file read with OpenCV as a camera stand-in: capture() returns
+    the next frame as a PIL image, paced to `fps` (-1: the file's own
+    rate, 0: as fast as it decodes), or None at the end.
+    """
+    def __init__(self, path: str, fps: float = -1.0, max_frames: int = 0):
+        try:
+            import cv2
+        except ImportError:
+            sys.exit("[ERROR] --bench needs OpenCV: pip install opencv-python-headless")
+        self.cv2 = cv2
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            sys.exit(f"[ERROR] Cannot open video: {path}")
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        rate = file_fps if fps < 0 else fps
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.max_frames = max_frames
+        self.count = 0
+        self._next = None
+        print(f"[INFO] Video: {path} ({file_fps:.1f} fps), paced at {rate:.1f} fps" if rate > 0
+              else f"[INFO] Video: {path} ({file_fps:.1f} fps), unpaced")
+
+    def capture(self) -> Optional[Image.Image]:
+        if self.max_frames and self.count >= self.max_frames:
+            return None
+        if self.period:
+            now = time.perf_counter()
+            if self._next is None or now - self._next > self.period:   # fell behind: do not burst to catch up
+                self._next = now
+            elif self._next > now:
+                time.sleep(self._next - now)
+            self._next += self.period
+        ok, bgr = self.cap.read()
+        if not ok:
+            return None
+        self.count += 1
+        return Image.fromarray(self.cv2.cvtColor(bgr, self.cv2.COLOR_BGR2RGB))
+
+    def release(self):
+        self.cap.release()
+
+
+def run_serial(detector: YoloxDetector, source: VideoSource) -> dict:
+    """The previous loop, one frame at a time (capture, infer, draw, encode, sleep), for comparison."""
+    stats = {k: StageStats() for k in STAT_KEYS}
+    t_start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        frame = source.capture()
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+        tm = {}
+        boxes, scores, classes = detector.detect(frame, tm)
+        t2 = time.perf_counter()
+        composed = render_on_pil(frame, boxes, scores, classes, detector.labels)
+        t3 = time.perf_counter()
+        encode_jpeg(composed, quality=JPEG_QUALITY)
+        t4 = time.perf_counter()
+        for k, v in (("capture", t1 - t0), ("inference", t2 - t1), ("render", t3 - t2), ("encode", t4 - t3),
+                     ("output", t4 - t2), ("end_to_end", t4 - t0), *tm.items()):
+            stats[k].add(v)
+        if LOOP_SLEEP > 0:
+            time.sleep(LOOP_SLEEP)
+    wall = time.perf_counter() - t_start
+    return {
+        "wall_sec": wall,
+        "fps": stats["output"].n / wall if wall > 0 else 0.0,
+        "stages": {k: v.summary(wall) for k, v in stats.items()},
+    }
+
+
+def run_bench(args):
+    detector = YoloxDetector(args.model, args.labels, args.threads)
+    source = VideoSource(args.bench, fps=args.source_fps, max_frames=args.frames)
+    try:
+        if args.serial:
+            report = run_serial(detector, source)
+            print_report(report, "Serial loop")
+        else:
+            pipe = DetectionPipeline(detector, source.capture, on_jpeg=lambda jpeg, t_cap: None,
+                                     capture_pause=LOOP_SLEEP).start()
+            try:
+                pipe.join()
+            except KeyboardInterrupt:
+                pipe.stop()
+            if pipe.error is not None:
+                raise pipe.error
+            report = pipe.report()
+            print_report(report, "Pipelined")
+    finally:
+        source.release()
+    report.update({"mode": "serial" if args.serial else "pipelined", "video": args.bench,
+                   "frames_read": source.count, "model": args.model})
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.json}")
 
 # =========================
-# REST API: get latest JPEG
+# Frame delivery
+# =========================
+class FrameHub:
+    """
+    Latest JPEG shared between the render stage and the clients. Stream
+    clients block in wait() until a newer frame is published; REST
+    pollers mark themselves active with each request. active() tells the
+    render stage whether anyone is watching.
+    """
+    def __init__(self, idle_sec: float = CLIENT_IDLE):
+        self._cond = threading.Condition()
+        self.jpeg = b""
+        self.seq = 0
+        self.ts = 0
+        self.streams = 0
+        self.idle_sec = idle_sec
+        self._last_poll = float("-inf")
+        self._b64 = ("", 0)   # (base64 payload, seq it was made from)
+
+    def publish(self, jpeg_bytes: bytes, t_capture: float = 0.0):
+        """Render stage callback: store the newest JPEG and wake the stream clients."""
+        with self._cond:
+            self.jpeg = jpeg_bytes
+            self.seq += 1
+            self.ts = int(time.time() * 1000)
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self.seq, self.jpeg
+
+    def wait(self, after_seq: int, timeout: float = 1.0):
+        """(seq, jpeg) of the latest frame, waiting up to timeout for one newer than after_seq."""
+        with self._cond:
+            if self.seq <= after_seq:
+                self._cond.wait(timeout)
+            return self.seq, self.jpeg
+
+    def latest_b64(self):
+        """(base64 payload, ts, seq); encoded at most once per frame however many pollers ask."""
+        self._last_poll = time.monotonic()
+        with self._cond:
+            seq, jpeg, ts = self.seq, self.jpeg, self.ts
+        payload, b64_seq = self._b64
+        if b64_seq != seq:
+            payload = base64.b64encode(jpeg).decode("ascii") if jpeg else ""
+            self._b64 = (payload, seq)
+        return payload, ts, seq
+
+    def add_stream(self, n: int):
+        with self._cond:
+            self.streams += n
+
+    def active(self) -> bool:
+        return self.streams > 0 or time.monotonic() - self._last_poll < self.idle_sec
+
+
+class MjpegHandler(BaseHTTPRequestHandler):
+    """
+    GET /stream.mjpg[?fps=N]: multipart/x-mixed-replace stream of raw
+    JPEG parts, one part per new frame. A client is sent at most
+    min(fps, max_fps) frames per second; after the rate-limit pause it
+    gets the newest frame, so slow clients skip frames instead of lagging.
+    """
+    hub: FrameHub = None
+    max_fps: float = STREAM_MAX_FPS
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/stream.mjpg":
+            self.send_error(404)
+            return
+        try:
+            fps = float(parse_qs(url.query).get("fps", ["0"])[0])
+        except ValueError:
+            fps = 0.0
+        fps = min(fps, self.max_fps) if fps > 0 else self.max_fps
+        period = 1.0 / fps if fps > 0 else 0.0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-cache, no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.hub.add_stream(1)
+        try:
+            seq, last = 0, float("-inf")
+            while True:
+                new_seq, jpeg = self.hub.wait(seq)
+                if new_seq == seq or not jpeg:
+                    continue
+                pause = last + period - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                    new_seq, jpeg = self.hub.latest()
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+                seq, last = new_seq, time.monotonic()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.hub.add_stream(-1)
+
+
+def start_mjpeg_server(hub: FrameHub, port: int, max_fps: float = STREAM_MAX_FPS) -> ThreadingHTTPServer:
+    handler = type("BoundMjpegHandler", (MjpegHandler,), {"hub": hub, "max_fps": max_fps})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mjpeg-server", daemon=True).start()
+    print(f"[INFO] MJPEG stream on http://0.0.0.0:{port}/stream.mjpg (max {max_fps:g} fps per client)")
+    return server
+
+
+_frames = FrameHub()
+_stream_port = 0   # port of the running MJPEG server, 0 if none
+
+# =========================
+# REST API: get latest JPEG / stream info
 # =========================
 def get_latest_frame():
     """
-    WebUI endpoint: return the latest JPEG as a base64 string and a timestamp.
+    WebUI endpoint (polling fallback): return the latest JPEG as a base64
+    string, its timestamp and sequence number.
     """
-    with _latest_lock:
-        payload = latest_jpeg
-        ts_local = latest_ts
+    payload, ts_local, seq = _frames.latest_b64()
 
     if not payload:
         # 首次或目前還沒有可用影格
@@ -398,52 +802,91 @@ def get_latest_frame():
 
     return {
         "mime": "image/jpeg",
-        "payload_b64": base64.b64encode(latest_jpeg).decode("ascii"),
+        "payload_b64": payload,
         "ts": ts_local,
+        "seq": seq,
     }
 
-# =========================
-# Main loop
-# =========================
-def user_loop():
-    """
-    Main capture & inference loop:
-      - Start camera on first run
-      - Capture a frame, run inference, draw results
-      - Encode to JPEG and cache it
-    """    
-    global latest_jpeg, _cam_started, latest_ts
-    
-    # Start camera
-    # if not _cam_started:
-        # cam.start()
-        # _cam_started = True
-    
-    # Capture a frame
-    frame = cam.capture()  
-    
-    # run inference and draw results
-    composed, boxes_pp, scores_pp, classes_pp = run_yolox_on_frame(frame)
-    
-    # Encode to JPEG
-    jpeg_bytes = encode_jpeg(composed, quality=JPEG_QUALITY)
-    with _latest_lock:
-        latest_jpeg = jpeg_bytes
-        latest_ts = int(time.time() * 1000)
 
-    time.sleep(LOOP_SLEEP)
+def get_stream_info():
+    """WebUI endpoint: where the page finds the MJPEG stream (port 0 = not available, poll instead)."""
+    return {"port": _stream_port, "path": "/stream.mjpg", "max_fps": STREAM_MAX_FPS}
+
+
+def run_app():
+    global _stream_port
+    # Arduino app framework, Web UI, and USB camera wrapper (only needed on the device)
+    from arduino.app_utils import App
+    from arduino.app_bricks.web_ui import WebUI
+    from arduino.app_peripherals.usb_camera import USBCamera
+
+    detector = YoloxDetector()
 
-# Start the app
-print("[INFO] YOLOX stream starting …")
-try:
+    # Start the app
+    print("[INFO] YOLOX stream starting …")
     # Web UI and USB camera
     ui = WebUI()
     cam = USBCamera( )
-    
-    # Expose GET /frame/latest
+
+    # Expose GET /frame/latest and /stream/info
     ui.expose_api("GET", "/frame/latest", get_latest_frame)
-    
+    ui.expose_api("GET", "/stream/info", get_stream_info)
+    server = None
+    if STREAM_PORT:
+        try:
+            server = start_mjpeg_server(_frames, STREAM_PORT)
+            _stream_port = STREAM_PORT
+        except OSError as e:
+            print(f"[WARN] MJPEG server not started on port {STREAM_PORT} ({e}); the page falls back to polling")
+
+    pipe = DetectionPipeline(detector, cam.capture, on_jpeg=_frames.publish, capture_pause=LOOP_SLEEP,
+                             want_output=_frames.active, end_on_none=False)
+    last_stats = [time.perf_counter()]
+
+    def user_loop():
+        """
+        Supervise the pipeline threads: surface a stage error or a stopped
+        pipeline and print throughput / latency every APP_STATS_EVERY seconds.
+        """
+        if pipe.error is not None:
+            raise pipe.error
+        if not pipe.running:
+            raise RuntimeError("YOLOX pipeline threads stopped unexpectedly")
+        time.sleep(0.2)
+        if STATS_EVERY > 0 and time.perf_counter() - last_stats[0] >= STATS_EVERY:
+            last_stats[0] = time.perf_counter()
+            print(f"{pipe.stats_line()} | stream clients {_frames.streams}")
+
     cam.start()
-    App.run(user_loop=user_loop)
-finally:
-    cam.stop()
+    try:
+        pipe.start()
+        App.run(user_loop=user_loop)
+    finally:
+        pipe.stop()
+        cam.stop()
+        if server is not None:
+            server.shutdown()
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="YOLOX (TFLite) object detection streaming demo")
+    ap.add_argument("--bench", metavar="VIDEO", default="",
+                    help="Headless benchmark on a video file instead of the camera + Web UI")
+    ap.add_argument("--frames", type=int, default=0, help="Benchmark: stop after N frames read (0 = whole video)")
+    ap.add_argument("--source-fps", type=float, default=-1.0,
+                    help="Benchmark: pace the video like a camera at this rate (-1 = the file's FPS, 0 = unpaced)")
+    ap.add_argument("--serial", action="store_true",
+                    help="Benchmark the previous one-frame-at-a-time loop instead of the pipeline")
+    ap.add_argument("--json", default="", help="Benchmark: also write the report to this JSON file")
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--labels", default=LABELS_PATH)
+    ap.add_argument("--threads", type=int, default=NUM_THREADS)
+    return ap.parse_known_args()[0]
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.bench:
+        run_bench(args)
+    else:
+        run_app()
@@ -0,0 +1,196 @@
+"""
+#===--preprocess.py: YOLOX input letterboxing------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+Letterbox preprocessing for the YOLOX TFLite app.
+
+Letterboxer writes each frame straight into one preallocated [1,H,W,3]
+model-input buffer:
+  - the padding is filled once per source size; frames only overwrite the
+    centered region
+  - uint8 models: cv2.resize writes into a view of that region
+  - float models: cv2.resize writes into a preallocated uint8 scratch, and
+    one np.multiply scales it by 1/255 into the region
+No per-frame canvas, paste or expand_dims. A PIL frame (what the camera
+and VideoSource deliver) is still copied once at full resolution by
+np.asarray before the resize; that copy plus cv2.resize is several times
+faster than a PIL resize of the full frame. ndarray frames are resized
+without a copy. Without OpenCV the resize falls back to PIL (one resized
+image per frame, still no canvas).
+
+letterbox_resize() / preprocess_input() are the previous PIL
+implementation, kept as the reference for preprocess_benchmark.py.
+"""
+from typing import Dict, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+PAD_VAL = 114
+
+
+def letterbox_geometry(w0: int, h0: int, H: int, W: int):
+    """(scale, new_w, new_h, pad_left, pad_top) for fitting a w0 x h0 image into W x H."""
+    scale = min(W / w0, H / h0)
+    new_w = int(round(w0 * scale))
+    new_h = int(round(h0 * scale))
+    return scale, new_w, new_h, (W - new_w) // 2, (H - new_h) // 2
+
+
+class Letterboxer:
+    """
+    Letterbox frames into a reused model-input buffer. The returned array
+    and meta dict are overwritten / shared by the next call; hand the array
+    to the interpreter (set_tensor copies it) before preprocessing another
+    frame. Not thread-safe: one instance per inference thread.
+    """
+    def __init__(self, size_hw: Tuple[int, int], dtype=np.float32, pad_val: int = PAD_VAL):
+        self.H, self.W = int(size_hw[0]), int(size_hw[1])
+        self.is_float = np.issubdtype(np.dtype(dtype), np.floating)
+        self.buf = np.empty((1, self.H, self.W, 3), dtype)
+        self.pad = pad_val / 255.0 if self.is_float else pad_val
+        self._key = None
+        self._roi = None
+        self._scratch = None
+        self._meta: Dict = {}
+
+    def _plan(self, w0: int, h0: int):
+        scale, new_w, new_h, left, top = letterbox_geometry(w0, h0, self.H, self.W)
+        self.buf.fill(self.pad)
+        self._roi = self.buf[0, top:top + new_h, left:left + new_w]
+        self._scratch = np.empty((new_h, new_w, 3), np.uint8) if self.is_float else None
+        self._meta = {
+            "orig_size": (h0, w0),
+            "input_size": (self.H, self.W),
+            "scale": scale, "pad_w": self.W - new_w, "pad_h": self.H - new_h, "add_batch": True
+        }
+        self._key = (w0, h0)
+
+    def __call__(self, img) -> Tuple[np.ndarray, dict]:
+        """img: PIL image or RGB uint8 array [H0,W0,3]. Returns (input [1,H,W,3], meta)."""
+        if isinstance(img, Image.Image):
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            w0, h0 = img.size
+        else:
+            h0, w0 = img.shape[:2]
+        if self._key != (w0, h0):
+            self._plan(w0, h0)
+        new_h, new_w = self._roi.shape[:2]
+        dst = self._scratch if self.is_float else self._roi
+
+        if cv2 is not None:
+            src = np.asarray(img)
+            if (new_w, new_h) == (w0, h0):
+                np.copyto(dst, src)
+            else:
+                cv2.resize(src, (new_w, new_h), dst=dst, interpolation=cv2.INTER_LINEAR)
+        else:
+            if not isinstance(img, Image.Image):
+                img = Image.fromarray(img)
+            if (new_w, new_h) != (w0, h0):
+                img = img.resize((new_w, new_h), Image.BILINEAR)
+            np.copyto(dst, np.asarray(img))
+
+        if self.is_float:
+            np.multiply(self._scratch, np.float32(1.0 / 255.0), out=self._roi)
+        return self.buf, self._meta
+
+
+def unletterbox_boxes(boxes: np.ndarray, meta: dict, inplace: bool = False) -> np.ndarray:
+    """
+    Convert xyxy boxes from letterboxed input coordinates back to original
+    image coordinates. With inplace=True a float32 array is modified and
+    returned instead of copied (pass boxes the caller owns, e.g. already
+    filtered by score).
+    """
+    H0, W0 = meta["orig_size"]
+    pad_left = meta["pad_w"] / 2.0
+    pad_top  = meta["pad_h"] / 2.0
+    if not (inplace and boxes.dtype == np.float32):
+        boxes = boxes.astype(np.float32)
+
+    # Remove letterbox offsets, reverse scaling
+    boxes[:, 0::2] -= pad_left
+    boxes[:, 1::2] -= pad_top
+    boxes /= max(meta["scale"], 1e-6)
+
+    # Clip to image bounds
+    np.clip(boxes[:, 0::2], 0, W0 - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, H0 - 1, out=boxes[:, 1::2])
+    return boxes
+
+
+# =========================
+# Previous PIL implementation (reference)
+# =========================
+def letterbox_resize(img: Image.Image, size_hw: Tuple[int, int], pad_val: int = PAD_VAL):
+    """
+    Resize with letterboxing to target size (H, W) while preserving aspect ratio.
+    The image is centered on a padded canvas.
+
+    Returns:
+      - canvas: resized RGB PIL image of size (W, H)
+      - (scale, pad_w, pad_h): scale factor and total padding in width/height
+    """
+    H, W = size_hw
+    img = img.convert("RGB")
+    w, h = img.size
+
+    # Uniform scale to fit within target (W,H)
+    scale = min(W / w, H / h)
+    new_w = int(round(w * scale))
+    new_h = int(round(h * scale))
+    resized = img.resize((new_w, new_h), Image.BILINEAR)
+
+    # Paste onto centered canvas
+    canvas = Image.new("RGB", (W, H), (pad_val, pad_val, pad_val))
+    pad_left = (W - new_w) // 2
+    pad_top  = (H - new_h) // 2
+    canvas.paste(resized, (pad_left, pad_top))
+    pad_w = W - new_w
+    pad_h = H - new_h
+    return canvas, (scale, pad_w, pad_h)
+
+
+def preprocess_input(img: Image.Image, size_hw: Tuple[int, int], expect_dtype, letterboxer: Optional[Letterboxer] = None):
+    """
+    Preprocess pipeline:
+      1) Letterbox to model input size
+      2) Normalize for float models (or keep uint8 as-is)
+      3) Add batch dim -> [1, H, W, 3]
+
+    With a Letterboxer the work goes through its preallocated buffer;
+    without, through the PIL reference path.
+
+    Returns:
+      - input array
+      - meta dict for reversing letterbox (used in post-processing)
+    """
+    if letterboxer is not None:
+        return letterboxer(img)
+
+    H, W = size_hw
+    img_resized, (scale, pad_w, pad_h) = letterbox_resize(img, (H, W))
+
+    if expect_dtype == np.float32:
+        arr = np.asarray(img_resized, dtype=np.float32) / 255.0
+    else:
+        arr = np.asarray(img_resized, dtype=np.uint8)
+
+    arr = np.expand_dims(arr, axis=0)  # [1,H,W,3]
+    meta = {
+        "orig_size": (img.size[1], img.size[0]),  # (H0, W0)
+        "input_size": (H, W),
+        "scale": scale, "pad_w": pad_w, "pad_h": pad_h, "add_batch": True
+    }
+    return arr, meta
@@ -0,0 +1,118 @@
+"""
+#===--preprocess_benchmark.py: letterbox micro-benchmark-------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+Compares the previous PIL letterbox (resize + new canvas + paste +
+asarray + expand_dims) with Letterboxer (resize into a preallocated
+model-input buffer), for float32 and uint8 inputs and several camera
+sizes, plus box un-letterboxing of a full YOLOX output. Needs no model.
+
+Per path it reports latency (mean / p50 / p95). Memory is not compared:
+tracemalloc does not see PIL's own image buffers, so it cannot weigh the
+two paths fairly. The camera delivers PIL frames, which Letterboxer copies
+once into an array before resizing; the "ndarray in" row shows frames that
+already are arrays. The mean absolute
+difference of the two input tensors is measured on a smooth synthetic
+frame (cv2 bilinear vs PIL's antialiased bilinear).
+
+    python preprocess_benchmark.py --iters 200 --sizes 640x480,1280x720,1920x1080
+"""
+import argparse, time
+import numpy as np
+from PIL import Image, ImageFilter
+
+from preprocess import Letterboxer, cv2, preprocess_input, unletterbox_boxes
+
+
+def legacy_unletterbox_boxes(boxes: np.ndarray, meta: dict):
+    """Previous version: copy + re-cast, fancy-indexed offsets, clip of every box."""
+    H0, W0 = meta["orig_size"]
+    pad_left = meta["pad_w"] / 2.0
+    pad_top  = meta["pad_h"] / 2.0
+    boxes = boxes.copy().astype(np.float32)
+    boxes[:, [0, 2]] -= pad_left
+    boxes[:, [1, 3]] -= pad_top
+    boxes /= max(meta["scale"], 1e-6)
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, W0 - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, H0 - 1)
+    boxes[:, 2] = np.clip(boxes[:, 2], 0, W0 - 1)
+    boxes[:, 3] = np.clip(boxes[:, 3], 0, H0 - 1)
+    return boxes
+
+
+def measure(fn, iters: int, warmup: int = 5) -> np.ndarray:
+    """Latencies in ms."""
+    for _ in range(warmup):
+        fn()
+    lat = np.empty(iters)
+    for i in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        lat[i] = (time.perf_counter() - t0) * 1000.0
+    return lat
+
+
+def row(name: str, lat: np.ndarray, ref_mean: float = 0.0):
+    speed = f"{ref_mean / lat.mean():6.1f}x" if ref_mean else f"{'':>7}"
+    print(f"  {name:<26} {lat.mean():8.3f} {np.percentile(lat, 50):8.3f} {np.percentile(lat, 95):8.3f} {speed}")
+
+
+def parse_size(s: str):
+    w, h = s.lower().split("x")
+    return int(w), int(h)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Letterbox preprocessing micro-benchmark")
+    ap.add_argument("--input", default="640x640", help="Model input WxH (default: 640x640)")
+    ap.add_argument("--sizes", default="640x480,1280x720,1920x1080", help="Camera frame sizes WxH, comma separated")
+    ap.add_argument("--dtypes", default="float32,uint8")
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--boxes", type=int, default=8400, help="Boxes per YOLOX output for the un-letterbox test")
+    args = ap.parse_args()
+
+    W, H = parse_size(args.input)
+    rng = np.random.default_rng(0)
+    print(f"[INFO] model input {W}x{H}, OpenCV {'available' if cv2 is not None else 'NOT available (PIL fallback)'}")
+    print(f"  {'path':<26} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'speed':>7}")
+
+    for size in args.sizes.split(","):
+        w0, h0 = parse_size(size)
+        frame = Image.fromarray(rng.integers(0, 256, (h0, w0, 3), dtype=np.uint8)).filter(ImageFilter.GaussianBlur(3))
+        frame_arr = np.asarray(frame)
+        for dt_name in args.dtypes.split(","):
+            dtype = np.dtype(dt_name).type
+            lb = Letterboxer((H, W), dtype)
+            old_lat = measure(lambda: preprocess_input(frame, (H, W), dtype), args.iters)
+            new_lat = measure(lambda: preprocess_input(frame, (H, W), dtype, letterboxer=lb), args.iters)
+            arr_lat = measure(lambda: lb(frame_arr), args.iters)
+            a, meta_a = preprocess_input(frame, (H, W), dtype)
+            b, meta_b = preprocess_input(frame, (H, W), dtype, letterboxer=lb)
+            assert a.shape == b.shape and a.dtype == b.dtype and meta_a == meta_b
+            diff = np.abs(a.astype(np.float32) - b.astype(np.float32)).mean()
+            print(f"{w0}x{h0} -> {W}x{H} {dt_name} (mean abs diff {diff:.4g})")
+            row("PIL canvas (previous)", old_lat)
+            row("Letterboxer (PIL in)", new_lat, old_lat.mean())
+            row("Letterboxer (ndarray in)", arr_lat, old_lat.mean())
+
+    # un-letterbox: previous (all boxes, copy) vs score filter first + in place
+    frame_meta = Letterboxer((H, W))(np.zeros((720, 1280, 3), np.uint8))[1]
+    xy = rng.uniform(0, min(W, H) - 100, (args.boxes, 2)).astype(np.float32)
+    boxes = np.concatenate([xy, xy + rng.uniform(4, 100, (args.boxes, 2)).astype(np.float32)], axis=1)
+    scores = rng.uniform(0, 0.35, args.boxes).astype(np.float32)
+    print(f"un-letterbox {args.boxes} boxes (1280x720 frame, score >= 0.25 kept)")
+    old_lat = measure(lambda: legacy_unletterbox_boxes(boxes, frame_meta)[scores >= 0.25], args.iters)
+    new_lat = measure(lambda: unletterbox_boxes(boxes[scores >= 0.25], frame_meta, inplace=True), args.iters)
+    ref = legacy_unletterbox_boxes(boxes, frame_meta)[scores >= 0.25]
+    assert np.allclose(ref, unletterbox_boxes(boxes[scores >= 0.25], frame_meta, inplace=True))
+    row("all boxes, copy (previous)", old_lat)
+    row("filtered, in place", new_lat, old_lat.mean())
+
+
+if __name__ == "__main__":
+    main()
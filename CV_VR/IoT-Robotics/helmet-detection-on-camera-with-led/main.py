@@ -10,27 +10,31 @@ from arduino.app_utils import *
 from arduino.app_bricks.web_ui import WebUI
 from arduino.app_bricks.video_objectdetection import VideoObjectDetection
 from datetime import datetime, UTC
-import threading
-import time
+from status_engine import RateLimitedLog, RateLimiter, StatusEngine
 
 # ---------------------------------------------------------
 # global state
 # ---------------------------------------------------------
-current_status = "Unknown"      # Helmet / No Helmet / Unknown
-status_lock = threading.Lock()
-
 HELMET_LABELS = ["Helmet", "helmet"]
 NO_HELMET_LABELS = ["No Helmet", "no helmet", "no_helmet", "no-helmet"]
 
 MIN_CONFIDENCE = 0.5
 
-last_decision = "Unknown"
-same_decision_count = 0
-DEBOUNCE_COUNT = 3
+# Debounce: a status is taken once it wins VOTE_MIN of the last VOTE_WINDOW frames
+VOTE_WINDOW = 5
+VOTE_MIN = 3
 
 # Timeout: if no detection occurs beyond this number of seconds, force the status to Unknown
 TIMEOUT_SECONDS = 1.0
-last_detection_time = time.time()
+
+# At most one UI message per label and one log line per topic in these intervals (seconds)
+UI_MIN_INTERVAL = 0.2
+LOG_INTERVAL = 5.0
+
+helmet_status = StatusEngine("Unknown", window=VOTE_WINDOW, votes=VOTE_MIN, timeout=TIMEOUT_SECONDS,
+                             name="Helmet status")      # Helmet / No Helmet / Unknown
+ui_limiter = RateLimiter(UI_MIN_INTERVAL)
+log = RateLimitedLog(LOG_INTERVAL)
 
 # ---------------------------------------------------------
 # Web UI & Video Object Detection
@@ -43,21 +47,11 @@ ui.on_message("override_th",
 
 
 def decide_status_from_detections(detections: dict) -> str:
- global last_detection_time
-
- # If there are any detections, update last_detection_time
- if detections:
-     last_detection_time = time.time()
- else:
-     print("[DEBUG] detections is empty (no boxes this frame)")
-
  found_helmet = False
  found_no_helmet = False
 
  for label, info in detections.items():
      conf = info.get("confidence", 0.0)
-     print(f"[DEBUG] detection label='{label}' confidence={conf}")
-
      if conf < MIN_CONFIDENCE:
          continue
 
@@ -79,66 +73,38 @@ def decide_status_from_detections(detections: dict) -> str:
      return "Unknown"
 
 
-def update_status_with_debounce(new_status: str):
- global last_decision, same_decision_count, current_status
-
- if new_status == last_decision:
-     same_decision_count += 1
- else:
-     last_decision = new_status
-     same_decision_count = 1
-
- if same_decision_count >= DEBOUNCE_COUNT:
-     with status_lock:
-         if current_status != new_status:
-             print(f"[INFO] Helmet status changed: {current_status} -> {new_status}")
-         current_status = new_status
-
-
 # ---------------------------------------------------------
 # VideoObjectDetection callback
 # ---------------------------------------------------------
 def send_detections_to_ui(detections: dict):
+ timestamp = None
  for key, value in detections.items():
+     if not ui_limiter.allow(key):
+         continue
+     if timestamp is None:
+         timestamp = datetime.now(UTC).isoformat()
      entry = {
          "content": key,
          "confidence": value.get("confidence"),
-         "timestamp": datetime.now(UTC).isoformat()
+         "timestamp": timestamp
      }
      ui.send_message("detection", message=entry)
 
- status = decide_status_from_detections(detections)
- update_status_with_debounce(status)
+ decision = decide_status_from_detections(detections)
+ helmet_status.update(decision, seen=bool(detections))
+ if detections:
+     log("detections", lambda: f"[DEBUG] {len(detections)} detection(s) -> {decision}: "
+                               + ", ".join(f"{k}={v.get('confidence', 0.0):.2f}" for k, v in detections.items()))
 
 
 detection_stream.on_detect_all(send_detections_to_ui)
 
 # ---------------------------------------------------------
-# Timeout background thread: set status to Unknown if no detection for over 1 second
-# ---------------------------------------------------------
-def timeout_watcher():
- global current_status
- while True:
-     now = time.time()
-     dt = now - last_detection_time
-     if dt > TIMEOUT_SECONDS:
-         with status_lock:
-             if current_status != "Unknown":
-                 print(f"[INFO] No detections for {dt:.2f}s -> force Unknown")
-                 current_status = "Unknown"
-     time.sleep(0.1)
-
-
-# Start the timeout thread
-threading.Thread(target=timeout_watcher, daemon=True).start()
-
-# ---------------------------------------------------------
-# Bridge: For MCU
+# Bridge: For MCU (O(1), no lock: the engine updates status with one assignment)
 # ---------------------------------------------------------
 def get_helmet_status():
- with status_lock:
-     status = current_status
- print(f"[DEBUG] get_helmet_status -> {status}")
+ status = helmet_status.status
+ log("get_helmet_status", f"[DEBUG] get_helmet_status -> {status}")
  return status
 
 
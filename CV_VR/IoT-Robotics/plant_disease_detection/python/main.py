@@ -10,9 +10,9 @@ from arduino.app_utils import *
 from arduino.app_bricks.web_ui import WebUI
 from arduino.app_bricks.video_imageclassification import VideoImageClassification
 from datetime import datetime, UTC
-import threading
 import time
 import json
+from status_engine import RateLimitedLog, RateLimiter, StatusEngine
 
 ## Disease Scenarios Configuration
 
@@ -74,23 +74,30 @@ def get_disease_info(classification: str) -> dict:
 
 ## global state
 
-current_status = "Unknown"      # Plant disease status or Unknown
-status_lock = threading.Lock()
-
 MIN_CONFIDENCE = 0.5
 
-last_decision = "Unknown"
-same_decision_count = 0
-DEBOUNCE_COUNT = 3
+# Debounce: a status is taken once it wins VOTE_MIN of the last VOTE_WINDOW frames
+VOTE_WINDOW = 5
+VOTE_MIN = 3
 
 # Timeout: if no detection occurs beyond this number of seconds, force the status to Unknown
 TIMEOUT_SECONDS = 1.0
-last_detection_time = time.time()
 
-# Track last detection for buzzer control (with lock protection)
-last_detected_disease = None
-detection_timestamp = 0
-detection_lock = threading.Lock()  # Add lock for buzzer state
+# Buzzer: a diseased classification triggers it for this many seconds
+BUZZER_WINDOW = 5.0
+
+# At most one UI message and one log line per topic in these intervals (seconds)
+UI_MIN_INTERVAL = 0.2
+LOG_INTERVAL = 5.0
+
+detection_status = StatusEngine("Unknown", window=VOTE_WINDOW, votes=VOTE_MIN,
+                                timeout=TIMEOUT_SECONDS)      # Plant disease status or Unknown
+ui_limiter = RateLimiter(UI_MIN_INTERVAL)
+log = RateLimitedLog(LOG_INTERVAL)
+
+# Last detection for buzzer control: (classification, monotonic time), replaced
+# as a whole so the Bridge callback reads it without a lock
+last_detection = (None, 0.0)
 
 
 # Web UI & Video Image Classification
@@ -102,132 +109,79 @@ ui.on_message("override_th",
               lambda sid, threshold: detection_stream.override_threshold(threshold))
 
 
-def update_status_with_debounce(new_status: str):
-    global last_decision, same_decision_count, current_status
-
-    if new_status == last_decision:
-        same_decision_count += 1
-    else:
-        last_decision = new_status
-        same_decision_count = 1
-
-    if same_decision_count >= DEBOUNCE_COUNT:
-        with status_lock:
-            if current_status != new_status:
-                print(f"[INFO] Detection status changed: {current_status} -> {new_status}")
-            current_status = new_status
-
-
 # VideoImageClassification callback
 
 def send_classifications_to_ui(classifications: dict):
-    global last_detection_time, last_detected_disease, detection_timestamp
+    global last_detection
     
     if len(classifications) == 0:
-        print("[DEBUG] classifications is empty (no detections this frame)")
         return
     
-    # Update last detection time
-    last_detection_time = time.time()
-    
-    entries = []
     best_classification = None
     best_confidence = 0.0
     
     for key, value in classifications.items():
         confidence = value if isinstance(value, float) else value.get("confidence", 0.0)
         
-        entry = {
-            "content": key,
-            "confidence": confidence,
-            "timestamp": datetime.now(UTC).isoformat()
-        }
-        entries.append(entry)
-        
-        # Validate against known disease scenarios
-        if key in DISEASE_SCENARIOS:
-            disease_info = get_disease_info(key)
-            print(f"[DEBUG] classification label='{key}' confidence={confidence} | "
-                  f"Plant: {disease_info['plant']}, Condition: {disease_info['condition']}, "
-                  f"Severity: {disease_info['severity']}")
-        else:
-            print(f"[DEBUG] classification label='{key}' confidence={confidence} (unknown scenario)")
-        
         # Track the best classification
         if confidence > best_confidence:
             best_confidence = confidence
             best_classification = key
     
     # Send all classifications to UI
-    if len(entries) > 0:
-        msg = json.dumps(entries)
-        ui.send_message("classifications", message=msg)
+    if ui_limiter.allow("classifications"):
+        timestamp = datetime.now(UTC).isoformat()
+        entries = [{
+            "content": key,
+            "confidence": value if isinstance(value, float) else value.get("confidence", 0.0),
+            "timestamp": timestamp
+        } for key, value in classifications.items()]
+        ui.send_message("classifications", message=json.dumps(entries))
     
     # Update status based on best classification
     if best_classification and best_confidence >= MIN_CONFIDENCE:
-        current_time = time.time()
-        with detection_lock:  # Protect shared state
-            if (last_detected_disease != best_classification or 
-                (current_time - detection_timestamp) > 5.0):
-                last_detected_disease = best_classification
-                detection_timestamp = current_time
-                print(f"[INFO] New plant disease detected: {best_classification} (confidence: {best_confidence:.2f})")
+        current_time = time.monotonic()
+        last_disease, detection_timestamp = last_detection
+        if (last_disease != best_classification or
+            (current_time - detection_timestamp) > BUZZER_WINDOW):
+            last_detection = (best_classification, current_time)
+            disease_info = get_disease_info(best_classification)
+            print(f"[INFO] New plant disease detected: {best_classification} (confidence: {best_confidence:.2f}) | "
+                  f"Plant: {disease_info['plant']}, Condition: {disease_info['condition']}, "
+                  f"Severity: {disease_info['severity']}")
         
-        update_status_with_debounce(best_classification)
+        detection_status.update(best_classification)
     else:
-        update_status_with_debounce("Unknown")
+        detection_status.update("Unknown")
 
 
 detection_stream.on_detect_all(send_classifications_to_ui)
 
 
-# Timeout background thread: set status to Unknown if no detection for over 1 second
-
-def timeout_watcher():
-    global current_status
-    while True:
-        now = time.time()
-        dt = now - last_detection_time
-        if dt > TIMEOUT_SECONDS:
-            with status_lock:
-                if current_status != "Unknown":
-                    print(f"[INFO] No detections for {dt:.2f}s -> force Unknown")
-                    current_status = "Unknown"
-        time.sleep(0.1)
-
-
-# Start the timeout thread
-threading.Thread(target=timeout_watcher, daemon=True).start()
-
-
-# Bridge: For MCU
+# Bridge: For MCU (O(1), no lock)
 
 def get_detection_status():
-    with status_lock:
-        status = current_status
-    print(f"[DEBUG] get_detection_status -> {status}")
+    status = detection_status.status
+    log("get_detection_status", f"[DEBUG] get_detection_status -> {status}")
     return status
 
 def should_trigger_buzzer():
     """Check if buzzer should be triggered based on new detection"""
-    with detection_lock:  # Protect shared state
-        current_time = time.time()
+    last_disease, detection_timestamp = last_detection
+    
+    # Trigger buzzer only for diseased plants (not healthy ones)
+    if last_disease and last_disease != "Unknown":
+        time_since_detection = time.monotonic() - detection_timestamp
+        is_recent = time_since_detection < BUZZER_WINDOW
+        should_trigger = is_recent and is_disease(last_disease)
         
-        # Trigger buzzer only for diseased plants (not healthy ones)
-        if last_detected_disease and last_detected_disease != "Unknown":
-            time_since_detection = current_time - detection_timestamp
-            is_recent = time_since_detection < 5.0
-            is_diseased = is_disease(last_detected_disease)
-            should_trigger = is_recent and is_diseased
-            
-            if is_recent:
-                disease_info = get_disease_info(last_detected_disease)
-                print(f"[DEBUG] should_trigger_buzzer -> {should_trigger} | "
-                      f"Disease: {last_detected_disease}, Condition: {disease_info['condition']}, "
-                      f"Severity: {disease_info['severity']}, Time since: {time_since_detection:.2f}s")
-            
-            return should_trigger
+        if is_recent:
+            log("should_trigger_buzzer",
+                lambda: f"[DEBUG] should_trigger_buzzer -> {should_trigger} | "
+                        f"Disease: {last_disease}, Time since: {time_since_detection:.2f}s")
         
+        return should_trigger
+    
     return False
 
 Bridge.provide("get_detection_status", get_detection_status)
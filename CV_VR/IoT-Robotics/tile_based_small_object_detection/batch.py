@@ -0,0 +1,247 @@
+#===------------------------batch.py--------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Purpose
+-------
+Batch version of main.py for surveys of many large images: a directory,
+a glob pattern or a video file in, one JSON line of merged detections per
+image (or video frame) out.
+
+High-level flow
+---------------
+1. The main thread decodes the inputs one by one (at most --max-inflight
+   images are held in memory) and plans their tiles
+2. Adaptive tiling: a low-res gradient pass scores every tile; tiles
+   below --skip-flat (sky, water, empty ground) are not run
+3. The remaining tiles are queued in groups of --tiles-per-job; --workers
+   threads each own a persistent TileEngine (its own pipeline and model
+   instance) and take groups from the shared queue, so tiles of several
+   images are in flight at once
+4. When the last group of an image returns, its detections are parsed,
+   merged across tiles and written to --out-jsonl as one line
+
+All main.py options (model, labels, constants, tiling, thresholds, merge)
+apply; --image is replaced by --input.
+"""
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# GStreamer (GI)
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from lib import (Detection, TileSpec, iter_video_frames, merge_tile_detections, parse_qtimlvdetection_text,
+                 plan_tiles, tile_activity)
+from main import build_parser, make_tile_engine
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+VIDEO_EXTS = ('.mp4', '.mov', '.mkv', '.avi', '.ts', '.h264', '.h265')
+
+
+def parse_args():
+    p = build_parser(image_required=False)
+    p.description = 'Tile-based detection over a directory, glob or video with a pool of persistent pipelines.'
+    p.add_argument(
+        '--input', required=True,
+        help='Image directory, glob pattern (quote it, e.g. "survey/*.jpg") or video file.'
+    )
+    p.add_argument(
+        '--out-jsonl', type=str, default='./detections.jsonl',
+        help='One JSON line per image/frame with its merged detections ("-" for stdout).'
+    )
+    p.add_argument(
+        '--workers', type=int, default=2,
+        help='Parallel pipelines, each with its own model instance (default: 2).'
+    )
+    p.add_argument(
+        '--tiles-per-job', type=int, default=4,
+        help='Tiles handed to a worker at once (default: 4).'
+    )
+    p.add_argument(
+        '--max-inflight', type=int, default=0,
+        help='Max decoded images held at once (default: 2 x workers).'
+    )
+    p.add_argument(
+        '--skip-flat', type=float, default=0.0,
+        help=('Adaptive tiling: skip tiles whose low-res mean gradient (0-255 scale) is below this '
+              'value, e.g. 2.0 for open sky/water (default: 0 = run every tile).')
+    )
+    p.add_argument(
+        '--lowres-factor', type=int, default=8,
+        help='Subsampling factor of the adaptive tiling pass (default: 8).'
+    )
+    p.add_argument(
+        '--video-stride', type=int, default=1,
+        help='Process every N-th frame of a video input (default: 1).'
+    )
+    args = p.parse_args()
+    for opt in ('workers', 'tiles_per_job', 'lowres_factor', 'video_stride'):
+        if getattr(args, opt) < 1:
+            p.error(f'--{opt.replace("_", "-")} must be at least 1')
+    if args.max_inflight < 0:
+        p.error('--max-inflight must be 0 (auto) or positive')
+    return args
+
+
+def iter_inputs(spec: str, video_stride: int) -> Iterator[Tuple[str, Optional[int], np.ndarray]]:
+    """(source name, video frame index or None, RGB image [H,W,3])."""
+    if os.path.isfile(spec) and spec.lower().endswith(VIDEO_EXTS):
+        for idx, frame in iter_video_frames(spec, every=video_stride):
+            yield spec, idx, frame
+        return
+    if os.path.isdir(spec):
+        files = sorted(os.path.join(spec, f) for f in os.listdir(spec) if f.lower().endswith(IMAGE_EXTS))
+    else:
+        files = sorted(f for f in glob.glob(spec) if f.lower().endswith(IMAGE_EXTS))
+    if not files:
+        raise FileNotFoundError(f'No images found for --input {spec}')
+    for f in files:
+        yield f, None, np.asarray(Image.open(f).convert('RGB'))
+
+
+class ImageJob:
+    """One image in flight: its tiles, and the detection texts as workers return them."""
+    def __init__(self, seq: int, name: str, frame: Optional[int], img: np.ndarray,
+                 tiles: List[TileSpec], run_ids: List[int]):
+        self.seq = seq
+        self.name = name
+        self.frame = frame
+        self.img = img
+        self.tiles = tiles
+        self.run_ids = run_ids
+        self.texts: List[Optional[str]] = [None] * len(tiles)
+        self.remaining = len(run_ids)
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def complete(self, ids: List[int], texts: List[str]) -> bool:
+        """Store a group's results; True for the call that finished the image."""
+        with self.lock:
+            for i, t in zip(ids, texts):
+                self.texts[i] = t
+            self.remaining -= len(ids)
+            return self.remaining == 0
+
+
+def main():
+    args = parse_args()
+    Gst.init(None)
+
+    out = sys.stdout if args.out_jsonl == '-' else open(args.out_jsonl, 'w', encoding='utf-8')
+    log = sys.stderr if out is sys.stdout else sys.stdout
+    out_lock = threading.Lock()
+    inflight = threading.BoundedSemaphore(args.max_inflight or 2 * args.workers)
+    jobs: 'queue.Queue[Optional[Tuple[ImageJob, List[int]]]]' = queue.Queue()
+    errors: List[BaseException] = []
+    stats = {'images': 0, 'tiles': 0, 'tiles_run': 0, 'dets': 0}
+
+    def finish(job: ImageJob):
+        dets: List[Detection] = []
+        for tid in job.run_ids:
+            dets.extend(parse_qtimlvdetection_text(
+                text=job.texts[tid], tile=job.tiles[tid], tile_id=tid,
+                score_thr=args.score_thr, assume_normalized=args.assume_normalized))
+        merged = dets if args.no_global_nms else merge_tile_detections(
+            dets, tiles=None if args.no_seam_prepass else job.tiles, iou_thr=args.nms_iou,
+            method=args.merge, class_aware=True, sigma=args.soft_sigma, score_thr=args.score_thr)
+        H, W = job.img.shape[:2]
+        rec = {
+            'image': job.name, 'frame': job.frame, 'width': W, 'height': H,
+            'tiles': len(job.tiles), 'tiles_run': len(job.run_ids),
+            'sec': round(time.perf_counter() - job.t0, 4),
+            'detections': [d.as_dict() for d in merged],
+        }
+        with out_lock:
+            out.write(json.dumps(rec, ensure_ascii=False) + '\n')
+            out.flush()
+            stats['images'] += 1
+            stats['dets'] += len(merged)
+            if stats['images'] % 50 == 0:
+                dt = time.perf_counter() - t0
+                print(f'[Info] {stats["images"]} images, {stats["images"] / dt:.2f} images/s', file=log, flush=True)
+        job.img = None
+        inflight.release()
+
+    def worker(engine):
+        while True:
+            item = jobs.get()
+            if item is None:
+                return
+            job, ids = item
+            try:
+                if errors:
+                    continue
+                texts = engine.run_tiles(job.img, [job.tiles[i] for i in ids])
+                if job.complete(ids, texts):
+                    finish(job)
+            except BaseException as e:   # surface on the main thread, stop feeding
+                errors.append(e)
+
+    t0 = time.perf_counter()
+    engines = [make_tile_engine(args).start() for _ in range(args.workers)]
+    threads = [threading.Thread(target=worker, args=(e,), daemon=True) for e in engines]
+    for th in threads:
+        th.start()
+
+    try:
+        for seq, (name, frame, img) in enumerate(iter_inputs(args.input, args.video_stride)):
+            while not inflight.acquire(timeout=0.5):
+                if errors:
+                    break
+            if errors:
+                break
+            H, W = img.shape[:2]
+            tiles = plan_tiles(W, H, tile=args.tile, overlap=args.overlap)
+            run_ids = list(range(len(tiles)))
+            if args.skip_flat > 0:
+                act = tile_activity(img, tiles, factor=args.lowres_factor)
+                run_ids = [i for i in run_ids if act[i] >= args.skip_flat]
+            job = ImageJob(seq, name, frame, img, tiles, run_ids)
+            stats['tiles'] += len(tiles)
+            stats['tiles_run'] += len(run_ids)
+            if not run_ids:
+                finish(job)
+                continue
+            for s in range(0, len(run_ids), args.tiles_per_job):
+                jobs.put((job, run_ids[s:s + args.tiles_per_job]))
+    finally:
+        for _ in threads:
+            jobs.put(None)
+        for th in threads:
+            th.join()
+        for e in engines:
+            e.close()
+        if out is not sys.stdout:
+            out.close()
+
+    if errors:
+        raise errors[0]
+
+    dt = time.perf_counter() - t0
+    skipped = stats['tiles'] - stats['tiles_run']
+    print('[Summary]', file=log)
+    print(json.dumps({
+        'images': stats['images'], 'wall_sec': dt, 'images_per_sec': stats['images'] / dt if dt > 0 else 0.0,
+        'tiles': stats['tiles'], 'tiles_run': stats['tiles_run'],
+        'tiles_skipped_pct': 100.0 * skipped / stats['tiles'] if stats['tiles'] else 0.0,
+        'detections': stats['dets'], 'workers': len(engines), 'out_jsonl': args.out_jsonl,
+    }, indent=2), file=log)
+
+
+if __name__ == '__main__':
+    main()
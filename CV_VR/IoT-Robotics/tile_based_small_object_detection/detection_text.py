@@ -0,0 +1,100 @@
+#===------------------------detection_text.py-----------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Parser for the text/x-raw output of qtimlvdetection / qtimlpostprocess,
+shared by the tile-based detector and the traffic intersection demo.
+
+The element serializes a GstStructure whose bounding boxes are nested,
+escaped structures, e.g. (one escape level):
+
+    ObjectDetection, batch-index=(uint)0, bounding-boxes=(structure)<
+      "person\\,\\ id\\=\\(uint\\)0\\,\\ confidence\\=\\(double\\)85.5\\,\\ color\\=\\(uint\\)0xff00ffff\\,\\
+       rectangle\\=\\(float\\)\\<\\ 0.1\\,\\ 0.2\\,\\ 0.3\\,\\ 0.4\\ \\>\\;" >, ...
+
+Backslashes in this format only escape punctuation, whatever the nesting
+depth, so they are all removed in one str.translate() pass. One compiled
+regex then finds every quoted record in a single scan, reading the fields
+in the order the elements write them (label, id, confidence, ...,
+rectangle); other fields in between are skipped, the id is optional and
+records missing a confidence or rectangle are dropped. All numbers of a
+message are converted to NumPy arrays in one call.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Union
+
+import numpy as np
+
+_STRIP = str.maketrans('', '', '\\\x00')
+_ENTITIES = (('&lt;', '<'), ('&gt;', '>'), ('&quot;', '"'), ('&#34;', '"'), ('&amp;', '&'))
+_NUM = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+
+RE_RECORD = re.compile(
+    r'"\s*(?P<label>[^",;<>=]*?)\s*,'
+    r'(?:[^"]*?\bid=\((?:uint|int)\)\s*(?P<id>\d+))?'
+    rf'[^"]*?confidence=\((?:double|float)\)\s*(?P<conf>{_NUM})'
+    rf'[^"]*?rectangle=\((?:float|double)\)\s*<\s*(?P<x>{_NUM})\s*,\s*(?P<y>{_NUM})\s*,'
+    rf'\s*(?P<w>{_NUM})\s*,\s*(?P<h>{_NUM})'
+)
+
+
+@dataclass
+class DetectionRecords:
+    """Records of one message: labels, class ids (-1 if absent), scores in 0-1, rectangles [N,4] x,y,w,h."""
+    labels: List[str]
+    ids: np.ndarray
+    scores: np.ndarray
+    xywh: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def xyxy(self) -> np.ndarray:
+        b = self.xywh.copy()
+        b[:, 2:] += b[:, :2]
+        return b
+
+
+def clean_text(raw: Union[str, bytes]) -> str:
+    """Drop NULs and every escape backslash; decode HTML entities if present."""
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw).decode('utf-8', errors='replace')
+    if not raw:
+        return ''
+    s = raw.translate(_STRIP)
+    if '&' in s:
+        for a, b in _ENTITIES:
+            s = s.replace(a, b)
+    return s
+
+
+def parse_detection_text(raw: Union[str, bytes], percent: Union[bool, str] = 'auto',
+                         cleaned: bool = False) -> DetectionRecords:
+    """
+    All bounding-box records of one message. confidence is divided by 100
+    when percent is True; with 'auto' only values above 1 are, as they can
+    only be percentages. Pass cleaned=True when raw already went through
+    clean_text().
+    """
+    s = raw if cleaned else clean_text(raw)
+    rows = RE_RECORD.findall(s)
+    if not rows:
+        return DetectionRecords([], np.zeros(0, np.int32), np.zeros(0), np.zeros((0, 4)))
+    nums = np.array([r[2:] for r in rows], dtype=np.float64)   # [N,5] conf, x, y, w, h
+    ids = np.array([int(r[1]) if r[1] else -1 for r in rows], np.int32)
+    labels = [r[0] for r in rows]
+    ok = np.isfinite(nums).all(axis=1)   # e.g. 1e999 in a corrupted message
+    if not ok.all():
+        nums, ids = nums[ok], ids[ok]
+        labels = [l for l, k in zip(labels, ok) if k]
+    scores = nums[:, 0]
+    if percent is True:
+        scores = scores / 100.0
+    elif percent == 'auto':
+        scores = np.where(scores > 1.0, scores / 100.0, scores)
+    return DetectionRecords(labels, ids, scores, np.ascontiguousarray(nums[:, 1:]))
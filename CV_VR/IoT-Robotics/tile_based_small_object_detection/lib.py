@@ -8,12 +8,13 @@
 from __future__ import annotations
 
 import os
-import re
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from detection_text import parse_detection_text
+
 # GStreamer (GI)
 import gi
 gi.require_version('Gst', '1.0')
@@ -30,6 +31,12 @@ class TileSpec:
 
 @dataclass
 class Detection:
+    """
+    One box in global image coordinates. cls is the model class id from the
+    record's id field (-1 when the element does not write one). Before the
+    shared detection_text parser it was the first-seen index of the label
+    within the tile, so cls values in older JSON output are not comparable.
+    """
     x1: float
     y1: float
     x2: float
@@ -79,6 +86,28 @@ def plan_tiles(W: int, H: int, tile: int, overlap: float) -> List[TileSpec]:
     return [TileSpec(x0=x, y0=y, w=tile, h=tile) for y in ys for x in xs]
 
 
+def tile_activity(img: np.ndarray, tiles: List[TileSpec], factor: int = 8) -> np.ndarray:
+    """
+    Cheap low-res pass for adaptive tiling: mean gradient magnitude (0-255
+    scale) of every tile, measured on the image subsampled by `factor`.
+    Flat tiles (sky, water, empty ground) score near 0.
+    """
+    small = img[::factor, ::factor].astype(np.float32).mean(axis=2)
+    g = np.zeros_like(small)
+    g[:, :-1] += np.abs(np.diff(small, axis=1))
+    g[:-1, :] += np.abs(np.diff(small, axis=0))
+    ii = np.zeros((g.shape[0] + 1, g.shape[1] + 1), np.float64)   # integral image
+    ii[1:, 1:] = g.cumsum(axis=0).cumsum(axis=1)
+    out = np.zeros(len(tiles), np.float32)
+    for k, t in enumerate(tiles):
+        x0, y0 = t.x0 // factor, t.y0 // factor
+        x1 = min(-(-(t.x0 + t.w) // factor), g.shape[1])
+        y1 = min(-(-(t.y0 + t.h) // factor), g.shape[0])
+        area = max((x1 - x0) * (y1 - y0), 1)
+        out[k] = (ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]) / area
+    return out
+
+
 # ----------------------------- NMS -----------------------------
 
 def iou_xyxy(a: np.ndarray, b: np.ndarray) -> float:
@@ -93,25 +122,208 @@ def iou_xyxy(a: np.ndarray, b: np.ndarray) -> float:
     return 0.0 if union <= 0 else inter / union
 
 
+@dataclass
+class DetectionArray:
+    """Detections as arrays: boxes [N,4] xyxy, scores [N], cls [N] (index into names), tile_ids [N]."""
+    boxes: np.ndarray
+    scores: np.ndarray
+    cls: np.ndarray
+    tile_ids: np.ndarray
+    names: List[str]
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    @classmethod
+    def from_detections(cls, dets: List[Detection]) -> 'DetectionArray':
+        """Class ids are assigned per label over all tiles (per-tile parser ids are not comparable)."""
+        names = sorted({d.label for d in dets})
+        ids = {n: i for i, n in enumerate(names)}
+        return cls(
+            boxes=np.array([[d.x1, d.y1, d.x2, d.y2] for d in dets], np.float32).reshape(-1, 4),
+            scores=np.array([d.score for d in dets], np.float32),
+            cls=np.array([ids[d.label] for d in dets], np.int32),
+            tile_ids=np.array([d.tile_id for d in dets], np.int32),
+            names=names,
+        )
+
+    def select(self, idx: np.ndarray) -> 'DetectionArray':
+        return DetectionArray(self.boxes[idx], self.scores[idx], self.cls[idx], self.tile_ids[idx], self.names)
+
+    def to_detections(self) -> List[Detection]:
+        return [
+            Detection(float(b[0]), float(b[1]), float(b[2]), float(b[3]), float(s), int(c), self.names[c], int(t))
+            for b, s, c, t in zip(self.boxes, self.scores, self.cls, self.tile_ids)
+        ]
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one xyxy box against boxes [M,4]."""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    area = np.maximum(0.0, box[2] - box[0]) * np.maximum(0.0, box[3] - box[1])
+    areas = np.maximum(0.0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0.0, boxes[:, 3] - boxes[:, 1])
+    union = area + areas - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-12), 0.0)
+
+
+def _class_offset_boxes(boxes: np.ndarray, cls: np.ndarray) -> np.ndarray:
+    """Shift each class to its own region of the plane, so boxes of different classes never overlap."""
+    if boxes.size == 0:
+        return boxes.astype(np.float64)
+    span = float(boxes.max() - min(float(boxes.min()), 0.0)) + 1.0
+    return boxes.astype(np.float64) + (cls.astype(np.float64) * span)[:, None]
+
+
+def nms_indices(boxes: np.ndarray, scores: np.ndarray, cls: Optional[np.ndarray] = None,
+                iou_thr: float = 0.5) -> np.ndarray:
+    """
+    Greedy NMS, highest score first (ties keep input order). With cls the
+    suppression is class-aware via class-offset boxes. Returns kept indices.
+    """
+    if cls is not None:
+        boxes = _class_offset_boxes(boxes, cls)
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iou = box_iou(boxes[i], boxes[rest])
+        drop = iou >= iou_thr
+        if cls is not None and iou_thr <= 0:
+            drop &= cls[rest] == cls[i]   # offsets separate classes only while IoU 0 is kept
+        order = rest[~drop]
+    return np.asarray(keep, np.int64)
+
+
+def soft_nms_indices(boxes: np.ndarray, scores: np.ndarray, cls: Optional[np.ndarray] = None,
+                     iou_thr: float = 0.5, sigma: float = 0.5, method: str = 'gaussian',
+                     score_thr: float = 0.001) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soft-NMS: overlapping boxes have their score decayed instead of being
+    removed ('gaussian': exp(-iou^2/sigma); 'linear': 1-iou above iou_thr).
+    Returns (kept indices, decayed scores), highest score first.
+    """
+    if cls is not None:
+        boxes = _class_offset_boxes(boxes, cls)
+    live = np.arange(scores.shape[0])
+    cur = scores.astype(np.float64).copy()
+    keep, kept_scores = [], []
+    while live.size:
+        j = int(np.argmax(cur[live]))
+        i = live[j]
+        keep.append(i)
+        kept_scores.append(cur[i])
+        live = np.delete(live, j)
+        if not live.size:
+            break
+        iou = box_iou(boxes[i], boxes[live])
+        if method == 'linear':
+            decay = np.where(iou > iou_thr, 1.0 - iou, 1.0)
+        else:
+            decay = np.exp(-(iou * iou) / max(sigma, 1e-6))
+        cur[live] *= decay
+        live = live[cur[live] >= score_thr]
+    return np.asarray(keep, np.int64), np.asarray(kept_scores, np.float32)
+
+
+def weighted_box_fusion(boxes: np.ndarray, scores: np.ndarray, cls: np.ndarray,
+                        iou_thr: float = 0.55) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fuse clusters of same-class boxes (IoU >= iou_thr with the cluster's top
+    box) into one score-weighted box carrying the cluster's highest score.
+    For objects cut by a tile seam this keeps one box spanning both halves
+    instead of the larger half. Returns (boxes, scores, cls, index of each
+    cluster's top box).
+    """
+    off = _class_offset_boxes(boxes, cls)
+    order = np.argsort(-scores, kind='stable')
+    out_b, out_s, out_c, top = [], [], [], []
+    while order.size:
+        i = order[0]
+        member = box_iou(off[i], off[order]) >= iou_thr
+        member[0] = True
+        idx = order[member]
+        w = scores[idx].astype(np.float64)
+        out_b.append((boxes[idx] * w[:, None]).sum(axis=0) / max(w.sum(), 1e-12))
+        out_s.append(scores[i])
+        out_c.append(cls[i])
+        top.append(i)
+        order = order[~member]
+    return (np.asarray(out_b, np.float32).reshape(-1, 4), np.asarray(out_s, np.float32),
+            np.asarray(out_c, np.int32), np.asarray(top, np.int64))
+
+
+def seam_mask(boxes: np.ndarray, tile_ids: np.ndarray, tiles: List[TileSpec]) -> np.ndarray:
+    """
+    Spatial pre-pass: True for boxes that reach into any tile other than
+    their own, i.e. lie in an overlap band. Each tile's output is already
+    NMS'd by qtimlvdetection, so the other boxes have nothing to merge with.
+    """
+    if not len(boxes) or not tiles:
+        return np.zeros(len(boxes), bool)
+    t = np.array([[ts.x0, ts.y0, ts.x0 + ts.w, ts.y0 + ts.h] for ts in tiles], np.float32)
+    hit = ((boxes[:, None, 0] < t[None, :, 2]) & (boxes[:, None, 2] > t[None, :, 0])
+           & (boxes[:, None, 1] < t[None, :, 3]) & (boxes[:, None, 3] > t[None, :, 1]))   # [N,T]
+    hit[np.arange(len(boxes)), tile_ids] = False
+    return hit.any(axis=1)
+
+
+def merge_tile_detections(
+    dets: List[Detection],
+    tiles: Optional[List[TileSpec]] = None,
+    iou_thr: float = 0.5,
+    method: str = 'nms',
+    class_aware: bool = True,
+    sigma: float = 0.5,
+    score_thr: float = 0.001,
+) -> List[Detection]:
+    """
+    Merge per-tile detections in global coordinates. method: 'nms',
+    'soft-nms' or 'wbf'. With tiles, only boxes in tile overlap bands
+    (seam_mask) are compared; the rest pass through unchanged.
+    """
+    if not dets:
+        return []
+    da = DetectionArray.from_detections(dets)
+    cls = da.cls if class_aware else None
+    if tiles is not None and len(tiles) > 1 and int(da.tile_ids.max()) < len(tiles):
+        seam = seam_mask(da.boxes, da.tile_ids, tiles)
+    else:
+        seam = np.ones(len(da), bool)
+    inner = da.select(np.flatnonzero(~seam))
+    cand = da.select(np.flatnonzero(seam))
+    ccls = cand.cls if class_aware else None
+
+    if method == 'soft-nms':
+        keep, new_scores = soft_nms_indices(cand.boxes, cand.scores, ccls, iou_thr, sigma, score_thr=score_thr)
+        merged = cand.select(keep)
+        merged.scores = new_scores
+    elif method == 'wbf':
+        fcls = cand.cls if class_aware else np.zeros(len(cand), np.int32)
+        b, s, _, top = weighted_box_fusion(cand.boxes, cand.scores, fcls, iou_thr)
+        merged = cand.select(top)
+        merged.boxes, merged.scores = b, s
+    else:
+        merged = cand.select(nms_indices(cand.boxes, cand.scores, ccls, iou_thr))
+
+    out = DetectionArray(
+        np.concatenate([merged.boxes, inner.boxes]), np.concatenate([merged.scores, inner.scores]),
+        np.concatenate([merged.cls, inner.cls]), np.concatenate([merged.tile_ids, inner.tile_ids]), da.names)
+    return out.select(np.argsort(-out.scores, kind='stable')).to_detections()
+
+
 def nms(dets: List[Detection], iou_thr: float = 0.5, class_aware: bool = True) -> List[Detection]:
+    """Greedy NMS over all detections (same result as before, vectorized)."""
     if not dets:
         return []
-    dets_sorted = sorted(dets, key=lambda d: d.score, reverse=True)
-    keep: List[Detection] = []
-    while dets_sorted:
-        best = dets_sorted.pop(0)
-        keep.append(best)
-        best_box = np.array([best.x1, best.y1, best.x2, best.y2], dtype=np.float32)
-        remain: List[Detection] = []
-        for d in dets_sorted:
-            if class_aware and d.label != best.label:
-                remain.append(d)
-                continue
-            box = np.array([d.x1, d.y1, d.x2, d.y2], dtype=np.float32)
-            if iou_xyxy(best_box, box) < iou_thr:
-                remain.append(d)
-        dets_sorted = remain
-    return keep
+    da = DetectionArray.from_detections(dets)
+    keep = nms_indices(da.boxes, da.scores, da.cls if class_aware else None, iou_thr)
+    return [dets[i] for i in keep]
 
 
 # ----------------------------- draw -----------------------------
@@ -129,116 +341,40 @@ def draw_detections(img: Image.Image, dets: List[Detection]) -> Image.Image:
     return out
 
 
-# ----------------------------- qtimlvdetection text parser (carry over from v9) -----------------------------
-
-def _gst_unescape_all(s: str) -> str:
-    if not s:
-        return ''
-    s = s.replace('\x00', '')
-
-    # Turn escaped quotes into quotes (multi-pass)
-    s = s.replace('\\\\\\\\"', '"').replace('\\\\\\"', '"').replace('\\\\"', '"').replace('\\"', '"')
-
-    # Collapse backslashes
-    for _ in range(3):
-        s = s.replace('\\\\', '\\')
-
-    # Unescape GstStructure punctuation: \\, \\= \\< \\> \\; \\(
-    s = re.sub(r'\\([,=<>;()\[\]])', r'\1', s)
-    s = s.replace('\\ ', ' ')
-    return s
-
-def _parse_one_bbox_record(rec: str) -> Optional[Tuple[str, float, float, float, float, float]]:
-    if not rec:
-        return None
-    rec = _gst_unescape_all(rec)
-
-    parts = rec.split(',', 1)
-    if not parts:
-        return None
-    label = parts[0].strip().strip('"')
-
-    m_conf = re.search(r'confidence=\((?:double|float)\)\s*([0-9.]+)', rec)
-    if not m_conf:
-        return None
-    conf = float(m_conf.group(1))
-    score = conf / 100.0 if conf > 1.0 else conf
-
-    m_rect = re.search(r'rectangle=\((?:float|double)\)\s*<\s*([^>]+?)\s*>', rec)
-    if not m_rect:
-        return None
-
-    nums = [x.strip() for x in m_rect.group(1).split(',')]
-    if len(nums) < 4:
-        return None
-
-    def to_f(snum: str) -> float:
-        snum = re.sub(r'\s+', '', snum)
-        return float(snum)
-
-    try:
-        x = to_f(nums[0])
-        y = to_f(nums[1])
-        w = to_f(nums[2])
-        h = to_f(nums[3])
-    except Exception:
-        return None
-
-    return label, score, x, y, w, h
-
-class LabelMapper:
-    def __init__(self):
-        self.label_to_idx = {}
-        self.idx_to_label = []
-
-    def get_cls(self, label: str) -> int:
-        if label not in self.label_to_idx:
-            idx = len(self.idx_to_label)
-            self.label_to_idx[label] = idx
-            self.idx_to_label.append(label)
-        return self.label_to_idx[label]
+# ----------------------------- qtimlvdetection text parser -----------------------------
 
 def parse_qtimlvdetection_text(
     text: str,
     tile: TileSpec,
     tile_id: int,
-    #label_to_idx: Dict[str, int],
     score_thr: float,
     assume_normalized: bool = True,
 ) -> List[Detection]:
-    t = _gst_unescape_all(text)
-    records = re.findall(r'"([^\"]*?rectangle=.*?;)"', t, flags=re.DOTALL)
-    label_mapper = LabelMapper()
-
-    dets: List[Detection] = []
-    for rec in records:
-        parsed = _parse_one_bbox_record(rec)
-        if not parsed:
-            continue
-        label, score, x, y, w, h = parsed
-        if score < score_thr:
-            continue
-
-        norm = assume_normalized
-        if assume_normalized and max(x, y, w, h) > 2.0:
-            norm = False
-
-        if norm:
-            x1 = x * tile.w
-            y1 = y * tile.h
-            x2 = (x + w) * tile.w
-            y2 = (y + h) * tile.h
-        else:
-            x1, y1, x2, y2 = x, y, x + w, y + h
-
-        x1, y1, x2, y2 = clip_xyxy(x1, y1, x2, y2, tile.w, tile.h)
-        gx1, gy1 = x1 + tile.x0, y1 + tile.y0
-        gx2, gy2 = x2 + tile.x0, y2 + tile.y0
-
-        cls = label_mapper.get_cls(label)
-        dets.append(Detection(gx1, gy1, gx2, gy2, score, cls, label, tile_id))
-
-    return dets
+    """
+    Detections of one tile's text output, in global image coordinates (see
+    detection_text.py). Detection.cls is the record's model class id, -1 if absent.
+    """
+    rec = parse_detection_text(text)
+    if not len(rec):
+        return []
+    keep = rec.scores >= score_thr
+    xywh = rec.xywh[keep]
+    scores = rec.scores[keep]
+    ids = rec.ids[keep]
+    labels = [l for l, k in zip(rec.labels, keep) if k]
+
+    # per record: treat as pixels if any value is clearly not normalized
+    norm = np.full(len(xywh), bool(assume_normalized))
+    if assume_normalized:
+        norm &= xywh.max(axis=1, initial=0.0) <= 2.0
+    s = np.where(norm[:, None], np.array([tile.w, tile.h], np.float64), 1.0)
+    b = np.concatenate([xywh[:, :2] * s, (xywh[:, :2] + xywh[:, 2:]) * s], axis=1)
+    np.clip(b[:, 0::2], 0, tile.w - 1, out=b[:, 0::2])
+    np.clip(b[:, 1::2], 0, tile.h - 1, out=b[:, 1::2])
+    b += [tile.x0, tile.y0, tile.x0, tile.y0]
+
+    return [Detection(float(x1), float(y1), float(x2), float(y2), float(sc), int(c), l, tile_id)
+            for (x1, y1, x2, y2), sc, c, l in zip(b, scores, ids, labels)]
 
 
 # ----------------------------- Gst helpers -----------------------------
@@ -419,4 +555,232 @@ def run_tile_pipeline_appsink(
         raise RuntimeError(f'GStreamer timed out after {timeout_sec:.1f}s (EOS={got_eos["flag"]})')
 
     raw = b''.join(chunks).replace(b'\x00', b'')
-    return raw.decode('utf-8', errors='replace')
\ No newline at end of file
+    return raw.decode('utf-8', errors='replace')
+
+def iter_video_frames(path: str, every: int = 1):
+    """Decoded RGB frames [H,W,3] of a video file (every `every`-th frame) via decodebin."""
+    pipeline = Gst.parse_launch(
+        'filesrc name=src ! decodebin ! videoconvert ! video/x-raw,format=RGB ! '
+        'appsink name=sink sync=false max-buffers=4 drop=false')
+    pipeline.get_by_name('src').set_property('location', path)
+    sink = pipeline.get_by_name('sink')
+    bus = pipeline.get_bus()
+    if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+        pipeline.set_state(Gst.State.NULL)
+        raise RuntimeError(f'Failed to open video: {path}')
+    try:
+        n = 0
+        while True:
+            sample = sink.emit('try-pull-sample', 5 * Gst.SECOND)
+            if sample is None:
+                msg = bus.timed_pop_filtered(0, Gst.MessageType.ERROR)
+                if msg is not None:
+                    err, dbg = msg.parse_error()
+                    raise RuntimeError(f'GStreamer ERROR: {err}\nDEBUG: {dbg}')
+                break   # EOS
+            n += 1
+            if (n - 1) % max(every, 1):
+                continue
+            st = sample.get_caps().get_structure(0)
+            w, h = st.get_value('width'), st.get_value('height')
+            buf = sample.get_buffer()
+            ok, mapinfo = buf.map(Gst.MapFlags.READ)
+            if not ok:
+                continue
+            try:
+                data = np.frombuffer(mapinfo.data, np.uint8)
+                stride = data.size // h
+                frame = data[:h * stride].reshape(h, stride)[:, :w * 3].reshape(h, w, 3).copy()
+            finally:
+                buf.unmap(mapinfo)
+            yield n - 1, frame
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+# ----------------------------- persistent tiling engine -----------------------------
+
+def _rgb_stride(w: int) -> int:
+    """Default GStreamer row stride for packed RGB (rows are 4-byte aligned)."""
+    return (w * 3 + 3) & ~3
+
+
+def slice_tile(img: np.ndarray, tile: TileSpec, out: np.ndarray) -> np.ndarray:
+    """Copy the tile view of img [H,W,3] into out [tile.h, stride] (edge tiles zero-padded)."""
+    H, W = img.shape[:2]
+    view = img[tile.y0:min(tile.y0 + tile.h, H), tile.x0:min(tile.x0 + tile.w, W)]
+    h, w = view.shape[:2]
+    rows = out[:, :tile.w * 3].reshape(tile.h, tile.w, 3)
+    rows[:h, :w] = view
+    if h < tile.h or w < tile.w:
+        rows[h:] = 0
+        rows[:h, w:] = 0
+    return out
+
+
+class TileEngine:
+    """One long-lived pipeline for all tiles of all images.
+
+    appsrc (RGB tiles) -> qtimlvconverter -> qtimltflite -> qtimlvdetection
+    -> text/x-raw (utf8) -> appsink
+
+    The model and delegate are loaded once in start(). Each image is decoded
+    once by the caller; tiles are sliced from the decoded array and all
+    tiles of an image are pushed back-to-back, so the converter, the model
+    and the detection parser work on consecutive tiles concurrently. Results
+    are matched to tiles by buffer timestamp.
+
+    After a run_tiles() timeout, tiles of that call may still come out of
+    the pipeline. Their timestamps are older than any tile of a later call,
+    so they are dropped. If the elements do not forward timestamps they
+    cannot be told apart, and the engine refuses further calls.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        labels_path: str,
+        tile_size: int,
+        delegate: str,
+        module: str,
+        constants: str,
+        threshold_percent: float,
+        results: int,
+        pre_engine: str,
+        timeout_sec: float,
+        gst_debug: Optional[str] = None,
+    ):
+        if gst_debug:
+            os.environ['GST_DEBUG'] = str(gst_debug)
+        self.tile_size = int(tile_size)
+        self.timeout_sec = float(timeout_sec)
+        self.stride = _rgb_stride(self.tile_size)
+        self._staging = np.zeros((self.tile_size, self.stride), np.uint8)
+        self._seq = 0
+        self._frame_ns = Gst.SECOND // 30
+        self._timed_out = False   # a call gave up on tiles that may still arrive
+
+        self.pipeline = Gst.Pipeline.new('tile-engine')
+
+        self.src = _make_element('appsrc', 'src')
+        self.src.set_property('caps', Gst.Caps.from_string(
+            f'video/x-raw,format=RGB,width={self.tile_size},height={self.tile_size},framerate=30/1'))
+        self.src.set_property('format', Gst.Format.TIME)
+        self.src.set_property('is-live', False)
+        self.src.set_property('block', False)
+        self.src.set_property('max-bytes', 0)
+
+        pre = _make_element('qtimlvconverter', 'pre')
+        pre.set_property('engine', pre_engine)
+
+        tfl = _make_element('qtimltflite', 'tfl')
+        tfl.set_property('delegate', delegate)
+        tfl.set_property('model', model_path)
+
+        det = _make_element('qtimlvdetection', 'det')
+        det.set_property('threshold', float(threshold_percent))
+        det.set_property('results', int(results))
+        det.set_property('module', module)
+        det.set_property('labels', labels_path)
+        det.set_property('constants', constants)
+
+        textcaps = _make_element('capsfilter', 'textcaps')
+        textcaps.set_property('caps', Gst.Caps.from_string('text/x-raw,format=utf8'))
+
+        self.sink = _make_element('appsink', 'appsink')
+        self.sink.set_property('emit-signals', False)
+        self.sink.set_property('sync', False)
+        self.sink.set_property('max-buffers', 0)
+        self.sink.set_property('drop', False)
+
+        chain = [self.src, pre, tfl, det, textcaps, self.sink]
+        for el in chain:
+            self.pipeline.add(el)
+        _link_chain(chain)
+        self.bus = self.pipeline.get_bus()
+        self._started = False
+
+    def start(self) -> 'TileEngine':
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            self.pipeline.set_state(Gst.State.NULL)
+            raise RuntimeError('Failed to set pipeline to PLAYING')
+        self._started = True
+        return self
+
+    def _check_bus(self) -> None:
+        msg = self.bus.timed_pop_filtered(0, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+        if msg is None:
+            return
+        if msg.type == Gst.MessageType.ERROR:
+            err, dbg = msg.parse_error()
+            raise RuntimeError(f'GStreamer ERROR: {err}\nDEBUG: {dbg}')
+        raise RuntimeError('GStreamer: unexpected EOS')
+
+    def _push(self, img: np.ndarray, tile: TileSpec) -> int:
+        slice_tile(img, tile, self._staging)
+        buf = Gst.Buffer.new_wrapped(self._staging.tobytes())
+        pts = self._seq * self._frame_ns
+        buf.pts = pts
+        buf.dts = pts
+        buf.duration = self._frame_ns
+        self._seq += 1
+        ret = self.src.emit('push-buffer', buf)
+        if ret != Gst.FlowReturn.OK:
+            raise RuntimeError(f'appsrc push-buffer failed: {ret}')
+        return pts
+
+    def run_tiles(self, img: np.ndarray, tiles: List[TileSpec]) -> List[str]:
+        """Detection text for every tile of one decoded RGB image [H,W,3] uint8, in tile order."""
+        if not self._started:
+            self.start()
+        for tile in tiles:
+            if tile.w != self.tile_size or tile.h != self.tile_size:
+                raise ValueError(f'TileEngine was built for {self.tile_size}px tiles, got {tile.w}x{tile.h}')
+        img = np.asarray(img, dtype=np.uint8)
+        call_start = self._seq * self._frame_ns
+        pending = {self._push(img, tile): i for i, tile in enumerate(tiles)}
+
+        texts: List[Optional[str]] = [None] * len(tiles)
+        timeout_ns = int(self.timeout_sec * Gst.SECOND)
+        while pending:
+            sample = self.sink.emit('try-pull-sample', timeout_ns)
+            if sample is None:
+                self._check_bus()
+                self._timed_out = True
+                raise RuntimeError(f'GStreamer timed out after {self.timeout_sec:.1f}s '
+                                   f'({len(pending)}/{len(tiles)} tiles pending)')
+            buf = sample.get_buffer()
+            if buf.pts == Gst.CLOCK_TIME_NONE:
+                if self._timed_out:
+                    raise RuntimeError('TileEngine timed out earlier and the pipeline does not forward '
+                                       'timestamps, so late results cannot be matched; create a new engine')
+                # elements that do not forward timestamps still keep the order
+                idx = pending.pop(min(pending))
+            elif buf.pts < call_start:
+                continue   # late result of a call that timed out
+            else:
+                idx = pending.pop(buf.pts if buf.pts in pending else min(pending))
+            ok, mapinfo = buf.map(Gst.MapFlags.READ)
+            if not ok:
+                texts[idx] = ''
+                continue
+            try:
+                raw = bytes(mapinfo.data)
+            finally:
+                buf.unmap(mapinfo)
+            texts[idx] = raw.replace(b'\x00', b'').decode('utf-8', errors='replace')
+        return texts
+
+    def close(self) -> None:
+        if self._started:
+            self.src.emit('end-of-stream')
+            self.bus.timed_pop_filtered(int(min(self.timeout_sec, 2.0) * Gst.SECOND),
+                                        Gst.MessageType.ERROR | Gst.MessageType.EOS)
+        self.pipeline.set_state(Gst.State.NULL)
+        self._started = False
+
+    def __enter__(self) -> 'TileEngine':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -16,7 +16,13 @@ High-level flow
 ---------------
 1. Load a large input image (e.g. 4K)
 2. Split the image into overlapping tiles (Python-controlled tiling)
-3. For each tile, run a GStreamer pipeline:
+3. Run every tile through one persistent GStreamer pipeline (the image is
+   decoded once, tiles are sliced from it in Python):
+
+   appsrc (RGB tile) → qtimlvconverter → qtimltflite → qtimlvdetection
+   → text/x-raw (utf8) → appsink
+
+   --engine per-tile keeps the original one-pipeline-per-tile path:
 
    filesrc → decodebin → videoconvert → videocrop (tile)
    → qtimlvconverter → qtimltflite → qtimlvdetection
@@ -24,7 +30,8 @@ High-level flow
 
 4. Parse qtimlvdetection's text output in Python
 5. Convert per-tile detections back to global image coordinates
-6. Apply **global class-aware NMS** across all tiles
+6. Merge across tiles with **global class-aware NMS** (or Soft-NMS / weighted
+   box fusion), comparing only boxes in tile overlap bands
 7. Save results to JSON and an annotated output image
 
 """
@@ -33,6 +40,7 @@ import json
 import os
 import time
 from typing import List
+import numpy as np
 from PIL import Image
 
 # GStreamer (GI)
@@ -40,9 +48,10 @@ import gi
 gi.require_version('Gst', '1.0')
 gi.require_version('GLib', '2.0')
 from gi.repository import Gst, GLib
-from lib import plan_tiles, run_tile_pipeline_appsink, parse_qtimlvdetection_text, nms, draw_detections
+from lib import (Detection, TileEngine, TileSpec, plan_tiles, run_tile_pipeline_appsink,
+                 parse_qtimlvdetection_text, merge_tile_detections, draw_detections)
 
-def parse_args():
+def build_parser(image_required: bool = True) -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
         description=(
             'Tile-based object detection for large images using a Python-constructed '
@@ -54,7 +63,7 @@ def parse_args():
 
     # ---- Input / Model ----
     p.add_argument(
-        '--image', required=True,
+        '--image', required=image_required,
         help='Path to the input image file (e.g. high-resolution or 4K image).'
     )
     p.add_argument(
@@ -109,6 +118,20 @@ def parse_args():
         '--no-global-nms', action='store_true',
         help='Disable global NMS and keep per-tile detection results.'
     )
+    p.add_argument(
+        '--merge', choices=['nms', 'soft-nms', 'wbf'], default='nms',
+        help=('How overlapping tile detections are merged: greedy NMS (default), Soft-NMS (decay '
+              'scores of overlapping boxes) or weighted box fusion (average boxes cut by tile seams).')
+    )
+    p.add_argument(
+        '--soft-sigma', type=float, default=0.5,
+        help='Gaussian sigma for --merge soft-nms (default: 0.5).'
+    )
+    p.add_argument(
+        '--no-seam-prepass', action='store_true',
+        help=('Compare all detections during the merge instead of only those in tile overlap bands '
+              '(needed if the detection module does not apply NMS within a tile).')
+    )
 
     # ---- Detection Output Interpretation ----
     p.add_argument(
@@ -119,6 +142,11 @@ def parse_args():
     p.set_defaults(assume_normalized=True)
 
     # ---- Pipeline / Debug ----
+    p.add_argument(
+        '--engine', choices=['persistent', 'per-tile'], default='persistent',
+        help=('persistent: decode once, one long-lived appsrc pipeline for all tiles (default); '
+              'per-tile: build, run and tear down a filesrc pipeline per tile.')
+    )
     p.add_argument(
         '--pre-engine', type=str, default='ocv',
         help='Pre-processing engine used by qtimlvconverter (default: ocv).'
@@ -152,7 +180,50 @@ def parse_args():
         help='Path to save the annotated output image.'
     )
 
-    return p.parse_args()
+    return p
+
+
+def parse_args():
+    return build_parser().parse_args()
+
+
+def make_tile_engine(args) -> TileEngine:
+    return TileEngine(
+        model_path=args.model,
+        labels_path=args.labels,
+        tile_size=args.tile,
+        delegate=args.delegate,
+        module=args.module,
+        constants=args.constants,
+        threshold_percent=float(args.score_thr) * 100.0,
+        results=args.results,
+        pre_engine=args.pre_engine,
+        timeout_sec=args.timeout,
+        gst_debug=args.gst_debug,
+    )
+
+
+def run_per_tile(args, image_path: str, W: int, H: int, tiles: List[TileSpec]) -> List[str]:
+    """Original path: a new filesrc pipeline (decode + model load) for every tile."""
+    return [
+        run_tile_pipeline_appsink(
+            image_path=image_path,
+            model_path=args.model,
+            labels_path=args.labels,
+            W=W,
+            H=H,
+            tile=ts,
+            delegate=args.delegate,
+            module=args.module,
+            constants=args.constants,
+            threshold_percent=float(args.score_thr) * 100.0,
+            results=args.results,
+            pre_engine=args.pre_engine,
+            timeout_sec=args.timeout,
+            gst_debug=args.gst_debug,
+        )
+        for ts in tiles
+    ]
 
 
 def main():
@@ -173,24 +244,13 @@ def main():
 
     t0 = time.perf_counter()
 
-    for tid, ts in enumerate(tiles):
-        txt = run_tile_pipeline_appsink(
-            image_path=args.image,
-            model_path=args.model,
-            labels_path=args.labels,
-            W=W,
-            H=H,
-            tile=ts,
-            delegate=args.delegate,
-            module=args.module,
-            constants=args.constants,
-            threshold_percent=float(args.score_thr) * 100.0,
-            results=args.results,
-            pre_engine=args.pre_engine,
-            timeout_sec=args.timeout,
-            gst_debug=args.gst_debug,
-        )
+    if args.engine == 'persistent':
+        with make_tile_engine(args) as engine:
+            texts = engine.run_tiles(np.asarray(img), tiles)
+    else:
+        texts = run_per_tile(args, args.image, W, H, tiles)
 
+    for tid, (ts, txt) in enumerate(zip(tiles, texts)):
         if not args.no_save_raw:
             out_txt = os.path.join(args.raw_out_dir, f'tile_{tid:04d}.txt')
             with open(out_txt, 'w', encoding='utf-8', errors='replace') as f:
@@ -207,13 +267,22 @@ def main():
 
     t1 = time.perf_counter()
 
-    merged = all_dets if args.no_global_nms else nms(all_dets, iou_thr=args.nms_iou, class_aware=True)
+    merged = all_dets if args.no_global_nms else merge_tile_detections(
+        all_dets,
+        tiles=None if args.no_seam_prepass else tiles,
+        iou_thr=args.nms_iou,
+        method=args.merge,
+        class_aware=True,
+        sigma=args.soft_sigma,
+        score_thr=args.score_thr,
+    )
 
     t2 = time.perf_counter()
 
     meta = {
         'image': {'path': args.image, 'width': W, 'height': H},
-        'tile': {'size': args.tile, 'overlap': args.overlap, 'count': len(tiles), 'cropping_in_pipeline': bool(do_crop)},
+        'tile': {'size': args.tile, 'overlap': args.overlap, 'count': len(tiles), 'cropping_in_pipeline': args.engine == 'per-tile'},
+        'engine': args.engine,
         'gst': {
             'delegate': args.delegate,
             'model': args.model,
@@ -224,6 +293,7 @@ def main():
             'sink': 'appsink',
         },
         'thresholds': {'score': args.score_thr, 'nms_iou': args.nms_iou},
+        'merge': {'method': args.merge, 'seam_prepass': not args.no_seam_prepass},
         'timing': {'gst_total_sec': t1 - t0, 'postprocess_sec': t2 - t1, 'end_to_end_sec': t2 - t0},
         'counts': {'raw_dets': len(all_dets), 'merged_dets': len(merged)},
         'raw_out_dir': None if args.no_save_raw else args.raw_out_dir,
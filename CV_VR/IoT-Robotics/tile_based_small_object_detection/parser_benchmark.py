@@ -0,0 +1,291 @@
+#===------------------------parser_benchmark.py---------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Fuzz check and throughput benchmark of detection_text.py against the two
+parsers it replaces (the tile detector's multi-pass unescape + per-record
+regexes, and the traffic demo's normalize_text + RE_DET). Runs on any host,
+no GStreamer needed.
+
+- Recorded outputs: pass --recorded with the per-tile text files written by
+  main.py (run it without --no-save-raw, files in --raw-out-dir).
+- Generated outputs: messages in the qtimlvdetection format with 1-3 escape
+  levels, labels with spaces, exponent notation and pixel/normalized boxes.
+- Fuzz: the generated messages truncated, with bytes dropped/duplicated and
+  garbage inserted. The parser must never raise, and on intact messages
+  it must return the same records as the legacy tile parser.
+- Class ids: on generated messages every record's id must be the one
+  written (the tile detector's Detection.cls is this id, not a per-tile
+  first-seen index as before).
+- Traffic demo: traffic_parse() mirrors rb3_intersection_traffic_measure
+  parse_dets (that module needs GStreamer to import) and is compared with
+  the previous normalize_text + RE_DET parser on messages without "e+"
+  exponents: every legacy record must be returned unchanged, extra records
+  are counted. RE_DET stopped numbers at the "+", so with such exponents
+  it either raised (float("4.3e")) or let its .*? run on into the next
+  record's rectangle; those messages are only counted.
+
+    python parser_benchmark.py --messages 2000 --fuzz 5000
+    python parser_benchmark.py --recorded ./raw_text_tiles
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from detection_text import clean_text, parse_detection_text
+
+LABELS = ['person', 'car', 'truck', 'traffic light', 'fire hydrant', 'boat', 'bicycle']
+
+
+# ----------------------------- legacy parsers (for comparison) -----------------------------
+
+def legacy_gst_unescape_all(s: str) -> str:
+    if not s:
+        return ''
+    s = s.replace('\x00', '')
+    s = s.replace('\\\\\\\\"', '"').replace('\\\\\\"', '"').replace('\\\\"', '"').replace('\\"', '"')
+    for _ in range(3):
+        s = s.replace('\\\\', '\\')
+    s = re.sub(r'\\([,=<>;()\[\]])', r'\1', s)
+    s = s.replace('\\ ', ' ')
+    return s
+
+
+def legacy_parse_one(rec: str) -> Optional[Tuple[str, float, float, float, float, float]]:
+    rec = legacy_gst_unescape_all(rec)
+    label = rec.split(',', 1)[0].strip().strip('"')
+    m_conf = re.search(r'confidence=\((?:double|float)\)\s*([0-9.]+)', rec)
+    if not m_conf:
+        return None
+    conf = float(m_conf.group(1))
+    score = conf / 100.0 if conf > 1.0 else conf
+    m_rect = re.search(r'rectangle=\((?:float|double)\)\s*<\s*([^>]+?)\s*>', rec)
+    if not m_rect:
+        return None
+    nums = [x.strip() for x in m_rect.group(1).split(',')]
+    if len(nums) < 4:
+        return None
+    try:
+        x, y, w, h = (float(re.sub(r'\s+', '', n)) for n in nums[:4])
+    except Exception:
+        return None
+    return label, score, x, y, w, h
+
+
+def legacy_tile_parse(text: str) -> List[Tuple[str, float, float, float, float, float]]:
+    t = legacy_gst_unescape_all(text)
+    out = []
+    for rec in re.findall(r'"([^\"]*?rectangle=.*?;)"', t, flags=re.DOTALL):
+        p = legacy_parse_one(rec)
+        if p:
+            out.append(p)
+    return out
+
+
+LEGACY_RE_DET = re.compile(
+    r'"(?P<label>[^",]+)\s*,\s*id=\(uint\)\s*(?P<oid>\d+)\s*,\s*confidence=\(double\)\s*(?P<conf>[-0-9.eE]+).*?'
+    r'rectangle=\(float\)\s*<\s*(?P<x>[-0-9.eE]+)\s*,\s*(?P<y>[-0-9.eE]+)\s*,\s*(?P<w>[-0-9.eE]+)\s*,\s*(?P<h>[-0-9.eE]+)',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def legacy_normalize_text(raw: str) -> str:
+    s = raw
+    while "\\\\" in s:
+        s = s.replace("\\\\", "\\")
+    s = s.replace("\\&", "&")
+    s = (s.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", "\"").replace("&#34;", "\""))
+    s = s.replace("\\ ", " ").replace("\\,", ",").replace("\\=", "=")
+    s = s.replace("\\(", "(").replace("\\)", ")").replace("\\<", "<").replace("\\>", ">")
+    s = s.replace('\\"', '"')
+    return s
+
+
+RE_PLUS_EXPONENT = re.compile(r'\d[eE]\+')
+
+
+def legacy_traffic_parse(raw: str) -> list:
+    """Previous rb3_intersection_traffic_measure.parse_dets: (label, conf, clamped xyxy) per record."""
+    s = legacy_normalize_text(raw)
+    out = []
+    for m in LEGACY_RE_DET.finditer(s):
+        x, y, w, h = (float(m.group(k)) for k in 'xywh')
+        box = tuple(min(max(v, 0.0), 1.0) for v in (x, y, x + w, y + h))
+        out.append((m.group('label').strip(), float(m.group('conf')) / 100.0, box))
+    return out
+
+
+def legacy_traffic_bench(raw: str) -> list:
+    try:
+        return legacy_traffic_parse(raw)
+    except ValueError:
+        return []
+
+
+def traffic_parse(raw: str) -> list:
+    """Current rb3_intersection_traffic_measure.parse_dets, same output layout as legacy_traffic_parse."""
+    s = clean_text(raw)
+    rec = parse_detection_text(s, percent=True, cleaned=True)
+    if not len(rec):
+        return []
+    b = np.clip(rec.xyxy(), 0.0, 1.0).tolist()
+    return [(label.strip(), float(c), tuple(bb)) for bb, label, c in zip(b, rec.labels, rec.scores)]
+
+
+def traffic_compare(new: list, old: list) -> Tuple[bool, int]:
+    """(every legacy record found in order with equal values, number of extra records)."""
+    it = iter(new)
+    for label, conf, box in old:
+        for n_label, n_conf, n_box in it:
+            if n_label == label and np.allclose([n_conf, *n_box], [conf, *box]):
+                break
+        else:
+            return False, 0
+    return True, len(new) - len(old)
+
+
+# ----------------------------- generated outputs -----------------------------
+
+def _escape(s: str, level: int) -> str:
+    """Escape a record string as GstStructure does, `level` times."""
+    for _ in range(level):
+        s = re.sub(r'([\\,=<>;()" ])', r'\\\1', s)
+    return s
+
+
+def make_message(rng: random.Random, n: int, level: int, pixel_boxes: bool = True) -> str:
+    recs = []
+    for i in range(n):
+        label = rng.choice(LABELS)
+        conf = rng.uniform(20.0, 99.9)
+        if rng.random() < 0.5 or not pixel_boxes:
+            box = [rng.random() * 0.9, rng.random() * 0.9, rng.random() * 0.1, rng.random() * 0.1]
+        else:
+            box = [rng.uniform(0, 600), rng.uniform(0, 600), rng.uniform(4, 60), rng.uniform(4, 60)]
+        nums = ', '.join(f'{v:.6g}' if rng.random() < 0.8 else f'{v:.4e}' for v in box)
+        rec = (f'{label}, id=(uint){LABELS.index(label)}, confidence=(double){conf:.4f}, '
+               f'color=(uint)0x{rng.getrandbits(32):08x}, rectangle=(float)< {nums} >;')
+        recs.append('"' + _escape(rec, level) + '"')
+    return (f'ObjectDetection, batch-index=(uint)0, bounding-boxes=(structure)< {", ".join(recs)} >, '
+            f'timestamp=(guint64){rng.getrandbits(40)}, sequence-index=(uint)1, sequence-num-entries=(uint)1;\x00')
+
+
+def mutate(rng: random.Random, s: str) -> str:
+    op = rng.randrange(4)
+    if not s:
+        return s
+    i = rng.randrange(len(s))
+    if op == 0:
+        return s[:i]                                          # truncated
+    if op == 1:
+        j = min(len(s), i + rng.randrange(1, 20))
+        return s[:i] + s[j:]                                  # bytes dropped
+    if op == 2:
+        return s[:i] + s[i:i + 10] + s[i:]                    # bytes duplicated
+    junk = ''.join(rng.choice('\\"<>,;=() abc0.9-e\x00') for _ in range(rng.randrange(1, 12)))
+    return s[:i] + junk + s[i:]                               # garbage inserted
+
+
+def records_equal(new, old) -> bool:
+    if len(new) != len(old):
+        return False
+    for k, (label, score, x, y, w, h) in enumerate(old):
+        if new.labels[k] != label or not np.allclose([new.scores[k], *new.xywh[k]], [score, x, y, w, h]):
+            return False
+    return True
+
+
+def bench(fn, messages: List[str], n_records: int, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for m in messages:
+            fn(m)
+    return n_records * rounds / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='qtimlvdetection text parser fuzz check and benchmark')
+    ap.add_argument('--recorded', type=str, default='', help='Directory of recorded raw text outputs (*.txt)')
+    ap.add_argument('--messages', type=int, default=2000, help='Generated messages')
+    ap.add_argument('--records', type=int, default=20, help='Max records per generated message')
+    ap.add_argument('--fuzz', type=int, default=5000, help='Mutated messages')
+    ap.add_argument('--rounds', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    sets = []
+    if args.recorded:
+        files = sorted(glob.glob(os.path.join(args.recorded, '*.txt')))
+        recorded = [open(f, encoding='utf-8', errors='replace').read() for f in files]
+        sets.append((f'recorded ({len(files)} files)', recorded))
+    for level in (1, 2, 3):
+        sets.append((f'generated, escape level {level}',
+                     [make_message(rng, rng.randrange(0, args.records + 1), level)
+                      for _ in range(args.messages // 3)]))
+    # normalized boxes only, as qtimlpostprocess writes them for the traffic demo
+    sets.append(('generated, normalized boxes',
+                 [make_message(rng, rng.randrange(0, args.records + 1), 1, pixel_boxes=False)
+                  for _ in range(args.messages // 3)]))
+
+    # correctness on intact messages
+    for name, msgs in sets:
+        bad = sum(not records_equal(parse_detection_text(m), legacy_tile_parse(m)) for m in msgs)
+        print(f'[check] {name}: {len(msgs)} messages, {bad} differ from the legacy tile parser')
+        if name.startswith('generated'):
+            bad_ids = 0
+            for m in msgs:
+                r = parse_detection_text(m)
+                bad_ids += any(int(i) != LABELS.index(l) for l, i in zip(r.labels, r.ids))
+            print(f'[check] {name}: {bad_ids} messages with class ids other than the ones written')
+        missing = extra = skipped = 0
+        for m in msgs:
+            if RE_PLUS_EXPONENT.search(m):
+                skipped += 1
+                continue
+            ok, n_extra = traffic_compare(traffic_parse(m), legacy_traffic_parse(m))
+            missing += not ok
+            extra += n_extra
+        print(f'[check] {name}: {missing} messages lose or change legacy traffic records, '
+              f'{extra} extra records from the shared parser ({skipped} messages with "e+" exponents not compared)')
+
+    # fuzz: must not raise; every record returned must be well-formed
+    pool = [m for _, msgs in sets for m in msgs] or ['']
+    crashes = 0
+    for _ in range(args.fuzz):
+        m = pool[rng.randrange(len(pool))]
+        for _ in range(rng.randrange(1, 4)):
+            m = mutate(rng, m)
+        try:
+            r = parse_detection_text(m)
+            assert r.xywh.shape == (len(r), 4) and np.isfinite(r.xywh).all() and len(r.scores) == len(r)
+        except Exception as e:   # noqa: BLE001 - report everything
+            crashes += 1
+            if crashes <= 3:
+                print(f'[fuzz] {type(e).__name__}: {e!r} on {m[:160]!r}')
+    print(f'[fuzz] {args.fuzz} mutated messages, {crashes} failures')
+
+    # throughput
+    print(f'\n{"set":<30}{"records":>9}{"legacy tile":>14}{"legacy traffic":>16}{"shared":>12}   records/s')
+    for name, msgs in sets:
+        n = sum(len(parse_detection_text(m)) for m in msgs)
+        if not n:
+            continue
+        r_tile = bench(legacy_tile_parse, msgs, n, args.rounds)
+        r_traffic = bench(legacy_traffic_bench, msgs, n, args.rounds)
+        r_new = bench(parse_detection_text, msgs, n, args.rounds)
+        print(f'{name:<30}{n:>9}{r_tile:>14.0f}{r_traffic:>16.0f}{r_new:>12.0f}   ({r_new / r_tile:.1f}x tile)')
+
+
+if __name__ == '__main__':
+    main()
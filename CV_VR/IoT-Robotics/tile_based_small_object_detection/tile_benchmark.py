@@ -0,0 +1,96 @@
+#===------------------------tile_benchmark.py-----------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Images/sec of the persistent tiling engine against the original
+one-pipeline-per-tile path, on the device.
+
+Takes every main.py option (--image, --model, --labels, --constants, ...)
+plus the benchmark options below. Each engine processes the same images
+for --iters rounds; the persistent engine's one-time start-up (model and
+delegate load) is reported separately. Detection counts of both engines
+are compared on the first round.
+
+    python tile_benchmark.py --image ./Images/test.png --model ./yolov8.tflite \\
+        --labels ./yolov8.labels --constants "..." --iters 3
+"""
+import time
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from lib import nms, parse_qtimlvdetection_text, plan_tiles
+from main import build_parser, make_tile_engine, run_per_tile
+
+
+def detect(args, texts: List[str], tiles) -> int:
+    dets = []
+    for tid, (ts, txt) in enumerate(zip(tiles, texts)):
+        dets.extend(parse_qtimlvdetection_text(text=txt, tile=ts, tile_id=tid, score_thr=args.score_thr,
+                                               assume_normalized=args.assume_normalized))
+    return len(nms(dets, iou_thr=args.nms_iou, class_aware=True))
+
+
+def bench(name: str, run, images: List[str], iters: int) -> List[int]:
+    counts = []
+    n_tiles = 0
+    t0 = time.perf_counter()
+    for it in range(iters):
+        for path in images:
+            n, tiles = run(path)
+            n_tiles += tiles
+            if it == 0:
+                counts.append(n)
+    dt = time.perf_counter() - t0
+    n_img = iters * len(images)
+    print(f'{name:<12}{n_img:>7}{n_tiles:>7}{dt:>10.2f}{n_img / dt:>11.3f}{n_tiles / dt:>10.1f}')
+    return counts
+
+
+def main():
+    p = build_parser()
+    p.add_argument('--images', nargs='*', default=[], help='Additional images to include in the run.')
+    p.add_argument('--iters', type=int, default=3, help='Rounds over the image list per engine.')
+    p.add_argument('--skip-per-tile', action='store_true', help='Only run the persistent engine.')
+    args = p.parse_args()
+    Gst.init(None)
+    images = [args.image] + list(args.images)
+
+    t0 = time.perf_counter()
+    engine = make_tile_engine(args).start()
+    startup = time.perf_counter() - t0
+
+    def run_persistent(path):
+        img = np.asarray(Image.open(path).convert('RGB'))
+        tiles = plan_tiles(img.shape[1], img.shape[0], tile=args.tile, overlap=args.overlap)
+        return detect(args, engine.run_tiles(img, tiles), tiles), len(tiles)
+
+    def run_legacy(path):
+        W, H = Image.open(path).size
+        tiles = plan_tiles(W, H, tile=args.tile, overlap=args.overlap)
+        return detect(args, run_per_tile(args, path, W, H, tiles), tiles), len(tiles)
+
+    print(f'{len(images)} image(s) x {args.iters} round(s), tile={args.tile} overlap={args.overlap}')
+    print(f'persistent engine start-up (model + delegate load): {startup:.2f}s')
+    print(f'{"engine":<12}{"images":>7}{"tiles":>7}{"seconds":>10}{"images/s":>11}{"tiles/s":>10}')
+    try:
+        new_counts = bench('persistent', run_persistent, images, args.iters)
+    finally:
+        engine.close()
+    if not args.skip_per_tile:
+        old_counts = bench('per-tile', run_legacy, images, args.iters)
+        print(f'detections per image  persistent={new_counts}  per-tile={old_counts}  '
+              f'identical={new_counts == old_counts}')
+
+
+if __name__ == '__main__':
+    main()
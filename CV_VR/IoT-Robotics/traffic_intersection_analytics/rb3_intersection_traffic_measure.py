@@ -9,7 +9,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, re, sys, time, signal, argparse, csv, json, math
+import os, sys, time, signal, argparse, csv, json, math
 from dataclasses import dataclass, field
 from collections import Counter, OrderedDict, deque
 
@@ -23,6 +23,12 @@ try:
 except Exception:
     cairo = None
 
+import numpy as np
+
+# qtimlvdetection / qtimlpostprocess text parser is shared with the tile-based detector
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tile_based_small_object_detection"))
+from detection_text import clean_text, parse_detection_text  # noqa: E402
+
 # -----------------------------
 # Utils
 # -----------------------------
@@ -49,19 +55,6 @@ def ema_bbox(old, new, alpha=0.6):
         alpha*new[3] + (1-alpha)*old[3],
     )
 
-def normalize_text(raw: str) -> str:
-    if not raw:
-        return ""
-    s = raw
-    while "\\\\" in s:
-        s = s.replace("\\\\", "\\")
-    s = s.replace("\\&", "&")
-    s = (s.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", "\"").replace("&#34;", "\""))
-    s = s.replace("\\ ", " ").replace("\\,", ",").replace("\\=", "=")
-    s = s.replace("\\(", "(").replace("\\)", ")").replace("\\<", "<").replace("\\>", ">")
-    s = s.replace('\\"', '"')
-    return s
-
 def get_caps_wh(elem, fallback=(1920,1080)):
     try:
         pad = elem.get_static_pad("sink")
@@ -100,23 +93,14 @@ def simple_nms(dets, iou_thr=0.6):
 # -----------------------------
 # Parse detections from qtimlpostprocess text/x-raw
 # -----------------------------
-RE_DET = re.compile(
-    r'"(?P<label>[^",]+)\s*,\s*id=\(uint\)\s*(?P<oid>\d+)\s*,\s*confidence=\(double\)\s*(?P<conf>[-0-9.eE]+).*?'
-    r'rectangle=\(float\)\s*<\s*(?P<x>[-0-9.eE]+)\s*,\s*(?P<y>[-0-9.eE]+)\s*,\s*(?P<w>[-0-9.eE]+)\s*,\s*(?P<h>[-0-9.eE]+)',
-    re.IGNORECASE | re.DOTALL
-)
-
 def parse_dets(raw: str):
-    s = normalize_text(raw)
-    dets = []
-    for m in RE_DET.finditer(s):
-        label = m.group("label").strip()
-        conf = float(m.group("conf")) / 100.0  # qtimlpostprocess 常用 0~100；這裡轉成 0~1
-        x = float(m.group("x")); y = float(m.group("y"))
-        w = float(m.group("w")); h = float(m.group("h"))
-        x1 = clamp(x, 0.0, 1.0); y1 = clamp(y, 0.0, 1.0)
-        x2 = clamp(x+w, 0.0, 1.0); y2 = clamp(y+h, 0.0, 1.0)
-        dets.append({"bbox": (x1,y1,x2,y2), "label": label, "conf": conf})
+    s = clean_text(raw)
+    rec = parse_detection_text(s, percent=True, cleaned=True)  # qtimlpostprocess 常用 0~100；這裡轉成 0~1
+    if not len(rec):
+        return [], s
+    b = np.clip(rec.xyxy(), 0.0, 1.0).tolist()
+    dets = [{"bbox": tuple(bb), "label": label.strip(), "conf": float(c)}
+            for bb, label, c in zip(b, rec.labels, rec.scores)]
     return dets, s
 
 # -----------------------------
@@ -0,0 +1,212 @@
+#===---feature_matcher.py-------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Descriptor matchers for the XFeat VO keyframe matching.
+
+All matchers take L2-normalized descriptors (query = keyframe, train =
+current frame) and return index arrays (query_idx, train_idx) of the
+matches that pass the ratio test:
+
+  bf     : cv2.BFMatcher(NORM_L2).knnMatch, vectorized ratio test
+  flann  : cv2.FlannBasedMatcher (randomized KD-trees), vectorized ratio test
+  numpy  : one GEMM into a reused similarity buffer, nearest / second
+           nearest per row, optional mutual-nearest check
+
+The numpy matcher also supports guided matching: given predicted
+positions of the keyframe points in the current frame, only candidates
+within a search radius are considered.
+"""
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+MATCHERS = ("bf", "flann", "numpy")
+
+_EMPTY = (np.zeros(0, np.int32), np.zeros(0, np.int32))
+
+
+def quantize_descriptors(desc: np.ndarray) -> np.ndarray:
+    """L2-normalized float descriptors -> int8 (x127), 4x smaller to store."""
+    return np.clip(np.rint(desc * 127.0), -127, 127).astype(np.int8)
+
+
+def _as_float(desc: np.ndarray) -> np.ndarray:
+    if desc.dtype == np.int8:
+        return desc.astype(np.float32) * (1.0 / 127.0)
+    return desc if desc.dtype == np.float32 else desc.astype(np.float32)
+
+
+def _knn_ratio(knn, ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Ratio test over an OpenCV knnMatch(k=2) result without a per-match Python branch."""
+    pairs = [p for p in knn if len(p) == 2]
+    if not pairs:
+        return _EMPTY
+    arr = np.array([(a.queryIdx, a.trainIdx, a.distance, b.distance) for a, b in pairs], dtype=np.float64)
+    ok = arr[:, 2] < ratio * arr[:, 3]
+    return arr[ok, 0].astype(np.int32), arr[ok, 1].astype(np.int32)
+
+
+class BFMatcher:
+    name = "bf"
+
+    def __init__(self, ratio: float = 0.9):
+        self.ratio = ratio
+        self.bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck=False)
+
+    def match(self, q_desc, t_desc, q_pred=None, t_xy=None):
+        if len(q_desc) < 2 or len(t_desc) < 2:
+            return _EMPTY
+        return _knn_ratio(self.bf.knnMatch(_as_float(q_desc), _as_float(t_desc), k=2), self.ratio)
+
+
+class FlannMatcher:
+    """
+    Randomized KD-tree FLANN. The train set changes every frame, so the
+    index is rebuilt per call; it pays off for larger descriptor sets.
+    (LSH needs binary descriptors and does not apply to XFeat's float ones.)
+    """
+    name = "flann"
+
+    def __init__(self, ratio: float = 0.9, trees: int = 4, checks: int = 32):
+        self.ratio = ratio
+        self.flann = cv2.FlannBasedMatcher(dict(algorithm=1, trees=trees), dict(checks=checks))
+
+    def match(self, q_desc, t_desc, q_pred=None, t_xy=None):
+        if len(q_desc) < 2 or len(t_desc) < 2:
+            return _EMPTY
+        return _knn_ratio(self.flann.knnMatch(_as_float(q_desc), _as_float(t_desc), k=2), self.ratio)
+
+
+class NumpyMatcher:
+    """
+    Vectorized nearest neighbour + ratio test (+ mutual check).
+    For unit vectors ||a - b||^2 = 2 - 2 a.b, so one matrix product gives
+    all distances; the similarity buffer is reused between frames.
+    """
+    name = "numpy"
+
+    def __init__(self, ratio: float = 0.9, mutual: bool = True, guided_radius: float = 0.0):
+        self.ratio = ratio
+        self.mutual = mutual
+        self.guided_radius = guided_radius
+        self._sim = np.empty((0,), np.float32)
+
+    def _sim_buffer(self, n: int, m: int) -> np.ndarray:
+        if self._sim.size < n * m:
+            self._sim = np.empty(n * m, np.float32)
+        return self._sim[:n * m].reshape(n, m)
+
+    def _accept(self, s1, s2, rows_ok):
+        d1 = np.sqrt(np.maximum(2.0 - 2.0 * s1, 0.0))
+        d2 = np.sqrt(np.maximum(2.0 - 2.0 * s2, 0.0))
+        return (d1 < self.ratio * d2) & rows_ok
+
+    def match(self, q_desc, t_desc, q_pred: Optional[np.ndarray] = None, t_xy: Optional[np.ndarray] = None):
+        n, m = len(q_desc), len(t_desc)
+        if n < 1 or m < 2:
+            return _EMPTY
+        q = _as_float(q_desc)
+        t = _as_float(t_desc)
+        if self.guided_radius > 0 and q_pred is not None and t_xy is not None:
+            return self._match_guided(q, t, q_pred, t_xy)
+
+        sim = self._sim_buffer(n, m)
+        np.matmul(q, t.T, out=sim)
+
+        rows = np.arange(n)
+        best = np.argmax(sim, axis=1)
+        s1 = sim[rows, best].copy()
+        col_best = np.argmax(sim, axis=0) if self.mutual else None
+
+        sim[rows, best] = -3.0
+        s2 = np.max(sim, axis=1)
+
+        ok = self._accept(s1, s2, True)
+        if self.mutual:
+            ok &= col_best[best] == rows
+
+        qi = np.flatnonzero(ok).astype(np.int32)
+        return qi, best[qi].astype(np.int32)
+
+    def _match_guided(self, q, t, q_pred, t_xy, block: int = 64):
+        """
+        Only candidates within guided_radius of the predicted position are
+        scored. Both sides are sorted by x, so each block of queries only
+        needs a GEMM against the band of train points whose x is in range.
+        """
+        r = float(self.guided_radius)
+        n, m = len(q), len(t)
+        t_order = np.argsort(t_xy[:, 0], kind="stable")
+        tx = t_xy[t_order, 0]
+        ty = t_xy[t_order, 1]
+        ts = t[t_order]
+        q_order = np.argsort(q_pred[:, 0], kind="stable")
+
+        best = np.full(n, -1, np.int64)       # into t_order
+        s1 = np.full(n, -3.0, np.float32)
+        s2 = np.full(n, -3.0, np.float32)
+        col_sim = np.full(m, -3.0, np.float32)
+        col_row = np.full(m, -1, np.int64)
+
+        for b0 in range(0, n, block):
+            rows = q_order[b0:b0 + block]
+            px = q_pred[rows, 0]
+            py = q_pred[rows, 1]
+            c0 = int(np.searchsorted(tx, px[0] - r, side="left"))
+            c1 = int(np.searchsorted(tx, px[-1] + r, side="right"))
+            if c1 - c0 < 1:
+                continue
+            S = q[rows] @ ts[c0:c1].T
+            dx = px[:, None] - tx[None, c0:c1]
+            dy = py[:, None] - ty[None, c0:c1]
+            S[dx * dx + dy * dy > r * r] = -3.0
+
+            k = np.arange(len(rows))
+            bl = np.argmax(S, axis=1)
+            s1[rows] = S[k, bl]
+            best[rows] = bl + c0
+            cb = np.argmax(S, axis=0)
+            cs = S[cb, np.arange(c1 - c0)]
+            upd = cs > col_sim[c0:c1]
+            col_sim[c0:c1][upd] = cs[upd]
+            col_row[c0:c1][upd] = rows[cb[upd]]
+            if c1 - c0 > 1:
+                S[k, bl] = -3.0
+                s2[rows] = np.max(S, axis=1)
+
+        ok = self._accept(s1, s2, s1 > -2.0)
+        if self.mutual:
+            ok &= col_row[np.maximum(best, 0)] == np.arange(n)
+        qi = np.flatnonzero(ok).astype(np.int32)
+        return qi, t_order[best[qi]].astype(np.int32)
+
+
+def create_matcher(kind: str, ratio: float = 0.9, mutual: bool = True, guided_radius: float = 0.0):
+    if kind == "bf":
+        return BFMatcher(ratio)
+    if kind == "flann":
+        return FlannMatcher(ratio)
+    if kind == "numpy":
+        return NumpyMatcher(ratio, mutual=mutual, guided_radius=guided_radius)
+    raise ValueError(f"unknown matcher: {kind} (choose from {', '.join(MATCHERS)})")
+
+
+def predict_positions(kf_xy: np.ndarray, H_kf_prev: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Where the keyframe points should appear in the current frame, assuming
+    the motion since the previous frame is small: the last accepted
+    keyframe->frame homography is reused as the predictor.
+    """
+    if H_kf_prev is None or len(kf_xy) == 0:
+        return None
+    return cv2.perspectiveTransform(kf_xy.reshape(-1, 1, 2).astype(np.float32), H_kf_prev).reshape(-1, 2)
@@ -0,0 +1,287 @@
+#===---keyframe_map.py----------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyframe map with place recognition and loop closure for the XFeat VO.
+
+- Every keyframe keeps its pose, keypoints, int8 descriptors and a compact
+  global descriptor: the XFeat descriptors average-pooled over a 2x2 image
+  grid (4 x 64 = 256-d for XFeat, L2-normalized).
+- Global descriptors live in one contiguous float32 matrix, so a place
+  query is a single matrix-vector product (well under a millisecond for
+  thousands of keyframes).
+- A background thread takes new keyframes, queries the index, verifies
+  candidates geometrically (descriptor matching + essential matrix) and,
+  on a loop, re-optimizes the pose graph.
+
+The pose graph optimizes keyframe positions only (rotations from VO are
+kept): odometry edges between consecutive keyframes and loop edges from
+the verified relative motion, solved as a weighted least-squares problem
+with conjugate gradients. Monocular VO is up to scale, so loop edges use
+the median odometry step as their length.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from feature_matcher import create_matcher, quantize_descriptors
+
+GLOBAL_GRID = 2
+
+
+@dataclass
+class Keyframe:
+    kf_id: int
+    R_w_c: np.ndarray         # 3x3, fixed after insertion
+    kp_xy: np.ndarray         # [N,2] float32
+    desc: np.ndarray          # [N,C] int8
+    stamp: float
+
+
+def global_descriptor(kp_xy: np.ndarray, desc: np.ndarray, w: int, h: int, grid: int = GLOBAL_GRID) -> np.ndarray:
+    """Average-pooled descriptors over a grid x grid image split, L2-normalized."""
+    d = desc.astype(np.float32)
+    c = d.shape[1]
+    gx = np.clip((kp_xy[:, 0] * grid / max(w, 1)).astype(np.int32), 0, grid - 1)
+    gy = np.clip((kp_xy[:, 1] * grid / max(h, 1)).astype(np.int32), 0, grid - 1)
+    cell = gy * grid + gx
+    pooled = np.zeros((grid * grid, c), np.float32)
+    np.add.at(pooled, cell, d)
+    counts = np.bincount(cell, minlength=grid * grid).astype(np.float32)
+    pooled /= np.maximum(counts, 1.0)[:, None]
+    g = pooled.reshape(-1)
+    return g / (np.linalg.norm(g) + 1e-8)
+
+
+class GlobalIndex:
+    """Append-only matrix of global descriptors with capacity doubling."""
+
+    def __init__(self, dim: int, capacity: int = 256):
+        self.dim = dim
+        self.mat = np.zeros((capacity, dim), np.float32)
+        self.n = 0
+
+    def add(self, g: np.ndarray) -> int:
+        if self.n == len(self.mat):
+            grown = np.zeros((2 * len(self.mat), self.dim), np.float32)
+            grown[:self.n] = self.mat[:self.n]
+            self.mat = grown
+        self.mat[self.n] = g
+        self.n += 1
+        return self.n - 1
+
+    def query(self, g: np.ndarray, exclude_from: int, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Best (index, cosine) among entries [0, exclude_from)."""
+        n = min(self.n, exclude_from)
+        if n <= 0:
+            return []
+        sims = self.mat[:n] @ g
+        k = min(top_k, n)
+        idx = np.argpartition(-sims, k - 1)[:k]
+        idx = idx[np.argsort(-sims[idx])]
+        return [(int(i), float(sims[i])) for i in idx]
+
+
+def optimize_positions(pos: np.ndarray, edges_i: np.ndarray, edges_j: np.ndarray, meas: np.ndarray,
+                       weights: np.ndarray, iters: int = 200, tol: float = 1e-6) -> np.ndarray:
+    """
+    min sum_e w_e ||p_j - p_i - d_e||^2 with p_0 fixed, by conjugate gradients
+    on the (matrix-free) weighted graph Laplacian. pos is the warm start.
+    """
+    n = len(pos)
+    if n < 2 or len(edges_i) == 0:
+        return pos.copy()
+
+    def scatter(v):
+        out = np.zeros((n, 3), np.float64)
+        for k in range(3):
+            out[:, k] = (np.bincount(edges_j, v[:, k], minlength=n)
+                         - np.bincount(edges_i, v[:, k], minlength=n))
+        return out
+
+    def apply_A(x):
+        y = scatter(weights[:, None] * (x[edges_j] - x[edges_i]))
+        y[0] = 0.0
+        return y
+
+    b = scatter(weights[:, None] * meas)
+    b[0] = 0.0
+
+    x = pos.astype(np.float64).copy()
+    x0 = x[0].copy()
+    # free-variable system: A_ff x_f = b_f - A_f0 x_0
+    shift = np.zeros_like(x)
+    shift[0] = x0
+    b = b - apply_A(shift)
+    x[0] = 0.0
+
+    r = b - apply_A(x)
+    p = r.copy()
+    rs = float(np.sum(r * r))
+    b_norm = max(float(np.sum(b * b)), 1e-12)
+    for _ in range(iters):
+        if rs / b_norm < tol * tol:
+            break
+        Ap = apply_A(p)
+        denom = float(np.sum(p * Ap))
+        if denom <= 1e-18:
+            break
+        alpha = rs / denom
+        x += alpha * p
+        r -= alpha * Ap
+        rs_new = float(np.sum(r * r))
+        p = r + (rs_new / rs) * p
+        rs = rs_new
+
+    x[0] = x0
+    return x
+
+
+class KeyframeMap:
+    """
+    Thread-safe keyframe store. The VO thread calls add_keyframe() and
+    take_correction(); loop detection and pose-graph optimization run on
+    the map's own thread.
+    """
+
+    def __init__(self, K: np.ndarray, img_w: int, img_h: int, ratio: float = 0.9,
+                 loop_sim: float = 0.85, loop_min_gap: int = 30, loop_min_inliers: int = 80,
+                 loop_weight: float = 10.0, max_keyframes: int = 5000):
+        self.K = K
+        self.img_w, self.img_h = img_w, img_h
+        self.loop_sim = loop_sim
+        self.loop_min_gap = loop_min_gap
+        self.loop_min_inliers = loop_min_inliers
+        self.loop_weight = loop_weight
+        self.max_keyframes = max_keyframes
+        self.matcher = create_matcher("numpy", ratio)
+
+        self.lock = threading.Lock()
+        self.keyframes: List[Keyframe] = []
+        self.index: Optional[GlobalIndex] = None  # sized from the first keyframe's descriptor width
+        self.positions = np.zeros((0, 3), np.float64)
+        # edges: (i, j, measured p_j - p_i in world frame, weight)
+        self.edges: List[Tuple[int, int, np.ndarray, float]] = []
+        self.loops = 0
+        self.last_query_ms = 0.0
+        self.last_optimize_ms = 0.0
+        self._pending_delta = np.zeros(3, np.float64)
+
+        self._jobs = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="loop-closing", daemon=True)
+        self._thread.start()
+
+    # ---- VO thread ----
+    def add_keyframe(self, T_w_c: np.ndarray, kp_xy: np.ndarray, desc: np.ndarray) -> Optional[int]:
+        with self.lock:
+            if len(self.keyframes) >= self.max_keyframes:
+                return None
+            desc8 = desc if desc.dtype == np.int8 else quantize_descriptors(desc)
+            kf = Keyframe(len(self.keyframes), T_w_c[:3, :3].copy(), kp_xy.copy(), desc8, time.time())
+            g = global_descriptor(kp_xy, desc8, self.img_w, self.img_h)
+            if self.index is None:
+                self.index = GlobalIndex(len(g))
+            self.index.add(g)
+            self.keyframes.append(kf)
+            # the VO pose may not have picked up the latest correction yet
+            p = T_w_c[:3, 3].astype(np.float64) + self._pending_delta
+            if kf.kf_id > 0:
+                self.edges.append((kf.kf_id - 1, kf.kf_id, p - self.positions[-1], 1.0))
+            self.positions = np.vstack([self.positions, p[None]])
+        self._jobs.put((kf, g))
+        return kf.kf_id
+
+    def take_correction(self) -> np.ndarray:
+        """Position change of the newest keyframe from optimizations since the last call."""
+        with self.lock:
+            d = self._pending_delta
+            self._pending_delta = np.zeros(3, np.float64)
+            return d
+
+    def trajectory_xz(self, last: int = 200) -> List[Tuple[float, float]]:
+        with self.lock:
+            p = self.positions[-last:]
+            return [(float(x), float(z)) for x, _, z in p]
+
+    def stats(self) -> str:
+        return f"KFs={len(self.keyframes)} loops={self.loops} q={self.last_query_ms:.2f}ms"
+
+    def close(self):
+        self._stop.set()
+        self._jobs.put(None)
+        self._thread.join(timeout=2.0)
+
+    # ---- loop-closing thread ----
+    def _run(self):
+        while not self._stop.is_set():
+            job = self._jobs.get()
+            if job is None:
+                break
+            kf, g = job
+            t0 = time.perf_counter()
+            cands = self.index.query(g, exclude_from=kf.kf_id - self.loop_min_gap + 1)
+            self.last_query_ms = (time.perf_counter() - t0) * 1000.0
+            for idx, sim in cands:
+                if sim < self.loop_sim:
+                    break
+                edge = self._verify(self.keyframes[idx], kf)
+                if edge is not None:
+                    self._add_loop(idx, kf.kf_id, edge)
+                    break
+
+    def _verify(self, old: Keyframe, new: Keyframe) -> Optional[np.ndarray]:
+        """Relative motion direction old -> new (camera frame of old) if geometrically consistent."""
+        qi, ti = self.matcher.match(old.desc, new.desc)
+        if len(qi) < self.loop_min_inliers:
+            return None
+        pts1 = old.kp_xy[qi]
+        pts2 = new.kp_xy[ti]
+        fx, cx, cy = float(self.K[0, 0]), float(self.K[0, 2]), float(self.K[1, 2])
+        E, mask = cv2.findEssentialMat(pts1, pts2, focal=fx, pp=(cx, cy), method=cv2.RANSAC, prob=0.999, threshold=2.0)
+        if E is None or E.shape != (3, 3) or int(mask.sum()) < self.loop_min_inliers:
+            return None
+        n_in, _, t, _ = cv2.recoverPose(E, pts1, pts2, focal=fx, pp=(cx, cy), mask=mask)
+        if n_in < self.loop_min_inliers:
+            return None
+        return t.reshape(3)
+
+    def _add_loop(self, i: int, j: int, t_rel: np.ndarray):
+        with self.lock:
+            steps = [np.linalg.norm(d) for a, b, d, _ in self.edges if b == a + 1]
+            step = float(np.median(steps)) if steps else 1.0
+            meas = self.keyframes[i].R_w_c @ t_rel * step
+            self.edges.append((i, j, meas, self.loop_weight))
+            self.loops += 1
+            pos = self.positions.copy()
+            ei = np.array([e[0] for e in self.edges], np.int64)
+            ej = np.array([e[1] for e in self.edges], np.int64)
+            dm = np.array([e[2] for e in self.edges], np.float64)
+            w = np.array([e[3] for e in self.edges], np.float64)
+
+        t0 = time.perf_counter()
+        opt = optimize_positions(pos, ei, ej, dm, w)
+        self.last_optimize_ms = (time.perf_counter() - t0) * 1000.0
+
+        with self.lock:
+            n = len(opt)
+            # keyframes added while optimizing move with the last optimized one
+            delta = opt[-1] - self.positions[n - 1]
+            self.positions[:n] = opt
+            self.positions[n:] += delta
+            self._pending_delta += delta
+        print(f"[INFO] loop closed KF{i} <-> KF{j}, graph: {n} nodes / {len(ei)} edges "
+              f"in {self.last_optimize_ms:.1f} ms")
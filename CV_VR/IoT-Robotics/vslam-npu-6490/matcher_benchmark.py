@@ -0,0 +1,104 @@
+#===---matcher_benchmark.py-----------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyframe matcher benchmark on synthetic XFeat-like descriptors:
+a keyframe set, and a current frame holding shifted + noisy copies of part
+of it plus distractors. Compares the original knnMatch + Python ratio loop
+with the matchers in feature_matcher.py.
+
+    python3 matcher_benchmark.py --points 1800 --iters 50
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from feature_matcher import create_matcher, quantize_descriptors
+
+
+def unit(x):
+    return (x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-8)).astype(np.float32)
+
+
+def make_scene(n, dim, overlap, noise, shift, seed=0):
+    rng = np.random.default_rng(seed)
+    kf_desc = unit(rng.normal(size=(n, dim)))
+    kf_xy = rng.uniform([0, 0], [640, 480], size=(n, 2)).astype(np.float32)
+
+    k = int(n * overlap)
+    src = rng.permutation(n)[:k]
+    cur_desc = np.concatenate([unit(kf_desc[src] + rng.normal(scale=noise, size=(k, dim))),
+                               unit(rng.normal(size=(n - k, dim)))])
+    cur_xy = np.concatenate([kf_xy[src] + np.float32(shift) + rng.normal(scale=1.0, size=(k, 2)).astype(np.float32),
+                             rng.uniform([0, 0], [640, 480], size=(n - k, 2)).astype(np.float32)])
+    perm = rng.permutation(n)
+    truth = {int(s): int(np.flatnonzero(perm == i)[0]) for i, s in enumerate(src)}
+    return kf_desc, kf_xy, cur_desc[perm], cur_xy[perm], truth
+
+
+def legacy_match(kf_desc, cur_desc, ratio):
+    """The loop previously inlined in VOTracker.process."""
+    bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck=False)
+    knn = bf.knnMatch(kf_desc.astype(np.float32), cur_desc.astype(np.float32), k=2)
+    good = []
+    for pair in knn:
+        if len(pair) < 2:
+            continue
+        a, b = pair[0], pair[1]
+        if a.distance < ratio * b.distance:
+            good.append(a)
+    return (np.array([m.queryIdx for m in good], np.int32), np.array([m.trainIdx for m in good], np.int32))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="VO descriptor matcher benchmark")
+    ap.add_argument("--points", type=int, default=1800)
+    ap.add_argument("--dim", type=int, default=64)
+    ap.add_argument("--overlap", type=float, default=0.6)
+    ap.add_argument("--noise", type=float, default=0.08)
+    ap.add_argument("--ratio", type=float, default=0.90)
+    ap.add_argument("--guided_radius", type=float, default=40.0)
+    ap.add_argument("--iters", type=int, default=50)
+    args = ap.parse_args()
+
+    kf_desc, kf_xy, cur_desc, cur_xy, truth = make_scene(args.points, args.dim, args.overlap, args.noise, (6.0, -3.0))
+    pred = kf_xy + np.float32([6.0, -3.0])
+
+    runs = {
+        "legacy": lambda: legacy_match(kf_desc, cur_desc, args.ratio),
+        "bf": (lambda m: lambda: m.match(kf_desc, cur_desc))(create_matcher("bf", args.ratio)),
+        "flann": (lambda m: lambda: m.match(kf_desc, cur_desc))(create_matcher("flann", args.ratio)),
+        "numpy": (lambda m: lambda: m.match(kf_desc, cur_desc))(create_matcher("numpy", args.ratio)),
+        "numpy-i8": (lambda m, a, b: lambda: m.match(a, b))(
+            create_matcher("numpy", args.ratio), quantize_descriptors(kf_desc), quantize_descriptors(cur_desc)),
+        "guided": (lambda m: lambda: m.match(kf_desc, cur_desc, pred, cur_xy))(
+            create_matcher("numpy", args.ratio, guided_radius=args.guided_radius)),
+    }
+
+    print(f"{args.points} x {args.points} descriptors, dim={args.dim}, true pairs={len(truth)}")
+    print(f"{'matcher':<10}{'mean ms':>9}{'p95 ms':>9}{'matches':>9}{'precision':>11}{'recall':>8}")
+    for name, fn in runs.items():
+        fn()
+        lat = []
+        for _ in range(args.iters):
+            t0 = time.perf_counter()
+            qi, ti = fn()
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        correct = sum(truth.get(int(q)) == int(t) for q, t in zip(qi, ti))
+        prec = correct / max(len(qi), 1)
+        rec = correct / max(len(truth), 1)
+        print(f"{name:<10}{np.mean(lat):9.2f}{np.percentile(lat, 95):9.2f}{len(qi):9d}{prec:11.3f}{rec:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#===---vo_dataset_runner.py-----------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless XFeat VO on recorded data, for accuracy / speed regression runs
+on any Linux box (no camera, display or NPU needed).
+
+Sources:
+  tum    : TUM RGB-D folder (rgb.txt [+ groundtruth.txt])
+  kitti  : KITTI odometry sequence folder (image_0/ or image_2/, times.txt);
+           ground truth poses file via --gt (poses/XX.txt)
+  video  : any video file OpenCV can read
+  images : folder of images, sorted by name
+
+Outputs in --out:
+  trajectory.txt  TUM format: timestamp tx ty tz qx qy qz qw (every frame)
+  latency.csv     per-frame stage latencies (ms) and keypoint counts
+  summary.json    latency percentiles + histograms, keypoints/sec, ATE/RPE
+
+    python3 vo_dataset_runner.py --model ./models/xfeat.onnx --runtime onnx \\
+        --dataset ~/data/rgbd_dataset_freiburg1_xyz --intrinsics 517.3,516.5,318.6,255.3
+"""
+
+import csv
+import glob
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import xfeat_vo_tflite_delegate as vo
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".pgm")
+STAGES = ("read", "pre", "invoke", "post", "kp", "match", "pose")
+HIST_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+
+
+# -----------------------------
+# Frame sources
+# -----------------------------
+class ImageSequence:
+    """read()/release() like cv2.VideoCapture, plus per-frame timestamps."""
+
+    def __init__(self, files: List[str], stamps: List[float]):
+        self.files = files
+        self.stamps = stamps
+        self.i = 0
+
+    def read(self):
+        if self.i >= len(self.files):
+            return False, None
+        img = cv2.imread(self.files[self.i], cv2.IMREAD_COLOR)
+        self.i += 1
+        return img is not None, img
+
+    def release(self):
+        pass
+
+
+class VideoSource:
+    def __init__(self, path: str, fps: float):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video: {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or fps
+        n = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.stamps = [i / self.fps for i in range(max(n, 0))]
+        self.i = 0
+
+    def read(self):
+        ok, frame = self.cap.read()
+        if ok and self.i >= len(self.stamps):
+            self.stamps.append(self.i / self.fps)
+        self.i += 1
+        return ok, frame
+
+    def release(self):
+        self.cap.release()
+
+
+def _read_tum_list(path: str) -> List[Tuple[float, List[str]]]:
+    rows = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            rows.append((float(parts[0]), parts[1:]))
+    return rows
+
+
+def open_tum(root: str):
+    rows = _read_tum_list(os.path.join(root, "rgb.txt"))
+    src = ImageSequence([os.path.join(root, r[1][0]) for r in rows], [r[0] for r in rows])
+    gt = None
+    gt_path = os.path.join(root, "groundtruth.txt")
+    if os.path.exists(gt_path):
+        gt = [(t, vals_to_pose([float(v) for v in vals])) for t, vals in _read_tum_list(gt_path)]
+    return src, gt
+
+
+def open_kitti(root: str, fps: float):
+    for sub in ("image_0", "image_2", "image_1", "image_3"):
+        files = sorted(glob.glob(os.path.join(root, sub, "*.png")))
+        if files:
+            break
+    else:
+        raise RuntimeError(f"No image_0/ or image_2/ PNGs in {root}")
+    times_path = os.path.join(root, "times.txt")
+    if os.path.exists(times_path):
+        stamps = [float(x) for x in open(times_path).read().split()]
+    else:
+        stamps = [i / fps for i in range(len(files))]
+    return ImageSequence(files, stamps[:len(files)])
+
+
+def open_images(root: str, fps: float):
+    files = sorted(p for p in glob.glob(os.path.join(root, "*")) if p.lower().endswith(IMAGE_EXTS))
+    if not files:
+        raise RuntimeError(f"No images in {root}")
+    return ImageSequence(files, [i / fps for i in range(len(files))])
+
+
+def detect_format(path: str) -> str:
+    if os.path.isfile(path):
+        return "video"
+    if os.path.exists(os.path.join(path, "rgb.txt")):
+        return "tum"
+    if glob.glob(os.path.join(path, "image_[0-3]")):
+        return "kitti"
+    return "images"
+
+
+def load_kitti_poses(path: str, stamps: List[float]):
+    poses = []
+    for t, line in zip(stamps, open(path)):
+        T = np.eye(4)
+        T[:3, :4] = np.array([float(v) for v in line.split()]).reshape(3, 4)
+        poses.append((t, T))
+    return poses
+
+
+# -----------------------------
+# Pose helpers
+# -----------------------------
+def vals_to_pose(vals) -> np.ndarray:
+    """tx ty tz qx qy qz qw -> 4x4."""
+    tx, ty, tz, qx, qy, qz, qw = vals[:7]
+    T = np.eye(4)
+    T[:3, :3] = quat_to_rot(np.array([qx, qy, qz, qw]))
+    T[:3, 3] = (tx, ty, tz)
+    return T
+
+
+def quat_to_rot(q: np.ndarray) -> np.ndarray:
+    x, y, z, w = q / (np.linalg.norm(q) + 1e-12)
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def rot_to_quat(R: np.ndarray) -> np.ndarray:
+    """3x3 -> (qx, qy, qz, qw)."""
+    tr = np.trace(R)
+    if tr > 0:
+        s = 2.0 * np.sqrt(tr + 1.0)
+        return np.array([(R[2, 1] - R[1, 2]) / s, (R[0, 2] - R[2, 0]) / s, (R[1, 0] - R[0, 1]) / s, 0.25 * s])
+    i = int(np.argmax(np.diag(R)))
+    j, k = (i + 1) % 3, (i + 2) % 3
+    s = 2.0 * np.sqrt(max(1.0 + R[i, i] - R[j, j] - R[k, k], 1e-12))
+    q = np.zeros(4)
+    q[i] = 0.25 * s
+    q[j] = (R[j, i] + R[i, j]) / s
+    q[k] = (R[k, i] + R[i, k]) / s
+    q[3] = (R[k, j] - R[j, k]) / s
+    return q
+
+
+def associate(est_t: np.ndarray, gt_t: np.ndarray, max_dt: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest ground-truth sample for each estimate within max_dt (indices into both)."""
+    idx = np.clip(np.searchsorted(gt_t, est_t), 1, len(gt_t) - 1)
+    prev_closer = np.abs(gt_t[idx - 1] - est_t) < np.abs(gt_t[idx] - est_t)
+    idx = idx - prev_closer
+    ok = np.abs(gt_t[idx] - est_t) <= max_dt
+    return np.flatnonzero(ok), idx[ok]
+
+
+def umeyama(src: np.ndarray, dst: np.ndarray, with_scale: bool = True):
+    """s, R, t minimizing ||dst - (s R src + t)||."""
+    mu_s, mu_d = src.mean(0), dst.mean(0)
+    xs, xd = src - mu_s, dst - mu_d
+    U, D, Vt = np.linalg.svd(xd.T @ xs / len(src))
+    S = np.eye(3)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        S[2, 2] = -1
+    R = U @ S @ Vt
+    var = (xs ** 2).sum() / len(src)
+    s = float(np.trace(np.diag(D) @ S) / var) if with_scale and var > 0 else 1.0
+    return s, R, mu_d - s * R @ mu_s
+
+
+def ate_rpe(est: List[np.ndarray], gt: List[np.ndarray], delta: int, with_scale: bool = True) -> dict:
+    """ATE RMSE after Sim(3)/SE(3) alignment and RPE over `delta` associated frames."""
+    P = np.array([T[:3, 3] for T in est])
+    G = np.array([T[:3, 3] for T in gt])
+    s, R, t = umeyama(P, G, with_scale)
+    aligned = (s * (R @ P.T)).T + t
+    err = np.linalg.norm(aligned - G, axis=1)
+
+    # apply the alignment to full poses, then compare relative motions
+    A = np.eye(4)
+    A[:3, :3], A[:3, 3] = R, t
+    est_a = []
+    for T in est:
+        Ts = T.copy()
+        Ts[:3, 3] *= s
+        est_a.append(A @ Ts)
+    rpe_t, rpe_r = [], []
+    for i in range(len(est_a) - delta):
+        dE = np.linalg.inv(est_a[i]) @ est_a[i + delta]
+        dG = np.linalg.inv(gt[i]) @ gt[i + delta]
+        E = np.linalg.inv(dG) @ dE
+        rpe_t.append(np.linalg.norm(E[:3, 3]))
+        rpe_r.append(vo.rot_angle_deg(E[:3, :3]))
+
+    def stats(v):
+        v = np.asarray(v, np.float64)
+        if v.size == 0:
+            return None
+        return {"rmse": float(np.sqrt(np.mean(v ** 2))), "mean": float(v.mean()),
+                "median": float(np.median(v)), "max": float(v.max())}
+
+    return {"pairs": len(P), "scale": s, "ate_m": stats(err), "rpe_delta": delta,
+            "rpe_trans_m": stats(rpe_t), "rpe_rot_deg": stats(rpe_r)}
+
+
+# -----------------------------
+# ONNX Runtime engine (same interface as vo.InferenceEngine)
+# -----------------------------
+class OnnxEngine:
+    def __init__(self, model_path: str, threads: int):
+        import onnxruntime as ort
+        so = ort.SessionOptions()
+        if threads > 0:
+            so.intra_op_num_threads = threads
+        self.sess = ort.InferenceSession(model_path, sess_options=so, providers=["CPUExecutionProvider"])
+        inp = self.sess.get_inputs()[0]
+        self.inp_name = inp.name
+        self.layout, self.in_w, self.in_h = vo.model_input_geometry(inp.shape)
+        self.last_times = {}
+
+    def run(self, frame_bgr: np.ndarray) -> List[np.ndarray]:
+        t0 = time.perf_counter()
+        x = vo._preprocess_frame(frame_bgr, in_w=self.in_w, in_h=self.in_h, layout=self.layout)
+        t1 = time.perf_counter()
+        outs = self.sess.run(None, {self.inp_name: x})
+        t2 = time.perf_counter()
+        outs = [o.astype(np.float32) for o in outs]
+        self.last_times = {"pre": t1 - t0, "invoke": t2 - t1, "post": time.perf_counter() - t2}
+        return outs
+
+
+def make_engine(args, model_path: Optional[str] = None):
+    model_path = model_path or args.model
+    if args.runtime == "onnx":
+        engine = OnnxEngine(model_path, args.threads)
+        print(f"[INFO] runtime=onnxruntime(cpu) input={engine.in_w}x{engine.in_h} layout={engine.layout}")
+        return engine
+    interpreter = vo.load_interpreter(model_path, args.backend, args.delegate_path)
+    in_det = interpreter.get_input_details()[0]
+    layout, in_w, in_h = vo.model_input_geometry(list(in_det["shape"]))
+    print(f"[INFO] runtime={vo.RUNTIME_KIND} backend={args.backend} input={in_w}x{in_h} layout={layout}")
+    return vo.InferenceEngine(interpreter, layout, in_w, in_h)
+
+
+def scaled_K(intrinsics: Optional[str], src_w: int, src_h: int, in_w: int, in_h: int) -> Optional[np.ndarray]:
+    if not intrinsics:
+        return None
+    fx, fy, cx, cy = (float(v) for v in intrinsics.split(","))
+    sx, sy = in_w / float(src_w), in_h / float(src_h)
+    return np.array([[fx * sx, 0, cx * sx], [0, fy * sy, cy * sy], [0, 0, 1]], np.float64)
+
+
+def histogram(values_ms: List[float]) -> dict:
+    counts, _ = np.histogram(values_ms, bins=HIST_EDGES_MS)
+    labels = [f"{HIST_EDGES_MS[i]:g}-{HIST_EDGES_MS[i + 1]:g}" for i in range(len(HIST_EDGES_MS) - 1)]
+    return dict(zip(labels, counts.tolist()))
+
+
+def print_histogram(stage: str, values_ms: List[float], width: int = 40):
+    hist = histogram(values_ms)
+    peak = max(hist.values()) or 1
+    print(f"  {stage}")
+    for label, c in hist.items():
+        if c:
+            print(f"    {label:>10} ms | {'#' * max(1, int(width * c / peak)):<{width}} {c}")
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    ap = vo.build_arg_parser()
+    ap.description = "Headless XFeat VO on TUM/KITTI/video/image datasets with latency and ATE/RPE"
+    ap.add_argument("--dataset", type=str, required=True, help="TUM/KITTI folder, image folder or video file")
+    ap.add_argument("--format", type=str, choices=["auto", "tum", "kitti", "video", "images"], default="auto")
+    ap.add_argument("--gt", type=str, default=None, help="Ground truth: TUM groundtruth.txt or KITTI poses/XX.txt")
+    ap.add_argument("--out", type=str, default="./vo_run")
+    ap.add_argument("--runtime", type=str, choices=["tflite", "onnx"], default="tflite")
+    ap.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0=default)")
+    ap.add_argument("--intrinsics", type=str, default=None, help="fx,fy,cx,cy of the source images (else --fov_deg)")
+    ap.add_argument("--fps", type=float, default=10.0, help="Frame rate for sources without timestamps")
+    ap.add_argument("--max_frames", type=int, default=0)
+    ap.add_argument("--max_dt", type=float, default=0.02, help="Max timestamp gap for GT association (s)")
+    ap.add_argument("--rpe_delta", type=int, default=1)
+    ap.add_argument("--no_scale", action="store_true", help="SE(3) instead of Sim(3) alignment for ATE")
+    ap.set_defaults(backend="cpu")
+    args = ap.parse_args()
+
+    fmt = detect_format(args.dataset) if args.format == "auto" else args.format
+    gt = None
+    if fmt == "tum":
+        src, gt = open_tum(args.dataset)
+    elif fmt == "kitti":
+        src = open_kitti(args.dataset, args.fps)
+    elif fmt == "video":
+        src = VideoSource(args.dataset, args.fps)
+    else:
+        src = open_images(args.dataset, args.fps)
+    if args.gt:
+        if args.gt.endswith(".txt") and fmt == "kitti":
+            gt = load_kitti_poses(args.gt, src.stamps)
+        else:
+            gt = [(t, vals_to_pose([float(v) for v in vals])) for t, vals in _read_tum_list(args.gt)]
+    print(f"[INFO] dataset={args.dataset} format={fmt} gt={'yes' if gt else 'no'}")
+
+    engines, ref_idx, sched = vo.make_scheduler(
+        args, [make_engine(args, m) for m in [args.model] + list(args.extra_models)])
+    engine = engines[ref_idx]
+    tracker = None
+    os.makedirs(args.out, exist_ok=True)
+
+    stamps, poses, rows = [], [], []
+    total_kp = 0
+    t_start = time.perf_counter()
+    frame_i = 0
+    try:
+        while True:
+            if args.max_frames and frame_i >= args.max_frames:
+                break
+            t0 = time.perf_counter()
+            ok, frame = src.read()
+            if not ok or frame is None:
+                break
+            t_read = time.perf_counter() - t0
+
+            if tracker is None:
+                K = scaled_K(args.intrinsics, frame.shape[1], frame.shape[0], engine.in_w, engine.in_h)
+                tracker = vo.VOTracker(args, engine.in_w, engine.in_h, K=K)
+
+            level = sched.pick()
+            outs = engines[level].run(frame)
+            res = tracker.process(outs, level)
+
+            times = {"read": t_read, **engines[level].last_times, **res["times"]}
+            n_kp = 0 if res["kp_xy"] is None else len(res["kp_xy"])
+            sched.update(level, n_kp, sum(times.get(s, 0.0) for s in ("pre", "invoke", "post", "kp")))
+            total_kp += n_kp
+            rows.append([frame_i] + [times.get(s, 0.0) * 1000.0 for s in STAGES]
+                        + [n_kp, sched.size_str(level), res["error"] or ""])
+
+            stamps.append(src.stamps[frame_i] if frame_i < len(src.stamps) else frame_i / args.fps)
+            poses.append(tracker.T_w_c.copy())
+            frame_i += 1
+            if frame_i % 100 == 0:
+                print(f"[INFO] {frame_i} frames, {frame_i / (time.perf_counter() - t_start):.1f} FPS")
+    finally:
+        src.release()
+        if tracker is not None:
+            tracker.close()
+    wall = time.perf_counter() - t_start
+
+    if not poses:
+        raise SystemExit("No frames processed.")
+
+    with open(os.path.join(args.out, "trajectory.txt"), "w") as f:
+        f.write("# timestamp tx ty tz qx qy qz qw\n")
+        for t, T in zip(stamps, poses):
+            q = rot_to_quat(T[:3, :3])
+            f.write(f"{t:.6f} {T[0, 3]:.6f} {T[1, 3]:.6f} {T[2, 3]:.6f} {q[0]:.6f} {q[1]:.6f} {q[2]:.6f} {q[3]:.6f}\n")
+
+    with open(os.path.join(args.out, "latency.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame"] + [f"{s}_ms" for s in STAGES] + ["keypoints", "input", "error"])
+        w.writerows(rows)
+
+    lat = np.array([r[1:1 + len(STAGES)] for r in rows], np.float64)
+    per_frame = lat.sum(axis=1)
+    summary = {
+        "dataset": args.dataset, "format": fmt, "frames": len(rows),
+        "runtime": args.runtime, "kp_mode": args.kp_mode, "matcher": args.matcher,
+        "wall_s": wall, "fps": len(rows) / wall,
+        "keypoints_per_s": total_kp / wall,
+        "frames_with_errors": sum(1 for r in rows if r[-1]),
+        "latency_ms": {},
+    }
+    print(f"\n[RESULT] {len(rows)} frames in {wall:.1f}s  FPS={summary['fps']:.2f}  "
+          f"keypoints/s={summary['keypoints_per_s']:.0f}")
+    print("[RESULT] latency histograms:")
+    for k, s in enumerate(list(STAGES) + ["total"]):
+        v = per_frame if s == "total" else lat[:, k]
+        summary["latency_ms"][s] = {
+            "mean": float(v.mean()), "p50": float(np.percentile(v, 50)),
+            "p95": float(np.percentile(v, 95)), "max": float(v.max()), "histogram": histogram(v),
+        }
+        print_histogram(f"{s}: mean={v.mean():.2f} p50={np.percentile(v, 50):.2f} p95={np.percentile(v, 95):.2f} ms", v)
+
+    if gt:
+        gt_t = np.array([t for t, _ in gt])
+        ei, gi = associate(np.array(stamps), gt_t, args.max_dt)
+        if len(ei) >= 3:
+            acc = ate_rpe([poses[i] for i in ei], [gt[i][1] for i in gi], args.rpe_delta, not args.no_scale)
+            summary["accuracy"] = acc
+            ate = acc["ate_m"]
+            rpe = acc["rpe_trans_m"]
+            print(f"[RESULT] ATE rmse={ate['rmse']:.4f} m (scale {acc['scale']:.3f}, {acc['pairs']} pairs)"
+                  + (f"  RPE rmse={rpe['rmse']:.4f} m / {acc['rpe_rot_deg']['rmse']:.2f} deg" if rpe else ""))
+        else:
+            print("[WARN] fewer than 3 frames associated with ground truth; ATE/RPE skipped")
+
+    if sched.enabled:
+        summary["resolution"] = sched.report()
+        print("[RESULT] resolution trade-off (pre + invoke + post + kp per frame):")
+        for line in sched.report_lines():
+            print(f"  {line}")
+
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"[INFO] wrote trajectory.txt, latency.csv, summary.json to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,25 @@
 
 import argparse
 import math
+import threading
 import time
+from collections import deque
 from typing import Optional, Tuple, List
 
+import os
+import sys
+
 import cv2
 import numpy as np
 
+# SuperPoint keypoint extraction is shared with the XFeat realtime demo
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "xfeat_qcs6490"))
+from superpoint_keypoints import KeypointExtractor, reliability_map  # noqa: E402
+from tflite_input import InputWriter  # noqa: E402
+from feature_matcher import MATCHERS, create_matcher, predict_positions, quantize_descriptors  # noqa: E402
+from keyframe_map import KeyframeMap  # noqa: E402
+from resolution_scheduler import ResolutionScheduler  # noqa: E402
+
 
 # -----------------------------
 # TFLite runtime loader
@@ -38,7 +51,11 @@ def _load_tflite():
             ) from e
 
 
-RUNTIME_KIND, TFL = _load_tflite()
+try:
+    RUNTIME_KIND, TFL = _load_tflite()
+except RuntimeError as _e:
+    # vo_dataset_runner.py can still run the ONNX model without TFLite
+    RUNTIME_KIND, TFL, _TFLITE_ERROR = None, None, _e
 
 
 def _load_delegate(delegate_path: str, backend_type: str):
@@ -53,100 +70,28 @@ def _load_delegate(delegate_path: str, backend_type: str):
 # -----------------------------
 # SuperPoint decode + NMS
 # -----------------------------
-def softmax_channel(x: np.ndarray, axis=0):
-    x = x - np.max(x, axis=axis, keepdims=True)
-    ex = np.exp(x)
-    return ex / (np.sum(ex, axis=axis, keepdims=True) + 1e-12)
-
-
-def decode_superpoint_k1_to_heat(k1_4d: np.ndarray, cell: int = 8) -> np.ndarray:
-    if k1_4d.ndim != 4:
-        raise ValueError(f"k1 dims invalid: {k1_4d.shape}")
-
-    if k1_4d.shape[1] == 65:
-        k1 = k1_4d[0]  # [65,Hc,Wc]
-    elif k1_4d.shape[3] == 65:
-        k1 = np.transpose(k1_4d[0], (2, 0, 1))
-    else:
-        raise ValueError(f"Cannot find 65-ch axis in {k1_4d.shape}")
-
-    c, hc, wc = k1.shape
-    assert c == (cell * cell + 1), f"expected 65 channels, got {c}"
-
-    prob = softmax_channel(k1, axis=0)
-    prob = prob[:cell * cell]
-    p = prob.reshape(cell, cell, hc, wc)
-    p = np.transpose(p, (2, 0, 3, 1))
-    heat = p.reshape(hc * cell, wc * cell)
-    return heat.astype(np.float32)
-
-
-def nms_peaks(heat2d: np.ndarray, thresh: float, nms: int, max_points: int):
-    h = heat2d.astype(np.float32)
-    mx = float(h.max()) if h.size else 0.0
-    if mx > 0:
-        h = h / (mx + 1e-6)
-
-    kernel = np.ones((2 * nms + 1, 2 * nms + 1), np.uint8)
-    dil = cv2.dilate(h, kernel)
-    peaks = (h >= thresh) & (h >= (dil - 1e-6))
-    ys, xs = np.where(peaks)
-    if ys.size == 0:
-        return np.zeros((0, 3), dtype=np.float32)
-
-    scores = h[ys, xs]
-    order = np.argsort(-scores)[:max_points]
-    xs = xs[order].astype(np.float32)
-    ys = ys[order].astype(np.float32)
-    scores = scores[order].astype(np.float32)
-    return np.stack([xs, ys, scores], axis=1)
-
-
 def apply_reliability(heat2d: np.ndarray, reli_4d: Optional[np.ndarray], act: str) -> np.ndarray:
-    if reli_4d is None or not isinstance(reli_4d, np.ndarray) or reli_4d.ndim != 4:
+    r = reliability_map(reli_4d, act)
+    if r is None:
         return heat2d
+    r = cv2.resize(r, (heat2d.shape[1], heat2d.shape[0]), interpolation=cv2.INTER_LINEAR)
+    return heat2d * r
 
-    if reli_4d.shape[1] == 1:
-        r = reli_4d[0, 0]
-    elif reli_4d.shape[3] == 1:
-        r = reli_4d[0, :, :, 0]
-    else:
-        r = reli_4d[0, :, :, 0]
-
-    r = r.astype(np.float32)
-    if act == "sigmoid":
-        r = 1.0 / (1.0 + np.exp(-r))
-    elif act == "tanh":
-        r = np.tanh(r)
-    elif act == "relu":
-        r = np.maximum(r, 0.0)
 
-    r = cv2.resize(r, (heat2d.shape[1], heat2d.shape[0]), interpolation=cv2.INTER_LINEAR)
-    return heat2d * np.clip(r, 0.0, 1.0)
+def load_interpreter(model_path: str, backend: str, delegate_path: str):
+    if TFL is None:
+        raise _TFLITE_ERROR
+    delegates = None
+    if backend != "cpu":
+        delegates = [_load_delegate(delegate_path, backend)]
+    interpreter = TFL.Interpreter(model_path=model_path, experimental_delegates=delegates)
+    interpreter.allocate_tensors()
+    return interpreter
 
 
 # -----------------------------
-# Quant/dequant + layout
+# Dequant + layout
 # -----------------------------
-def _quantize_input(x_float01: np.ndarray, dtype: np.dtype, quant: Tuple[float, int]) -> np.ndarray:
-    scale, zp = quant
-    if scale is None or scale == 0:
-        if dtype == np.uint8:
-            return (x_float01 * 255.0).clip(0, 255).astype(np.uint8)
-        if dtype == np.int8:
-            return (x_float01 * 127.0).clip(-128, 127).astype(np.int8)
-        return x_float01.astype(dtype)
-
-    q = np.round(x_float01 / scale + zp)
-    if dtype == np.uint8:
-        return q.clip(0, 255).astype(np.uint8)
-    if dtype == np.int8:
-        return q.clip(-128, 127).astype(np.int8)
-    if dtype == np.int16:
-        return q.clip(-32768, 32767).astype(np.int16)
-    return q.astype(dtype)
-
-
 def _dequantize_output(y: np.ndarray, quant: Tuple[float, int]) -> np.ndarray:
     scale, zp = quant
     if scale is None or scale == 0:
@@ -164,6 +109,16 @@ def _infer_layout_from_shape(shape) -> str:
     return "unknown"
 
 
+def model_input_geometry(shape) -> Tuple[str, int, int]:
+    """(layout, in_w, in_h) of a 4D image input."""
+    layout = _infer_layout_from_shape(shape)
+    if layout == "unknown":
+        layout = "nhwc"
+    if layout == "nchw":
+        return layout, int(shape[3]), int(shape[2])
+    return layout, int(shape[2]), int(shape[1])
+
+
 def _preprocess_frame(frame_bgr: np.ndarray, in_w: int, in_h: int, layout: str) -> np.ndarray:
     rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
     rgb = cv2.resize(rgb, (in_w, in_h), interpolation=cv2.INTER_LINEAR)
@@ -308,38 +263,513 @@ def rot_angle_deg(R: np.ndarray) -> float:
     return math.degrees(math.acos(c))
 
 
-def draw_hud(img, line1: str, line2: str, org=(10, 26),
+def draw_hud(img, lines: List[str], org=(10, 26),
              font=cv2.FONT_HERSHEY_SIMPLEX, base_scale=0.72,
              color=(0, 255, 255), thickness=2):
     x, y = org
     H, W = img.shape[:2]
     scale = base_scale
     for _ in range(7):
-        (w1, h1), _ = cv2.getTextSize(line1, font, scale, thickness)
-        (w2, h2), _ = cv2.getTextSize(line2, font, scale, thickness)
-        if max(w1, w2) <= W - 20:
+        widths = [cv2.getTextSize(ln, font, scale, thickness)[0][0] for ln in lines]
+        if max(widths) <= W - 20:
             break
         scale *= 0.85
 
-    (w1, h1), _ = cv2.getTextSize(line1, font, scale, thickness)
-    (w2, h2), _ = cv2.getTextSize(line2, font, scale, thickness)
-    bar_h = h1 + h2 + 18
-    bar_w = max(w1, w2) + 16
-    cv2.rectangle(img, (x - 6, y - h1 - 8), (x - 6 + bar_w, y - h1 - 8 + bar_h), (0, 0, 0), -1)
-    cv2.putText(img, line1, (x, y), font, scale, color, thickness, cv2.LINE_AA)
-    cv2.putText(img, line2, (x, y + h2 + 10), font, scale, color, thickness, cv2.LINE_AA)
+    sizes = [cv2.getTextSize(ln, font, scale, thickness)[0] for ln in lines]
+    line_h = max(h for _, h in sizes)
+    bar_h = len(lines) * (line_h + 10) + 8
+    bar_w = max(w for w, _ in sizes) + 16
+    cv2.rectangle(img, (x - 6, y - line_h - 8), (x - 6 + bar_w, y - line_h - 8 + bar_h), (0, 0, 0), -1)
+    for i, ln in enumerate(lines):
+        cv2.putText(img, ln, (x, y + i * (line_h + 10)), font, scale, color, thickness, cv2.LINE_AA)
+
+
+# -----------------------------
+# Pipeline plumbing
+# -----------------------------
+class LatestQueue:
+    """
+    Bounded hand-off between stages. put() never blocks: when the queue is
+    full the oldest item is dropped, so a slow consumer always sees the
+    latest frame instead of building up latency.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self.maxsize = max(1, maxsize)
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """Returns the next item, or None once the queue is closed and drained."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items or self.closed, timeout=timeout):
+                return None
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class StageTimer:
+    """Per-stage latency (EMA and running mean) in milliseconds."""
+
+    def __init__(self, names, alpha: float = 0.1):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.ema = {n: 0.0 for n in names}
+        self.total = {n: 0.0 for n in names}
+        self.count = {n: 0 for n in names}
+
+    def add(self, name: str, seconds: float):
+        ms = seconds * 1000.0
+        with self.lock:
+            self.ema[name] = ms if self.count[name] == 0 else (1.0 - self.alpha) * self.ema[name] + self.alpha * ms
+            self.total[name] += ms
+            self.count[name] += 1
+
+    def hud(self) -> str:
+        with self.lock:
+            return " ".join(f"{n}={self.ema[n]:.1f}ms" for n in self.ema)
+
+    def summary(self) -> str:
+        with self.lock:
+            return " | ".join(
+                f"{n}: mean={self.total[n] / max(self.count[n], 1):.2f}ms n={self.count[n]}" for n in self.ema
+            )
+
+
+def _run_stage(name: str, fn, stop: threading.Event, outputs: List[LatestQueue]):
+    try:
+        fn()
+    except Exception as e:
+        print(f"[ERROR] {name} stage failed: {e}")
+    finally:
+        stop.set()
+        for q in outputs:
+            q.close()
+
+
+# -----------------------------
+# Stage bodies
+# -----------------------------
+class InferenceEngine:
+    """Preprocess + invoke + dequantize. Owned by the inference thread only."""
+
+    def __init__(self, interpreter, layout: str, in_w: int, in_h: int):
+        self.interpreter = interpreter
+        in_det = interpreter.get_input_details()[0]
+        # BGR frame -> RGB [0,1] -> input quantization, folded into one uint8 lookup per pixel
+        self.writer = InputWriter(interpreter, in_det, layout, gain=1.0 / 255.0, channel_map=(2, 1, 0))
+        self.out_dets = interpreter.get_output_details()
+        self.layout = layout
+        self.in_w, self.in_h = in_w, in_h
+        self.resized = np.empty((in_h, in_w, 3), np.uint8)
+        self.last_times = {}
+
+    def run(self, frame_bgr: np.ndarray) -> List[np.ndarray]:
+        t0 = time.perf_counter()
+        img = frame_bgr
+        if img.shape[1] != self.in_w or img.shape[0] != self.in_h:
+            img = cv2.resize(frame_bgr, (self.in_w, self.in_h), dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        self.writer.write(img)
+
+        t1 = time.perf_counter()
+        self.interpreter.invoke()
+        t2 = time.perf_counter()
+
+        outs = []
+        for od in self.out_dets:
+            y = self.interpreter.get_tensor(od["index"])
+            q = od.get("quantization", (0.0, 0))
+            if y.dtype != np.float32 and y.dtype != np.float16:
+                y = _dequantize_output(y, q)
+            else:
+                y = y.astype(np.float32)
+            outs.append(y)
+        self.last_times = {"pre": t1 - t0, "invoke": t2 - t1, "post": time.perf_counter() - t2}
+        return outs
+
+
+def load_engines(args) -> List[InferenceEngine]:
+    """One engine (interpreter + input writer) per model: --model first, then --extra_models."""
+    engines = []
+    for path in [args.model] + list(args.extra_models):
+        interpreter = load_interpreter(path, args.backend, args.delegate_path)
+        layout, in_w, in_h = model_input_geometry(list(interpreter.get_input_details()[0]["shape"]))
+        engines.append(InferenceEngine(interpreter, layout, in_w, in_h))
+    return engines
+
+
+def make_scheduler(args, engines: list) -> Tuple[list, int, ResolutionScheduler]:
+    """
+    Orders the engines smallest input first and returns (engines, index of
+    --model, scheduler). The tracker works in --model coordinates, so the
+    scheduler starts there.
+    """
+    ref = engines[0]
+    engines = sorted(engines, key=lambda e: e.in_w * e.in_h)
+    sizes = [(e.in_w, e.in_h) for e in engines]
+    if len(set(sizes)) != len(sizes):
+        raise ValueError(f"--extra_models must all have different input sizes, got {sizes}")
+    ref_idx = engines.index(ref)
+    sched = ResolutionScheduler(sizes, target_kp=args.target_kp, budget_ms=args.budget_ms,
+                                hysteresis=args.res_hysteresis, dwell=args.res_dwell, start=ref_idx)
+    return engines, ref_idx, sched
+
+
+class VOTracker:
+    """
+    Keypoint extraction, matching against the keyframe, pose gating and
+    keyframe policy (V5). Owned by the geometry thread only.
+    """
+
+    def __init__(self, args, in_w: int, in_h: int, K: Optional[np.ndarray] = None):
+        self.args = args
+        self.in_w, self.in_h = in_w, in_h
+        self.K = K if K is not None else make_K_from_fov(in_w, in_h, args.fov_deg)
+        self.fx, self.cx, self.cy = self.K[0, 0], self.K[0, 2], self.K[1, 2]
+        self.matcher = create_matcher(args.matcher, args.ratio, mutual=not args.no_mutual,
+                                      guided_radius=args.guided_radius)
+        self.extractor = KeypointExtractor(args.cell, args.threshold, args.nms, args.max_points, mode=args.kp_mode)
+
+        # keyframe
+        self.kf_kp = None
+        self.kf_desc = None
+        self.kf_level = 0   # input-size level the keyframe was extracted at
+        self.level = 0
+        self.H_pred = None  # last keyframe->frame homography, predicts positions for guided matching
+        self.kf_age = 0
+        self.bad_streak = 0
+
+        # pose
+        self.T_w_c = np.eye(4, dtype=np.float64)
+        self.traj = [(0.0, 0.0)]
+        self.t_dir_ema = None
+
+        # keyframe database + loop closure (background thread)
+        self.kmap = None
+        if not args.no_loop:
+            self.kmap = KeyframeMap(self.K, in_w, in_h, ratio=args.ratio, loop_sim=args.loop_sim,
+                                    loop_min_gap=args.loop_min_gap, loop_min_inliers=args.loop_min_inliers)
+        self.traj_kf_idx = 0  # first traj entry since the current keyframe
+
+    def _set_keyframe(self, kp_xy, desc):
+        self.kf_kp = kp_xy
+        self.kf_desc = desc
+        self.kf_level = self.level
+        self.H_pred = np.eye(3)
+        self.kf_age = 0
+        self.bad_streak = 0
+        if self.kmap is not None:
+            self.kmap.add_keyframe(self.T_w_c, kp_xy, desc)
+            self.traj_kf_idx = len(self.traj) - 1
+
+    def _apply_map_correction(self):
+        """Shift the live pose by the pose-graph correction of the newest keyframe."""
+        d = self.kmap.take_correction()
+        if not d.any():
+            return
+        self.T_w_c[:3, 3] += d
+        self.traj[self.traj_kf_idx:] = [(x + d[0], z + d[2]) for x, z in self.traj[self.traj_kf_idx:]]
+
+    def trajectory(self):
+        if self.kmap is None:
+            return self.traj[-200:]
+        return (self.kmap.trajectory_xz(200) + self.traj[self.traj_kf_idx + 1:])[-200:]
+
+    def close(self):
+        if self.kmap is not None:
+            self.kmap.close()
+
+    def process(self, outs: List[np.ndarray], level: int = 0) -> dict:
+        """
+        outs may come from a model at any input size: keypoints are mapped to
+        in_w x in_h, so K and the trajectory are unaffected. level identifies
+        that size; descriptors are not matched across levels.
+        """
+        args = self.args
+        in_w, in_h = self.in_w, self.in_h
+        self.level = level
+        res = {"error": None, "kp_xy": None, "lines": [], "heat2d": None, "times": {}}
+        if self.kmap is not None:
+            self._apply_map_correction()
+        t0 = time.perf_counter()
+
+        mode, heat_or_k1, desc_map, reli = _pick_outputs(outs)
+        if mode is None or desc_map is None:
+            res["error"] = "Missing outputs"
+            return res
+
+        if mode == "k1":
+            reli2d = reliability_map(reli, args.reli_act) if args.use_reli else None
+            peaks, (Hm, Wm) = self.extractor.extract(heat_or_k1, reli2d, blur=args.blur)
+            if args.show_heat:
+                res["heat2d"] = self.extractor.heatmap(heat_or_k1).copy()
+        else:
+            heat2d = heat_or_k1
+            if args.use_reli:
+                heat2d = apply_reliability(heat2d, reli, act=args.reli_act)
+            if args.blur >= 3 and args.blur % 2 == 1:
+                heat2d = cv2.GaussianBlur(heat2d, (args.blur, args.blur), 0.0)
+            if args.show_heat:
+                res["heat2d"] = heat2d
+            peaks = self.extractor.dense_peaks(heat2d)
+            Hm, Wm = heat2d.shape[:2]
+
+        sx = in_w / float(Wm)
+        sy = in_h / float(Hm)
+        xs = (peaks[:, 0] + 0.5) * sx
+        ys = (peaks[:, 1] + 0.5) * sy
+
+        # border filter
+        m = 8
+        valid = (xs >= m) & (xs < in_w - m) & (ys >= m) & (ys < in_h - m)
+        xs, ys = xs[valid], ys[valid]
+
+        if xs.size < 120:
+            res["error"] = f"Too few keypoints: {xs.size}"
+            return res
+
+        kp_xy = np.stack([xs, ys], axis=1).astype(np.float32)
+        hx = xs / max(in_w - 1, 1) * (Wm - 1)
+        hy = ys / max(in_h - 1, 1) * (Hm - 1)
+        desc = _bilinear_sample_desc(desc_map, hx, hy, Hm, Wm)
+        if args.desc_int8:
+            desc = quantize_descriptors(desc)
+        res["kp_xy"] = kp_xy
+
+        # init keyframe
+        if self.kf_desc is None:
+            self._set_keyframe(kp_xy, desc)
+            self.t_dir_ema = None
+        elif level != self.kf_level:
+            # input size switched: descriptors of another scale match poorly, restart from this frame
+            self._set_keyframe(kp_xy, desc)
+
+        t1 = time.perf_counter()
+        res["times"]["kp"] = t1 - t0
+
+        # match current -> keyframe
+        pred = predict_positions(self.kf_kp, self.H_pred) if args.guided_radius > 0 else None
+        qi, ti = self.matcher.match(self.kf_desc, desc, pred, kp_xy)
+        n_good = len(qi)
+
+        t2 = time.perf_counter()
+        res["times"]["match"] = t2 - t1
+
+        # default status
+        E_in = 0
+        H_in = 0
+        pose_in = 0
+        pose_ok = False
+        planar = False
+        jump_reject = False
+        median_flow = 0.0
+        max_flow = 0.0
+        R_deg = 0.0
+
+        if n_good >= args.min_good_matches:
+            pts1 = self.kf_kp[qi]
+            pts2 = kp_xy[ti]
+
+            # flow stats (pixel displacement from keyframe)
+            flow = np.linalg.norm(pts2 - pts1, axis=1)
+            median_flow = float(np.median(flow)) if flow.size else 0.0
+            max_flow = float(np.max(flow)) if flow.size else 0.0
+
+            # compute Essential (general motion)
+            E, maskE = cv2.findEssentialMat(
+                pts1, pts2, focal=float(self.fx), pp=(float(self.cx), float(self.cy)),
+                method=cv2.RANSAC, prob=0.999, threshold=float(args.ransac_E)
+            )
+            E_in = mask_count(maskE)
+
+            # compute Homography (planar or pure rotation fits well) [1](https://docs.opencv.org/master/d9/dab/tutorial_homography.html)[3](https://cseweb.ucsd.edu/classes/sp04/cse252b/notes/lec04/lec4.pdf)
+            H, maskH = cv2.findHomography(pts1, pts2, method=cv2.RANSAC, ransacReprojThreshold=float(args.ransac_H))
+            H_in = mask_count(maskH)
+            self.H_pred = H if H is not None else None
+
+            # planar detection: if H inliers clearly dominate E inliers
+            if H is not None and H_in >= args.min_H_inliers and (H_in > args.planar_ratio * max(E_in, 1)):
+                planar = True
+
+            # visualization: only keep lines with reasonable displacement
+            short = np.flatnonzero(flow <= args.draw_max_disp)[:args.draw_max_lines]
+            res["lines"] = (pts2[short], pts1[short])
+
+            # hard gates: if flow huge -> reject pose and refresh keyframe
+            if median_flow > args.max_median_flow or max_flow > args.max_max_flow:
+                jump_reject = True
+            elif (not planar) and E is not None and maskE is not None and E_in >= args.min_E_inliers:
+                # use only E-inliers for recoverPose (stability)
+                sel = (maskE.reshape(-1) > 0)
+                pts1_in = pts1[sel]
+                pts2_in = pts2[sel]
+
+                if pts1_in.shape[0] >= args.min_pose_inliers:
+                    _, R, t, maskP = cv2.recoverPose(E, pts1_in, pts2_in, focal=float(self.fx), pp=(float(self.cx), float(self.cy)))
+                    pose_in = mask_count(maskP)
+                    R_deg = rot_angle_deg(R)
+
+                    denom = max(pts1_in.shape[0], 1)
+                    inlier_ratio = pose_in / float(denom)
+
+                    # rotation gate
+                    if R_deg > args.max_rot_deg:
+                        jump_reject = True
+                    else:
+                        # t direction gate
+                        tn = float(np.linalg.norm(t))
+                        if tn > 1e-9:
+                            t = t / tn
+                        t_dir = t.flatten()
+
+                        if self.t_dir_ema is None:
+                            self.t_dir_ema = t_dir
+                        else:
+                            # if direction flips too much -> reject
+                            dot = float(np.dot(self.t_dir_ema, t_dir))
+                            dot = max(-1.0, min(1.0, dot))
+                            ang = math.degrees(math.acos(dot))
+                            if ang > args.max_t_change_deg:
+                                jump_reject = True
+                            else:
+                                a = float(np.clip(args.t_ema, 0.0, 0.95))
+                                self.t_dir_ema = (1.0 - a) * t_dir + a * self.t_dir_ema
+                                self.t_dir_ema = self.t_dir_ema / (np.linalg.norm(self.t_dir_ema) + 1e-9)
+
+                        if (not jump_reject) and (pose_in >= args.min_pose_inliers) and (inlier_ratio >= args.min_inlier_ratio):
+                            # update pose (up-to-scale)
+                            T = np.eye(4, dtype=np.float64)
+                            T[:3, :3] = R
+                            T[:3, 3] = self.t_dir_ema
+                            self.T_w_c = self.T_w_c @ T
+                            self.traj.append((float(self.T_w_c[0, 3]), float(self.T_w_c[2, 3])))
+                            pose_ok = True
+
+        res["times"]["pose"] = time.perf_counter() - t2
+
+        # keyframe update policy (avoid long lines)
+        self.kf_age += 1
+
+        # if planar/rotation dominated or jump_reject -> refresh KF immediately
+        if planar or jump_reject:
+            self._set_keyframe(kp_xy, desc)
+            # do not change pose here (avoid wrong update)
+        else:
+            if pose_ok:
+                self.bad_streak = 0
+            else:
+                self.bad_streak += 1
+
+            # refresh KF if too old or parallax too large (avoid long baseline)
+            if (self.kf_age >= args.kf_max_age) or (median_flow >= args.kf_parallax_px) or (self.bad_streak >= args.kf_bad_streak):
+                self._set_keyframe(kp_xy, desc)
+
+        flags = []
+        if planar:
+            flags.append("PLANAR")
+        if jump_reject:
+            flags.append("JUMP_REJ")
+        if pose_ok:
+            flags.append("POSE_OK")
+        else:
+            flags.append("POSE_SKIP")
+
+        res["line1"] = f"kpt={len(kp_xy)} good={n_good} E_in={E_in} H_in={H_in} pose_in={pose_in}"
+        res["line2"] = f"KF_age={self.kf_age} bad={self.bad_streak} flow_med={median_flow:.1f} rot={R_deg:.1f}  {'|'.join(flags)}"
+        if self.kmap is not None:
+            res["line2"] += f"  {self.kmap.stats()}"
+        res["traj"] = self.trajectory()
+        return res
+
+
+def render_main(frame_bgr, res: dict, in_w: int, in_h: int, hud_lines: List[str], args):
+    disp = cv2.resize(frame_bgr, (in_w, in_h))
+    if res["error"]:
+        cv2.putText(disp, res["error"], (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+        return disp
+
+    kp_xy = res["kp_xy"]
+    # draw points sparsely
+    for (xk, yk) in kp_xy[::max(1, len(kp_xy)//900)]:
+        cv2.circle(disp, (int(xk), int(yk)), 2, (0, 255, 0), -1, lineType=cv2.LINE_AA)
+
+    if len(res["lines"]):
+        p2s, p1s = res["lines"]
+        for p2, p1 in zip(p2s, p1s):
+            cv2.line(disp, (int(p2[0]), int(p2[1])), (int(p1[0]), int(p1[1])),
+                     (255, 0, 0), 1, lineType=cv2.LINE_AA)
+
+    draw_hud(disp, hud_lines)
+
+    if res["heat2d"] is not None:
+        h = res["heat2d"].copy()
+        h -= h.min()
+        if h.max() > 0:
+            h /= h.max()
+        hm = (h * 255).astype(np.uint8)
+        hm = cv2.applyColorMap(hm, cv2.COLORMAP_JET)
+        hm = cv2.resize(hm, (in_w, in_h), interpolation=cv2.INTER_LINEAR)
+        disp = cv2.addWeighted(disp, 1.0, hm, 0.30, 0.0)
+    return disp
+
+
+def render_traj(traj_img, traj, args):
+    # trajectory auto-center (last ~200)
+    traj_img[:] = (10, 10, 10)
+    if len(traj) >= 2:
+        xs_tr = np.array([p[0] for p in traj], dtype=np.float64)
+        zs_tr = np.array([p[1] for p in traj], dtype=np.float64)
+        cx_tr, cz_tr = xs_tr[-1], zs_tr[-1]
+        rx = xs_tr - cx_tr
+        rz = zs_tr - cz_tr
+        spread = max(np.max(np.abs(rx)), np.max(np.abs(rz)), 1e-3)
+        scale = 0.40 * min(args.traj_w, args.traj_h) / spread
+
+        ox, oy = args.traj_w // 2, args.traj_h // 2
+        pts = np.stack([ox + rx * scale, oy - rz * scale], axis=1).astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(traj_img, [pts], False, (0, 255, 0), 2, lineType=cv2.LINE_AA)
+        cv2.circle(traj_img, tuple(int(v) for v in pts[-1, 0]), 4, (0, 0, 255), -1)
+
+    cv2.putText(traj_img, "Trajectory (auto-center, last ~200)", (10, 25),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (220, 220, 220), 2, cv2.LINE_AA)
+    return traj_img
 
 
 # -----------------------------
 # Main (V5: anti-planar/jump gating)
 # -----------------------------
-def main():
+def build_arg_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="XFeat VO v5 (anti-planar / anti-jump gating)")
 
     ap.add_argument("--model", type=str, required=True)
     ap.add_argument("--backend", type=str, choices=["htp", "dsp", "cpu"], default="htp")
     ap.add_argument("--delegate_path", type=str, default="libQnnTFLiteDelegate.so")
 
+    # adaptive input resolution (needs the model compiled at several input sizes)
+    ap.add_argument("--extra_models", type=str, nargs="*", default=[],
+                    help="Same network compiled at other input sizes; enables per-frame resolution scheduling")
+    ap.add_argument("--target_kp", type=int, default=600, help="Keypoint yield the scheduler aims for")
+    ap.add_argument("--budget_ms", type=float, default=0.0,
+                    help="Per-frame inference + keypoint budget in ms (0 = keypoint yield only)")
+    ap.add_argument("--res_hysteresis", type=float, default=0.25,
+                    help="Step down only if the smaller size is expected to exceed target_kp by this fraction")
+    ap.add_argument("--res_dwell", type=int, default=10, help="Frames to stay on a size after switching")
+
     ap.add_argument("--camera_index", type=int, default=-1)
     ap.add_argument("--cap_w", type=int, default=1280)
     ap.add_argument("--cap_h", type=int, default=720)
@@ -351,11 +781,19 @@ def main():
     ap.add_argument("--max_points", type=int, default=1800)
     ap.add_argument("--use_reli", action="store_true")
     ap.add_argument("--reli_act", type=str, choices=["none", "sigmoid", "tanh", "relu"], default="sigmoid")
-    ap.add_argument("--blur", type=int, default=3)
+    ap.add_argument("--blur", type=int, default=3, help="Heatmap blur (dense keypoint mode only)")
+    ap.add_argument("--kp_mode", type=str, choices=["cell", "dense"], default="cell",
+                    help="cell: one keypoint per 8x8 cell, no full-res heatmap; dense: full heatmap + dilate NMS")
 
     # geometry / VO params
     ap.add_argument("--fov_deg", type=float, default=110.0)
     ap.add_argument("--ratio", type=float, default=0.90)
+    ap.add_argument("--matcher", type=str, choices=list(MATCHERS), default="numpy",
+                    help="numpy: vectorized GEMM nearest/second-nearest; bf: OpenCV brute force; flann: KD-tree")
+    ap.add_argument("--no_mutual", action="store_true", help="Disable the mutual-nearest check (numpy matcher)")
+    ap.add_argument("--guided_radius", type=float, default=0.0,
+                    help="Guided matching search radius in px around predicted positions (numpy matcher, 0=off)")
+    ap.add_argument("--desc_int8", action="store_true", help="Store and match int8-quantized descriptors")
     ap.add_argument("--ransac_E", type=float, default=2.0)
     ap.add_argument("--ransac_H", type=float, default=3.0)
     ap.add_argument("--min_good_matches", type=int, default=80)
@@ -378,6 +816,12 @@ def main():
     ap.add_argument("--kf_parallax_px", type=float, default=25.0)   # if median flow from KF too big -> refresh KF
     ap.add_argument("--kf_bad_streak", type=int, default=8)
 
+    # map / loop closure
+    ap.add_argument("--no_loop", action="store_true", help="Disable the keyframe map and loop closure")
+    ap.add_argument("--loop_sim", type=float, default=0.85, help="Min global-descriptor cosine for a loop candidate")
+    ap.add_argument("--loop_min_gap", type=int, default=30, help="Ignore the most recent N keyframes as loop candidates")
+    ap.add_argument("--loop_min_inliers", type=int, default=80)
+
     # smoothing
     ap.add_argument("--t_ema", type=float, default=0.25)
 
@@ -395,41 +839,38 @@ def main():
     ap.add_argument("--show_heat", action="store_true")
     ap.add_argument("--debug", action="store_true")
 
-    args = ap.parse_args()
+    # pipeline
+    ap.add_argument("--queue_size", type=int, default=1, help="Frames buffered between stages (latest-frame hand-off)")
 
-    delegates = None
-    if args.backend != "cpu":
-        delegates = [_load_delegate(args.delegate_path, args.backend)]
+    return ap
 
-    interpreter = TFL.Interpreter(model_path=args.model, experimental_delegates=delegates)
-    interpreter.allocate_tensors()
+
+def main():
+    args = build_arg_parser().parse_args()
+
+    engines = load_engines(args)
+    interpreter = engines[0].interpreter
 
     in_det = interpreter.get_input_details()[0]
     out_dets = interpreter.get_output_details()
-    inp_index = in_det["index"]
     inp_shape = list(in_det["shape"])
     inp_dtype = in_det["dtype"]
     inp_quant = in_det.get("quantization", (0.0, 0))
 
-    layout = _infer_layout_from_shape(inp_shape)
-    if layout == "unknown":
-        layout = "nhwc"
-    if layout == "nchw":
-        in_h, in_w = int(inp_shape[2]), int(inp_shape[3])
-    else:
-        in_h, in_w = int(inp_shape[1]), int(inp_shape[2])
+    layout, in_w, in_h = model_input_geometry(inp_shape)
 
     print(f"[INFO] runtime={RUNTIME_KIND} backend={args.backend} delegate={args.delegate_path if args.backend!='cpu' else 'none'}")
     print(f"[INFO] input: shape={inp_shape} layout={layout} dtype={inp_dtype} quant={inp_quant}")
     for i, od in enumerate(out_dets):
         print(f"[INFO] output[{i}]: shape={od['shape']} dtype={od['dtype']} quant={od.get('quantization', (0.0,0))}")
+    engines, ref_idx, sched = make_scheduler(args, engines)
+    if sched.enabled:
+        print(f"[INFO] adaptive resolution: sizes={[sched.size_str(i) for i in range(len(engines))]} "
+              f"target_kp={args.target_kp} budget={args.budget_ms:g}ms (0=none), tracking at {in_w}x{in_h}")
 
     cam_idx, cap = open_camera(args.camera_index, args.cap_w, args.cap_h)
     print(f"[INFO] camera=/dev/video{cam_idx} capture={args.cap_w}x{args.cap_h} model_in={in_w}x{in_h}")
 
-    K = make_K_from_fov(in_w, in_h, args.fov_deg)
-    fx, fy, cx, cy = K[0, 0], K[1, 1], K[0, 2], K[1, 2]
-
     # windows
     win_main = f"XFeat-VOv5({args.backend}) /dev/video{cam_idx}"
     win_traj = "Trajectory (auto-center)"
@@ -440,296 +881,120 @@ def main():
     if args.fullscreen:
         cv2.setWindowProperty(win_main, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
 
-    bf = cv2.BFMatcher(cv2.NORM_L2, crossCheck=False)
-
-    # keyframe
-    kf_kp = None
-    kf_desc = None
-    kf_age = 0
-    bad_streak = 0
-
-    # pose
-    T_w_c = np.eye(4, dtype=np.float64)
-    traj = [(0.0, 0.0)]
+    tracker = VOTracker(args, in_w, in_h)
     traj_img = np.zeros((args.traj_h, args.traj_w, 3), dtype=np.uint8)
-    t_dir_ema = None
-
-    frame_id = 0
-    t0 = time.time()
 
-    try:
-        while True:
+    # capture -> inference -> geometry -> display (main thread, owns HighGUI)
+    stop = threading.Event()
+    q_cap = LatestQueue(args.queue_size)
+    q_inf = LatestQueue(args.queue_size)
+    q_geo = LatestQueue(args.queue_size)
+    timer = StageTimer(["cap", "inf", "geo", "disp"])
+
+    def capture_loop():
+        frame_id = 0
+        while not stop.is_set():
+            t = time.perf_counter()
             ok, frame_bgr = cap.read()
             if not ok or frame_bgr is None:
                 break
+            timer.add("cap", time.perf_counter() - t)
+            q_cap.put((frame_id, frame_bgr))
+            frame_id += 1
 
-            x = _preprocess_frame(frame_bgr, in_w=in_w, in_h=in_h, layout=layout)
-            if inp_dtype != np.float32 and inp_dtype != np.float16:
-                x_in = _quantize_input(x, inp_dtype, inp_quant)
-            else:
-                x_in = x.astype(inp_dtype)
-
-            interpreter.set_tensor(inp_index, x_in)
-            interpreter.invoke()
-
-            outs = []
-            for od in out_dets:
-                y = interpreter.get_tensor(od["index"])
-                q = od.get("quantization", (0.0, 0))
-                if y.dtype != np.float32 and y.dtype != np.float16:
-                    y = _dequantize_output(y, q)
-                else:
-                    y = y.astype(np.float32)
-                outs.append(y)
-
-            mode, heat_or_k1, desc_map, reli = _pick_outputs(outs)
-            if mode is None or desc_map is None:
-                disp0 = cv2.resize(frame_bgr, (in_w, in_h))
-                cv2.putText(disp0, "Missing outputs", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                cv2.imshow(win_main, disp0)
-                if (cv2.waitKey(1) & 0xFF) == ord("q"):
+    def inference_loop():
+        while not stop.is_set():
+            item = q_cap.get(timeout=0.5)
+            if item is None:
+                if q_cap.closed:
                     break
                 continue
+            frame_id, frame_bgr = item
+            t = time.perf_counter()
+            level = sched.pick()
+            outs = engines[level].run(frame_bgr)
+            t_inf = time.perf_counter() - t
+            timer.add("inf", t_inf)
+            q_inf.put((frame_id, frame_bgr, outs, level, t_inf))
+
+    def geometry_loop():
+        while not stop.is_set():
+            item = q_inf.get(timeout=0.5)
+            if item is None:
+                if q_inf.closed:
+                    break
+                continue
+            frame_id, frame_bgr, outs, level, t_inf = item
+            t = time.perf_counter()
+            res = tracker.process(outs, level)
+            timer.add("geo", time.perf_counter() - t)
+            n_kp = 0 if res["kp_xy"] is None else len(res["kp_xy"])
+            sched.update(level, n_kp, t_inf + res["times"].get("kp", 0.0))
+            q_geo.put((frame_id, frame_bgr, res))
+
+    threads = [
+        threading.Thread(target=_run_stage, args=("capture", capture_loop, stop, [q_cap]), daemon=True),
+        threading.Thread(target=_run_stage, args=("inference", inference_loop, stop, [q_inf]), daemon=True),
+        threading.Thread(target=_run_stage, args=("geometry", geometry_loop, stop, [q_geo]), daemon=True),
+    ]
+    for th in threads:
+        th.start()
+
+    shown = 0
+    t0 = time.time()
 
-            heat2d = decode_superpoint_k1_to_heat(heat_or_k1, cell=args.cell) if mode == "k1" else heat_or_k1
-            if args.use_reli:
-                heat2d = apply_reliability(heat2d, reli, act=args.reli_act)
-            if args.blur >= 3 and args.blur % 2 == 1:
-                heat2d = cv2.GaussianBlur(heat2d, (args.blur, args.blur), 0.0)
-
-            peaks = nms_peaks(heat2d, args.threshold, args.nms, args.max_points)
-
-            Hm, Wm = heat2d.shape[:2]
-            sx = in_w / float(Wm)
-            sy = in_h / float(Hm)
-            xs = (peaks[:, 0] + 0.5) * sx
-            ys = (peaks[:, 1] + 0.5) * sy
-
-            # border filter
-            m = 8
-            valid = (xs >= m) & (xs < in_w - m) & (ys >= m) & (ys < in_h - m)
-            xs, ys = xs[valid], ys[valid]
-
-            if xs.size < 120:
-                disp0 = cv2.resize(frame_bgr, (in_w, in_h))
-                cv2.putText(disp0, f"Too few keypoints: {xs.size}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                cv2.imshow(win_main, disp0)
+    try:
+        while not stop.is_set():
+            item = q_geo.get(timeout=0.5)
+            if item is None:
+                if q_geo.closed:
+                    break
                 if (cv2.waitKey(1) & 0xFF) == ord("q"):
                     break
                 continue
-
-            kp_xy = np.stack([xs, ys], axis=1).astype(np.float32)
-            hx = xs / max(in_w - 1, 1) * (Wm - 1)
-            hy = ys / max(in_h - 1, 1) * (Hm - 1)
-            desc = _bilinear_sample_desc(desc_map, hx, hy, Hm, Wm)
-
-            # init keyframe
-            if kf_desc is None:
-                kf_kp, kf_desc = kp_xy, desc
-                kf_age = 0
-                bad_streak = 0
-                t_dir_ema = None
-
-            # match current -> keyframe
-            knn = bf.knnMatch(kf_desc.astype(np.float32), desc.astype(np.float32), k=2)
-            good = []
-            for pair in knn:
-                if len(pair) < 2:
-                    continue
-                a, b = pair[0], pair[1]
-                if a.distance < args.ratio * b.distance:
-                    good.append(a)
-
-            # default status
-            E_in = 0
-            H_in = 0
-            pose_in = 0
-            pose_ok = False
-            planar = False
-            jump_reject = False
-            median_flow = 0.0
-            max_flow = 0.0
-            R_deg = 0.0
-
-            disp = cv2.resize(frame_bgr, (in_w, in_h))
-
-            # draw points sparsely
-            for (xk, yk) in kp_xy[::max(1, len(kp_xy)//900)]:
-                cv2.circle(disp, (int(xk), int(yk)), 2, (0, 255, 0), -1, lineType=cv2.LINE_AA)
-
-            if len(good) >= args.min_good_matches:
-                pts1 = np.float32([kf_kp[m.queryIdx] for m in good])
-                pts2 = np.float32([kp_xy[m.trainIdx] for m in good])
-
-                # flow stats (pixel displacement from keyframe)
-                flow = np.linalg.norm(pts2 - pts1, axis=1)
-                median_flow = float(np.median(flow)) if flow.size else 0.0
-                max_flow = float(np.max(flow)) if flow.size else 0.0
-
-                # compute Essential (general motion)
-                E, maskE = cv2.findEssentialMat(
-                    pts1, pts2, focal=float(fx), pp=(float(cx), float(cy)),
-                    method=cv2.RANSAC, prob=0.999, threshold=float(args.ransac_E)
-                )
-                E_in = mask_count(maskE)
-
-                # compute Homography (planar or pure rotation fits well) [1](https://docs.opencv.org/master/d9/dab/tutorial_homography.html)[3](https://cseweb.ucsd.edu/classes/sp04/cse252b/notes/lec04/lec4.pdf)
-                H, maskH = cv2.findHomography(pts1, pts2, method=cv2.RANSAC, ransacReprojThreshold=float(args.ransac_H))
-                H_in = mask_count(maskH)
-
-                # planar detection: if H inliers clearly dominate E inliers
-                if H is not None and H_in >= args.min_H_inliers and (H_in > args.planar_ratio * max(E_in, 1)):
-                    planar = True
-
-                # visualization: only draw lines with reasonable displacement
-                drawn = 0
-                for mm in good:
-                    if drawn >= args.draw_max_lines:
-                        break
-                    p1 = kf_kp[mm.queryIdx]
-                    p2 = kp_xy[mm.trainIdx]
-                    d = float(np.linalg.norm(p2 - p1))
-                    if d <= args.draw_max_disp:
-                        cv2.line(disp, (int(p2[0]), int(p2[1])), (int(p1[0]), int(p1[1])),
-                                 (255, 0, 0), 1, lineType=cv2.LINE_AA)
-                        drawn += 1
-
-                # hard gates: if flow huge -> reject pose and refresh keyframe
-                if median_flow > args.max_median_flow or max_flow > args.max_max_flow:
-                    jump_reject = True
-                elif (not planar) and E is not None and maskE is not None and E_in >= args.min_E_inliers:
-                    # use only E-inliers for recoverPose (stability)
-                    sel = (maskE.reshape(-1) > 0)
-                    pts1_in = pts1[sel]
-                    pts2_in = pts2[sel]
-
-                    if pts1_in.shape[0] >= args.min_pose_inliers:
-                        _, R, t, maskP = cv2.recoverPose(E, pts1_in, pts2_in, focal=float(fx), pp=(float(cx), float(cy)))
-                        pose_in = mask_count(maskP)
-                        R_deg = rot_angle_deg(R)
-
-                        denom = max(pts1_in.shape[0], 1)
-                        inlier_ratio = pose_in / float(denom)
-
-                        # rotation gate
-                        if R_deg > args.max_rot_deg:
-                            jump_reject = True
-                        else:
-                            # t direction gate
-                            tn = float(np.linalg.norm(t))
-                            if tn > 1e-9:
-                                t = t / tn
-                            t_dir = t.flatten()
-
-                            if t_dir_ema is None:
-                                t_dir_ema = t_dir
-                            else:
-                                # if direction flips too much -> reject
-                                dot = float(np.dot(t_dir_ema, t_dir))
-                                dot = max(-1.0, min(1.0, dot))
-                                ang = math.degrees(math.acos(dot))
-                                if ang > args.max_t_change_deg:
-                                    jump_reject = True
-                                else:
-                                    a = float(np.clip(args.t_ema, 0.0, 0.95))
-                                    t_dir_ema = (1.0 - a) * t_dir + a * t_dir_ema
-                                    t_dir_ema = t_dir_ema / (np.linalg.norm(t_dir_ema) + 1e-9)
-
-                            if (not jump_reject) and (pose_in >= args.min_pose_inliers) and (inlier_ratio >= args.min_inlier_ratio):
-                                # update pose (up-to-scale)
-                                T = np.eye(4, dtype=np.float64)
-                                T[:3, :3] = R
-                                T[:3, 3] = t_dir_ema
-                                T_w_c = T_w_c @ T
-                                traj.append((float(T_w_c[0, 3]), float(T_w_c[2, 3])))
-                                pose_ok = True
-
-            # keyframe update policy (avoid long lines)
-            kf_age += 1
-
-            # if planar/rotation dominated or jump_reject -> refresh KF immediately
-            if planar or jump_reject:
-                kf_kp, kf_desc = kp_xy, desc
-                kf_age = 0
-                bad_streak = 0
-                # do not change pose here (avoid wrong update)
-            else:
-                if pose_ok:
-                    bad_streak = 0
-                else:
-                    bad_streak += 1
-
-                # refresh KF if too old or parallax too large (avoid long baseline)
-                if (kf_age >= args.kf_max_age) or (median_flow >= args.kf_parallax_px) or (bad_streak >= args.kf_bad_streak):
-                    kf_kp, kf_desc = kp_xy, desc
-                    kf_age = 0
-                    bad_streak = 0
-
-            fps = (frame_id + 1) / max(time.time() - t0, 1e-6)
-            line1 = f"kpt={len(kp_xy)} good={len(good)} E_in={E_in} H_in={H_in} pose_in={pose_in} FPS={fps:.1f}"
-            flags = []
-            if planar:
-                flags.append("PLANAR")
-            if jump_reject:
-                flags.append("JUMP_REJ")
-            if pose_ok:
-                flags.append("POSE_OK")
-            else:
-                flags.append("POSE_SKIP")
-            line2 = f"KF_age={kf_age} bad={bad_streak} flow_med={median_flow:.1f} rot={R_deg:.1f}  {'|'.join(flags)}"
-            draw_hud(disp, line1, line2)
-
-            if args.show_heat:
-                h = heat2d.copy()
-                h -= h.min()
-                if h.max() > 0:
-                    h /= h.max()
-                hm = (h * 255).astype(np.uint8)
-                hm = cv2.applyColorMap(hm, cv2.COLORMAP_JET)
-                hm = cv2.resize(hm, (in_w, in_h), interpolation=cv2.INTER_LINEAR)
-                disp = cv2.addWeighted(disp, 1.0, hm, 0.30, 0.0)
-
-            if args.display_scale != 1.0:
+            frame_id, frame_bgr, res = item
+            t = time.perf_counter()
+
+            fps = (shown + 1) / max(time.time() - t0, 1e-6)
+            drops = q_cap.dropped + q_inf.dropped + q_geo.dropped
+            hud_lines = [
+                f"{res.get('line1', '')} FPS={fps:.1f}",
+                res.get("line2", ""),
+                f"{timer.hud()} drop={drops}",
+            ]
+            if sched.enabled:
+                hud_lines.append(sched.hud())
+            disp = render_main(frame_bgr, res, in_w, in_h, hud_lines, args)
+
+            if args.display_scale != 1.0 and not res["error"]:
                 disp_show = cv2.resize(disp, None, fx=args.display_scale, fy=args.display_scale, interpolation=cv2.INTER_LINEAR)
             else:
                 disp_show = disp
             cv2.imshow(win_main, disp_show)
 
-            # trajectory auto-center (last ~200)
-            traj_img[:] = (10, 10, 10)
-            if len(traj) >= 2:
-                recent = min(len(traj), 200)
-                xs_tr = np.array([p[0] for p in traj[-recent:]], dtype=np.float64)
-                zs_tr = np.array([p[1] for p in traj[-recent:]], dtype=np.float64)
-                cx_tr, cz_tr = xs_tr[-1], zs_tr[-1]
-                rx = xs_tr - cx_tr
-                rz = zs_tr - cz_tr
-                spread = max(np.max(np.abs(rx)), np.max(np.abs(rz)), 1e-3)
-                scale = 0.40 * min(args.traj_w, args.traj_h) / spread
-
-                ox, oy = args.traj_w // 2, args.traj_h // 2
-                pts = []
-                for (tx, tz) in traj[-recent:]:
-                    px = int(ox + (tx - cx_tr) * scale)
-                    pz = int(oy - (tz - cz_tr) * scale)
-                    pts.append([px, pz])
-                pts = np.array(pts, dtype=np.int32).reshape(-1, 1, 2)
-                cv2.polylines(traj_img, [pts], False, (0, 255, 0), 2, lineType=cv2.LINE_AA)
-                cv2.circle(traj_img, tuple(pts[-1, 0]), 4, (0, 0, 255), -1)
-
-            cv2.putText(traj_img, "Trajectory (auto-center, last ~200)", (10, 25),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (220, 220, 220), 2, cv2.LINE_AA)
-            cv2.imshow(win_traj, traj_img)
+            if not res["error"]:
+                cv2.imshow(win_traj, render_traj(traj_img, res["traj"], args))
+
+            timer.add("disp", time.perf_counter() - t)
+            shown += 1
 
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"):
                 break
 
-            frame_id += 1
-
     finally:
+        stop.set()
+        for q in (q_cap, q_inf, q_geo):
+            q.close()
+        for th in threads:
+            th.join(timeout=2.0)
+        tracker.close()
+        print(f"[INFO] frames shown={shown} dropped={q_cap.dropped + q_inf.dropped + q_geo.dropped}")
+        print(f"[INFO] stage latency: {timer.summary()}")
+        if sched.enabled:
+            print("[INFO] resolution trade-off (inference + keypoints per frame):")
+            for line in sched.report_lines():
+                print(f"  {line}")
         cap.release()
         cv2.destroyAllWindows()
 
@@ -0,0 +1,114 @@
+#===-- calib_benchmark.py ------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+#!/usr/bin/env python3
+"""
+Calibration builder benchmark: the previous one-image-at-a-time loaders
+against calib_dataset.py (process-pool decode into a memmapped .npy,
+chunked synthetic generation). Without --calib-dir a folder of random
+JPEGs is generated first.
+
+    python3 calib_benchmark.py --count 256 --height 480 --width 640
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from calib_dataset import build_synthetic_calib, load_calib_images
+
+
+def legacy_load_calib_images(calib_dir: str, H: int, W: int, max_images: int = 64) -> np.ndarray:
+    """The loader previously inlined in xfeat_to_qcs6490_tflite.py."""
+    p = Path(calib_dir)
+    imgs = []
+    for ext in ("*.jpg", "*.jpeg", "*.png", "*.bmp"):
+        for f in sorted(p.glob(ext)):
+            img = Image.open(f).convert("RGB").resize((W, H))
+            arr = np.asarray(img).astype(np.float32) / 255.0
+            arr = np.transpose(arr, (2, 0, 1))
+            imgs.append(arr)
+            if len(imgs) >= max_images:
+                break
+        if len(imgs) >= max_images:
+            break
+    return np.stack(imgs, axis=0)
+
+
+def legacy_rand_img(H: int, W: int) -> np.ndarray:
+    y = np.linspace(0, 1, H, dtype=np.float32)
+    x = np.linspace(0, 1, W, dtype=np.float32)
+    xv, yv = np.meshgrid(x, y)
+    base = 0.6 * xv + 0.4 * yv
+    noise = np.random.randn(H, W).astype(np.float32)
+    noise = (noise - noise.min()) / (noise.max() - noise.min() + 1e-6)
+    noise = 0.15 * noise
+    stripes = (np.sin(2 * np.pi * (xv * 4 + np.random.rand() * 2)) * 0.5 + 0.5).astype(np.float32)
+    mix = 0.6 * base + 0.2 * noise + 0.2 * stripes
+    c1 = 0.7 * mix + 0.3 * (1 - mix)
+    c2 = np.clip(mix + 0.1 * np.random.randn(H, W).astype(np.float32), 0, 1)
+    return np.clip(np.stack([mix, c1, c2], axis=0), 0.0, 1.0).astype(np.float32)
+
+
+def make_jpegs(folder: str, count: int, w: int, h: int):
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, size=(h // 8, w // 8, 3), dtype=np.uint8)
+    for i in range(count):
+        img = Image.fromarray(np.roll(base, i, axis=1)).resize((w, h), Image.BILINEAR)
+        img.save(os.path.join(folder, f"{i:05d}.jpg"), quality=90)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Calibration data builder benchmark")
+    ap.add_argument("--calib-dir", type=str, default="")
+    ap.add_argument("--count", type=int, default=256)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--src-size", type=str, default="1280x720", help="size of the generated JPEGs")
+    ap.add_argument("--workers", type=int, default=0)
+    args = ap.parse_args()
+    H, W, n = args.height, args.width, args.count
+
+    with tempfile.TemporaryDirectory() as tmp:
+        calib_dir = args.calib_dir
+        if not calib_dir:
+            calib_dir = os.path.join(tmp, "images")
+            os.makedirs(calib_dir)
+            sw, sh = (int(v) for v in args.src_size.lower().split("x"))
+            make_jpegs(calib_dir, n, sw, sh)
+
+        mb = n * 3 * H * W * 4 / 1e6
+        print(f"{n} samples at {W}x{H} ({mb:.0f} MB float32), {args.workers or os.cpu_count()} workers")
+        print(f"{'builder':<28}{'seconds':>9}{'samples/s':>11}")
+
+        t_ref, ref = timed(lambda: legacy_load_calib_images(calib_dir, H, W, n))
+        print(f"{'legacy images':<28}{t_ref:9.2f}{len(ref) / t_ref:11.1f}")
+        t, mm = timed(lambda: load_calib_images(calib_dir, H, W, n, out_path=os.path.join(tmp, "calib.npy"),
+                                                workers=args.workers))
+        print(f"{'pool + memmap images':<28}{t:9.2f}{len(mm) / t:11.1f}   identical={np.array_equal(ref, mm)}")
+        del ref, mm
+
+        t, s = timed(lambda: np.stack([legacy_rand_img(H, W) for _ in range(n)], axis=0))
+        print(f"{'legacy synthetic':<28}{t:9.2f}{n / t:11.1f}")
+        del s
+        t, s = timed(lambda: build_synthetic_calib(H, W, n, seed=0, out_path=os.path.join(tmp, "synth.npy")))
+        print(f"{'chunked synthetic + memmap':<28}{t:9.2f}{n / t:11.1f}")
+        del s
+
+
+if __name__ == "__main__":
+    main()
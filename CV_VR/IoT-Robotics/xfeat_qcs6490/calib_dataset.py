@@ -0,0 +1,158 @@
+#===-- calib_dataset.py --------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Calibration data for XFeat quantization, as float32 [N,3,H,W] in [0,1].
+
+- Image folders are decoded and resized in a process pool. Each worker
+  writes its slice straight into a memory-mapped .npy, so no image is
+  pickled back to the parent and N is not limited by RAM.
+- Synthetic sets are generated a chunk of images at a time with
+  broadcasting instead of one image per Python iteration.
+- iter_calib_samples() yields [1,3,H,W] views of the memmap, so the
+  quantizer reads samples from disk as it consumes them.
+
+Without out_path the result is an in-memory array, as before.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+IMAGE_GLOBS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+
+# The pool may be created from a worker thread of a process that already
+# runs torch and other threads; forking such a process can deadlock on
+# locks those threads hold, so workers start from a clean process.
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def list_calib_images(calib_dir: str, max_images: int) -> List[Path]:
+    """Same selection order as before: per extension, sorted by name."""
+    p = Path(calib_dir)
+    files: List[Path] = []
+    for ext in IMAGE_GLOBS:
+        for f in sorted(p.glob(ext)):
+            files.append(f)
+            if len(files) >= max_images:
+                return files
+    return files
+
+
+def decode_image(path: str, H: int, W: int) -> np.ndarray:
+    img = Image.open(path).convert("RGB").resize((W, H))
+    arr = np.asarray(img, dtype=np.float32) / np.float32(255.0)   # [H,W,3]
+    return arr.transpose(2, 0, 1)                                 # [3,H,W]
+
+
+def _decode_into(out_path: str, start: int, files: List[str], H: int, W: int) -> int:
+    """Worker: decode files into rows [start, start+len(files)) of the .npy on disk."""
+    out = np.load(out_path, mmap_mode="r+")
+    for i, f in enumerate(files):
+        out[start + i] = decode_image(f, H, W)
+    out.flush()
+    del out
+    return len(files)
+
+
+def _open_output(out_path: Optional[str], shape) -> np.ndarray:
+    if out_path is None:
+        return np.empty(shape, np.float32)
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    return np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=shape)
+
+
+def load_calib_images(calib_dir: str, H: int, W: int, max_images: int = 64,
+                      out_path: Optional[str] = None, workers: int = 0, chunk: int = 16) -> np.ndarray:
+    """
+    Decode up to max_images into [N,3,H,W]. With out_path the array is a
+    memmap of that .npy, filled by `workers` processes (0 = all cores).
+    """
+    files = list_calib_images(calib_dir, max_images)
+    if not files:
+        raise FileNotFoundError(f"Calibration image directory is empty: {calib_dir}")
+    n = len(files)
+    workers = workers or os.cpu_count() or 1
+
+    if out_path is None or workers == 1 or n <= chunk:
+        batch = _open_output(out_path, (n, 3, H, W))
+        for i, f in enumerate(files):
+            batch[i] = decode_image(str(f), H, W)
+    else:
+        batch = _open_output(out_path, (n, 3, H, W))
+        batch.flush()   # header + size on disk before the workers open it
+        ctx = multiprocessing.get_context(_START_METHOD)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futs = [pool.submit(_decode_into, out_path, s, [str(f) for f in files[s:s + chunk]], H, W)
+                    for s in range(0, n, chunk)]
+            done = sum(f.result() for f in futs)
+        if done != n:
+            raise RuntimeError(f"Calibration decode wrote {done} of {n} images into {out_path}")
+    log(f"[Calib] Loaded {n} images from {calib_dir}" + (f" -> {out_path}" if out_path else ""))
+    return batch
+
+
+def _rand_img(H: int, W: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Synthesize natural-image-like samples (low-frequency gradient + noise + stripes) to better match real distributions."""
+    return _rand_imgs(1, H, W, rng if rng is not None else np.random.default_rng())[0]
+
+
+def _rand_imgs(k: int, H: int, W: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    k samples of _rand_img at once: [k,3,H,W] float32. Noise is drawn in
+    float32 and the stripes only vary along x, so they are computed per
+    column and broadcast over rows.
+    """
+    y = np.linspace(0, 1, H, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, W, dtype=np.float32)[None, :]
+    base = 0.6 * x + 0.4 * y                                                  # [H,W]
+
+    out = np.empty((3, k, H, W), np.float32)   # channel-major so each plane set is contiguous
+    mix = out[0]
+    rng.standard_normal((k, H, W), dtype=np.float32, out=mix)
+    lo = mix.min(axis=(1, 2), keepdims=True)
+    hi = mix.max(axis=(1, 2), keepdims=True)
+    mix -= lo
+    mix *= 0.2 * 0.15 / (hi - lo + 1e-6)                                      # 0.2 * noise
+    phase = rng.random((k, 1, 1), dtype=np.float32) * 2
+    mix += 0.2 * (np.sin(2 * np.pi * (x * 4 + phase)) * 0.5 + 0.5)            # 0.2 * stripes, [k,1,W]
+    mix += 0.6 * base
+
+    np.multiply(mix, 0.4, out=out[1])
+    out[1] += 0.3                                                             # 0.7 m + 0.3 (1 - m)
+    rng.standard_normal((k, H, W), dtype=np.float32, out=out[2])
+    out[2] *= 0.1
+    out[2] += mix
+    np.clip(out, 0.0, 1.0, out=out)
+    return out.transpose(1, 0, 2, 3)
+
+
+def build_synthetic_calib(H: int, W: int, count: int = 64, seed: Optional[int] = None,
+                          out_path: Optional[str] = None, chunk: int = 16) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    batch = _open_output(out_path, (count, 3, H, W))
+    for s in range(0, count, chunk):
+        k = min(chunk, count - s)
+        batch[s:s + k] = _rand_imgs(k, H, W, rng)
+    if out_path is not None:
+        batch.flush()
+    log(f"[Calib] Built synthetic calibration set: {batch.shape}")
+    return batch
+
+
+def iter_calib_samples(calib: np.ndarray, batch: int = 1) -> Iterator[np.ndarray]:
+    """[batch,3,H,W] views in order; on a memmap each view is read from disk only when used."""
+    for s in range(0, len(calib), batch):
+        yield calib[s:s + batch]
@@ -0,0 +1,94 @@
+#===-- keypoint_benchmark.py ---------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+#!/usr/bin/env python3
+"""
+Benchmark SuperPoint keypoint extraction on synthetic K1 tensors:
+  legacy : decode_superpoint_k1_to_heat + nms_peaks (per-frame allocations)
+  dense  : KeypointExtractor(mode="dense") (same output, reused buffers)
+  cell   : KeypointExtractor(mode="cell")  (cell-wise, no full-res heatmap)
+
+    python3 keypoint_benchmark.py --sizes 640x480 1280x720 --iters 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from superpoint_keypoints import KeypointExtractor, decode_superpoint_k1_to_heat, nms_peaks
+
+
+def synthetic_k1(w: int, h: int, cell: int, layout: str, seed: int = 0) -> np.ndarray:
+    """Dustbin-dominated logits with a random fraction of cells holding a corner."""
+    rng = np.random.default_rng(seed)
+    hc, wc = h // cell, w // cell
+    k1 = rng.normal(0.0, 1.0, size=(65, hc, wc)).astype(np.float32)
+    k1[64] += 4.0
+    corners = rng.random((hc, wc)) < 0.35
+    pos = rng.integers(0, 64, size=(hc, wc))
+    k1[pos, np.arange(hc)[:, None], np.arange(wc)[None, :]] += np.where(corners, rng.uniform(5.0, 9.0, (hc, wc)), 0.0)
+    k1 = k1[None]
+    return np.ascontiguousarray(k1.transpose(0, 2, 3, 1)) if layout == "nhwc" else k1
+
+
+def time_it(fn, iters: int, warmup: int = 5):
+    for _ in range(warmup):
+        fn()
+    lat = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        out = fn()
+        lat.append(time.perf_counter() - t0)
+    return np.asarray(lat) * 1000.0, out
+
+
+def recall(ref: np.ndarray, got: np.ndarray, radius: float = 1.5) -> float:
+    """Fraction of ref keypoints that have a got keypoint within radius px."""
+    if len(ref) == 0:
+        return 1.0
+    if len(got) == 0:
+        return 0.0
+    d = np.abs(ref[:, None, :2] - got[None, :, :2]).max(axis=2)
+    return float((d.min(axis=1) <= radius).mean())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SuperPoint decode + NMS benchmark")
+    ap.add_argument("--sizes", nargs="+", default=["640x480", "1280x720"])
+    ap.add_argument("--layouts", nargs="+", choices=["nchw", "nhwc"], default=["nchw", "nhwc"])
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--cell", type=int, default=8)
+    ap.add_argument("--threshold", type=float, default=0.15)
+    ap.add_argument("--nms", type=int, default=2)
+    ap.add_argument("--max-points", type=int, default=1500)
+    args = ap.parse_args()
+
+    print(f"{'size':<10}{'layout':<7}{'path':<8}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'kpts':>7}{'recall':>8}")
+    for size in args.sizes:
+        w, h = (int(v) for v in size.lower().split("x"))
+        for layout in args.layouts:
+            k1 = synthetic_k1(w, h, args.cell, layout)
+            dense = KeypointExtractor(args.cell, args.threshold, args.nms, args.max_points, mode="dense")
+            cell = KeypointExtractor(args.cell, args.threshold, args.nms, args.max_points, mode="cell")
+
+            runs = {
+                "legacy": lambda: nms_peaks(decode_superpoint_k1_to_heat(k1, args.cell),
+                                            args.threshold, args.nms, args.max_points),
+                "dense": lambda: dense.extract(k1)[0],
+                "cell": lambda: cell.extract(k1)[0],
+            }
+            ref = None
+            for name, fn in runs.items():
+                lat, peaks = time_it(fn, args.iters)
+                if ref is None:
+                    ref = peaks
+                print(f"{size:<10}{layout:<7}{name:<8}{lat.mean():9.3f}{np.percentile(lat, 50):9.3f}"
+                      f"{np.percentile(lat, 95):9.3f}{len(peaks):7d}{recall(ref, peaks):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
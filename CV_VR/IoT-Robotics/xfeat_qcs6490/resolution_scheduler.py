@@ -0,0 +1,158 @@
+#===-- resolution_scheduler.py -------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Adaptive input-resolution scheduler for the XFeat demos.
+
+The same network is compiled once per input size (e.g. 320x240, 480x360,
+640x480). Every size keeps its own interpreter; per frame the scheduler
+picks which one to run from the recent keypoint yield and latency:
+
+  - keypoints below --target_kp  -> step up, if the next size's latency
+                                    (measured, or extrapolated by pixel
+                                    count) still fits the budget
+  - keypoints comfortably above  -> step down, if the smaller size is
+    target (by --res_hysteresis)    expected to still reach the target
+  - latency over the budget      -> step down
+
+After each switch the scheduler stays on the new size for `dwell` frames
+so the estimates settle before the next decision. report() gives the
+per-size frame share, FPS and keypoints/s actually achieved.
+"""
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+
+class ResolutionScheduler:
+    def __init__(self, sizes: Sequence[Tuple[int, int]], target_kp: int = 600, budget_ms: float = 0.0,
+                 hysteresis: float = 0.25, dwell: int = 10, ema: float = 0.2, start: Optional[int] = None):
+        """
+        sizes: (w, h) per level, smallest first. budget_ms=0 disables the
+        latency constraint (keypoint yield alone decides).
+        """
+        if not sizes:
+            raise ValueError("ResolutionScheduler needs at least one input size")
+        areas = [w * h for w, h in sizes]
+        if areas != sorted(areas):
+            raise ValueError(f"sizes must be ordered smallest first, got {list(sizes)}")
+        self.sizes = [(int(w), int(h)) for w, h in sizes]
+        self.areas = [float(a) for a in areas]
+        self.target_kp = int(target_kp)
+        self.budget = budget_ms / 1000.0
+        self.hysteresis = float(hysteresis)
+        self.dwell = max(int(dwell), 1)
+        self.alpha = float(ema)
+
+        n = len(self.sizes)
+        self.cur = n - 1 if start is None else min(max(int(start), 0), n - 1)
+        self.since_switch = 0
+        self.switches = 0
+        self.lat_ema: List[Optional[float]] = [None] * n
+        self.kp_ema: List[Optional[float]] = [None] * n
+        self.frames = [0] * n
+        self.kp_sum = [0] * n
+        self.lat_sum = [0.0] * n
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.sizes) > 1
+
+    def pick(self) -> int:
+        """Level to run for the next frame."""
+        return self.cur
+
+    def _ema(self, old: Optional[float], new: float) -> float:
+        return new if old is None else (1.0 - self.alpha) * old + self.alpha * new
+
+    def est_latency(self, i: int) -> Optional[float]:
+        """Measured EMA latency of level i, else scaled by pixel count from the nearest measured level."""
+        if self.lat_ema[i] is not None:
+            return self.lat_ema[i]
+        known = [j for j, v in enumerate(self.lat_ema) if v is not None]
+        if not known:
+            return None
+        j = min(known, key=lambda k: abs(k - i))
+        return self.lat_ema[j] * self.areas[i] / self.areas[j]
+
+    def update(self, level: int, n_kp: int, seconds: float):
+        """
+        Record one processed frame (level may lag pick() by a frame in a
+        pipelined loop) and decide the level for the next frames.
+        """
+        with self._lock:
+            self.frames[level] += 1
+            self.kp_sum[level] += int(n_kp)
+            self.lat_sum[level] += seconds
+            self.lat_ema[level] = self._ema(self.lat_ema[level], seconds)
+            self.kp_ema[level] = self._ema(self.kp_ema[level], float(n_kp))
+            if level != self.cur or not self.enabled:
+                return
+            self.since_switch += 1
+            if self.since_switch < self.dwell:
+                return
+
+            i = self.cur
+            kp, lat = self.kp_ema[i], self.lat_ema[i]
+            nxt = i
+            if self.budget > 0 and lat > self.budget and i > 0:
+                nxt = i - 1
+            elif kp < self.target_kp and i + 1 < len(self.sizes):
+                est = self.est_latency(i + 1)
+                if self.budget <= 0 or est is None or est <= self.budget:
+                    nxt = i + 1
+            elif i > 0:
+                # keypoints grow roughly with pixel count; only drop when the smaller size keeps the target
+                kp_down = kp * self.areas[i - 1] / self.areas[i]
+                if kp_down >= self.target_kp * (1.0 + self.hysteresis):
+                    nxt = i - 1
+            if nxt != i:
+                self.cur = nxt
+                self.since_switch = 0
+                self.switches += 1
+
+    def size_str(self, i: Optional[int] = None) -> str:
+        w, h = self.sizes[self.cur if i is None else i]
+        return f"{w}x{h}"
+
+    def hud(self) -> str:
+        i = self.cur
+        lat = self.lat_ema[i]
+        kp = self.kp_ema[i]
+        return (f"res={self.size_str(i)} kp~{0 if kp is None else kp:.0f}/{self.target_kp} "
+                f"lat~{0 if lat is None else lat * 1000:.1f}ms sw={self.switches}")
+
+    def report(self) -> dict:
+        total = sum(self.frames)
+        levels = []
+        for i, (w, h) in enumerate(self.sizes):
+            n = self.frames[i]
+            mean_lat = self.lat_sum[i] / n if n else 0.0
+            mean_kp = self.kp_sum[i] / n if n else 0.0
+            levels.append({
+                "size": f"{w}x{h}", "frames": n, "share": n / total if total else 0.0,
+                "mean_ms": mean_lat * 1000.0, "fps": 1.0 / mean_lat if mean_lat > 0 else 0.0,
+                "mean_kp": mean_kp, "kp_per_s": mean_kp / mean_lat if mean_lat > 0 else 0.0,
+            })
+        lat_all = sum(self.lat_sum)
+        return {
+            "target_kp": self.target_kp, "budget_ms": self.budget * 1000.0, "switches": self.switches,
+            "frames": total, "mean_kp": sum(self.kp_sum) / total if total else 0.0,
+            "fps": total / lat_all if lat_all > 0 else 0.0,
+            "kp_per_s": sum(self.kp_sum) / lat_all if lat_all > 0 else 0.0,
+            "levels": levels,
+        }
+
+    def report_lines(self) -> List[str]:
+        r = self.report()
+        lines = [f"{'size':>9} {'frames':>7} {'share':>6} {'ms':>7} {'fps':>6} {'kp':>6} {'kp/s':>8}"]
+        for lv in r["levels"]:
+            lines.append(f"{lv['size']:>9} {lv['frames']:7d} {lv['share'] * 100:5.1f}% {lv['mean_ms']:7.2f} "
+                         f"{lv['fps']:6.1f} {lv['mean_kp']:6.0f} {lv['kp_per_s']:8.0f}")
+        lines.append(f"{'all':>9} {r['frames']:7d} {'':>6} {'':>7} {r['fps']:6.1f} {r['mean_kp']:6.0f} "
+                     f"{r['kp_per_s']:8.0f}   switches={r['switches']}")
+        return lines
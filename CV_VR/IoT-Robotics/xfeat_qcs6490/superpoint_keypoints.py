@@ -0,0 +1,271 @@
+#===-- superpoint_keypoints.py -------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+SuperPoint-style keypoint extraction from the XFeat K1 head (65 channels:
+64 positions of an 8x8 cell + dustbin), shared by the XFeat demos.
+
+Two paths:
+  - "dense": softmax over all channels, full-resolution heatmap, dilate-NMS.
+    Same output as decode_superpoint_k1_to_heat + nms_peaks, but decoded
+    into preallocated buffers.
+  - "cell":  works on the Hc x Wc cell grid and never builds the full
+    heatmap. Per cell only the best non-dustbin position is kept (score =
+    its softmax probability), NMS compares neighbouring cells only and the
+    final top-k uses argpartition. At most one keypoint per cell.
+
+Both return peaks as float32 [N, 3] = (x, y, score) in full-resolution
+heatmap pixels, score normalized to the frame maximum, strongest first.
+"""
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+import cv2
+
+
+# -----------------------------
+# Reference implementation
+# -----------------------------
+def softmax_channel(x: np.ndarray, axis=0):
+    x = x - np.max(x, axis=axis, keepdims=True)
+    ex = np.exp(x)
+    return ex / (np.sum(ex, axis=axis, keepdims=True) + 1e-12)
+
+
+def _k1_chw(k1_4d: np.ndarray) -> np.ndarray:
+    """[1,65,Hc,Wc] or [1,Hc,Wc,65] -> [65,Hc,Wc] view."""
+    if k1_4d.ndim != 4:
+        raise ValueError(f"k1 dims invalid: {k1_4d.shape}")
+    if k1_4d.shape[1] == 65:          # NCHW
+        return k1_4d[0]
+    if k1_4d.shape[3] == 65:          # NHWC
+        return np.transpose(k1_4d[0], (2, 0, 1))
+    raise ValueError(f"Cannot find 65-ch axis in {k1_4d.shape}")
+
+
+def decode_superpoint_k1_to_heat(k1_4d: np.ndarray, cell: int = 8) -> np.ndarray:
+    """
+    k1_4d: [1,65,Hc,Wc] (NCHW) or [1,Hc,Wc,65] (NHWC)
+    return: [Hc*cell, Wc*cell] full-res heatmap
+    """
+    k1 = _k1_chw(k1_4d)
+    c, hc, wc = k1.shape
+    assert c == (cell * cell + 1), f"expected 65 channels, got {c}"
+
+    prob = softmax_channel(k1, axis=0)       # [65,Hc,Wc]
+    p = prob[:cell * cell].reshape(cell, cell, hc, wc)
+    p = np.transpose(p, (2, 0, 3, 1))        # (Hc,8,Wc,8)
+    return p.reshape(hc * cell, wc * cell).astype(np.float32)
+
+
+def nms_peaks(heat2d: np.ndarray, thresh: float = 0.3, nms: int = 3, max_points: int = 1000):
+    h = heat2d.astype(np.float32)
+    mx = float(h.max()) if h.size else 0.0
+    if mx > 0:
+        h = h / (mx + 1e-6)
+    kernel = np.ones((2 * nms + 1, 2 * nms + 1), np.uint8)
+    dil = cv2.dilate(h, kernel)
+    peaks = (h >= thresh) & (h >= (dil - 1e-6))
+    ys, xs = np.where(peaks)
+    if ys.size == 0:
+        return np.zeros((0, 3), dtype=np.float32)
+    scores = h[ys, xs]
+    order = np.argsort(-scores)[:max_points]
+    return np.stack([xs[order].astype(np.float32), ys[order].astype(np.float32),
+                     scores[order].astype(np.float32)], axis=1)
+
+
+def reliability_map(reli_4d: Optional[np.ndarray], act: str = "sigmoid") -> Optional[np.ndarray]:
+    """[1,1,H,W] or [1,H,W,1] reliability logits -> [H,W] float32 in [0,1]."""
+    if reli_4d is None or not isinstance(reli_4d, np.ndarray) or reli_4d.ndim != 4:
+        return None
+    r = reli_4d[0, 0] if reli_4d.shape[1] == 1 else reli_4d[0, :, :, 0]
+    r = r.astype(np.float32)
+    if act == "sigmoid":
+        r = 1.0 / (1.0 + np.exp(-r))
+    elif act == "tanh":
+        r = np.tanh(r)
+    elif act == "relu":
+        r = np.maximum(r, 0.0)
+    return np.clip(r, 0.0, 1.0)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, strongest first."""
+    if scores.size > k:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.size)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+# -----------------------------
+# Buffered extractor
+# -----------------------------
+class KeypointExtractor:
+    """
+    Reusable keypoint extractor. Buffers are (re)allocated only when the
+    K1 grid size or layout changes, so steady-state frames only allocate
+    the small per-keypoint output arrays.
+    """
+
+    def __init__(self, cell: int = 8, threshold: float = 0.15, nms: int = 2,
+                 max_points: int = 1500, mode: str = "cell"):
+        if mode not in ("cell", "dense"):
+            raise ValueError(f"unknown keypoint mode: {mode}")
+        self.cell = cell
+        self.threshold = threshold
+        self.nms = nms
+        self.max_points = max_points
+        self.mode = mode
+        self._key = None  # K1 [65,Hc,Wc] shape the buffers were sized for
+        self._dense_norm = None
+        self._dense_dil = None
+        self._dil_kernel = np.ones((2 * nms + 1, 2 * nms + 1), np.uint8)
+
+    # ---- buffers ----
+    def _ensure(self, k1_4d: np.ndarray) -> np.ndarray:
+        """Copies K1 into the [65,Hc,Wc] float32 logit buffer (NHWC is transposed on copy)."""
+        k1 = _k1_chw(k1_4d)
+        if k1.shape != self._key:
+            self._allocate(k1.shape)
+            self._key = k1.shape
+        # channel reductions are much faster over the leading axis, so NHWC
+        # outputs are transposed once here instead of reducing the last axis
+        np.copyto(self.logits, k1, casting="unsafe")
+        return self.logits
+
+    def _allocate(self, shape):
+        c = self.cell
+        _, hc, wc = shape
+        self.hc, self.wc = hc, wc
+        self.heat_shape = (hc * c, wc * c)
+        self.logits = np.empty(shape, np.float32)
+        self.expbuf = np.empty(shape, np.float32)
+        self.cmax = np.empty((hc, wc), np.float32)
+        self.csum = np.empty((hc, wc), np.float32)
+        self.best = np.empty((hc, wc), np.float32)
+        self.score = np.empty((hc, wc), np.float32)
+        # cell-grid NMS works on padded copies so neighbour shifts are plain slices
+        r = self._nms_cells()
+        self.pad_score = np.full((hc + 2 * r, wc + 2 * r), -1.0, np.float32)
+        self.pad_x = np.zeros((hc + 2 * r, wc + 2 * r), np.float32)
+        self.pad_y = np.zeros((hc + 2 * r, wc + 2 * r), np.float32)
+        self.keep = np.empty((hc, wc), bool)
+        self.heat = np.empty(self.heat_shape, np.float32)
+
+    def _nms_cells(self) -> int:
+        return max(1, int(math.ceil(self.nms / float(self.cell)))) if self.nms > 0 else 0
+
+    def _softmax_parts(self, logits: np.ndarray):
+        """Per-cell max logit and sum(exp(l - max)) over all 65 channels."""
+        np.max(logits, axis=0, out=self.cmax)
+        np.subtract(logits, self.cmax[None], out=self.expbuf)
+        np.exp(self.expbuf, out=self.expbuf)
+        np.sum(self.expbuf, axis=0, out=self.csum)
+        self.csum += 1e-12
+
+    # ---- public API ----
+    def heatmap(self, k1_4d: np.ndarray) -> np.ndarray:
+        """Full-res heatmap (same values as decode_superpoint_k1_to_heat) in a reused buffer."""
+        logits = self._ensure(k1_4d)
+        self._softmax_parts(logits)
+        c = self.cell
+        self.expbuf /= self.csum[None]
+        p = self.expbuf[:c * c].reshape(c, c, self.hc, self.wc).transpose(2, 0, 3, 1)
+        np.copyto(self.heat.reshape(self.hc, c, self.wc, c), p)
+        return self.heat
+
+    def dense_peaks(self, heat2d: np.ndarray) -> np.ndarray:
+        """Dilate-NMS over a full-res heatmap (same output as nms_peaks)."""
+        if self._dense_norm is None or self._dense_norm.shape != heat2d.shape:
+            self._dense_norm = np.empty(heat2d.shape, np.float32)
+            self._dense_dil = np.empty(heat2d.shape, np.float32)
+        h = self._dense_norm
+        mx = float(heat2d.max()) if heat2d.size else 0.0
+        np.divide(heat2d, (mx + 1e-6) if mx > 0 else 1.0, out=h, casting="unsafe")
+        cv2.dilate(h, self._dil_kernel, dst=self._dense_dil)
+        self._dense_dil -= 1e-6
+        ys, xs = np.nonzero((h >= self.threshold) & (h >= self._dense_dil))
+        if ys.size == 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        scores = h[ys, xs]
+        order = _top_k(scores, self.max_points)
+        return np.stack([xs[order].astype(np.float32), ys[order].astype(np.float32),
+                         scores[order].astype(np.float32)], axis=1)
+
+    def cell_peaks(self, k1_4d: np.ndarray, reli2d: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cell-wise decode + NMS without building the full-res heatmap."""
+        logits = self._ensure(k1_4d)
+        self._softmax_parts(logits)
+        c = self.cell
+        pos = logits[:c * c]
+        np.max(pos, axis=0, out=self.best)
+
+        # probability of the best non-dustbin position: exp(best - max) / sum
+        np.subtract(self.best, self.cmax, out=self.score)
+        np.exp(self.score, out=self.score)
+        self.score /= self.csum
+        if reli2d is not None:
+            if reli2d.shape != (self.hc, self.wc):
+                reli2d = cv2.resize(reli2d, (self.wc, self.hc), interpolation=cv2.INTER_LINEAR)
+            self.score *= reli2d
+
+        mx = float(self.score.max()) if self.score.size else 0.0
+        if mx <= 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        self.score /= (mx + 1e-6)
+        np.greater_equal(self.score, self.threshold, out=self.keep)
+        iy, ix = np.nonzero(self.keep)
+        if iy.size == 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        scores = self.score[iy, ix]
+
+        # sub-cell position of the winner, only for cells above threshold
+        sub = np.argmax(pos[:, iy, ix], axis=0)
+        xs = (ix * c + sub % c).astype(np.float32)
+        ys = (iy * c + sub // c).astype(np.float32)
+
+        r = self._nms_cells()
+        if r:
+            self.pad_score.fill(-1.0)
+            py, px = iy + r, ix + r
+            self.pad_score[py, px] = scores
+            self.pad_x[py, px] = xs
+            self.pad_y[py, px] = ys
+            keep = np.ones(iy.size, bool)
+            for oy in range(-r, r + 1):
+                for ox in range(-r, r + 1):
+                    if oy == 0 and ox == 0:
+                        continue
+                    ny, nx = py + oy, px + ox
+                    # suppressed by a strictly stronger neighbour within the NMS window
+                    keep &= ~((self.pad_score[ny, nx] > scores)
+                              & (np.abs(self.pad_x[ny, nx] - xs) <= self.nms)
+                              & (np.abs(self.pad_y[ny, nx] - ys) <= self.nms))
+            xs, ys, scores = xs[keep], ys[keep], scores[keep]
+
+        order = _top_k(scores, self.max_points)
+        return np.stack([xs[order], ys[order], scores[order]], axis=1)
+
+    def extract(self, k1_4d: np.ndarray, reli2d: Optional[np.ndarray] = None,
+                blur: int = 0) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Keypoints from a K1 tensor using the configured mode.
+        Returns (peaks [N,3], full-res heatmap shape (H, W)).
+        blur only applies to the dense path.
+        """
+        if self.mode == "cell":
+            peaks = self.cell_peaks(k1_4d, reli2d)
+            return peaks, self.heat_shape
+        heat = self.heatmap(k1_4d)
+        if reli2d is not None:
+            heat *= cv2.resize(reli2d, (heat.shape[1], heat.shape[0]), interpolation=cv2.INTER_LINEAR)
+        if blur >= 3 and blur % 2 == 1:
+            cv2.GaussianBlur(heat, (blur, blur), 0.0, dst=heat)
+        return self.dense_peaks(heat), self.heat_shape
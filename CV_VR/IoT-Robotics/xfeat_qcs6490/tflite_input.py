@@ -0,0 +1,149 @@
+#===-- tflite_input.py ---------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+"""
+Direct image -> TFLite input tensor writer, shared by the XFeat demos.
+
+Every 8-bit pixel value maps to exactly one model input value, so the
+normalization (v * gain + bias per channel) and the input quantization
+(round(x / scale + zero_point), clipped to the dtype) are folded into a
+256-entry lookup table per channel, computed once. Each frame is then a
+single table lookup from the uint8 image straight into the interpreter's
+input buffer: no float32 image, no divide/round/cast passes, no extra copy
+through set_tensor().
+
+  uint8/int8 NHWC : cv2.LUT into the tensor (plain copy if the table is identity)
+  NCHW            : cv2.split into reused planes, then cv2.LUT per plane
+                    into the tensor (channel swap folded into the plane order)
+  float32/float16 : same tables, output dtype = table dtype
+"""
+from typing import Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+Number = Union[float, Sequence[float]]
+
+_DTYPE_RANGE = {
+    np.dtype(np.uint8): (0, 255),
+    np.dtype(np.int8): (-128, 127),
+    np.dtype(np.int16): (-32768, 32767),
+}
+
+
+def build_input_lut(dtype, quant: Tuple[float, int], gain: Number = 1.0 / 255.0,
+                    bias: Number = 0.0) -> np.ndarray:
+    """
+    [3, 256] table: pixel value v of channel c -> model input value.
+    quant is the input (scale, zero_point); scale 0 means "not quantized",
+    in which case 8-bit inputs take the normalized value x255 (uint8) or
+    x127 (int8), rounded to the nearest integer. With the default gain the
+    uint8 table is the identity, as in the previous float32 path.
+    """
+    dtype = np.dtype(dtype)
+    v = np.arange(256, dtype=np.float64)[None, :]
+    g = np.broadcast_to(np.asarray(gain, np.float64), (3,))[:, None]
+    b = np.broadcast_to(np.asarray(bias, np.float64), (3,))[:, None]
+    x = v * g + b                                   # [3,256] normalized input
+
+    if dtype.kind == "f":
+        return x.astype(dtype)
+
+    scale, zp = quant if quant else (0.0, 0)
+    if scale is None or scale == 0:
+        q = np.rint(x * (255.0 if dtype == np.uint8 else 127.0))
+    else:
+        q = np.rint(x / float(scale) + float(zp))
+    lo, hi = _DTYPE_RANGE.get(dtype, (np.iinfo(dtype).min, np.iinfo(dtype).max))
+    return np.clip(q, lo, hi).astype(dtype)
+
+
+class InputWriter:
+    """
+    Writes uint8 HxWx3 frames (already at the model resolution) into a
+    TFLite interpreter input.
+
+    channel_map[c] is the source channel feeding model channel c, e.g.
+    (2, 1, 0) for a BGR frame into an RGB model.
+    """
+
+    def __init__(self, interpreter, in_det: dict, layout: str, gain: Number = 1.0 / 255.0,
+                 bias: Number = 0.0, channel_map: Sequence[int] = (0, 1, 2)):
+        self.interpreter = interpreter
+        self.index = in_det["index"]
+        self.dtype = np.dtype(in_det["dtype"])
+        self.shape = tuple(int(s) for s in in_det["shape"])
+        self.layout = layout
+        self.channel_map = tuple(int(c) for c in channel_map)
+        self.lut = build_input_lut(self.dtype, in_det.get("quantization", (0.0, 0)), gain, bias)
+
+        # cv2.LUT wants [256,1,3]; it is applied after the channel swap, so row c = model channel c
+        self._lut_cv = np.ascontiguousarray(self.lut.T.reshape(256, 1, 3))
+        self._identity = (self.dtype == np.uint8
+                          and np.array_equal(self.lut, np.broadcast_to(np.arange(256, dtype=np.uint8), (3, 256))))
+        self._swap = None
+        if self.channel_map == (2, 1, 0):
+            self._swap = cv2.COLOR_BGR2RGB
+        elif self.channel_map != (0, 1, 2):
+            raise ValueError(f"channel_map must be (0,1,2) or (2,1,0), got {self.channel_map}")
+        self._scratch = None
+        self._planes = None
+
+        # Write into the interpreter's own buffer when the runtime exposes it,
+        # otherwise into a preallocated array handed to set_tensor().
+        self._buf = None
+        try:
+            interpreter.tensor(self.index)()
+            self.direct = True
+        except Exception:
+            self.direct = False
+            self._buf = np.zeros(self.shape, self.dtype)
+
+    def _target(self) -> np.ndarray:
+        return self.interpreter.tensor(self.index)() if self.direct else self._buf
+
+    def _swapped(self, img: np.ndarray) -> np.ndarray:
+        if self._swap is None:
+            return img
+        if self._scratch is None or self._scratch.shape != img.shape:
+            self._scratch = np.empty_like(img)
+        return cv2.cvtColor(img, self._swap, dst=self._scratch)
+
+    def write(self, img: np.ndarray):
+        """img: uint8 [H,W,3] at the model input resolution."""
+        if img.dtype != np.uint8 or img.ndim != 3 or img.shape[2] != 3:
+            raise ValueError(f"expected uint8 HxWx3 image, got {img.dtype} {img.shape}")
+        dst = self._target()[0]
+        if self.layout == "nchw":
+            if self._planes is None or self._planes[0].shape != img.shape[:2]:
+                self._planes = [np.empty(img.shape[:2], np.uint8) for _ in range(3)]
+            cv2.split(img, self._planes)
+            for c in range(3):
+                cv2.LUT(self._planes[self.channel_map[c]], self.lut[c], dst=dst[c])
+        elif self._identity:
+            if self._swap is None:
+                np.copyto(dst, img)
+            else:
+                cv2.cvtColor(img, self._swap, dst=dst)
+        else:
+            cv2.LUT(self._swapped(img), self._lut_cv, dst=dst)
+        # the interpreter refuses to invoke() while views of its buffers are alive
+        del dst
+        if not self.direct:
+            self.interpreter.set_tensor(self.index, self._buf)
+
+
+if __name__ == "__main__":
+    # Self-check: unquantized uint8 tables must reproduce the old float32
+    # path, (img.astype(float32) / 255 * 255).astype(uint8).
+    v = np.arange(256, dtype=np.uint8)
+    lut = build_input_lut(np.uint8, (0.0, 0))
+    for c in range(3):
+        assert np.array_equal(lut[c], v), f"uint8 table not identity in channel {c}"
+    old = (v.astype(np.float32) / 255.0 * 255.0).clip(0, 255).astype(np.uint8)
+    assert np.array_equal(lut[0], old)
+    print("tflite_input: uint8 input table OK")
@@ -21,6 +21,11 @@ from gi.repository import Gst, GLib
 # Visualization
 import cv2
 
+# SuperPoint decode + NMS (shared with the VSLAM demo)
+from superpoint_keypoints import KeypointExtractor, reliability_map
+from tflite_input import InputWriter
+from resolution_scheduler import ResolutionScheduler
+
 # ---------- Optional runtimes ----------
 LiteRTInterpreter = None
 TFLiteRuntime = None
@@ -80,39 +85,6 @@ def create_qnn_delegate(backend: str = "htp"):
             errors.append(f"{dotted}: {e}")
     raise RuntimeError("Failed to create QNN delegate.\n" + "\n".join(errors))
 
-# -----------------------------
-# SuperPoint decoding
-# -----------------------------
-def softmax_channel(x: np.ndarray, axis=0):
-    x = x - np.max(x, axis=axis, keepdims=True)
-    ex = np.exp(x)
-    return ex / (np.sum(ex, axis=axis, keepdims=True) + 1e-12)
-
-def decode_superpoint_k1_to_heat(k1_4d: np.ndarray, cell: int = 8) -> np.ndarray:
-    """
-    k1_4d: [1,65,Hc,Wc] (NCHW) or [1,Hc,Wc,65] (NHWC)
-    return: [Hc*cell, Wc*cell] full-res heatmap
-    """
-    if k1_4d.ndim != 4:
-        raise ValueError(f"k1 dims invalid: {k1_4d.shape}")
-
-    if k1_4d.shape[1] == 65:          # NCHW
-        k1 = k1_4d[0]                 # [65,Hc,Wc]
-    elif k1_4d.shape[3] == 65:        # NHWC
-        k1 = np.transpose(k1_4d[0], (2, 0, 1))  # -> [65,Hc,Wc]
-    else:
-        raise ValueError(f"Cannot find 65-ch axis in {k1_4d.shape}")
-
-    c, hc, wc = k1.shape
-    assert c == (cell*cell + 1), f"expected 65 channels, got {c}"
-
-    prob = softmax_channel(k1, axis=0)       # [65,Hc,Wc]
-    prob_no_dust = prob[:cell*cell]          # [64,Hc,Wc]
-    p = prob_no_dust.reshape(cell, cell, hc, wc)
-    p = np.transpose(p, (2, 0, 3, 1))        # (Hc,8,Wc,8)
-    full = p.reshape(hc*cell, wc*cell)       # (H,W)
-    return full
-
 # -----------------------------
 # GStreamer helpers
 # -----------------------------
@@ -206,42 +178,131 @@ def push_bgr_frame(appsrc, frame_bgr: np.ndarray, fps: int):
     buf.dts = rt
     return appsrc.emit("push-buffer", buf)
 
-def gst_sample_to_numpy(sample):
+# -----------------------------
+# Zero-copy frame buffers
+# -----------------------------
+class FramePool:
+    """Fixed ring of preallocated frames, reused instead of allocating one per frame."""
+    def __init__(self, count: int = 3):
+        self.count = count
+        self.frames = []
+        self.i = 0
+
+    def next(self, shape) -> np.ndarray:
+        if not self.frames or self.frames[0].shape != tuple(shape):
+            self.frames = [np.empty(shape, np.uint8) for _ in range(self.count)]
+        self.i = (self.i + 1) % self.count
+        return self.frames[self.i]
+
+def read_frame_into(cap, dst: np.ndarray) -> bool:
+    """cap.read() straight into dst; resized into it if the camera delivers another size."""
+    ok, frame = cap.read(dst)
+    if not ok or frame is None:
+        return False
+    if frame.ctypes.data != dst.ctypes.data:
+        cv2.resize(frame, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_LINEAR)
+    return True
+
+def _frame_view(data, width: int, height: int):
+    """HxWx3 uint8 view of mapped buffer memory, honouring row padding."""
+    mem = np.frombuffer(data, dtype=np.uint8)
+    stride = mem.size // max(height, 1)
+    if stride < width * 3:
+        return None
+    return mem[:height * stride].reshape(height, stride)[:, :width * 3].reshape(height, width, 3)
+
+def with_mapped_sample(sample, fn):
+    """
+    Map the sample's RGB buffer and call fn(view) on it in place. The view
+    is only valid inside fn: the buffer is unmapped on return, so fn must
+    copy out whatever it keeps.
+    """
     buf = sample.get_buffer()
-    caps = sample.get_caps()
-    s = caps.get_structure(0)
-    width = s.get_value('width')
-    height = s.get_value('height')
+    s = sample.get_caps().get_structure(0)
+    width, height = s.get_value('width'), s.get_value('height')
     ok, mapinfo = buf.map(Gst.MapFlags.READ)
     if not ok:
         return None
+    view = None
     try:
-        arr = np.frombuffer(mapinfo.data, dtype=np.uint8)
-        frame = arr.reshape((height, width, 3))
-        return frame
+        view = _frame_view(mapinfo.data, width, height)
+        return None if view is None else fn(view)
     finally:
+        view = None  # no NumPy export may outlive the mapping
         buf.unmap(mapinfo)
 
-# -----------------------------
-# NMS utils
-# -----------------------------
-def nms_peaks(heat2d: np.ndarray, thresh: float = 0.3, nms: int = 3, max_points: int = 1000):
-    h = heat2d.astype(np.float32)
-    mx = float(h.max()) if h.size else 0.0
-    if mx > 0:
-        h = h / (mx + 1e-6)
-    kernel = np.ones((2 * nms + 1, 2 * nms + 1), np.uint8)
-    dil = cv2.dilate(h, kernel)
-    peaks = (h >= thresh) & (h >= (dil - 1e-6))
-    ys, xs = np.where(peaks)
-    if ys.size == 0:
-        return np.zeros((0, 3), dtype=np.float32)
-    scores = h[ys, xs]
-    order = np.argsort(-scores)[:max_points]
-    xs = xs[order]
-    ys = ys[order]
-    scores = scores[order]
-    return np.stack([xs.astype(np.float32), ys.astype(np.float32), scores.astype(np.float32)], axis=1)
+class AppsrcPusher:
+    """
+    Feeds appsrc from a fixed Gst.BufferPool: each camera frame is read
+    directly into a mapped pool buffer, which returns to the pool once the
+    pipeline drops it. Falls back to push_bgr_frame() when the GStreamer
+    bindings only expose read-only copies of mapped memory.
+    """
+    def __init__(self, appsrc, width: int, height: int, fps: int, count: int = 4):
+        self.appsrc = appsrc
+        self.shape = (height, width, 3)
+        self.fps = fps
+        self.frames = FramePool(count)
+        caps = Gst.Caps.from_string(f"video/x-raw,format=BGR,width={width},height={height},framerate={fps}/1")
+        self.pool = Gst.BufferPool.new()
+        config = self.pool.get_config()
+        Gst.BufferPool.config_set_params(config, caps, width * height * 3, count, count)
+        self.pool.set_config(config)
+        self.pool.set_active(True)
+        self.zero_copy = self._probe_writable()
+
+    def _probe_writable(self) -> bool:
+        ret, buf = self.pool.acquire_buffer(None)
+        if ret != Gst.FlowReturn.OK:
+            return False
+        ok, mapinfo = buf.map(Gst.MapFlags.WRITE)
+        if not ok:
+            return False
+        try:
+            return not isinstance(mapinfo.data, bytes) and np.frombuffer(mapinfo.data, np.uint8).flags.writeable
+        finally:
+            buf.unmap(mapinfo)
+
+    def push(self, cap) -> bool:
+        if not self.zero_copy:
+            frame = self.frames.next(self.shape)
+            if not read_frame_into(cap, frame):
+                return False
+            push_bgr_frame(self.appsrc, frame, self.fps)
+            return True
+
+        ret, buf = self.pool.acquire_buffer(None)
+        if ret != Gst.FlowReturn.OK:
+            return False
+        ok, mapinfo = buf.map(Gst.MapFlags.WRITE)
+        if not ok:
+            return False
+        dst = None
+        try:
+            dst = np.frombuffer(mapinfo.data, np.uint8, count=int(np.prod(self.shape))).reshape(self.shape)
+            got = read_frame_into(cap, dst)
+        finally:
+            dst = None
+            buf.unmap(mapinfo)
+        if not got:
+            return False
+        buf.duration = Gst.SECOND // max(1, self.fps)
+        rt = self.appsrc.get_current_running_time()
+        buf.pts = rt
+        buf.dts = rt
+        self.appsrc.emit("push-buffer", buf)
+        return True
+
+    def close(self):
+        self.pool.set_active(False)
+
+def use_direct_ext_path(args, in_w: int, in_h: int) -> bool:
+    """Skip the appsrc -> GStreamer -> appsink round trip when it adds no hardware preproc."""
+    if args.ext_path != "auto":
+        return args.ext_path == "direct"
+    if not has_element("qtivtransform"):
+        return True   # the fallback pipeline is a CPU videoconvert only
+    return (args.width, args.height) == (in_w, in_h)   # nothing for the hardware scaler to do
 
 # -----------------------------
 # Interpreter selection (auto)
@@ -319,6 +380,24 @@ def pick_interpreter(model_path: str, backend: str, num_threads: int = 2):
     # tflite_runtime / TF CPU
     return try_tflite_runtime(model_path, "cpu", num_threads)
 
+# -----------------------------
+# Per-size models (adaptive resolution)
+# -----------------------------
+class ModelLevel:
+    """One compiled input size: its own interpreter and input writer, created once and reused."""
+    def __init__(self, path: str, backend: str, threads: int):
+        self.path = path
+        self.interpreter, self.runtime_kind, self.accel = pick_interpreter(path, backend, threads)
+        self.in_det = self.interpreter.get_input_details()[0]
+        self.out_dets = self.interpreter.get_output_details()
+        shape = list(self.in_det["shape"])
+        if len(shape) != 4:
+            raise ValueError(f"Unsupported input shape: {shape} ({path})")
+        self.nhwc = (shape[3] == 3)
+        self.in_h, self.in_w = (shape[1], shape[2]) if self.nhwc else (shape[2], shape[3])
+        self.resized = np.empty((self.in_h, self.in_w, 3), np.uint8)
+        self.writer = None
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -327,6 +406,14 @@ def main():
     ap.add_argument("--model", type=str, required=True)
     ap.add_argument("--backend", type=str, choices=["auto", "htp", "cpu"], default="auto")
     ap.add_argument("--threads", type=int, default=2)
+    ap.add_argument("--extra-models", type=str, nargs="*", default=[],
+                    help="Same network compiled at other input sizes; enables per-frame resolution scheduling")
+    ap.add_argument("--target-kp", type=int, default=600, help="Keypoint yield the scheduler aims for")
+    ap.add_argument("--budget-ms", type=float, default=0.0,
+                    help="Per-frame preprocess + invoke + decode budget in ms (0 = keypoint yield only)")
+    ap.add_argument("--res-hysteresis", type=float, default=0.25,
+                    help="Step down only if the smaller size is expected to exceed --target-kp by this fraction")
+    ap.add_argument("--res-dwell", type=int, default=10, help="Frames to stay on a size after switching")
 
     # Sources
     ap.add_argument("--src", type=str, choices=["qti", "ext", "v4l2"], default="ext")
@@ -335,6 +422,9 @@ def main():
     ap.add_argument("--width", type=int, default=1280)
     ap.add_argument("--height", type=int, default=720)
     ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--ext-path", type=str, choices=["auto", "gst", "direct"], default="auto",
+                    help="ext source: gst = appsrc -> qtivtransform -> appsink, direct = OpenCV frame straight "
+                         "into the interpreter; auto = direct unless hardware scaling is available and needed")
 
     # Preprocess
     ap.add_argument("--preproc", type=str, choices=["01", "imagenet", "none", "gray01"], default="01")
@@ -352,6 +442,8 @@ def main():
     ap.add_argument("--threshold", type=float, default=0.15)
     ap.add_argument("--nms", type=int, default=2)
     ap.add_argument("--max-points", type=int, default=1500)
+    ap.add_argument("--kp-mode", type=str, choices=["cell", "dense"], default="cell",
+                    help="cell: one keypoint per 8x8 cell, no full-res heatmap; dense: full heatmap + dilate NMS")
 
     # Display
     ap.add_argument("--show-heat", action="store_true")
@@ -359,45 +451,69 @@ def main():
     ap.add_argument("--debug", action="store_true")
     args = ap.parse_args()
 
-    # Init interpreter first (we need input dims for ext/qti preproc)
-    interpreter, runtime_kind, accel = pick_interpreter(args.model, args.backend, args.threads)
-    in_det = interpreter.get_input_details()[0]
-    out_dets = interpreter.get_output_details()
-    inp_index = in_det["index"]
-    inp_shape = list(in_det["shape"])
-    inp_dtype = in_det["dtype"]
-    if len(inp_shape) != 4:
-        log(f"[Error] Unsupported input shape: {inp_shape}")
+    # Init interpreters first (we need input dims for ext/qti preproc), one per compiled input size
+    try:
+        levels = [ModelLevel(p, args.backend, args.threads) for p in [args.model] + list(args.extra_models)]
+    except ValueError as e:
+        log(f"[Error] {e}")
         return 3
-    nhwc = (inp_shape[3] == 3)
-    in_h, in_w = (inp_shape[1], inp_shape[2]) if nhwc else (inp_shape[2], inp_shape[3])
+    main_level = levels[0]
+    runtime_kind, accel = main_level.runtime_kind, main_level.accel
+    in_det, out_dets = main_level.in_det, main_level.out_dets
 
     log(f"[Runtime] kind={runtime_kind}, accel={accel}, threads={args.threads}")
-    log(f"[TFLite] Input: index={inp_index}, shape={inp_shape}, dtype={inp_dtype}")
+    log(f"[TFLite] Input: index={in_det['index']}, shape={list(in_det['shape'])}, dtype={in_det['dtype']}")
     for i, od in enumerate(out_dets):
         q = od.get("quantization_parameters", {})
         log(f"[TFLite] Output[{i}]: index={od['index']}, shape={od['shape']}, dtype={od['dtype']} "
             f"(scale={q.get('scales')}, zp={q.get('zero_points')})")
 
-    # Init GStreamer
+    levels.sort(key=lambda lv: lv.in_w * lv.in_h)
+    sizes = [(lv.in_w, lv.in_h) for lv in levels]
+    if len(set(sizes)) != len(sizes):
+        log(f"[Error] --extra-models must all have different input sizes, got {sizes}")
+        return 3
+    sched = ResolutionScheduler(sizes, target_kp=args.target_kp, budget_ms=args.budget_ms,
+                                hysteresis=args.res_hysteresis, dwell=args.res_dwell,
+                                start=levels.index(main_level))
+    if sched.enabled:
+        log(f"[Info] adaptive resolution: sizes={[sched.size_str(i) for i in range(len(levels))]} "
+            f"target_kp={args.target_kp} budget={args.budget_ms:g}ms (0=none)")
+    # the source is scaled to the largest size; smaller sizes are resized from it on the CPU
+    in_w, in_h = levels[-1].in_w, levels[-1].in_h
+
+    # Init GStreamer (not needed at all for the direct ext path)
     Gst.init(None)
-    pipeline_str = build_gst_pipeline(args, in_w=in_w, in_h=in_h)
-    log(f"[GStreamer] Pipeline: {pipeline_str}")
-    pipeline = Gst.parse_launch(pipeline_str)
+    direct = args.src == "ext" and use_direct_ext_path(args, in_w, in_h)
+    pipeline = appsink = bus = pusher = None
+    if direct:
+        log("[Info] ext source: direct OpenCV -> interpreter path (no GStreamer round trip)")
+    else:
+        pipeline_str = build_gst_pipeline(args, in_w=in_w, in_h=in_h)
+        log(f"[GStreamer] Pipeline: {pipeline_str}")
+        pipeline = Gst.parse_launch(pipeline_str)
+
+        appsrc  = pipeline.get_by_name("mysrc")
+        appsink = pipeline.get_by_name("appsink")
+        preproc = pipeline.get_by_name("preproc")
 
-    appsrc  = pipeline.get_by_name("mysrc")
-    appsink = pipeline.get_by_name("appsink")
-    preproc = pipeline.get_by_name("preproc")
+        if appsink is None:
+            log("[Error] appsink not found.")
+            pipeline.set_state(Gst.State.NULL)
+            return 2
 
-    if appsink is None:
-        log("[Error] appsink not found.")
-        pipeline.set_state(Gst.State.NULL)
-        return 2
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
 
-    bus = pipeline.get_bus()
-    bus.add_signal_watch()
+        pipeline.set_state(Gst.State.PLAYING)
 
-    pipeline.set_state(Gst.State.PLAYING)
+        # Update preproc destination to model input size
+        if preproc is not None:
+            try:
+                preproc.set_property("destination", f"<0,0,{in_w},{in_h}>")
+                log(f"[Gst] preproc.destination set to <0,0,{in_w},{in_h}>")
+            except Exception as e:
+                log(f"[Warn] set preproc.destination failed: {e}")
 
     # OpenCV source for ext
     cap = None
@@ -405,19 +521,15 @@ def main():
         cap = cv2.VideoCapture(args.cam_index)
         if not cap.isOpened():
             log(f"[Error] Cannot open camera index {args.cam_index}")
-            pipeline.set_state(Gst.State.NULL)
+            if pipeline is not None:
+                pipeline.set_state(Gst.State.NULL)
             return 1
         cap.set(cv2.CAP_PROP_FRAME_WIDTH,  args.width)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
         cap.set(cv2.CAP_PROP_FPS,          args.fps)
-
-    # Update preproc destination to model input size
-    if preproc is not None:
-        try:
-            preproc.set_property("destination", f"<0,0,{in_w},{in_h}>")
-            log(f"[Gst] preproc.destination set to <0,0,{in_w},{in_h}>")
-        except Exception as e:
-            log(f"[Warn] set preproc.destination failed: {e}")
+        if not direct and appsrc is not None:
+            pusher = AppsrcPusher(appsrc, args.width, args.height, args.fps)
+            log(f"[Gst] appsrc buffer pool: {'zero-copy capture into pool buffers' if pusher.zero_copy else 'copy (read-only map)'}")
 
     # Display window
     show = True
@@ -428,6 +540,43 @@ def main():
         log("[Warn] OpenCV window creation failed. Running headless.")
         show = False
 
+    extractor = KeypointExtractor(args.cell, args.threshold, args.nms, args.max_points, mode=args.kp_mode)
+
+    # Normalization + input quantization folded into per-channel uint8 lookup tables
+    if args.preproc == "imagenet":
+        mean = np.array([0.485, 0.456, 0.406], dtype=np.float64)
+        std = np.array([0.229, 0.224, 0.225], dtype=np.float64)
+        gain, bias = 1.0 / (255.0 * std), -mean / std
+    elif args.preproc == "none":
+        gain, bias = 1.0, 0.0
+    else:
+        gain, bias = 1.0 / 255.0, 0.0
+    # frames arrive as BGR on the direct path and RGB from appsink
+    src_order = "bgr" if direct else "rgb"
+    for lv in levels:
+        lv.writer = InputWriter(lv.interpreter, lv.in_det, "nhwc" if lv.nhwc else "nchw", gain=gain, bias=bias,
+                                channel_map=(0, 1, 2) if args.color_order == src_order else (2, 1, 0))
+        log(f"[TFLite] Input writer {lv.in_w}x{lv.in_h}: dtype={lv.writer.dtype}, "
+            f"quant={lv.in_det.get('quantization')}, direct={'tensor buffer' if lv.writer.direct else 'set_tensor'}")
+    frames = FramePool(3)
+    to_gray = cv2.COLOR_BGR2GRAY if direct else cv2.COLOR_RGB2GRAY
+
+    def feed(img: np.ndarray, lv: ModelLevel):
+        """uint8 frame -> interpreter input tensor (no float copy)."""
+        if args.preproc == "gray01":
+            img = cv2.cvtColor(cv2.cvtColor(img, to_gray), cv2.COLOR_GRAY2RGB)
+        if (img.shape[1] != lv.in_w) or (img.shape[0] != lv.in_h):
+            img = cv2.resize(img, (lv.in_w, lv.in_h), dst=lv.resized, interpolation=cv2.INTER_LINEAR)
+        lv.writer.write(img)
+
+    def feed_mapped(view: np.ndarray, lv: ModelLevel) -> np.ndarray:
+        """Runs on the mapped appsink buffer: fill the input tensor, copy out the display frame."""
+        feed(view, lv)
+        return cv2.cvtColor(view, cv2.COLOR_RGB2BGR, dst=frames.next(view.shape))
+
+    if args.kp_mode == "cell" and args.blur >= 3:
+        log("[Info] --blur only applies to --kp-mode dense")
+
     # Main loop
     try:
         last_fps = 0.0
@@ -435,70 +584,41 @@ def main():
         frames_since_update = 0
 
         while True:
-            # ext: push BGR frames via appsrc
-            if args.src == "ext" and appsrc is not None:
-                ok, frame_bgr = cap.read()
-                if not ok:
-                    break
-                if (frame_bgr.shape[1] != args.width) or (frame_bgr.shape[0] != args.height):
-                    frame_bgr = cv2.resize(frame_bgr, (args.width, args.height), interpolation=cv2.INTER_LINEAR)
-                _ = push_bgr_frame(appsrc, frame_bgr, args.fps)
-
-            # pull RGB frame
-            sample = appsink.emit("try_pull_sample", int(0.5 * Gst.SECOND))
-            if sample is None:
-                msg = bus.timed_pop_filtered(0, Gst.MessageType.ERROR | Gst.MessageType.EOS)
-                if msg is not None:
-                    if msg.type == Gst.MessageType.ERROR:
-                        err, debug = msg.parse_error()
-                        log(f"[GStreamer Error] {err}, debug={debug}")
-                    else:
-                        log("[GStreamer] EOS")
+            level = sched.pick()
+            lv = levels[level]
+            if direct:
+                # ext direct: camera frame straight into a pooled array, then into the input tensor
+                disp_bgr = frames.next((args.height, args.width, 3))
+                if not read_frame_into(cap, disp_bgr):
                     break
-                continue
-
-            frame_rgb = gst_sample_to_numpy(sample)
-            if frame_rgb is None:
-                continue
-
-            # ---- preprocess ----
-            img = frame_rgb  # RGB
-            if args.preproc == "gray01":
-                g = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-                img = np.stack([g, g, g], axis=-1)
-            if args.color_order == "bgr":
-                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-            if (img.shape[1] != in_w) or (img.shape[0] != in_h):
-                img = cv2.resize(img, (in_w, in_h), interpolation=cv2.INTER_LINEAR)
-
-            if args.preproc == "01":
-                img_f = img.astype(np.float32) / 255.0
-            elif args.preproc == "imagenet":
-                img_f = img.astype(np.float32) / 255.0
-                mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-                std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-                img_f = (img_f - mean) / std
-            elif args.preproc == "none":
-                img_f = img.astype(np.float32)
-            elif args.preproc == "gray01":
-                img_f = img.astype(np.float32) / 255.0
+                t_lv = time.perf_counter()
+                feed(disp_bgr, lv)
             else:
-                img_f = img.astype(np.float32) / 255.0
+                # ext: push BGR frames via appsrc
+                if pusher is not None and not pusher.push(cap):
+                    break
 
-            if inp_dtype == np.uint8:
-                tin = (img_f * 255.0).clip(0, 255).astype(np.uint8)
-            else:
-                tin = img_f.astype(np.float32)
+                # pull RGB frame
+                sample = appsink.emit("try_pull_sample", int(0.5 * Gst.SECOND))
+                if sample is None:
+                    msg = bus.timed_pop_filtered(0, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+                    if msg is not None:
+                        if msg.type == Gst.MessageType.ERROR:
+                            err, debug = msg.parse_error()
+                            log(f"[GStreamer Error] {err}, debug={debug}")
+                        else:
+                            log("[GStreamer] EOS")
+                        break
+                    continue
 
-            if nhwc:
-                tin = tin[None, ...]
-            else:
-                tin = np.transpose(tin, (2, 0, 1))[None, ...]
+                t_lv = time.perf_counter()
+                disp_bgr = with_mapped_sample(sample, lambda view: feed_mapped(view, lv))
+                if disp_bgr is None:
+                    continue
 
             # ---- inference ----
-            interpreter.set_tensor(inp_index, tin)
-            interpreter.invoke()
-            raw_outs = [interpreter.get_tensor(od["index"]) for od in out_dets]
+            lv.interpreter.invoke()
+            raw_outs = [lv.interpreter.get_tensor(od["index"]) for od in lv.out_dets]
 
             # ---- pick K1/H1 ----
             k1_4d = raw_outs[args.k1_idx] if args.k1_idx >= 0 else None
@@ -521,34 +641,14 @@ def main():
             if k1_4d is None:
                 raise RuntimeError("Could not find a 65-channel K1 output; specify it explicitly via --k1-idx.")
 
-            # ---- SuperPoint decode ----
-            heat2d = decode_superpoint_k1_to_heat(k1_4d, cell=args.cell)
-
-            # reliability weighting
-            if args.use_reli and (h1_4d is not None):
-                if h1_4d.shape[1] == 1:
-                    reli = h1_4d[0, 0, :, :]
-                else:
-                    reli = h1_4d[0, :, :, 0]
-                if args.reli_act == "sigmoid":
-                    reli = 1.0 / (1.0 + np.exp(-reli))
-                elif args.reli_act == "tanh":
-                    reli = np.tanh(reli)
-                elif args.reli_act == "relu":
-                    reli = np.maximum(reli, 0.0)
-                reli = cv2.resize(reli, (heat2d.shape[1], heat2d.shape[0]), interpolation=cv2.INTER_LINEAR)
-                heat2d *= np.clip(reli, 0.0, 1.0)
-
-            if args.blur >= 3 and args.blur % 2 == 1:
-                heat2d = cv2.GaussianBlur(heat2d, (args.blur, args.blur), 0.0)
-
-            # ---- NMS ----
-            peaks = nms_peaks(heat2d, thresh=args.threshold, nms=args.nms, max_points=args.max_points)
+            # ---- SuperPoint decode + NMS ----
+            reli = reliability_map(h1_4d, args.reli_act) if args.use_reli else None
+            peaks, (H_full, W_full) = extractor.extract(k1_4d, reli, blur=args.blur)
+            sched.update(level, len(peaks), time.perf_counter() - t_lv)
 
             # ---- draw ----
-            disp_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
             if args.show_heat:
-                h = heat2d.copy()
+                h = extractor.heatmap(k1_4d).copy()
                 h -= h.min()
                 if h.max() > 0:
                     h /= h.max()
@@ -558,8 +658,7 @@ def main():
                 disp_bgr = cv2.addWeighted(disp_bgr, 1.0, hm, 0.35, 0.0)
 
             # map points back to display size
-            H_full, W_full = heat2d.shape[:2]
-            H_show, W_show = frame_rgb.shape[:2]
+            H_show, W_show = disp_bgr.shape[:2]
             sx, sy = W_show / float(W_full), H_show / float(H_full)
             for xh, yh, sc in peaks:
                 x_img = int((xh + 0.5) * sx)
@@ -577,6 +676,9 @@ def main():
             hud = f"{runtime_kind}({accel}) | FPS: {last_fps:.1f} | Pts: {len(peaks)}"
             cv2.putText(disp_bgr, hud, (10, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
                         (0, 255, 255), 2, cv2.LINE_AA)
+            if sched.enabled:
+                cv2.putText(disp_bgr, sched.hud(), (10, 56), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                            (0, 255, 255), 2, cv2.LINE_AA)
 
             if show:
                 cv2.imshow(args.window, disp_bgr)
@@ -587,12 +689,19 @@ def main():
     except KeyboardInterrupt:
         pass
     finally:
-        pipeline.set_state(Gst.State.NULL)
+        if pipeline is not None:
+            pipeline.set_state(Gst.State.NULL)
+        if pusher is not None:
+            pusher.close()
         if cap: cap.release()
         try:
             cv2.destroyAllWindows()
         except Exception:
             pass
+        if sched.enabled:
+            log("[Info] resolution trade-off (preprocess + invoke + decode per frame):")
+            for line in sched.report_lines():
+                log(f"  {line}")
 
     return 0
 
@@ -10,13 +10,16 @@
 
 import os
 import sys
+import json
 import shutil
+import hashlib
 import zipfile
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-from PIL import Image
 
 import torch
 import torch.nn as nn
@@ -27,6 +30,9 @@ import onnxruntime as ort
 
 import qai_hub as hub  # Qualcomm AI Hub Python SDK
 
+# Calibration set builder (process-pool decode into memory-mapped .npy)
+from calib_dataset import _rand_img, build_synthetic_calib, iter_calib_samples, load_calib_images
+
 
 # ------------------------------
 # Logger
@@ -35,6 +41,83 @@ def log(msg: str) -> None:
     print(msg, flush=True)
 
 
+# ------------------------------
+# Content-addressed artifact cache
+# ------------------------------
+# Bump when the export wrapper or the local ONNX fixes change, so stale artifacts are not reused.
+EXPORT_VERSION = 1
+ONNX_FIX_VERSION = 1
+
+
+def sha256_json(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def hash_module_weights(module: nn.Module) -> str:
+    h = hashlib.sha256()
+    for name, t in sorted(module.state_dict().items()):
+        a = t.detach().cpu().contiguous().numpy()
+        h.update(f"{name}|{a.dtype}|{a.shape}".encode("utf-8"))
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def hash_file(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(chunk), b""):
+            h.update(b)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Stage outputs stored under <root>/<stage>/<key>/, where key is the hash
+    of everything the stage depends on (upstream keys, options, versions).
+    An entry counts only once its manifest.json exists; the manifest is
+    written last, so an interrupted stage is simply rebuilt next time.
+    """
+
+    def __init__(self, root: str, enabled: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+
+    def key(self, stage: str, **parts) -> str:
+        return sha256_json({"stage": stage, **parts})[:24]
+
+    def entry(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def get(self, stage: str, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        man = self.entry(stage, key) / "manifest.json"
+        if not man.exists():
+            return None
+        meta = json.loads(man.read_text())
+        if not all((man.parent / f).exists() for f in meta.get("files", [])):
+            return None
+        log(f"[Cache] hit  {stage}/{key}")
+        return meta
+
+    def begin(self, stage: str, key: str) -> Path:
+        """Fresh, empty directory for building an entry."""
+        d = self.entry(stage, key)
+        if d.exists():
+            shutil.rmtree(d)
+        d.mkdir(parents=True)
+        log(f"[Cache] miss {stage}/{key}")
+        return d
+
+    def put(self, stage: str, key: str, files: List[str], **meta) -> dict:
+        d = self.entry(stage, key)
+        manifest = {"stage": stage, "key": key, "files": files, **meta}
+        tmp = d / "manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest, indent=2, default=str))
+        os.replace(tmp, d / "manifest.json")
+        return manifest
+
+
 # ------------------------------
 # AI Hub model saving (SDK compatibility)
 # ------------------------------
@@ -88,56 +171,6 @@ def save_hub_model(model_obj, path: str) -> str:
     raise RuntimeError("Unable to save AI Hub model: no usable saving method/field found.")
 
 
-# ------------------------------
-# Calibration data utilities
-# ------------------------------
-def load_calib_images(calib_dir: str, H: int, W: int, max_images: int = 64) -> np.ndarray:
-    p = Path(calib_dir)
-    imgs: List[np.ndarray] = []
-    for ext in ("*.jpg", "*.jpeg", "*.png", "*.bmp"):
-        for f in sorted(p.glob(ext)):
-            img = Image.open(f).convert("RGB").resize((W, H))
-            arr = np.asarray(img).astype(np.float32) / 255.0  # [H,W,3]
-            arr = np.transpose(arr, (2, 0, 1))               # [3,H,W]
-            imgs.append(arr)
-            if len(imgs) >= max_images:
-                break
-        if len(imgs) >= max_images:
-            break
-    if not imgs:
-        raise FileNotFoundError(f"Calibration image directory is empty: {calib_dir}")
-    batch = np.stack(imgs, axis=0)  # [N,3,H,W]
-    log(f"[Calib] Loaded {len(batch)} images from {calib_dir}")
-    return batch
-
-
-def _rand_img(H: int, W: int) -> np.ndarray:
-    """Synthesize natural-image-like samples (low-frequency gradient + noise + stripes) to better match real distributions."""
-    y = np.linspace(0, 1, H, dtype=np.float32)
-    x = np.linspace(0, 1, W, dtype=np.float32)
-    xv, yv = np.meshgrid(x, y)
-
-    base = 0.6 * xv + 0.4 * yv
-    noise = np.random.randn(H, W).astype(np.float32)
-    noise = (noise - noise.min()) / (noise.max() - noise.min() + 1e-6)
-    noise = 0.15 * noise
-    stripes = (np.sin(2 * np.pi * (xv * 4 + np.random.rand() * 2)) * 0.5 + 0.5).astype(np.float32)
-    mix = 0.6 * base + 0.2 * noise + 0.2 * stripes
-
-    c0 = mix
-    c1 = 0.7 * mix + 0.3 * (1 - mix)
-    c2 = np.clip(mix + 0.1 * np.random.randn(H, W).astype(np.float32), 0, 1)
-    img = np.stack([c0, c1, c2], axis=0)  # [3,H,W]
-    return np.clip(img, 0.0, 1.0).astype(np.float32)
-
-
-def build_synthetic_calib(H: int, W: int, count: int = 64) -> np.ndarray:
-    arrs = [_rand_img(H, W) for _ in range(count)]
-    batch = np.stack(arrs, axis=0)
-    log(f"[Calib] Built synthetic calibration set: {batch.shape}")
-    return batch
-
-
 # ------------------------------
 # Build XFeat via torch.hub (using official pretrained weights)
 # ------------------------------
@@ -284,9 +317,10 @@ def to_torchscript(wrapper: nn.Module, input_shape=(1, 3, 480, 640)) -> torch.ji
 
 # ------------------------------
 # AI Hub compile: TorchScript -> ONNX (cloud)
-# Returns (hub.Model or None, error_message or "")
+# Returns (hub.Model or None, error_message or "", job_id)
 # ------------------------------
 def aihub_compile_ts_to_onnx(ts_model, device_name: str, input_shape, job_name="xfeat_compile_to_onnx"):
+    job_id = None
     try:
         device = hub.Device(device_name)
         job = hub.submit_compile_job(
@@ -308,7 +342,7 @@ def aihub_compile_ts_to_onnx(ts_model, device_name: str, input_shape, job_name="
         job.wait()
         model = job.get_target_model()
         if model is None:
-            return None, "AI Hub compile returned no model (failed remotely)."
+            return None, "AI Hub compile returned no model (failed remotely).", job_id
         log("[AI Hub] Compile job completed.")
         return model, "", job_id
     except Exception as e:
@@ -465,7 +499,8 @@ def aihub_quantize_and_compile_tflite(onnx_model_or_path, device_name: str,
     device = hub.Device(device_name)
 
     log("[AI Hub] Submitting quantize job (INT8)...")
-    calib_list = [im[np.newaxis, ...] for im in calib_np_batch]  # (1,3,H,W)
+    # (1,3,H,W) views; with a memmapped batch each sample is read from disk as the SDK consumes it
+    calib_list = list(iter_calib_samples(calib_np_batch))
     quant_job = hub.submit_quantize_job(
         model=onnx_model_or_path,
         calibration_data={"images": calib_list},
@@ -528,6 +563,7 @@ def aihub_profile_and_inference_tflite(tflite_model, device_name: str, height, w
     )
     prof_job.wait()
     log("[AI Hub] Profile done.")
+    prof_id = getattr(prof_job, "id", None) or getattr(prof_job, "job_id", None)
 
     log("[AI Hub] Submitting Inference job ...")
     arrs = [_rand_img(height, width) for _ in range(calib_count)]
@@ -543,6 +579,126 @@ def aihub_profile_and_inference_tflite(tflite_model, device_name: str, height, w
     )
     infer_job.wait()
     log("[AI Hub] Inference done.")
+    infer_id = getattr(infer_job, "id", None) or getattr(infer_job, "job_id", None)
+    return {"profile_job": prof_id, "inference_job": infer_id}
+
+# ------------------------------
+# Cached stages
+# ------------------------------
+def _parse_resolution(text: str) -> Tuple[int, int]:
+    w, h = (int(v) for v in text.lower().split("x"))
+    return h, w
+
+
+def stage_hub_onnx(cache: ArtifactCache, wrapper: nn.Module, trace_lock: threading.Lock,
+                   weights_key: str, H: int, W: int, device_name: str) -> Tuple[str, str]:
+    """TorchScript trace + cloud TorchScript->ONNX compile. Returns (raw onnx path, key)."""
+    key = cache.key("hub_onnx", weights=weights_key, height=H, width=W, device=device_name,
+                    export=EXPORT_VERSION, torch=torch.__version__)
+    name = "xfeat_from_aihub.onnx"
+    if cache.get("hub_onnx", key) is not None:
+        return str(cache.entry("hub_onnx", key) / name), key
+
+    d = cache.begin("hub_onnx", key)
+    # tracing shares the wrapper module; keep it to one thread at a time
+    with trace_lock:
+        ts = to_torchscript(wrapper, input_shape=(1, 3, H, W))
+
+    log(f"[AI Hub] Trying TorchScript -> ONNX compile in the cloud ({W}x{H}) ...")
+    onnx_model, err, job_id = aihub_compile_ts_to_onnx(
+        ts_model=ts,
+        device_name=device_name,
+        input_shape=(1, 3, H, W),
+    )
+    if onnx_model is None:
+        raise RuntimeError(err or "AI Hub compile failed: Unknown error")
+
+    onnx_raw_path = str(d / name)
+    save_hub_model(onnx_model, onnx_raw_path)
+    print(f"[AI Hub] Saved ONNX from Hub: {onnx_raw_path}")
+    unzip_onnx_model(onnx_raw_path, job_id, str(d))
+
+    files = [name] + (["model.data"] if (d / "model.data").exists() else [])
+    cache.put("hub_onnx", key, files, job_id=job_id, height=H, width=W)
+    return onnx_raw_path, key
+
+
+def stage_clean_onnx(cache: ArtifactCache, onnx_raw_path: str, hub_key: str) -> Tuple[str, str]:
+    """Local ONNX fixes. Returns (clean onnx path, key)."""
+    key = cache.key("clean_onnx", hub_onnx=hub_key, fixes=ONNX_FIX_VERSION, onnx=onnx.__version__)
+    name = "xfeat_clean.onnx"
+    if cache.get("clean_onnx", key) is not None:
+        return str(cache.entry("clean_onnx", key) / name), key
+
+    d = cache.begin("clean_onnx", key)
+    onnx_noIN_path = decompose_instance_norm(onnx_raw_path, str(d / "xfeat_no_instance_norm.onnx"))
+    onnx_clean_path = remove_trivial_unsqueeze(onnx_noIN_path, str(d / name))
+    cache.put("clean_onnx", key, [name])
+    return onnx_clean_path, key
+
+
+def stage_calibration(cache: ArtifactCache, args, H: int, W: int) -> Tuple[str, str]:
+    """Calibration batch as .npy. Returns (path, content hash)."""
+    if args.calib_mode == "dir":
+        if not args.calib_dir:
+            raise ValueError("--calib_dir not specified (calib_mode=dir)")
+        p = Path(args.calib_dir)
+        listing = [(f.name, f.stat().st_size, f.stat().st_mtime_ns)
+                   for ext in ("*.jpg", "*.jpeg", "*.png", "*.bmp") for f in sorted(p.glob(ext))]
+        source = {"dir": str(p.resolve()), "files": listing}
+    else:
+        source = {"seed": args.calib_seed}
+    key = cache.key("calib", mode=args.calib_mode, source=source, count=args.calib_count, height=H, width=W)
+    name = "calib.npy"
+    meta = cache.get("calib", key)
+    if meta is not None:
+        return str(cache.entry("calib", key) / name), meta["sha256"]
+
+    d = cache.begin("calib", key)
+    path = str(d / name)
+    if args.calib_mode == "dir":
+        calib = load_calib_images(args.calib_dir, H, W, max_images=args.calib_count,
+                                  out_path=path, workers=args.calib_workers)
+    else:
+        calib = build_synthetic_calib(H, W, count=args.calib_count, seed=args.calib_seed, out_path=path)
+    del calib   # flushes the memmap
+    digest = hash_file(path)
+    cache.put("calib", key, [name], sha256=digest, shape=list(np.load(path, mmap_mode="r").shape))
+    return path, digest
+
+
+def stage_tflite(cache: ArtifactCache, clean_path: str, clean_key: str, precision: str,
+                 calib: Optional[Tuple[str, str]], device_name: str, job_prefix: str) -> Tuple[str, str, bool]:
+    """Quantize/compile on AI Hub. Returns (tflite path in cache, key, cache hit)."""
+    key = cache.key("tflite", clean_onnx=clean_key, precision=precision, device=device_name,
+                    calib=calib[1] if precision == "int8" else None)
+    meta = cache.get("tflite", key)
+    if meta is not None:
+        return str(cache.entry("tflite", key) / meta["files"][0]), key, True
+
+    d = cache.begin("tflite", key)
+    if precision == "fp32":
+        # No quantization: compile to FP32 TFLite (typically runs on CPU/GPU)
+        tfl_path, _ = aihub_compile_fp32_tflite(onnx.load(clean_path), device_name, str(d),
+                                                job_prefix=f"{job_prefix}_fp32")
+    else:
+        tfl_path, _ = aihub_quantize_and_compile_tflite(onnx.load(clean_path), device_name,
+                                                        np.load(calib[0], mmap_mode="r"), str(d),
+                                                        job_prefix=job_prefix)
+    cache.put("tflite", key, [Path(tfl_path).name], precision=precision)
+    return tfl_path, key, False
+
+
+def stage_profile(cache: ArtifactCache, tfl_path: str, tflite_key: str, device_name: str,
+                  H: int, W: int, count: int) -> dict:
+    key = cache.key("profile", tflite=tflite_key, device=device_name, count=count)
+    meta = cache.get("profile", key)
+    if meta is not None:
+        return meta
+    cache.begin("profile", key)
+    jobs = aihub_profile_and_inference_tflite(tfl_path, device_name, H, W, count)
+    return cache.put("profile", key, [], **jobs)
+
 
 # ------------------------------
 # Main
@@ -553,15 +709,34 @@ def main():
                     help="dir: use image folder; random: synthetic calibration; none: no quantization (FP32 TFLite)")
     ap.add_argument("--calib_dir", type=str, default="")
     ap.add_argument("--calib_count", type=int, default=64, help="number of synthetic samples when mode=random")
+    ap.add_argument("--calib_workers", type=int, default=0, help="processes decoding calibration images (0=all cores)")
+    ap.add_argument("--calib_seed", type=int, default=0, help="seed of the synthetic calibration set (part of the cache key)")
     ap.add_argument("--height", type=int, default=480)
     ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--resolutions", type=str, nargs="+", default=None,
+                    help="export several input sizes, e.g. 640x480 320x240 (default: --width x --height)")
+    ap.add_argument("--precisions", type=str, nargs="+", choices=["fp32", "int8"], default=None,
+                    help="variants to build (default: int8, or fp32 when --calib_mode none)")
     ap.add_argument("--device_name", type=str, default="QCS6490 (Proxy)")
     ap.add_argument("--workdir", type=str, default="./xfeat_qai-hub_model")
+    ap.add_argument("--cache_dir", type=str, default="", help="artifact cache (default: <workdir>/cache)")
+    ap.add_argument("--no_cache", action="store_true", help="rebuild every stage (results are still cached)")
+    ap.add_argument("--max_jobs", type=int, default=4, help="AI Hub jobs in flight at once")
+    ap.add_argument("--skip_profile", action="store_true")
     args = ap.parse_args()
 
-    H, W = args.height, args.width
     WDIR = Path(args.workdir)
     WDIR.mkdir(parents=True, exist_ok=True)
+    out_dir = WDIR / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cache = ArtifactCache(args.cache_dir or str(WDIR / "cache"), enabled=not args.no_cache)
+
+    resolutions = ([_parse_resolution(r) for r in args.resolutions] if args.resolutions
+                   else [(args.height, args.width)])
+    precisions = args.precisions or (["fp32"] if args.calib_mode == "none" else ["int8"])
+    if "int8" in precisions and args.calib_mode == "none":
+        raise ValueError("int8 needs calibration data; use --calib_mode dir|random")
+    multi_res = len(resolutions) > 1
 
     xfeat = build_xfeat_via_hub()
 
@@ -571,6 +746,8 @@ def main():
 
     # Decompose InstanceNorm first (critical before quant/HTP)
     replace_instancenorm2d(core)
+    weights_key = hash_module_weights(core)
+    log(f"[Cache] weights sha256={weights_key[:16]}...")
 
     # Guard: if any sparse APIs are used by mistake, fail fast to ensure we use the dense wrapper
     def _guard_detectAndCompute(*args, **kwargs):
@@ -582,63 +759,55 @@ def main():
     # Use Dense wrapper
     wrapper = XFeatExportDense(xfeat).eval()
     print(f"[Wrapper] Using {wrapper.__class__.__name__}")
-
-    # TorchScript trace (fixed 1x3xHxW)
-    ts = to_torchscript(wrapper, input_shape=(1, 3, H, W))
-
-    # Prepare output paths
-    onnx_raw_path = str(WDIR / "xfeat_from_aihub.onnx")
-
-    # Single cloud TorchScript->ONNX attempt; fall back to local Dynamo on failure
-    onnx_model = None
-    err = ""
-
-    log("[AI Hub] Trying TorchScript -> ONNX compile in the cloud ...")
-    onnx_model, err, job_id = aihub_compile_ts_to_onnx(
-        ts_model=ts,
-        device_name=args.device_name,
-        input_shape=(1, 3, H, W),
-    )
-
-    if onnx_model is not None:
-        save_hub_model(onnx_model, onnx_raw_path)
-        print(f"[AI Hub] Saved ONNX from Hub: {onnx_raw_path}")
-    else:
-        if err:
-            print(f"[Warn] AI Hub compile failed: {err}")
-        else:
-            print("[Warn] AI Hub compile failed: Unknown error")
-
-
-    target_path = str(WDIR)
-    unzip_onnx_model(onnx_raw_path, job_id, target_path)
-
-    # Local ONNX fixes
-    onnx_noIN_path = str(Path(WDIR) / "xfeat_no_instance_norm.onnx")
-    onnx_noIN_path = decompose_instance_norm(onnx_raw_path, onnx_noIN_path)
-
-    onnx_clean_path = str(Path(WDIR) / "xfeat_clean.onnx")
-    onnx_clean_path = remove_trivial_unsqueeze(onnx_noIN_path, onnx_clean_path)
-
-    # Quantize (or skip) -> TFLite
-    out_dir = str(Path(WDIR) / "out")
-    if args.calib_mode == "none":
-        # No quantization: compile to FP32 TFLite (typically runs on CPU/GPU)
-        tfl_path, tflite_model = aihub_compile_fp32_tflite(onnx.load(onnx_clean_path),
-                                             args.device_name, out_dir, job_prefix="xfeat_fp32")
-    else:
-        # Prepare calibration data
-        if args.calib_mode == "dir":
-            if not args.calib_dir:
-                raise ValueError("--calib_dir not specified (calib_mode=dir)")
-            calib = load_calib_images(args.calib_dir, H, W, max_images=args.calib_count)
-        else:
-            calib = build_synthetic_calib(H, W, count=args.calib_count)
-
-        tfl_path, tflite_model = aihub_quantize_and_compile_tflite(onnx.load(onnx_clean_path),
-                                                     args.device_name, calib, out_dir, job_prefix="xfeat")
-
-    aihub_profile_and_inference_tflite(tflite_model, args.device_name, args.height, args.width, args.calib_count)
+    trace_lock = threading.Lock()
+
+    def prepare_resolution(res):
+        H, W = res
+        raw_path, hub_key = stage_hub_onnx(cache, wrapper, trace_lock, weights_key, H, W, args.device_name)
+        clean_path, clean_key = stage_clean_onnx(cache, raw_path, hub_key)
+        calib = stage_calibration(cache, args, H, W) if "int8" in precisions else None
+        return clean_path, clean_key, calib
+
+    def build_variant(res, precision, clean_path, clean_key, calib):
+        H, W = res
+        prefix = f"xfeat_{W}x{H}" if multi_res else "xfeat"
+        cached_path, tfl_key, hit = stage_tflite(cache, clean_path, clean_key, precision, calib,
+                                                 args.device_name, prefix)
+        # Named from (resolution, precision), not the cached file: cache entries built
+        # by single-resolution runs all carry the plain "xfeat" prefix.
+        final = out_dir / f"{prefix}_{'quant_int8' if precision == 'int8' else precision}.tflite"
+        shutil.copyfile(cached_path, final)
+        if not args.skip_profile:
+            stage_profile(cache, str(final), tfl_key, args.device_name, H, W, args.calib_count)
+        return {"resolution": f"{W}x{H}", "precision": precision, "path": str(final), "cached": hit}
+
+    # Resolutions are prepared concurrently; each variant is submitted as soon as its ONNX is ready.
+    results, failures = [], []
+    with ThreadPoolExecutor(max_workers=max(1, args.max_jobs)) as pool:
+        prep = {pool.submit(prepare_resolution, res): res for res in resolutions}
+        variants: Dict = {}
+        for fut in as_completed(prep):
+            res = prep[fut]
+            try:
+                clean_path, clean_key, calib = fut.result()
+            except Exception as e:
+                failures.append((f"{res[1]}x{res[0]}", "onnx", e))
+                continue
+            for precision in precisions:
+                variants[pool.submit(build_variant, res, precision, clean_path, clean_key, calib)] = (res, precision)
+        for fut in as_completed(variants):
+            res, precision = variants[fut]
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                failures.append((f"{res[1]}x{res[0]}", precision, e))
+
+    for r in sorted(results, key=lambda r: (r["resolution"], r["precision"])):
+        log(f"[Result] {r['resolution']:>9} {r['precision']:<5} {'cached' if r['cached'] else 'built ':<6} {r['path']}")
+    for res, precision, e in failures:
+        log(f"[Error] {res} {precision}: {e}")
+    if failures:
+        raise RuntimeError(f"{len(failures)} variant(s) failed")
 
     log("[Done] Pipeline finished successfully.")
 
@@ -45,6 +45,10 @@ def main():
         objectives = st.text_area("Focus",
             placeholder="Enter key area of interest")
 
+        st.markdown("---")
+        use_cache = st.checkbox("Reuse cached responses", value=True,
+            help="Identical queries are answered from the local response cache")
+
     # Main content area with cleaner layout
     col1, col2 = st.columns(2)
     
@@ -114,7 +118,8 @@ def main():
                     prompt=prompt,
                     add_ons=development_aspects if development_aspects else None,
                     additional_context=objectives if objectives else None,
-                    resp_len = Response_Config[response_length] if response_length else None
+                    resp_len = Response_Config[response_length] if response_length else None,
+                    use_cache=use_cache
                 )
                 
                 # Process the stream
@@ -6,56 +6,205 @@
 # SPDX-License-Identifier: MIT License
 #===----------------------------------------------------------------------===//
 
+import json
+import threading
+import time
+
 import requests
-import os
+from requests.adapters import HTTPAdapter
+
+from LLM_Utils.response_cache import ResponseCache
+
+# Streamlit builds a new LLM_Module on every rerun, so the HTTP session,
+# server health and response cache are shared at module level.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+_CACHE = None
+
+
+def _get_session():
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _SESSION.mount("http://", adapter)
+            _SESSION.mount("https://", adapter)
+        return _SESSION
+
+
+def _get_cache():
+    global _CACHE
+    with _SESSION_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache()
+        return _CACHE
+
+
+class ServerHealth:
+    """Tracks the LLM server from real requests instead of probing it."""
+
+    def __init__(self, retry_after=3.0):
+        self.retry_after = retry_after
+        self.consecutive_failures = 0
+        self.last_ok = None
+        self.last_failure = None
+        self.last_error = None
+
+    def mark_ok(self):
+        self.consecutive_failures = 0
+        self.last_ok = time.time()
+
+    def mark_failed(self, error):
+        self.consecutive_failures += 1
+        self.last_failure = time.time()
+        self.last_error = str(error)
+
+    @property
+    def cooling_down(self):
+        return (
+            self.consecutive_failures > 0
+            and self.last_failure is not None
+            and time.time() - self.last_failure < self.retry_after
+        )
+
+
+_HEALTH = ServerHealth()
+
+# Model reported by each server, re-read every MODEL_TTL seconds so a model
+# swapped in LM Studio does not get the previous model's cached answers.
+MODEL_TTL = 30.0
+_MODELS = {}
+
+
+def _served_model(session, api_base, timeout=2.0):
+    now = time.monotonic()
+    hit = _MODELS.get(api_base)
+    if hit is not None and now - hit[1] < MODEL_TTL:
+        return hit[0]
+    try:
+        response = session.get(f"{api_base}/v1/models", timeout=timeout)
+        response.raise_for_status()
+        model = response.json()["data"][0]["id"]
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError):
+        return None
+    _MODELS[api_base] = (model, now)
+    return model
+
+
+def _delta_content(line):
+    try:
+        data = json.loads(line.decode("utf-8").strip("data: ").strip())
+        return data["choices"][0].get("delta", {}).get("content", "")
+    except (ValueError, KeyError, IndexError, AttributeError):
+        return ""
+
 
 class LLM_Module:
     def __init__(self):
         self.api_base = "http://127.0.0.1:1234"
         self.timeout = 60
+        self.temperature = 0.7
+        self.model = None       # None: whichever model the server has loaded
+        self.session = _get_session()
+        self.health = _HEALTH
 
-    def generate(self, prompt, max_length=2048, additional_context=None, add_ons=None, resp_len=None):
-        try:
-            
-            requests.get(self.api_base, timeout=2)  
-        except requests.exceptions.ConnectionError:
-            raise Exception(
-                "LLM Connection Failure"
-                f"at {self.api_base} Initiate Retry."
-            )
-            
-        
+    def build_prompt(self, prompt, additional_context=None, add_ons=None, resp_len=None):
+        # The template comes first so its fixed text forms a stable prefix the
+        # server can reuse from its KV cache; per-request options follow it.
+        parts = [prompt.rstrip()]
         if add_ons:
-            prompt = f"Focus on Developmental Aspects {add_ons} and how it impacted the human life. {prompt}"
-            
-        
+            parts.append(f"Focus on Developmental Aspects {add_ons} and how it impacted the human life.")
         if additional_context:
-            prompt = f"Using this historical context:\n{additional_context}\n\n{prompt}"
-            
-        
+            parts.append(f"Using this historical context:\n{additional_context}")
         if resp_len:
-            prompt = f"Give the summary in no more than {resp_len} words.\n\n{prompt}"
-            prompt = f"Prepare the summary in no more than 5 paragraphs.\n\n{prompt}"
-        
+            parts.append(f"Give the summary in no more than {resp_len} words.")
+            parts.append("Prepare the summary in no more than 5 paragraphs.")
+        return "\n\n".join(parts)
+
+    def generate(self, prompt, max_length=2048, additional_context=None, add_ons=None, resp_len=None, use_cache=True):
+        prompt = self.build_prompt(prompt, additional_context, add_ons, resp_len)
+        messages = [{"role": "user", "content": prompt}]
+
+        cache = _get_cache() if use_cache else None
+        key = None
+        model = self.model
+        if cache and model is None:
+            model = _served_model(self.session, self.api_base)
+            if model is None:
+                cache = None    # unknown model: neither serve nor store cached answers
+        if cache:
+            key = ResponseCache.make_key(
+                api_base=self.api_base,
+                model=model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_length,
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                return self._replay(cached)
+
+        if self.health.cooling_down:
+            raise Exception(
+                "LLM Connection Failure "
+                f"at {self.api_base} Initiate Retry."
+            )
+
+        payload = {
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": max_length,
+            "stream": True,
+            # llama.cpp-based servers reuse the KV cache for the shared prompt prefix
+            "cache_prompt": True
+        }
+        if self.model is not None:
+            payload["model"] = self.model
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base}/v1/chat/completions",
-                json={
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                    "max_tokens": max_length,
-                    "stream": True
-                },
+                json=payload,
                 timeout=self.timeout,
                 stream=True
             )
-            
-            if response.status_code == 200:
-                return response.iter_lines()
-            else:
-                raise Exception(f"Error: {response.status_code}, {response.text}")
-            
-        except requests.exceptions.Timeout:
+        except requests.exceptions.ConnectionError as e:
+            self.health.mark_failed(e)
+            raise Exception(
+                "LLM Connection Failure "
+                f"at {self.api_base} Initiate Retry."
+            )
+        except requests.exceptions.Timeout as e:
+            self.health.mark_failed(e)
             raise Exception("Request timed out. Please try again.")
         except requests.exceptions.RequestException as e:
+            self.health.mark_failed(e)
             raise Exception(f"Network error: {str(e)}")
+
+        if response.status_code == 200:
+            self.health.mark_ok()
+            lines = response.iter_lines()
+            return self._record(lines, cache, key) if cache else lines
+        else:
+            self.health.mark_failed(f"HTTP {response.status_code}")
+            raise Exception(f"Error: {response.status_code}, {response.text}")
+
+    @staticmethod
+    def _replay(text):
+        """Yield a cached response in the same SSE line format as the server."""
+        chunk = {"choices": [{"delta": {"content": text}}]}
+        yield b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8")
+        yield b"data: [DONE]"
+
+    @staticmethod
+    def _record(lines, cache, key):
+        """Pass the stream through and store it once it completes."""
+        parts = []
+        for line in lines:
+            if line:
+                content = _delta_content(line)
+                if content:
+                    parts.append(content)
+            yield line
+        if parts:
+            cache.put(key, "".join(parts))
@@ -7,9 +7,7 @@
 #===----------------------------------------------------------------------===//
 
 HISTORY_PROMPTS = {
-    "Political History": """Generate the response entirely in {language}.
-
-As an expert storyteller, narrate the comprehensive political history of {topic} in the region {region} during {Year}. Address the following aspects:
+    "Political History": """As an expert storyteller, narrate the comprehensive political history of the topic, region and period given at the end. Address the following aspects:
 1. Colonial History: Summarize colonial influences and their effects on political structures.
 2. Independence Movements: Describe key independence movements and their impact on national identity.
 3. Constitutional Development: Outline major constitutional changes, amendments, and reforms.
@@ -20,11 +18,14 @@ As an expert storyteller, narrate the comprehensive political history of {topic}
 8. Social Movements: Explain the role of civil rights and social reforms in political transformation.
 9. International Relations: Discuss diplomatic relations, alliances, and conflicts influencing the country’s trajectory.
 10. Cultural and Ethnic Diversity: Examine how ethnic and cultural diversity affected political representation.
-    """,
 
-    "Social History": """Generate the response entirely in {language}.
+Topic: {topic}
+Region: {region}
+Period: {Year}
+Generate the response entirely in {language}.
+    """,
 
-As an expert storyteller, narrate the comprehensive social history of {topic} in the region {region} during {Year}. Address the following aspects:
+    "Social History": """As an expert storyteller, narrate the comprehensive social history of the topic, region and period given at the end. Address the following aspects:
 1. Education: Assess access to quality education and its impact on equality and economic growth.
 2. Healthcare: Highlight the role of healthcare in ensuring a productive and healthy population.
 3. Social Inclusion: Discuss efforts to provide equal opportunities for marginalized communities.
@@ -35,11 +36,14 @@ As an expert storyteller, narrate the comprehensive social history of {topic} in
 8. Governance and Institutions: Evaluate the role of transparent governance in shaping social policies.
 9. Environmental Sustainability: Cover sustainable resource management and its impact on social development.
 10. Community Engagement: Highlight active community participation in shaping social policies.
-    """,
 
-    "Economic History": """Generate the response entirely in {language}.
+Topic: {topic}
+Region: {region}
+Period: {Year}
+Generate the response entirely in {language}.
+    """,
 
-As an expert storyteller, narrate the comprehensive economic history of {topic} in the region {region} during {Year}. Address the following aspects:
+    "Economic History": """As an expert storyteller, narrate the comprehensive economic history of the topic, region and period given at the end. Address the following aspects:
 1. Human Resources: Assess workforce quality and its impact on economic growth.
 2. Natural Resources: Analyze resource availability and sustainable management practices.
 3. Capital Formation: Explain how infrastructure investments boost productivity and development.
@@ -50,11 +54,14 @@ As an expert storyteller, narrate the comprehensive economic history of {topic}
 8. Social Factors: Explain corruption levels and wealth distribution in economic sustainability.
 9. Global Integration: Discuss participation in trade and investment for economic expansion.
 10. Environmental Sustainability: Examine economic growth strategies that balance ecological protection.
-    """,
 
-    "Cultural History": """Generate the response entirely in {language}.
+Topic: {topic}
+Region: {region}
+Period: {Year}
+Generate the response entirely in {language}.
+    """,
 
-As an expert storyteller, narrate the comprehensive cultural history of {topic} in the region {region} during {Year}. Address the following aspects:
+    "Cultural History": """As an expert storyteller, narrate the comprehensive cultural history of the topic, region and period given at the end. Address the following aspects:
 1. Historical Heritage: Discuss preservation of traditions, sites, and artifacts.
 2. Education and Awareness: Examine how education fosters cultural sustainability.
 3. Arts and Literature: Analyze support for literature, music, and visual arts.
@@ -66,5 +73,10 @@ As an expert storyteller, narrate the comprehensive cultural history of {topic}
 9. Economic Support: Assess funding for cultural institutions and its sustainability.
 10. Innovation and Adaptation: Explain how cultural practices evolve in modern.
 11. Intercultural Dialogue: Discuss the importance of dialogue in promoting cultural understanding.
+
+Topic: {topic}
+Region: {region}
+Period: {Year}
+Generate the response entirely in {language}.
     """,
 }
@@ -56,6 +56,7 @@ for source, destinations in all_fares.items():
     for destination, info in destinations.items():
         fare_entries.append((source, destination, info["fare"], info["platform"]))
 fares_cursor.executemany('INSERT INTO fares (source, destination, fare, platform) VALUES (?, ?, ?, ?)', fare_entries)
+fares_cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_fares_route ON fares (source, destination)')
 fares_conn.commit()
 fares_conn.close()
 
@@ -76,6 +77,9 @@ CREATE TABLE IF NOT EXISTS tickets (
     platform INTEGER
 )
 ''')
+tickets_cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_timestamp ON tickets (timestamp)')
+tickets_cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_destination ON tickets (destination_station, timestamp)')
+tickets_cursor.execute('PRAGMA journal_mode=WAL')
 tickets_conn.commit()
 tickets_conn.close()
 
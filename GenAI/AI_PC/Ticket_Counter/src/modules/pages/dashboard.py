@@ -7,63 +7,73 @@
 #===----------------------------------------------------------------------===//
 
 import streamlit as st
-import sqlite3
-import pandas as pd
 import matplotlib.pyplot as plt
-from io import BytesIO
-from pathlib import Path
 
-# Resolve base directory and DB path
-BASE_DIR = Path(__file__).resolve().parents[2]
-DB_PATH = BASE_DIR / 'modules' / 'db' / 'tickets.db'
+from modules.utils.db_utils import (
+    TICKET_COLUMNS,
+    count_tickets,
+    delete_ticket,
+    destination_counts,
+    load_tickets,
+    ticket_date_bounds,
+    tickets_version,
+    update_ticket_count,
+)
 
-def load_data():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM tickets ORDER BY timestamp DESC", conn)
-    conn.close()
+# Rows per table page; filtering, export and aggregation always cover the full range
+DISPLAY_LIMIT = 1000
 
-    # Add a summary column replacing transcription
-    df['summary'] = df.apply(
-        lambda row: f"{row['source_station']} → {row['destination_station']} ({row['ticket_count']} tickets)", axis=1
-    )
-    return df
+def load_data(start_date, end_date, limit=DISPLAY_LIMIT, page=1):
+    offset = (page - 1) * limit if limit else 0
+    return load_tickets(start_date, end_date, limit=limit, offset=offset)
 
 def convert_df_to_csv(df):
-    export_df = df[[
-        'id', 'username', 'source_station', 'destination_station',
-        'ticket_count', 'timestamp', 'summary', 'fare', 'platform'
-    ]]
+    export_df = df[TICKET_COLUMNS]
     return export_df.to_csv(index=False).encode('utf-8')
 
 def dashboard_page():
     st.title("📊 Ticket Dashboard")
-    df = load_data()
+
+    min_date, max_date = ticket_date_bounds()
+    if min_date is None:
+        st.info("No tickets available yet.")
+        return
 
     # 📅 Date Range Filter
     st.subheader("📅 Filter by Date Range")
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    min_date = df['timestamp'].min().date()
-    max_date = df['timestamp'].max().date()
     start_date = st.date_input("Start Date", min_value=min_date, max_value=max_date, value=min_date)
     end_date = st.date_input("End Date", min_value=min_date, max_value=max_date, value=max_date)
 
-    filtered_df = df[(df['timestamp'].dt.date >= start_date) & (df['timestamp'].dt.date <= end_date)]
+    total = count_tickets(start_date, end_date)
+    pages = max(1, -(-total // DISPLAY_LIMIT))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (newest first, {DISPLAY_LIMIT} tickets per page)",
+                               min_value=1, max_value=pages, value=1, step=1)
+    filtered_df = load_data(start_date, end_date, page=page)
 
     # 📋 Display Filtered Data
-    st.dataframe(filtered_df[[
-        'id', 'username', 'source_station', 'destination_station',
-        'ticket_count', 'timestamp', 'summary', 'fare', 'platform'
-    ]])
+    if pages > 1:
+        first = (page - 1) * DISPLAY_LIMIT + 1
+        st.caption(f"Showing tickets {first}-{first + len(filtered_df) - 1} of {total} in this range (page {page} of {pages}).")
+    st.dataframe(filtered_df[TICKET_COLUMNS])
 
     # 📤 Export to CSV
     st.subheader("📤 Export Filtered Data")
-    csv = convert_df_to_csv(filtered_df)
-    st.download_button("Download CSV", csv, "filtered_tickets.csv", "text/csv")
+    # tickets_version() changes on every insert, edit or cancellation, which may leave total unchanged
+    export_key = ("csv_export", start_date, end_date, total, tickets_version())
+    if st.session_state.get("csv_export_key") != export_key:
+        if st.button(f"Prepare CSV ({total} tickets)"):
+            st.session_state.csv_export = convert_df_to_csv(load_data(start_date, end_date, limit=None))
+            st.session_state.csv_export_key = export_key
+            st.rerun()
+    else:
+        st.download_button("Download CSV", st.session_state.csv_export, "filtered_tickets.csv", "text/csv")
 
     # 📊 Most Popular Destinations
     st.subheader("📊 Most Popular Destinations")
-    if not filtered_df.empty:
-        dest_counts = filtered_df['destination_station'].value_counts()
+    if total:
+        dest_counts = destination_counts(start_date, end_date)
         fig, ax = plt.subplots()
         dest_counts.plot(kind='bar', ax=ax, color='skyblue')
         ax.set_xlabel("Destination")
@@ -73,7 +83,7 @@ def dashboard_page():
     else:
         st.info("No data available for the selected date range.")
 
-    # 📝 Ticket Cancellation or Editing
+    # 📝 Ticket Cancellation or Editing (tickets of the page shown above)
     st.subheader("📝 Edit or Cancel Ticket")
     if not filtered_df.empty:
         ticket_ids = filtered_df['id'].tolist()
@@ -82,39 +92,20 @@ def dashboard_page():
 
         if action == "Cancel Ticket":
             if st.button("Confirm Cancellation"):
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM tickets WHERE id=?", (selected_id,))
-                conn.commit()
-                conn.close()
+                delete_ticket(selected_id)
                 st.success(f"✅ Ticket ID {selected_id} cancelled.")
 
         elif action == "Edit Ticket Count":
             new_count = st.number_input("New Ticket Count", min_value=1, max_value=10, value=1)
             if st.button("Update Ticket"):
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-
-                # Fetch original fare and ticket count
-                cursor.execute("SELECT fare, ticket_count FROM tickets WHERE id=?", (selected_id,))
-                result = cursor.fetchone()
-
-                if result:
-                    original_total_fare, old_count = result
-                    if old_count > 0:
-                        fare_per_ticket = original_total_fare / old_count
-                        new_total_fare = fare_per_ticket * new_count
-
-                        # Update ticket count and fare
-                        cursor.execute("UPDATE tickets SET ticket_count=?, fare=? WHERE id=?", (new_count, new_total_fare, selected_id))
-                        conn.commit()
-                        st.success(f"✅ Ticket ID {selected_id} updated to {new_count} tickets. New fare: ₹{int(new_total_fare)}")
-                    else:
-                        st.error("⚠️ Original ticket count is zero. Cannot compute fare per ticket.")
+                try:
+                    new_total_fare = update_ticket_count(selected_id, new_count)
+                except ValueError:
+                    st.error("⚠️ Original ticket count is zero. Cannot compute fare per ticket.")
                 else:
-                    st.error("❌ Ticket ID not found.")
-
-                conn.close()
+                    if new_total_fare is None:
+                        st.error("❌ Ticket ID not found.")
+                    else:
+                        st.success(f"✅ Ticket ID {selected_id} updated to {new_count} tickets. New fare: ₹{int(new_total_fare)}")
     else:
         st.info("No tickets available to edit or cancel.")
-
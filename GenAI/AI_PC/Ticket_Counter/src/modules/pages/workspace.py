@@ -7,21 +7,17 @@
 #===----------------------------------------------------------------------===//
 
 import streamlit as st
-import sqlite3
 import os
 from datetime import datetime
 import qrcode
 from PIL import Image
 import io
-from pathlib import Path
 
 from modules.utils.transcription_utils import list_input_devices, record_audio, transcribe_audio
-from modules.utils.llm_utils import extract_with_llm, get_destination_insights
+from modules.utils.llm_utils import extract_booking, get_destination_insights
+from modules.utils.station_parser import STATS as PARSER_STATS
 from modules.utils.fare_utils import get_fare_and_platform
-
-# Resolve base directory
-BASE_DIR = Path(__file__).resolve().parents[2]
-DB_DIR = BASE_DIR / 'modules' / 'db'
+from modules.utils.db_utils import get_stations, insert_ticket
 
 def workspace_page():
 
@@ -49,13 +45,17 @@ def workspace_page():
     input_devices, device_names = list_input_devices()
     selected_device_index = st.sidebar.selectbox("Select Microphone Device", options=range(len(device_names)), format_func=lambda x: device_names[x])
 
-    # Load station list
-    station_db_path = DB_DIR / 'stations.db'
-    station_conn = sqlite3.connect(station_db_path)
-    station_cursor = station_conn.cursor()
-    station_cursor.execute('SELECT name FROM stations')
-    stations = [row[0] for row in station_cursor.fetchall()]
-    station_conn.close()
+    # Sidebar: Extraction Metrics
+    stats = PARSER_STATS.summary()
+    if stats["requests"]:
+        st.sidebar.header("⚡ Extraction Metrics")
+        st.sidebar.write(f"Fast-path hit rate: {stats['hit_rate']:.0%} ({stats['fast_path_hits']}/{stats['requests']})")
+        st.sidebar.write(f"Avg local parse: {stats['avg_parse_us']:.0f} µs")
+        if stats["llm_fallbacks"]:
+            st.sidebar.write(f"Avg LLM fallback: {stats['avg_llm_ms']:.0f} ms")
+
+    # Load station list (cached for the lifetime of the process)
+    stations = get_stations()
 
     with st.expander("ℹ️ Showing all capital cities for user reference"):
         st.markdown("### 🏙️ Available Capital Cities")
@@ -96,13 +96,13 @@ def workspace_page():
             return
 
         if st.session_state.confirm == "Yes":
-            source, destination, ticket_count = extract_with_llm(
+            source, destination, ticket_count = extract_booking(
                 st.session_state.transcription,
                 stations,
                 st.session_state.llm_api_url,
                 st.session_state.llm_api_key
             )
-            print("LLM Extraction:", source, destination, ticket_count)
+            print("Extraction:", source, destination, ticket_count)
 
             if not destination:
                 st.error("❌ Could not extract destination. Please try again.")
@@ -115,18 +115,7 @@ def workspace_page():
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             qr_data = f"Fare: ₹{fare} | Platform: {platform} | Source: {source} | Destination: {destination} | Tickets: {ticket_count} | Time: {timestamp}"
 
-            ticket_db_path = DB_DIR / 'tickets.db'
-            ticket_conn = sqlite3.connect(ticket_db_path)
-            ticket_cursor = ticket_conn.cursor()
-            ticket_cursor.execute(
-                """
-                INSERT INTO tickets (username, source_station, destination_station, ticket_count, timestamp, qr_data, transcription, fare, platform)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (username, source, destination, ticket_count, timestamp, qr_data, st.session_state.transcription, fare, platform)
-            )
-            ticket_conn.commit()
-            ticket_conn.close()
+            insert_ticket(username, source, destination, ticket_count, timestamp, qr_data, st.session_state.transcription, fare, platform)
 
             qr = qrcode.QRCode(
                 version=1,
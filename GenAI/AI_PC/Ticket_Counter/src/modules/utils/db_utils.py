@@ -0,0 +1,230 @@
+#===--db_utils.py---------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+# Resolve base directory and DB paths
+BASE_DIR = Path(__file__).resolve().parents[2]
+DB_DIR = BASE_DIR / 'modules' / 'db'
+FARES_JSON_PATH = BASE_DIR / 'modules' / 'config' / 'fares.json'
+
+DB_PATHS = {
+    'stations': DB_DIR / 'stations.db',
+    'fares': DB_DIR / 'fares.db',
+    'tickets': DB_DIR / 'tickets.db',
+}
+
+TICKET_COLUMNS = [
+    'id', 'username', 'source_station', 'destination_station',
+    'ticket_count', 'timestamp', 'summary', 'fare', 'platform'
+]
+
+INDEXES = {
+    'fares': [
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_fares_route ON fares (source, destination)',
+    ],
+    'tickets': [
+        'CREATE INDEX IF NOT EXISTS idx_tickets_timestamp ON tickets (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_tickets_destination ON tickets (destination_station, timestamp)',
+    ],
+}
+
+# Streamlit runs every rerun on a new script thread, so a per-thread
+# connection would be reopened (and its PRAGMAs re-run) on almost every
+# rerun. Instead each database has one process-wide connection, opened with
+# check_same_thread=False and used under its own lock.
+_open_lock = threading.Lock()
+_conns = {}
+_locks = {name: threading.RLock() for name in DB_PATHS}
+
+# Bumped on every ticket write, so pages can tell when cached results are stale
+_tickets_version = 0
+
+
+def _open(name):
+    conn = sqlite3.connect(DB_PATHS[name], timeout=5.0, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    for ddl in INDEXES.get(name, []):
+        try:
+            conn.execute(ddl)
+        except sqlite3.Error as e:
+            print(f"?? Could not create index on {name}.db: {e}")
+    conn.commit()
+    return conn
+
+
+@contextmanager
+def connection(name):
+    """The shared WAL-mode connection for 'stations', 'fares' or 'tickets', held under its lock."""
+    with _locks[name]:
+        conn = _conns.get(name)
+        if conn is None:
+            with _open_lock:
+                conn = _conns[name] = _open(name)
+        yield conn
+
+
+def tickets_version():
+    """Counter of ticket writes made by this process."""
+    return _tickets_version
+
+
+def _ticket_written():
+    global _tickets_version
+    _tickets_version += 1
+
+
+# ---------------------------------------------------------------------------
+# Stations and fares (static data, loaded once per process)
+# ---------------------------------------------------------------------------
+@lru_cache(maxsize=1)
+def load_fare_matrix():
+    """{(source, destination): (fare, platform)} built once from fares.json."""
+    with FARES_JSON_PATH.open() as f:
+        all_fares = json.load(f)
+    return {
+        (source, destination): (info['fare'], info['platform'])
+        for source, destinations in all_fares.items()
+        for destination, info in destinations.items()
+    }
+
+
+@lru_cache(maxsize=1)
+def _station_tuple():
+    try:
+        with connection('stations') as conn:
+            rows = conn.execute('SELECT name FROM stations ORDER BY name').fetchall()
+        stations = [row[0] for row in rows]
+    except sqlite3.Error as e:
+        print(f"?? Could not read stations.db ({e}); using fares.json")
+        stations = []
+    if not stations:
+        stations = sorted({city for route in load_fare_matrix() for city in route})
+    return tuple(stations)
+
+
+def get_stations():
+    return list(_station_tuple())
+
+
+def lookup_fare(source, destination):
+    """(fare, platform) for one ticket on the route, or None if unknown."""
+    return load_fare_matrix().get((source, destination))
+
+
+# ---------------------------------------------------------------------------
+# Tickets
+# ---------------------------------------------------------------------------
+def _date_range_params(start_date, end_date):
+    # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS', so ISO date strings
+    # compare correctly and the range scan uses idx_tickets_timestamp.
+    return start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()
+
+
+def insert_ticket(username, source, destination, ticket_count, timestamp, qr_data, transcription, fare, platform):
+    with connection('tickets') as conn, conn:
+        cur = conn.execute(
+            """
+            INSERT INTO tickets (username, source_station, destination_station, ticket_count, timestamp, qr_data, transcription, fare, platform)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (username, source, destination, ticket_count, timestamp, qr_data, transcription, fare, platform)
+        )
+        _ticket_written()
+    return cur.lastrowid
+
+
+def ticket_date_bounds():
+    """(min_date, max_date) over all tickets, or (None, None) if there are none."""
+    with connection('tickets') as conn:
+        row = conn.execute('SELECT MIN(timestamp), MAX(timestamp) FROM tickets').fetchone()
+    if not row or row[0] is None:
+        return None, None
+    return date.fromisoformat(row[0][:10]), date.fromisoformat(row[1][:10])
+
+
+def count_tickets(start_date, end_date):
+    with connection('tickets') as conn:
+        return conn.execute(
+            'SELECT COUNT(*) FROM tickets WHERE timestamp >= ? AND timestamp < ?',
+            _date_range_params(start_date, end_date)
+        ).fetchone()[0]
+
+
+def load_tickets(start_date, end_date, limit=None, offset=0):
+    """
+    Tickets in [start_date, end_date], newest first, with the summary built
+    in SQL. limit/offset select one page of that order.
+    """
+    sql = """
+        SELECT id, username, source_station, destination_station, ticket_count, timestamp,
+               source_station || ' → ' || destination_station || ' (' || ticket_count || ' tickets)' AS summary,
+               fare, platform
+        FROM tickets
+        WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp DESC, id DESC
+    """
+    params = _date_range_params(start_date, end_date)
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params = params + (int(limit), int(offset))
+    with connection('tickets') as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def destination_counts(start_date, end_date):
+    """Tickets sold per destination in the date range, most popular first."""
+    with connection('tickets') as conn:
+        return pd.read_sql_query(
+            """
+            SELECT destination_station, COUNT(*) AS tickets
+            FROM tickets
+            WHERE timestamp >= ? AND timestamp < ?
+            GROUP BY destination_station
+            ORDER BY tickets DESC
+            """,
+            conn,
+            params=_date_range_params(start_date, end_date),
+            index_col='destination_station'
+        )['tickets']
+
+
+def delete_ticket(ticket_id):
+    with connection('tickets') as conn, conn:
+        cur = conn.execute('DELETE FROM tickets WHERE id=?', (ticket_id,))
+        _ticket_written()
+    return cur.rowcount > 0
+
+
+def update_ticket_count(ticket_id, new_count):
+    """
+    Rescale the stored fare to new_count tickets.
+    Returns the new total fare, None if the ticket does not exist,
+    or raises ValueError if the original ticket count is zero.
+    """
+    with connection('tickets') as conn, conn:
+        row = conn.execute('SELECT fare, ticket_count FROM tickets WHERE id=?', (ticket_id,)).fetchone()
+        if not row:
+            return None
+        original_total_fare, old_count = row
+        if old_count <= 0:
+            raise ValueError("Original ticket count is zero")
+        new_total_fare = original_total_fare / old_count * new_count
+        conn.execute('UPDATE tickets SET ticket_count=?, fare=? WHERE id=?', (new_count, new_total_fare, ticket_id))
+        _ticket_written()
+    return new_total_fare
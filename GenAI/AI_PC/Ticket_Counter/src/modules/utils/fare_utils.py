@@ -6,17 +6,10 @@
 # SPDX-License-Identifier: MIT License
 #===----------------------------------------------------------------------===//
 
-import sqlite3
-from pathlib import Path
+from modules.utils.db_utils import lookup_fare
 
 def get_fare_and_platform(source, destination, ticket_count):
-    fare_db_path = Path(__file__).resolve().parents[2] / 'modules' / 'db' / 'fares.db'
-
-    conn = sqlite3.connect(fare_db_path)
-    cursor = conn.cursor()
-    cursor.execute('SELECT fare, platform FROM fares WHERE source=? AND destination=?', (source, destination))
-    result = cursor.fetchone()
-    conn.close()
+    result = lookup_fare(source, destination)
 
     if result:
         single_fare, platform = result
@@ -24,4 +17,3 @@ def get_fare_and_platform(source, destination, ticket_count):
     else:
         print(f"?? No fare found for route: {source} ? {destination}")
         return 0, 1  # Default fare and platform
-
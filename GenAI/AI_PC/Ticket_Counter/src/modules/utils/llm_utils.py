@@ -8,6 +8,9 @@
 
 import requests
 import json
+import time
+
+from modules.utils.station_parser import STATS, parse_booking
 
 def extract_with_llm(transcription, stations, api_url, api_key):
     prompt = f"""
@@ -101,6 +104,23 @@ Your task:
         print("⚠️ Exception during LLM extraction:", e)
         return None, None, 0
 
+def extract_booking(transcription, stations, api_url, api_key):
+    """Try the local station parser first; fall back to the LLM when it is not confident."""
+    t0 = time.perf_counter()
+    parsed = parse_booking(transcription, stations)
+    parse_seconds = time.perf_counter() - t0
+
+    if parsed.confident:
+        STATS.record(True, parse_seconds)
+        print(f"Fast-path parse ({parse_seconds * 1e6:.0f} us, confidence {parsed.confidence:.2f})")
+        return parsed.source, parsed.destination, parsed.ticket_count
+
+    print(f"Fast-path parse not confident ({parsed.confidence:.2f}); asking LLM")
+    t1 = time.perf_counter()
+    result = extract_with_llm(transcription, stations, api_url, api_key)
+    STATS.record(False, parse_seconds, time.perf_counter() - t1)
+    return result
+
 def get_destination_insights(destination, api_url, api_key):
     prompt = f"""
 You are a travel assistant. Provide detailed insights about the city '{destination}'.
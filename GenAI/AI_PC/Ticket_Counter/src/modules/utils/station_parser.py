@@ -0,0 +1,252 @@
+#===--station_parser.py---------------------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+DEFAULT_SOURCE = "Bengaluru"
+
+# Parses at or above this confidence skip the LLM
+FAST_PATH_CONFIDENCE = 0.85
+# Minimum similarity for a fuzzy station match to be considered at all
+MIN_STATION_SIMILARITY = 0.75
+MAX_SPAN_TOKENS = 3
+
+# Common spoken / historical names that Whisper tends to produce
+ALIASES = {
+    "bangalore": "Bengaluru",
+    "bengalooru": "Bengaluru",
+    "bombay": "Mumbai",
+    "madras": "Chennai",
+    "calcutta": "Kolkata",
+    "trivandrum": "Thiruvananthapuram",
+    "newdelhi": "Delhi",
+    "poona": "Pune",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "single": 1, "two": 2, "couple": 2, "pair": 2,
+    "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
+    "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40,
+    "fifty": 50,
+}
+# "twenty one" style compounds: a tens word followed by a units word
+TENS_WORDS = {"twenty", "thirty", "forty", "fifty"}
+UNIT_WORDS = {"one", "two", "three", "four", "five", "six", "seven", "eight", "nine"}
+# Confidence given to parses the LLM should decide (contradicting markers)
+AMBIGUOUS_CONFIDENCE = 0.5
+
+SOURCE_MARKERS = {"from"}
+DEST_MARKERS = {"to", "till", "until", "towards", "into"}
+TICKET_WORDS = {"ticket", "tickets", "seat", "seats", "passenger", "passengers"}
+# Words never treated as (part of) a station name
+STOP_WORDS = SOURCE_MARKERS | DEST_MARKERS | TICKET_WORDS | set(NUMBER_WORDS) | {
+    "i", "want", "need", "please", "book", "give", "me", "for", "go", "going",
+    "travel", "the", "and", "of", "station", "city",
+}
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+
+
+@dataclass
+class ParseResult:
+    source: str | None
+    destination: str | None
+    ticket_count: int
+    confidence: float
+
+    @property
+    def confident(self):
+        return self.destination is not None and self.confidence >= FAST_PATH_CONFIDENCE
+
+
+def _levenshtein(a, b, max_dist):
+    """Edit distance between a and b, or max_dist + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            cur.append(d)
+            row_min = min(row_min, d)
+        if row_min > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1]
+
+
+class StationMatcher:
+    """Exact, alias and bounded edit-distance lookup over the station list."""
+
+    def __init__(self, stations):
+        self.exact = {re.sub(r"[^a-z]", "", s.lower()): s for s in stations}
+        self.exact.update({k: v for k, v in ALIASES.items() if v in stations})
+        self.keys = list(self.exact)
+
+    def match(self, candidate):
+        """Returns (station, similarity) or (None, 0.0)."""
+        hit = self.exact.get(candidate)
+        if hit:
+            return hit, 1.0
+        if len(candidate) < 3:
+            return None, 0.0
+
+        best, best_sim = None, 0.0
+        for key in self.keys:
+            max_dist = int(max(len(key), len(candidate)) * (1.0 - MIN_STATION_SIMILARITY))
+            d = _levenshtein(candidate, key, max_dist)
+            if d > max_dist:
+                continue
+            sim = 1.0 - d / max(len(key), len(candidate))
+            if sim > best_sim:
+                best, best_sim = self.exact[key], sim
+        return best, best_sim
+
+
+@lru_cache(maxsize=4)
+def _matcher_for(stations):
+    return StationMatcher(stations)
+
+
+def _parse_count(tokens):
+    """Number closest before a ticket word, else the first number; defaults to 1."""
+    numbers = []
+    for i, tok in enumerate(tokens):
+        if tok.isdigit():
+            numbers.append((i, int(tok)))
+        elif tok in UNIT_WORDS and i > 0 and tokens[i - 1] in TENS_WORDS:
+            numbers[-1] = (i, numbers[-1][1] + NUMBER_WORDS[tok])
+        elif tok in NUMBER_WORDS and tok not in ("a", "an"):
+            numbers.append((i, NUMBER_WORDS[tok]))
+        elif tok in ("a", "an") and i + 1 < len(tokens) and tokens[i + 1] in TICKET_WORDS | {"couple", "pair"}:
+            numbers.append((i, 1))
+
+    for i, tok in enumerate(tokens):
+        if tok in TICKET_WORDS:
+            before = [n for j, n in numbers if j < i and i - j <= 3]
+            if before:
+                return before[-1]
+    return numbers[0][1] if numbers else 1
+
+
+def _find_mentions(tokens, matcher):
+    """Non-overlapping station mentions as (start, end, station, similarity)."""
+    candidates = []
+    for i in range(len(tokens)):
+        if tokens[i] in STOP_WORDS or tokens[i].isdigit():
+            continue
+        for span in range(1, MAX_SPAN_TOKENS + 1):
+            window = tokens[i:i + span]
+            if len(window) < span or any(t in STOP_WORDS or t.isdigit() for t in window):
+                break
+            station, sim = matcher.match("".join(window))
+            if station:
+                candidates.append((sim, span, i, station))
+
+    mentions, used = [], set()
+    for sim, span, i, station in sorted(candidates, key=lambda c: (-c[0], -c[1], c[2])):
+        covered = set(range(i, i + span))
+        if covered & used:
+            continue
+        used |= covered
+        mentions.append((i, i + span, station, sim))
+    return sorted(mentions)
+
+
+def parse_booking(transcription, stations):
+    """
+    Resolve source, destination and ticket count without the LLM.
+    Mirrors the LLM prompt rules: missing source means Bengaluru,
+    missing count means 1, missing destination is a failed parse.
+    """
+    tokens = _TOKEN_RE.findall((transcription or "").lower())
+    matcher = _matcher_for(tuple(stations))
+    mentions = _find_mentions(tokens, matcher)
+    ticket_count = _parse_count(tokens)
+
+    if not mentions:
+        return ParseResult(None, None, ticket_count, 0.0)
+
+    source = destination = None
+    confidence = min(m[3] for m in mentions)
+    unassigned = []
+    for start, _, station, _ in mentions:
+        marker = tokens[start - 1] if start > 0 else ""
+        if marker in SOURCE_MARKERS:
+            if source is None:
+                source = station
+            elif station != source:
+                # "from X ... from Y": a correction or a second trip, let the LLM decide
+                confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+        elif marker in DEST_MARKERS:
+            if destination is None:
+                destination = station
+            elif station != destination:
+                # "to X not to Y", "to X sorry I mean to Y"
+                confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+        else:
+            unassigned.append(station)
+
+    # "X Y" / "X to Y" ordering rule for stations without their own marker
+    for station in unassigned:
+        if source is None and destination is None and len(unassigned) > 1:
+            source = station
+        elif destination is None:
+            destination = station
+        elif source is None:
+            source = station
+        else:
+            confidence *= 0.5  # more stations than roles
+
+    if source is None:
+        source = DEFAULT_SOURCE if DEFAULT_SOURCE in stations else None
+    if destination is None or source == destination:
+        return ParseResult(source, None, ticket_count, 0.0)
+    return ParseResult(source, destination, ticket_count, confidence)
+
+
+class ParserStats:
+    """Fast-path hit rate and latency, shared by all Streamlit sessions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_hits = 0
+        self.llm_fallbacks = 0
+        self.fast_seconds = 0.0
+        self.llm_seconds = 0.0
+
+    def record(self, fast_hit, parse_seconds, llm_seconds=0.0):
+        with self._lock:
+            self.fast_seconds += parse_seconds
+            if fast_hit:
+                self.fast_hits += 1
+            else:
+                self.llm_fallbacks += 1
+                self.llm_seconds += llm_seconds
+
+    def summary(self):
+        with self._lock:
+            total = self.fast_hits + self.llm_fallbacks
+            return {
+                "requests": total,
+                "fast_path_hits": self.fast_hits,
+                "llm_fallbacks": self.llm_fallbacks,
+                "hit_rate": self.fast_hits / total if total else 0.0,
+                "avg_parse_us": self.fast_seconds / total * 1e6 if total else 0.0,
+                "avg_llm_ms": self.llm_seconds / self.llm_fallbacks * 1e3 if self.llm_fallbacks else 0.0,
+            }
+
+
+STATS = ParserStats()
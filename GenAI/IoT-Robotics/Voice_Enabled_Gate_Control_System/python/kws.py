@@ -0,0 +1,233 @@
+#===-------------------------kws.py---------------------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+"""
+Lightweight keyword spotting for the gate commands.
+
+Each utterance is reduced to a mean-normalised MFCC sequence and compared
+against a handful of recorded OPEN/CLOSE templates with DTW. Only clear
+matches are accepted; everything else is left for Whisper to transcribe.
+"""
+
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+WIN_LENGTH = 400        # 25 ms
+HOP_LENGTH = 160        # 10 ms
+N_FFT = 512
+N_MELS = 26
+N_MFCC = 13
+TRIM_DB = 30.0          # frames this far below the loudest frame are trimmed
+
+# Decision rule: accept the best label only if its DTW distance is small
+# and clearly separated from the runner-up label.
+ACCEPT_DISTANCE = 6.0
+MARGIN_RATIO = 0.8
+MAX_TEMPLATES_PER_LABEL = 5
+
+# Auto-enrolment only takes utterances with a plausible command length of
+# speech (after silence trimming); once a label is full, the oldest
+# enrolled template makes room for the new one.
+# Templates recorded by hand (any name without the "auto" tag) never age out.
+ENROLL_MIN_MS = 250
+ENROLL_MAX_MS = 1500
+AUTO_TAG = "auto"
+
+LABELS = ("OPEN", "CLOSE")
+
+
+def _mel_filterbank(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mels) / sr).astype(np.int32)
+
+    fb = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        lo, mid, hi = bins[m - 1], bins[m], bins[m + 1]
+        if mid > lo:
+            fb[m - 1, lo:mid] = (np.arange(lo, mid) - lo) / (mid - lo)
+        if hi > mid:
+            fb[m - 1, mid:hi] = (hi - np.arange(mid, hi)) / (hi - mid)
+    return fb
+
+
+def _dct_matrix(n_in=N_MELS, n_out=N_MFCC):
+    n = np.arange(n_in)
+    k = np.arange(n_out)[:, None]
+    dct = np.cos(np.pi / n_in * (n + 0.5) * k) * np.sqrt(2.0 / n_in)
+    dct[0] *= np.sqrt(0.5)
+    return dct.astype(np.float32)
+
+
+_WINDOW = np.hamming(WIN_LENGTH).astype(np.float32)
+_MEL_FB = _mel_filterbank()
+_DCT = _dct_matrix()
+
+
+def mfcc(samples: np.ndarray):
+    """int16 PCM -> (frames, N_MFCC) float32, silence-trimmed and mean-normalised."""
+    x = samples.astype(np.float32) / 32768.0
+    if x.size < WIN_LENGTH:
+        x = np.pad(x, (0, WIN_LENGTH - x.size))
+    x = np.append(x[0], x[1:] - 0.97 * x[:-1])
+
+    n_frames = 1 + (x.size - WIN_LENGTH) // HOP_LENGTH
+    frames = np.lib.stride_tricks.sliding_window_view(x, WIN_LENGTH)[::HOP_LENGTH][:n_frames]
+    power = np.abs(np.fft.rfft(frames * _WINDOW, n=N_FFT)) ** 2
+    log_mel = np.log(power @ _MEL_FB.T + 1e-10)
+
+    energy_db = 10.0 * np.log10(power.sum(axis=1) + 1e-10)
+    keep = np.flatnonzero(energy_db >= energy_db.max() - TRIM_DB)
+    log_mel = log_mel[keep[0]:keep[-1] + 1]
+
+    feats = log_mel @ _DCT.T
+    return feats - feats.mean(axis=0, keepdims=True)
+
+
+def dtw_distance(query: np.ndarray, template: np.ndarray):
+    """
+    DTW with Itakura-style steps (i-1, j), (i-1, j-1), (i-1, j-2), so every
+    row depends only on the previous one and is computed in one NumPy pass.
+    Returns the path cost normalised by query length.
+    """
+    n, m = len(query), len(template)
+    if n == 0 or m == 0 or m > 2 * n:
+        return np.inf
+
+    cost = np.sqrt(((query[:, None, :] - template[None, :, :]) ** 2).sum(axis=2))
+
+    prev = np.full(m, np.inf, dtype=np.float32)
+    prev[0] = cost[0, 0]
+    shifted = np.empty(m, dtype=np.float32)
+    for i in range(1, n):
+        shifted[0] = np.inf
+        shifted[1:] = prev[:-1]
+        best = np.minimum(prev, shifted)
+        best[2:] = np.minimum(best[2:], prev[:-2])
+        prev = cost[i] + best
+    return float(prev[-1] / n)
+
+
+def load_wav(path: Path):
+    with wave.open(str(path), "rb") as wf:
+        if wf.getframerate() != SAMPLE_RATE or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz 16-bit PCM")
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+        if wf.getnchannels() > 1:
+            pcm = pcm.reshape(-1, wf.getnchannels())[:, 0]
+    return pcm
+
+
+def save_wav(path: Path, samples: np.ndarray):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(samples.astype("<i2", copy=False).tobytes())
+
+
+class KeywordSpotter:
+    """
+    DTW template matcher for OPEN/CLOSE.
+
+    Templates are WAV files named <label>_<n>.wav in template_dir. When
+    enroll() is given utterances that Whisper already resolved, they are
+    saved as <label>_auto_<ms>.wav; at most MAX_TEMPLATES_PER_LABEL are
+    kept per label and the oldest enrolled one is replaced first.
+    """
+
+    def __init__(self, template_dir: Path | None = None):
+        self.template_dir = Path(template_dir) if template_dir else None
+        self.templates = {label: [] for label in LABELS}
+        self._enrolled = {label: [] for label in LABELS}   # (features, path), oldest first
+        if self.template_dir and self.template_dir.is_dir():
+            for label in LABELS:
+                manual, auto = [], []
+                for wav_path in sorted(self.template_dir.glob(f"{label.lower()}_*.wav")):
+                    try:
+                        feats = mfcc(load_wav(wav_path))
+                    except Exception as e:
+                        print(f"[KWS] skip template {wav_path.name}: {e}", flush=True)
+                        continue
+                    if wav_path.stem.startswith(f"{label.lower()}_{AUTO_TAG}_"):
+                        auto.append((feats, wav_path))
+                    else:
+                        manual.append(feats)
+                self.templates[label] = manual + [f for f, _ in auto]
+                self._enrolled[label] = auto
+
+    @property
+    def ready(self):
+        return all(self.templates[label] for label in LABELS)
+
+    def scores(self, samples: np.ndarray):
+        feats = mfcc(samples)
+        return {
+            label: min((dtw_distance(feats, t) for t in temps), default=np.inf)
+            for label, temps in self.templates.items()
+        }
+
+    def classify(self, samples: np.ndarray):
+        """Returns (label or None, scores). None means escalate to Whisper."""
+        if not self.ready:
+            return None, {}
+        scores = self.scores(samples)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1])
+        (best_label, best), (_, second) = ranked[0], ranked[1]
+        if best <= ACCEPT_DISTANCE and best <= MARGIN_RATIO * second:
+            return best_label, scores
+        return None, scores
+
+    def enroll(self, label: str, samples: np.ndarray):
+        """
+        Add a Whisper-confirmed utterance as a template. Rejected if its
+        length is implausible for a command or the current templates match
+        it to the other label; returns whether it was added.
+        """
+        temps = self.templates.get(label)
+        if temps is None:
+            return False
+        feats = mfcc(samples)
+        duration_ms = len(feats) * HOP_LENGTH * 1000 // SAMPLE_RATE     # speech after trimming
+        if not ENROLL_MIN_MS <= duration_ms <= ENROLL_MAX_MS:
+            print(f"[KWS] not enrolling {label}: {duration_ms} ms of speech", flush=True)
+            return False
+        if self.ready:
+            other, _ = self.classify(samples)
+            if other is not None and other != label:
+                print(f"[KWS] not enrolling {label}: templates match it to {other}", flush=True)
+                return False
+
+        enrolled = self._enrolled[label]
+        if len(temps) >= MAX_TEMPLATES_PER_LABEL:
+            if not enrolled:
+                return False
+            old_feats, old_path = enrolled.pop(0)
+            temps[:] = [t for t in temps if t is not old_feats]
+            if old_path is not None:
+                old_path.unlink(missing_ok=True)
+
+        path = None
+        if self.template_dir:
+            self.template_dir.mkdir(parents=True, exist_ok=True)
+            path = self.template_dir / f"{label.lower()}_{AUTO_TAG}_{int(time.time() * 1000)}.wav"
+            save_wav(path, samples)
+        temps.append(feats)
+        enrolled.append((feats, path))
+        print(f"[KWS] enrolled {label} template ({len(temps)}/{MAX_TEMPLATES_PER_LABEL})", flush=True)
+        return True
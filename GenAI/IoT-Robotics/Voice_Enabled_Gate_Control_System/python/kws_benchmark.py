@@ -0,0 +1,139 @@
+#===-------------------------kws_benchmark.py-----------------------------===//
+# Part of the Startup-Demos Project, under the MIT License
+# See https://github.com/qualcomm/Startup-Demos/blob/main/LICENSE.txt
+# for license information.
+# Copyright (c) Qualcomm Technologies, Inc. and/or its subsidiaries.
+# SPDX-License-Identifier: MIT License
+#===----------------------------------------------------------------------===//
+
+"""
+Compare the KWS fast path with the whisper-cli transcribe_wav path.
+
+Samples are 16 kHz mono WAVs named open_*.wav, close_*.wav or anything
+else (treated as non-command). If the template directory does not hold
+both labels, templates are taken from the other samples (leave-one-out).
+
+    python3 kws_benchmark.py --samples /path/to/recordings
+"""
+
+import argparse
+import re
+import resource
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+
+from kws import KeywordSpotter, LABELS, load_wav, mfcc
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_DIR = BASE_DIR / "model"
+
+_TS_LINE_RE = re.compile(r"^\[\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}\]\s*(.*)$")
+
+
+def label_of(path: Path):
+    prefix = path.stem.split("_", 1)[0].upper()
+    return prefix if prefix in LABELS else None
+
+
+def whisper_command(whisper_bin: Path, model: Path, wav: Path):
+    """Same invocation and command rule as main.transcribe_wav/detect_command."""
+    proc = subprocess.run(
+        [str(whisper_bin), "-m", str(model), "-f", str(wav)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        cwd=str(model.parent),
+    )
+    text = " ".join(
+        m.group(1).strip()
+        for ln in (proc.stdout or "").splitlines()
+        if (m := _TS_LINE_RE.match(ln.strip())) and m.group(1).strip() != "[BLANK_AUDIO]"
+    ).lower()
+    if re.search(r"\bopen\b", text):
+        return "OPEN"
+    if re.search(r"\bclose\b", text):
+        return "CLOSE"
+    return None
+
+
+def children_cpu():
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def summarize(name, lat, cpu, correct, total, extra=""):
+    lat_ms = np.asarray(lat) * 1000.0
+    print(
+        f"{name:<10} correct={correct}/{total}  "
+        f"latency ms mean={lat_ms.mean():8.2f} p50={np.percentile(lat_ms, 50):8.2f} "
+        f"p95={np.percentile(lat_ms, 95):8.2f}  cpu s total={sum(cpu):7.3f}{extra}"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="KWS vs Whisper benchmark for gate commands")
+    ap.add_argument("--samples", required=True, type=Path, help="Directory of recorded WAV samples")
+    ap.add_argument("--templates", type=Path, default=MODEL_DIR / "kws", help="KWS template directory")
+    ap.add_argument("--whisper-bin", type=Path, default=MODEL_DIR / "whisper-cli")
+    ap.add_argument("--model", type=Path, default=MODEL_DIR / "ggml-tiny.en.bin")
+    ap.add_argument("--skip-whisper", action="store_true", help="Only benchmark the KWS path")
+    args = ap.parse_args()
+
+    wavs = sorted(args.samples.glob("*.wav"))
+    if not wavs:
+        raise SystemExit(f"No WAV files in {args.samples}")
+    pcm = {p: load_wav(p) for p in wavs}
+
+    spotter = KeywordSpotter(args.templates)
+    leave_one_out = not spotter.ready
+    feats = {p: mfcc(pcm[p]) for p in wavs} if leave_one_out else {}
+    print(f"{len(wavs)} samples, templates: {'leave-one-out' if leave_one_out else args.templates}")
+
+    kws_lat, kws_cpu, kws_ok, escalated = [], [], 0, []
+    for p in wavs:
+        if leave_one_out:
+            spotter.templates = {
+                label: [feats[q] for q in wavs if q != p and label_of(q) == label] for label in LABELS
+            }
+        c0, t0 = time.process_time(), time.perf_counter()
+        cmd, scores = spotter.classify(pcm[p])
+        kws_lat.append(time.perf_counter() - t0)
+        kws_cpu.append(time.process_time() - c0)
+        if cmd is None:
+            escalated.append(p)
+        elif cmd == label_of(p):
+            kws_ok += 1
+        score_str = " ".join(f"{k}={v:.2f}" for k, v in scores.items())
+        print(f"  KWS {p.name:<28} -> {cmd or 'ESCALATE':<9} {score_str}")
+
+    wh_lat, wh_cpu, wh_ok, wh_cmd = [], [], 0, {}
+    if not args.skip_whisper:
+        for p in wavs:
+            c0, t0 = children_cpu(), time.perf_counter()
+            cmd = whisper_command(args.whisper_bin, args.model, p)
+            wh_lat.append(time.perf_counter() - t0)
+            wh_cpu.append(children_cpu() - c0)
+            wh_cmd[p] = cmd
+            wh_ok += int(cmd == label_of(p))
+
+    print()
+    accepted = len(wavs) - len(escalated)
+    summarize(
+        "kws", kws_lat, kws_cpu, kws_ok, len(wavs),
+        f"  accepted={accepted} escalated={len(escalated)} false_accept={accepted - kws_ok}",
+    )
+    if wh_lat:
+        summarize("whisper", wh_lat, wh_cpu, wh_ok, len(wavs))
+        # Cascade: KWS first, Whisper only for escalated samples
+        idx = {p: i for i, p in enumerate(wavs)}
+        cas_lat = [kws_lat[i] + (wh_lat[i] if p in escalated else 0.0) for p, i in idx.items()]
+        cas_cpu = [kws_cpu[i] + (wh_cpu[i] if p in escalated else 0.0) for p, i in idx.items()]
+        cas_ok = kws_ok + sum(int(wh_cmd[p] == label_of(p)) for p in escalated)
+        summarize("kws+whisp", cas_lat, cas_cpu, cas_ok, len(wavs))
+
+
+if __name__ == "__main__":
+    main()
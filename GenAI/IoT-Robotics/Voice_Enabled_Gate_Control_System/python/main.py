@@ -8,16 +8,24 @@
 
 from arduino.app_utils import *
 import os
+import io
 import re
+import json
 import time
+import uuid
+import queue
+import socket
 import tempfile
 import subprocess
 import threading
+import collections
+import urllib.request
 from pathlib import Path
 
 import wave
-import struct
-import math
+import numpy as np
+
+from kws import KeywordSpotter
 
 # ----------------------------
 # Paths / Config
@@ -26,22 +34,42 @@ BASE_DIR = Path("/app/python")
 MODEL_DIR = BASE_DIR / "model"
 
 WHISPER_BIN = MODEL_DIR / "whisper-cli"
+WHISPER_SERVER_BIN = MODEL_DIR / "whisper-server"
 MODEL_FILE = MODEL_DIR / "ggml-tiny.en.bin"
 
+# Resident whisper-server keeps the model loaded between commands.
+# Falls back to spawning whisper-cli per utterance if the server binary is missing.
+WHISPER_SERVER_HOST = "127.0.0.1"
+WHISPER_SERVER_PORT = int(os.getenv("WHISPER_SERVER_PORT", "8178"))
+WHISPER_SERVER_START_TIMEOUT = 30.0
+WHISPER_REQUEST_TIMEOUT = 30.0
+
 SAMPLE_RATE = 16000
 CHANNELS = 1
 FORMAT = "S16_LE"
 
-# Increase if you want more speaking time
+# Upper bound on a single utterance; segments are cut here even if speech continues
 CHUNK_SECONDS = 4
 
+# Streaming VAD: audio is read in FRAME_MS frames from one long-running arecord
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FRAME_BYTES = FRAME_SAMPLES * CHANNELS * 2
+SPEECH_START_FRAMES = 3       # consecutive voiced frames needed to open a segment
+SPEECH_HANGOVER_MS = 450      # trailing silence that closes a segment
+PRE_ROLL_MS = 300             # audio kept from before the segment opened
+MIN_SEGMENT_MS = 250          # shorter segments are treated as clicks/noise
+
+# Keyword-spotting fast path; ambiguous utterances still go to Whisper.
+# Templates live in KWS_DIR and are enrolled from Whisper-confirmed commands.
+KWS_ENABLED = os.getenv("KWS_ENABLED", "1") != "0"
+KWS_DIR = MODEL_DIR / "kws"
+
 # Optional user override:
 #   export ALSA_DEVICE=plughw:0,0
 ALSA_DEVICE = os.getenv("ALSA_DEVICE", "").strip()
 
 DEBUG = True
-COUNTDOWN_SECONDS = 5
-MIN_WAV_BYTES = 5000
 RMS_THRESHOLD = 200
 IGNORE_REPEAT_SECONDS = 1.0
 
@@ -166,85 +194,115 @@ def ensure_mic_connected_or_continue():
 
 
 # ----------------------------
-# Countdown + WAV validation
+# Voice activity (NumPy)
 # ----------------------------
-def countdown(n=COUNTDOWN_SECONDS):
-    if n <= 0:
-        return
-    banner("GET READY TO SPEAK")
-    for i in range(n, 0, -1):
-        print(f"Starting in {i}...", flush=True)
-        time.sleep(1)
+def pcm_rms(samples: np.ndarray):
+    if samples.size == 0:
+        return 0.0
+    x = samples.astype(np.float32)
+    return float(np.sqrt(np.dot(x, x) / x.size))
 
 
-def wav_has_voice(wav_path: Path, rms_threshold=RMS_THRESHOLD):
-    try:
-        with wave.open(str(wav_path), "rb") as wf:
-            n_channels = wf.getnchannels()
-            sampwidth = wf.getsampwidth()
-            fr = wf.getframerate()
-            n_frames = wf.getnframes()
-
-            if fr != SAMPLE_RATE or n_channels != CHANNELS or sampwidth != 2:
-                return True
+def pcm_to_wav_bytes(samples: np.ndarray):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(samples.astype("<i2", copy=False).tobytes())
+    return buf.getvalue()
 
-            frames = wf.readframes(min(n_frames, SAMPLE_RATE))
-            if not frames:
-                return False
 
-            samples = struct.unpack("<" + "h" * (len(frames) // 2), frames)
-            if not samples:
-                return False
+class SpeechSegmenter:
+    """
+    Frame-level energy VAD. Feed fixed-size int16 frames with push();
+    it returns a whole utterance (int16 array) once trailing silence or
+    CHUNK_SECONDS closes the segment, otherwise None.
+    """
 
-            s2 = 0
-            for s in samples:
-                s2 += s * s
-            rms = math.sqrt(s2 / len(samples))
-            return rms >= rms_threshold
-    except Exception:
-        return True
+    def __init__(self, rms_threshold=RMS_THRESHOLD):
+        self.rms_threshold = rms_threshold
+        self.hangover_frames = max(1, SPEECH_HANGOVER_MS // FRAME_MS)
+        self.max_frames = max(1, CHUNK_SECONDS * 1000 // FRAME_MS)
+        self.min_frames = max(1, MIN_SEGMENT_MS // FRAME_MS)
+        self.pre_roll = collections.deque(maxlen=max(1, PRE_ROLL_MS // FRAME_MS))
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.frames = []
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.pre_roll.clear()
+
+    def push(self, frame: np.ndarray):
+        voiced = pcm_rms(frame) >= self.rms_threshold
+
+        if not self.active:
+            self.pre_roll.append(frame)
+            self.voiced_run = self.voiced_run + 1 if voiced else 0
+            if self.voiced_run >= SPEECH_START_FRAMES:
+                self.active = True
+                self.frames = list(self.pre_roll)
+                self.pre_roll.clear()
+                self.silent_run = 0
+            return None
+
+        self.frames.append(frame)
+        self.silent_run = 0 if voiced else self.silent_run + 1
+
+        if self.silent_run >= self.hangover_frames or len(self.frames) >= self.max_frames:
+            speech_frames = len(self.frames) - self.silent_run
+            segment = np.concatenate(self.frames)
+            self.reset()
+            if speech_frames < self.min_frames:
+                return None
+            return segment
+        return None
 
 
 # ----------------------------
-# Record Audio
+# Continuous Capture
 # ----------------------------
-def record_chunk(wav_path: Path):
-    countdown(COUNTDOWN_SECONDS)
-
-    banner("START SPEAK NOW (RECORDING...)")
-    print(f"Speak clearly for {CHUNK_SECONDS} second(s):  OPEN  or  CLOSE", flush=True)
-
-    t0 = time.perf_counter()
-
-    cmd = ["arecord"]
-    if ALSA_DEVICE:
-        cmd += ["-D", ALSA_DEVICE]
-    cmd += ["-f", FORMAT, "-r", str(SAMPLE_RATE), "-c", str(CHANNELS), "-d", str(CHUNK_SECONDS), str(wav_path)]
-
-    rc, out = run_cmd(cmd)
-    dt = time.perf_counter() - t0
-
-    banner("STOP RECORDING (RECORDING FINISHED)")
-    print(f"Record time: {dt:.3f}s", flush=True)
-
-    if rc != 0:
-        print("[RECORD] arecord failed", flush=True)
-        print(out, flush=True)
-        return False
-
-    size = wav_path.stat().st_size if wav_path.exists() else 0
-    print(f"WAV size: {size} bytes", flush=True)
-
-    if size < MIN_WAV_BYTES:
-        print("[RECORD] File too small → likely no audio", flush=True)
-        return False
-
-    if not wav_has_voice(wav_path):
-        print("[RECORD] Silence detected → speak louder / check mute", flush=True)
-        return False
-
-    print("[RECORD] Valid audio captured", flush=True)
-    return True
+class MicStream:
+    """Single long-running arecord process streaming raw PCM on stdout."""
+
+    def __init__(self):
+        self.proc = None
+
+    def start(self):
+        cmd = ["arecord", "-q"]
+        if ALSA_DEVICE:
+            cmd += ["-D", ALSA_DEVICE]
+        cmd += ["-f", FORMAT, "-r", str(SAMPLE_RATE), "-c", str(CHANNELS), "-t", "raw"]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        if DEBUG:
+            print(f"[CAPTURE] {' '.join(cmd)}", flush=True)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+    def read_frame(self):
+        if self.proc is None or self.proc.poll() is not None:
+            self.stop()
+            self.start()
+
+        buf = bytearray()
+        while len(buf) < FRAME_BYTES:
+            chunk = self.proc.stdout.read(FRAME_BYTES - len(buf))
+            if not chunk:
+                print("[CAPTURE] arecord stream ended, restarting", flush=True)
+                self.stop()
+                time.sleep(0.5)
+                return None
+            buf += chunk
+        return np.frombuffer(bytes(buf), dtype="<i2")
 
 
 # ----------------------------
@@ -284,6 +342,126 @@ def transcribe_wav(wav_path: Path):
     return (rc == 0), transcript
 
 
+class WhisperWorker:
+    """
+    Keeps whisper-server (and therefore the ggml model) resident and sends
+    each utterance to it as an in-memory WAV. If the server binary is not
+    deployed, every call falls back to whisper-cli on a temp file.
+    """
+
+    def __init__(self):
+        self.proc = None
+        self.url = f"http://{WHISPER_SERVER_HOST}:{WHISPER_SERVER_PORT}/inference"
+
+    def _port_open(self):
+        try:
+            with socket.create_connection((WHISPER_SERVER_HOST, WHISPER_SERVER_PORT), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def start(self):
+        if not WHISPER_SERVER_BIN.exists():
+            banner("whisper-server NOT FOUND → USING whisper-cli PER UTTERANCE")
+            return False
+
+        cmd = [
+            str(WHISPER_SERVER_BIN),
+            "-m", str(MODEL_FILE),
+            "--host", WHISPER_SERVER_HOST,
+            "--port", str(WHISPER_SERVER_PORT),
+        ]
+        self.proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=str(MODEL_DIR),
+        )
+
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < WHISPER_SERVER_START_TIMEOUT:
+            if self.proc.poll() is not None:
+                break
+            if self._port_open():
+                banner("WHISPER SERVER READY (MODEL RESIDENT)")
+                print(f"Model load time: {time.perf_counter() - t0:.3f}s", flush=True)
+                return True
+            time.sleep(0.2)
+
+        banner("WHISPER SERVER FAILED TO START → USING whisper-cli")
+        self.stop()
+        return False
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+    @property
+    def resident(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _post_wav(self, wav_bytes: bytes):
+        boundary = uuid.uuid4().hex
+        parts = [
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="audio.wav"\r\n'
+            "Content-Type: audio/wav\r\n\r\n".encode() + wav_bytes + b"\r\n",
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="response_format"\r\n\r\n'
+            "json\r\n".encode(),
+            f"--{boundary}--\r\n".encode(),
+        ]
+        req = urllib.request.Request(
+            self.url,
+            data=b"".join(parts),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=WHISPER_REQUEST_TIMEOUT) as resp:
+            return json.loads(resp.read().decode("utf-8", errors="replace"))
+
+    def transcribe(self, samples: np.ndarray):
+        if not self.resident:
+            return self._transcribe_cli(samples)
+
+        banner("TRANSCRIBING (SERVER)")
+        t0 = time.perf_counter()
+        try:
+            data = self._post_wav(pcm_to_wav_bytes(samples))
+        except Exception as e:
+            print(f"[WHISPER] server request failed: {e}", flush=True)
+            if not self.resident:
+                self.start()
+            return False, ""
+
+        dt = time.perf_counter() - t0
+        text = (data.get("text") or "").replace("[BLANK_AUDIO]", " ")
+        transcript = " ".join(text.split())
+
+        banner("TRANSCRIPTION COMPLETED")
+        print(f"Whisper time: {dt:.3f}s (audio {samples.size / SAMPLE_RATE:.2f}s)", flush=True)
+        print("TRANSCRIBED TEXT:", flush=True)
+        print(transcript if transcript else "(empty)", flush=True)
+        return True, transcript
+
+    def _transcribe_cli(self, samples: np.ndarray):
+        tmp_wav = None
+        try:
+            fd, name = tempfile.mkstemp(prefix="gate_", suffix=".wav", dir="/tmp")
+            os.close(fd)
+            tmp_wav = Path(name)
+            tmp_wav.write_bytes(pcm_to_wav_bytes(samples))
+            return transcribe_wav(tmp_wav)
+        finally:
+            if tmp_wav and tmp_wav.exists():
+                tmp_wav.unlink()
+
+
 def detect_command(text: str):
     t = (text or "").lower()
     for pat in OPEN_PATTERNS:
@@ -295,6 +473,12 @@ def detect_command(text: str):
     return None
 
 
+def is_bare_command(text: str):
+    """True if the transcript is nothing but one of the command phrases."""
+    t = " ".join(re.sub(r"[^a-z]+", " ", (text or "").lower()).split())
+    return any(re.fullmatch(pat, t) for pat in OPEN_PATTERNS + CLOSE_PATTERNS)
+
+
 # ----------------------------
 # LED Action (UPDATED)
 # ----------------------------
@@ -307,54 +491,92 @@ def led_action(cmd: str):
     print(f"LED MATRIX ACTION (MCU will draw): {cmd}", flush=True)
 
 
+def capture_loop(segments: queue.Queue):
+    mic = MicStream()
+    segmenter = SpeechSegmenter()
+    mic.start()
+
+    banner("LISTENING (SPEAK ANYTIME: OPEN or CLOSE)")
+    while True:
+        frame = mic.read_frame()
+        if frame is None:
+            segmenter.reset()
+            continue
+
+        segment = segmenter.push(frame)
+        if segment is None:
+            continue
+
+        # Keep only the freshest utterance if transcription is lagging
+        if segments.full():
+            try:
+                segments.get_nowait()
+                print("[CAPTURE] Transcriber busy, dropped stale utterance", flush=True)
+            except queue.Empty:
+                pass
+        segments.put_nowait((time.perf_counter(), segment))
+
+
 def voice_loop():
     global last_detected_cmd, _last_cmd_time, _last_cmd_value
 
     banner("WHISPER VOICE LOOP STARTED")
 
+    worker = WhisperWorker()
+    worker.start()
+
+    spotter = KeywordSpotter(KWS_DIR) if KWS_ENABLED else None
+    if spotter:
+        counts = ", ".join(f"{k}={len(v)}" for k, v in spotter.templates.items())
+        banner(f"KWS FAST PATH {'READY' if spotter.ready else 'ENROLLING'} ({counts})")
+
+    segments = queue.Queue(maxsize=1)
+    threading.Thread(target=capture_loop, args=(segments,), daemon=True).start()
+
     while True:
-        tmp_wav = None
-        try:
-            fd, name = tempfile.mkstemp(prefix="gate_", suffix=".wav", dir="/tmp")
-            os.close(fd)
-            tmp_wav = Path(name)
+        t_end, segment = segments.get()
+        print(f"STAGE: Utterance captured ({segment.size / SAMPLE_RATE:.2f}s)", flush=True)
 
-            print("STAGE: Recording chunk...", flush=True)
-            if not record_chunk(tmp_wav):
-                print("Invalid/silent audio. Retrying...", flush=True)
-                continue
+        cmd = None
+        if spotter and spotter.ready:
+            t0 = time.perf_counter()
+            cmd, scores = spotter.classify(segment)
+            score_str = " ".join(f"{k}={v:.2f}" for k, v in scores.items())
+            print(f"STAGE: KWS {cmd or 'AMBIGUOUS'} ({score_str}) in {time.perf_counter() - t0:.3f}s", flush=True)
 
+        if cmd is None:
             print("STAGE: Transcribing...", flush=True)
-            ok, transcript = transcribe_wav(tmp_wav)
+            ok, transcript = worker.transcribe(segment)
             if not ok:
-                print("Transcription failed. Retrying...", flush=True)
+                print("Transcription failed. Listening...", flush=True)
                 continue
 
             print("STAGE: Detecting command...", flush=True)
             cmd = detect_command(transcript)
+            # Only bare commands become templates; "don't open it yet" also
+            # detects OPEN but would teach KWS the wrong sound.
+            if cmd and spotter and is_bare_command(transcript):
+                spotter.enroll(cmd, segment)
 
-            if cmd:
-                now = time.time()
-                if _last_cmd_value == cmd and (now - _last_cmd_time) < IGNORE_REPEAT_SECONDS:
-                    print(f"Too soon repeat: {cmd} (ignored)", flush=True)
-                    continue
+        print(f"End-of-speech to command: {time.perf_counter() - t_end:.3f}s", flush=True)
 
-                _last_cmd_value = cmd
-                _last_cmd_time = now
+        if cmd:
+            now = time.time()
+            if _last_cmd_value == cmd and (now - _last_cmd_time) < IGNORE_REPEAT_SECONDS:
+                print(f"Too soon repeat: {cmd} (ignored)", flush=True)
+                continue
 
-                banner(f"DETECTED COMMAND: {cmd}")
-                last_detected_cmd = cmd
+            _last_cmd_value = cmd
+            _last_cmd_time = now
 
-                # Debug print only; MCU reads last_detected_cmd and draws matrix
-                led_action(cmd)
-            else:
-                banner("NO COMMAND DETECTED")
-                print("Say only: open / close", flush=True)
+            banner(f"DETECTED COMMAND: {cmd}")
+            last_detected_cmd = cmd
 
-        finally:
-            if tmp_wav and tmp_wav.exists():
-                tmp_wav.unlink()
-                print("Cleanup: temp wav deleted", flush=True)
+            # Debug print only; MCU reads last_detected_cmd and draws matrix
+            led_action(cmd)
+        else:
+            banner("NO COMMAND DETECTED")
+            print("Say only: open / close", flush=True)
 
 
 # PROVIDED TO MCU